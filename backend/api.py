@@ -1,7 +1,10 @@
 
 
 import os
+import asyncio
+import logging
 from dotenv import load_dotenv
+from backend.registro import configurar_logging, encerrar_logging
 
 # ==============================================================================
 # LÓGICA DE CARREGAMENTO DE AMBIENTE À PROVA DE FALHAS
@@ -15,28 +18,44 @@ project_root = os.path.dirname(base_dir)
 dotenv_path = os.path.join(project_root, '.env')
 
 # 4. Se o arquivo .env for encontrado nesse caminho, carrega as variáveis dele
-if os.path.exists(dotenv_path):
-    print(f"INFO: Carregando variáveis de ambiente do arquivo: {dotenv_path}")
+env_encontrado = os.path.exists(dotenv_path)
+if env_encontrado:
     load_dotenv(dotenv_path=dotenv_path)
+# 5. Logging em fila (ver registro.py); depois do .env, que pode trazer ESCALA_LOG_NIVEL/FORMATO
+configurar_logging()
+logger = logging.getLogger("backend.api")
+if env_encontrado:
+    logger.info("Variáveis de ambiente carregadas do arquivo: %s", dotenv_path)
 else:
-    print(f"INFO: Arquivo .env não encontrado em '{dotenv_path}'. Usando variáveis de ambiente do sistema (ideal para produção no Render).")
+    logger.info("Arquivo .env não encontrado em '%s'. Usando variáveis de ambiente do sistema (ideal para produção no Render).", dotenv_path)
 # ==============================================================================
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from backend.pdf_generator import gerar_pdf_escala
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, Request
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordRequestForm
 from backend.auth import create_access_token, get_current_user, Token
 import pandas as pd
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Dict, List
 import numpy as np
 from datetime import datetime
 from collections import defaultdict
-from backend.db_utils import verificar_login_puro
-
-
-from backend.database import (
+from backend import cache_escala
+from backend.db_utils import fechar_pool
+from backend.migrations import aplicar_migracoes
+from backend.motor_escala import MOTORES, MODOS, MAX_TENTATIVAS, encerrar_pool_processos
+
+
+# Todas as funções de dados são as versões assíncronas (mesma API de database.py).
+from backend.database_async import (
+    executar_bloqueante,
+    encerrar_executores,
+    verificar_login_puro,
+    get_grupo_by_id,
+    inativar_voluntario,
+    get_voluntarios_for_funcao,
     add_funcao,
     add_servico_fixo,
     add_voluntario,
@@ -45,8 +64,15 @@ from backend.database import (
     delete_funcao,
     delete_grupo,
     delete_servico_fixo,
-    ensure_connection,
-    gerar_escala_automatica,
+    submeter_geracao,
+    consultar_job,
+    rastro_do_job,
+    atualizar_vagas_em_lote,
+    alteracoes_desde,
+    elegibilidade_do_mes,
+    desfazer_edicao,
+    refazer_edicao,
+    marcar_jobs_abandonados,
     get_all_grupos_com_membros,
     get_all_ministerios,
     get_all_voluntarios_com_detalhes,
@@ -56,6 +82,11 @@ from backend.database import (
     get_events_for_month,
     create_events_for_month, # <-- Adicionada
     update_escala_entry,
+    reverter_escala_do_mes,
+    planejar_reparo_ausencia,
+    simular_escala,
+    analisar_escala,
+    aplicar_reparo_ausencia,
     get_escala_completa,
     get_funcoes_of_voluntario,
     get_voluntario_by_id,
@@ -102,11 +133,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def aplicar_migracoes_pendentes():
+    await executar_bloqueante(aplicar_migracoes)
+    await marcar_jobs_abandonados()
+
+@app.on_event("shutdown")
+def encerrar_pool_de_conexoes():
+    encerrar_executores()
+    encerrar_pool_processos()
+    fechar_pool()
+    encerrar_logging()
+
 # NOVO ENDPOINT DE LOGIN
 @app.post("/token", response_model=Token, tags=["Autenticação"])
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
     # Altere esta linha para chamar a função pura
-    id_ministerio = verificar_login_puro(form_data.username, form_data.password)
+    id_ministerio = await verificar_login_puro(form_data.username, form_data.password)
     
     if not id_ministerio:
         raise HTTPException(
@@ -126,37 +169,31 @@ async def read_users_me(current_user: dict = Depends(get_current_user)):
 
 # --- Endpoints da API ---
 @app.get("/")
-def read_root():
+async def read_root():
     return {"Status": "API da Escala Connect está online"}
 
 # --- Endpoints de Ministérios ---
 @app.get("/ministerios", tags=["Ministérios"])
-def get_todos_ministerios():
-    conn = ensure_connection()
-    if conn is None:
-        raise HTTPException(status_code=500, detail="Não foi possível conectar ao banco de dados")
-    try:
-        query = "SELECT id_ministerio, nome_ministerio FROM ministerios ORDER BY nome_ministerio"
-        df = pd.read_sql(query, conn)
-        return df.to_dict('records')
-    finally:
-        if conn:
-            conn.close()
+async def get_todos_ministerios():
+    df = await get_all_ministerios()
+    return df.to_dict('records')
 
 # NOVO ENDPOINT DE DASHBOARD
 @app.get("/ministerios/{id_ministerio}/dashboard", tags=["Dashboard"])
-def get_dashboard_data(id_ministerio: int, current_user: dict = Depends(get_current_user)):
+async def get_dashboard_data(id_ministerio: int, current_user: dict = Depends(get_current_user)):
     if current_user["id_ministerio"] != id_ministerio:
         raise HTTPException(status_code=403, detail="Acesso não autorizado")
 
-    # 1. Carrega dados básicos
-    grupos_df = get_all_grupos_com_membros(id_ministerio)
-    eventos_mes_atual_df = get_events_for_month(datetime.now().year, datetime.now().month, id_ministerio)
-    cotas_df = get_cotas_all_servicos()
-    
+    # 1. Carrega dados básicos e
     # 2. Carrega voluntários COM DETALHES (incluindo inativos para calcular os dias off)
-    # Note que usamos include_inactive=True
-    todos_voluntarios = get_all_voluntarios_com_detalhes(id_ministerio, include_inactive=True)
+    # Note que usamos include_inactive=True. As consultas são independentes e rodam em paralelo.
+    grupos_df, eventos_mes_atual_df, cotas_df, todos_voluntarios, funcoes_ref = await asyncio.gather(
+        get_all_grupos_com_membros(id_ministerio),
+        get_events_for_month(datetime.now().year, datetime.now().month, id_ministerio),
+        get_cotas_all_servicos(),
+        get_all_voluntarios_com_detalhes(id_ministerio, include_inactive=True),
+        view_all_funcoes(id_ministerio),
+    )
     
     if todos_voluntarios.empty:
         # Retorno seguro caso não tenha ninguém cadastrado
@@ -207,7 +244,6 @@ def get_dashboard_data(id_ministerio: int, current_user: dict = Depends(get_curr
     # Contagem de funções (precisa expandir as listas)
     contagem_funcoes = defaultdict(int)
     # Busca nomes das funções para o gráfico
-    funcoes_ref = view_all_funcoes(id_ministerio)
     mapa_nomes_funcao = funcoes_ref.set_index('id_funcao')['nome_funcao'].to_dict()
     
     for lista_ids in voluntarios_ativos['funcoes']:
@@ -247,14 +283,14 @@ class FuncaoUpdate(FuncaoBase):
     
 
 @app.get("/ministerios/{id_ministerio}/funcoes", tags=["Funções"])
-def get_funcoes_por_ministerio(id_ministerio: int):
-    df_funcoes = view_all_funcoes(id_ministerio)
+async def get_funcoes_por_ministerio(id_ministerio: int):
+    df_funcoes = await view_all_funcoes(id_ministerio)
     return df_funcoes.to_dict('records')
 
 @app.post("/ministerios/{id_ministerio}/funcoes", tags=["Funções"])
-def create_funcao_no_ministerio(id_ministerio: int, funcao: FuncaoCreate):
+async def create_funcao_no_ministerio(id_ministerio: int, funcao: FuncaoCreate):
     # Passando os novos campos para a função add_funcao
-    add_funcao(
+    await add_funcao(
         nome_funcao=funcao.nome_funcao,
         descricao=funcao.descricao,
         id_ministerio=id_ministerio,
@@ -264,9 +300,9 @@ def create_funcao_no_ministerio(id_ministerio: int, funcao: FuncaoCreate):
     return {"status": "success", "message": f"Função '{funcao.nome_funcao}' criada."}
 
 @app.put("/funcoes/{id_funcao}", tags=["Funções"])
-def update_funcao_by_id(id_funcao: int, funcao: FuncaoUpdate):
+async def update_funcao_by_id(id_funcao: int, funcao: FuncaoUpdate):
     # Passando os novos campos para a função update_funcao
-    update_funcao(
+    await update_funcao(
         id_funcao=id_funcao,
         novo_nome=funcao.nome_funcao,
         nova_descricao=funcao.descricao,
@@ -276,8 +312,8 @@ def update_funcao_by_id(id_funcao: int, funcao: FuncaoUpdate):
     return {"status": "success", "message": f"Função ID {id_funcao} atualizada."}
 
 @app.delete("/funcoes/{id_funcao}", tags=["Funções"])
-def delete_funcao_by_id(id_funcao: int):
-    delete_funcao(id_funcao)
+async def delete_funcao_by_id(id_funcao: int):
+    await delete_funcao(id_funcao)
     return {"status": "success", "message": f"Função ID {id_funcao} excluída."}
 
 # --- Endpoints de Serviços e Cotas ---
@@ -293,33 +329,33 @@ class CotasUpdate(BaseModel):
 
 
 @app.get("/ministerios/{id_ministerio}/servicos", tags=["Serviços"])
-def get_servicos_por_ministerio(id_ministerio: int):
-    df_servicos = view_all_servicos_fixos(id_ministerio)
+async def get_servicos_por_ministerio(id_ministerio: int):
+    df_servicos = await view_all_servicos_fixos(id_ministerio)
     return df_servicos.to_dict('records')
 
 @app.post("/ministerios/{id_ministerio}/servicos", tags=["Serviços"])
-def create_servico_no_ministerio(id_ministerio: int, servico: ServicoCreate):
-    add_servico_fixo(nome=servico.nome_servico, dia_da_semana=servico.dia_da_semana, id_ministerio=id_ministerio)
+async def create_servico_no_ministerio(id_ministerio: int, servico: ServicoCreate):
+    await add_servico_fixo(nome=servico.nome_servico, dia_da_semana=servico.dia_da_semana, id_ministerio=id_ministerio)
     return {"status": "success", "message": f"Serviço '{servico.nome_servico}' criado."}
 
 @app.put("/servicos/{id_servico}", tags=["Serviços"])
-def update_servico_by_id(id_servico: int, servico: ServicoUpdate):
-    update_servico_fixo(id_servico=id_servico, nome=servico.nome_servico, dia_da_semana=servico.dia_da_semana, ativo=servico.ativo)
+async def update_servico_by_id(id_servico: int, servico: ServicoUpdate):
+    await update_servico_fixo(id_servico=id_servico, nome=servico.nome_servico, dia_da_semana=servico.dia_da_semana, ativo=servico.ativo)
     return {"status": "success", "message": f"Serviço ID {id_servico} atualizado."}
 
 @app.delete("/servicos/{id_servico}", tags=["Serviços"])
-def delete_servico_by_id(id_servico: int):
-    delete_servico_fixo(id_servico)
+async def delete_servico_by_id(id_servico: int):
+    await delete_servico_fixo(id_servico)
     return {"status": "success", "message": f"Serviço ID {id_servico} excluído."}
 
 @app.get("/servicos/{id_servico}/cotas", tags=["Serviços"])
-def get_cotas_do_servico(id_servico: int):
-    cotas = get_cotas_for_servico(id_servico)
+async def get_cotas_do_servico(id_servico: int):
+    cotas = await get_cotas_for_servico(id_servico)
     return cotas
 
 @app.put("/servicos/{id_servico}/cotas", tags=["Serviços"])
-def update_cotas_do_servico(id_servico: int, cotas_data: CotasUpdate):
-    update_cotas_servico(id_servico, cotas_data.cotas)
+async def update_cotas_do_servico(id_servico: int, cotas_data: CotasUpdate):
+    await update_cotas_servico(id_servico, cotas_data.cotas)
     return {"status": "success", "message": f"Cotas do serviço ID {id_servico} atualizadas."}
 
 # --- Endpoints de Voluntários ---
@@ -336,60 +372,52 @@ class VoluntarioUpdate(VoluntarioBase):
     pass
 
 @app.get("/ministerios/{id_ministerio}/voluntarios", tags=["Voluntários"])
-def get_voluntarios_por_ministerio(id_ministerio: int, inativos: bool = False):
-    df_voluntarios = get_all_voluntarios_com_detalhes(id_ministerio, include_inactive=inativos)
+async def get_voluntarios_por_ministerio(id_ministerio: int, inativos: bool = False):
+    df_voluntarios = await get_all_voluntarios_com_detalhes(id_ministerio, include_inactive=inativos)
     
     # Tratamento para JSON (Pandas NaN vira None)
     df_processado = df_voluntarios.replace({np.nan: None})
     return df_processado.to_dict('records')
 
 @app.get("/voluntarios/{id_voluntario}/detalhes", tags=["Voluntários"])
-def get_detalhes_do_voluntario(id_voluntario: int):
-    dados_principais = get_voluntario_by_id(id_voluntario)
+async def get_detalhes_do_voluntario(id_voluntario: int):
+    dados_principais = await get_voluntario_by_id(id_voluntario)
     if dados_principais is None:
         raise HTTPException(status_code=404, detail="Voluntário não encontrado")
-    funcoes_ids = get_funcoes_of_voluntario(id_voluntario)
-    disponibilidade_ids = get_disponibilidade_of_voluntario(id_voluntario)
+    funcoes_ids = await get_funcoes_of_voluntario(id_voluntario)
+    disponibilidade_ids = await get_disponibilidade_of_voluntario(id_voluntario)
     resposta = dados_principais.to_dict()
     resposta['funcoes_ids'] = funcoes_ids
     resposta['disponibilidade_ids'] = disponibilidade_ids
     return resposta
 
 @app.post("/ministerios/{id_ministerio}/voluntarios", tags=["Voluntários"])
-def create_voluntario_no_ministerio(id_ministerio: int, voluntario: VoluntarioCreate):
-    id_novo_voluntario = add_voluntario(nome=voluntario.nome_voluntario, limite_mes=voluntario.limite_escalas_mes, nivel_experiencia=voluntario.nivel_experiencia, id_ministerio=id_ministerio)
+async def create_voluntario_no_ministerio(id_ministerio: int, voluntario: VoluntarioCreate):
+    id_novo_voluntario = await add_voluntario(nome=voluntario.nome_voluntario, limite_mes=voluntario.limite_escalas_mes, nivel_experiencia=voluntario.nivel_experiencia, id_ministerio=id_ministerio)
     if id_novo_voluntario is None:
         raise HTTPException(status_code=500, detail="Erro ao criar o registro principal do voluntário.")
-    atualizar_funcoes_do_voluntario(id_novo_voluntario, voluntario.funcoes_ids)
-    update_disponibilidade_of_voluntario(id_novo_voluntario, voluntario.disponibilidade_ids)
+    await atualizar_funcoes_do_voluntario(id_novo_voluntario, voluntario.funcoes_ids)
+    await update_disponibilidade_of_voluntario(id_novo_voluntario, voluntario.disponibilidade_ids)
     return {"status": "success", "message": f"Voluntário '{voluntario.nome_voluntario}' criado com sucesso.", "id_voluntario": id_novo_voluntario}
 
 @app.put("/voluntarios/{id_voluntario}", tags=["Voluntários"])
-def update_voluntario_by_id(id_voluntario: int, voluntario: VoluntarioUpdate):
-    update_voluntario(id_voluntario=id_voluntario, nome=voluntario.nome_voluntario, limite_mes=voluntario.limite_escalas_mes, ativo=voluntario.ativo, nivel_experiencia=voluntario.nivel_experiencia)
-    atualizar_funcoes_do_voluntario(id_voluntario, voluntario.funcoes_ids)
-    update_disponibilidade_of_voluntario(id_voluntario, voluntario.disponibilidade_ids)
+async def update_voluntario_by_id(id_voluntario: int, voluntario: VoluntarioUpdate):
+    await update_voluntario(id_voluntario=id_voluntario, nome=voluntario.nome_voluntario, limite_mes=voluntario.limite_escalas_mes, ativo=voluntario.ativo, nivel_experiencia=voluntario.nivel_experiencia)
+    await atualizar_funcoes_do_voluntario(id_voluntario, voluntario.funcoes_ids)
+    await update_disponibilidade_of_voluntario(id_voluntario, voluntario.disponibilidade_ids)
     return {"status": "success", "message": f"Voluntário ID {id_voluntario} atualizado."}
 
 @app.delete("/voluntarios/{id_voluntario}", tags=["Voluntários"])
-def delete_voluntario_by_id(id_voluntario: int):
-    conn = ensure_connection()
-    if conn is None:
-        raise HTTPException(status_code=500, detail="Erro de conexão com o banco de dados")
+async def delete_voluntario_by_id(id_voluntario: int):
     try:
-        with conn.cursor() as cur:
-            cur.execute("UPDATE voluntarios SET ativo = FALSE WHERE id_voluntario = %s", (id_voluntario,))
-            if cur.rowcount == 0:
-                conn.rollback()
-                raise HTTPException(status_code=404, detail="Voluntário não encontrado")
-        conn.commit()
-        return {"status": "success", "message": f"Voluntário ID {id_voluntario} inativado."}
+        inativado = await inativar_voluntario(id_voluntario)
     except Exception as e:
-        conn.rollback()
         raise HTTPException(status_code=500, detail=f"Erro no servidor: {e}")
-    finally:
-        if conn:
-            conn.close()
+    if inativado is None:
+        raise HTTPException(status_code=500, detail="Erro de conexão com o banco de dados")
+    if not inativado:
+        raise HTTPException(status_code=404, detail="Voluntário não encontrado")
+    return {"status": "success", "message": f"Voluntário ID {id_voluntario} inativado."}
 
 
     # --- ENDPOINTS DE INDISPONIBILIDADE VOLUNTÁRIOS---
@@ -398,23 +426,23 @@ class IndisponibilidadeUpdate(BaseModel):
     eventos_ids: List[int]
 
 @app.get("/voluntarios/{id_voluntario}/eventos-disponiveis/{ano}/{mes}", tags=["Voluntários"])
-def get_eventos_disponiveis_para_voluntario(id_voluntario: int, ano: int, mes: int, current_user: dict = Depends(get_current_user)):
-    servicos_disponiveis_ids = get_disponibilidade_of_voluntario(id_voluntario)
+async def get_eventos_disponiveis_para_voluntario(id_voluntario: int, ano: int, mes: int, current_user: dict = Depends(get_current_user)):
+    servicos_disponiveis_ids = await get_disponibilidade_of_voluntario(id_voluntario)
     id_ministerio = current_user['id_ministerio']
-    eventos_do_mes_df = get_events_for_month(ano, mes, id_ministerio)
+    eventos_do_mes_df = await get_events_for_month(ano, mes, id_ministerio)
     if eventos_do_mes_df.empty or not servicos_disponiveis_ids:
         return []
     eventos_relevantes_df = eventos_do_mes_df[eventos_do_mes_df['id_servico_fixo'].isin(servicos_disponiveis_ids)]
     return eventos_relevantes_df.to_dict('records')
 
 @app.get("/voluntarios/{id_voluntario}/indisponibilidade/{ano}/{mes}", tags=["Voluntários"])
-def get_voluntario_indisponibilidade(id_voluntario: int, ano: int, mes: int, current_user: dict = Depends(get_current_user)):
-    eventos_ids = get_indisponibilidade_eventos(id_voluntario, ano, mes)
+async def get_voluntario_indisponibilidade(id_voluntario: int, ano: int, mes: int, current_user: dict = Depends(get_current_user)):
+    eventos_ids = await get_indisponibilidade_eventos(id_voluntario, ano, mes)
     return {"eventos_ids": eventos_ids}
 
 @app.put("/voluntarios/{id_voluntario}/indisponibilidade/{ano}/{mes}", tags=["Voluntários"])
-def update_voluntario_indisponibilidade(id_voluntario: int, ano: int, mes: int, data: IndisponibilidadeUpdate, current_user: dict = Depends(get_current_user)):
-    sucesso = update_indisponibilidade_eventos(id_voluntario, ano, mes, data.eventos_ids)
+async def update_voluntario_indisponibilidade(id_voluntario: int, ano: int, mes: int, data: IndisponibilidadeUpdate, current_user: dict = Depends(get_current_user)):
+    sucesso = await update_indisponibilidade_eventos(id_voluntario, ano, mes, data.eventos_ids)
     if not sucesso:
         raise HTTPException(status_code=500, detail="Falha ao salvar indisponibilidades no banco de dados.")
     return {"status": "success", "message": "Indisponibilidades atualizadas com sucesso."}
@@ -430,57 +458,50 @@ class GrupoUpdate(GrupoBase):
     pass
 
 @app.get("/ministerios/{id_ministerio}/grupos", tags=["Vínculos"])
-def get_grupos_por_ministerio(id_ministerio: int):
-    df_grupos = get_all_grupos_com_membros(id_ministerio)
+async def get_grupos_por_ministerio(id_ministerio: int):
+    df_grupos = await get_all_grupos_com_membros(id_ministerio)
     return df_grupos.to_dict('records')
 
 @app.get("/ministerios/{id_ministerio}/voluntarios-sem-grupo", tags=["Vínculos"])
-def get_voluntarios_livres_por_ministerio(id_ministerio: int):
-    df_voluntarios = get_voluntarios_sem_grupo(id_ministerio)
+async def get_voluntarios_livres_por_ministerio(id_ministerio: int):
+    df_voluntarios = await get_voluntarios_sem_grupo(id_ministerio)
     return df_voluntarios.to_dict('records')
 
 # << FUNÇÃO COM A INDENTAÇÃO CORRIGIDA >>
 @app.get("/grupos/{id_grupo}/detalhes", tags=["Vínculos"])
-def get_detalhes_do_grupo(id_grupo: int):
+async def get_detalhes_do_grupo(id_grupo: int):
     """Retorna os dados de um grupo e os detalhes de seus membros."""
-    conn = ensure_connection()
-    if conn is None:
+    grupo_info_df, membros_df = await asyncio.gather(
+        get_grupo_by_id(id_grupo),
+        get_voluntarios_do_grupo(id_grupo),
+    )
+    if grupo_info_df is None:
         raise HTTPException(status_code=500, detail="Erro de conexão com o banco de dados")
-    
-    try:
-        query_grupo = "SELECT * FROM grupos_vinculados WHERE id_grupo = %s"
-        grupo_info_df = pd.read_sql(query_grupo, conn, params=(id_grupo,))
-        
-        if grupo_info_df.empty:
-            raise HTTPException(status_code=404, detail="Grupo não encontrado")
-            
-        membros_df = get_voluntarios_do_grupo(id_grupo)
-        
-        resposta = grupo_info_df.to_dict('records')[0]
-        resposta['membros'] = membros_df.to_dict('records')
+    if grupo_info_df.empty:
+        raise HTTPException(status_code=404, detail="Grupo não encontrado")
 
-        return resposta
-    finally:
-        if conn:
-            conn.close()
+    resposta = grupo_info_df.to_dict('records')[0]
+    resposta['membros'] = membros_df.to_dict('records')
+
+    return resposta
 
 @app.post("/ministerios/{id_ministerio}/grupos", tags=["Vínculos"])
-def create_grupo_no_ministerio(id_ministerio: int, grupo: GrupoCreate):
+async def create_grupo_no_ministerio(id_ministerio: int, grupo: GrupoCreate):
     if len(grupo.membros_ids) < 2:
         raise HTTPException(status_code=400, detail="Um grupo precisa de pelo menos 2 membros.")
-    create_grupo(nome_grupo=grupo.nome_grupo, ids_membros=grupo.membros_ids, id_ministerio=id_ministerio, limite_grupo=grupo.limite_escalas_grupo)
+    await create_grupo(nome_grupo=grupo.nome_grupo, ids_membros=grupo.membros_ids, id_ministerio=id_ministerio, limite_grupo=grupo.limite_escalas_grupo)
     return {"status": "success", "message": f"Grupo '{grupo.nome_grupo}' criado com sucesso."}
 
 @app.put("/grupos/{id_grupo}", tags=["Vínculos"])
-def update_grupo_by_id(id_grupo: int, grupo: GrupoUpdate):
+async def update_grupo_by_id(id_grupo: int, grupo: GrupoUpdate):
     if len(grupo.membros_ids) < 2:
         raise HTTPException(status_code=400, detail="Um grupo precisa de pelo menos 2 membros.")
-    update_grupo(id_grupo=id_grupo, novo_nome=grupo.nome_grupo, ids_membros_novos=grupo.membros_ids, novo_limite=grupo.limite_escalas_grupo)
+    await update_grupo(id_grupo=id_grupo, novo_nome=grupo.nome_grupo, ids_membros_novos=grupo.membros_ids, novo_limite=grupo.limite_escalas_grupo)
     return {"status": "success", "message": f"Grupo ID {id_grupo} atualizado com sucesso."}
 
 @app.delete("/grupos/{id_grupo}", tags=["Vínculos"])
-def delete_grupo_by_id(id_grupo: int):
-    delete_grupo(id_grupo)
+async def delete_grupo_by_id(id_grupo: int):
+    await delete_grupo(id_grupo)
     return {"status": "success", "message": f"Grupo ID {id_grupo} excluído com sucesso."}
 
 # ==============================================================================
@@ -503,7 +524,7 @@ class EscalaRequest(BaseModel):
 
 
 @app.post("/ministerios/{id_ministerio}/eventos/criar", tags=["Eventos"])
-def endpoint_criar_eventos(
+async def endpoint_criar_eventos(
     id_ministerio: int,
     request_data: EscalaRequest,
     current_user: dict = Depends(get_current_user)
@@ -512,7 +533,7 @@ def endpoint_criar_eventos(
         raise HTTPException(status_code=403, detail="Acesso não autorizado")
 
     # Chama a função do database.py que você já tinha no projeto antigo
-    sucesso = create_events_for_month(request_data.ano, request_data.mes, id_ministerio)
+    sucesso = await create_events_for_month(request_data.ano, request_data.mes, id_ministerio)
     
     if sucesso:
         return {
@@ -524,33 +545,240 @@ def endpoint_criar_eventos(
 
 
 @app.get("/ministerios/{id_ministerio}/escala/{ano}/{mes}", tags=["Escala"])
-def endpoint_get_escala(id_ministerio: int, ano: int, mes: int):
+async def endpoint_get_escala(id_ministerio: int, ano: int, mes: int, request: Request):
     """
     Busca a escala completa já gerada para um mês e ano específicos.
+    A resposta fica em cache até a escala do mês mudar (cache_escala.py); com If-None-Match
+    igual ao ETag, a resposta é 304 sem corpo.
     """
-    escala_df = get_escala_completa(ano, mes, id_ministerio)
-    if escala_df.empty:
-        return []  # Retorna lista vazia se não houver escala
-    
-    # Substitui valores NaN por None para compatibilidade com JSON
-    df_processado = escala_df.replace({np.nan: None})
-    return df_processado.to_dict("records")
+    entrada = cache_escala.obter(id_ministerio, ano, mes)
+    if entrada is None:
+        versao = cache_escala.versao_do_mes(id_ministerio, ano, mes)
+        escala_df = await get_escala_completa(ano, mes, id_ministerio)
+        # Substitui valores NaN por None para compatibilidade com JSON (lista vazia se não houver escala)
+        registros = [] if escala_df.empty else escala_df.replace({np.nan: None}).to_dict("records")
+        corpo = JSONResponse(content=jsonable_encoder(registros)).body
+        entrada = cache_escala.guardar(id_ministerio, ano, mes, versao, corpo)
+
+    # no-cache: o navegador guarda, mas sempre revalida com If-None-Match.
+    cabecalhos = {"ETag": entrada.etag, "Cache-Control": "private, no-cache"}
+    if cache_escala.etag_confere(request.headers.get("if-none-match"), entrada.etag):
+        return Response(status_code=304, headers=cabecalhos)
+    return Response(content=entrada.corpo, media_type="application/json", headers=cabecalhos)
+
+
+@app.post("/ministerios/{id_ministerio}/escala/gerar", status_code=202, tags=["Escala"])
+async def endpoint_gerar_escala(
+    id_ministerio: int,
+    request_data: EscalaRequest,
+    engine: str = Query("greedy", description="Motor de alocação: greedy, flow ou milp"),
+    tempo_limite: float | None = Query(None, gt=0, le=300, description="Segundos para o motor flow/milp antes de usar o guloso"),
+    tentativas: int = Query(1, ge=1, le=MAX_TENTATIVAS, description="Gerações paralelas com sementes diferentes; grava só a melhor"),
+    busca_local: bool = Query(True, description="Tenta preencher as vagas que o guloso deixou abertas com trocas entre alocações"),
+    modo: str = Query("completo", description="completo (refaz o mês, menos as vagas fixadas) ou incremental (só as vagas vazias ou invalidadas)"),
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["id_ministerio"] != id_ministerio:
+        raise HTTPException(status_code=403, detail="Acesso não autorizado")
+    if engine not in MOTORES:
+        raise HTTPException(status_code=400, detail=f"Motor inválido. Opções: {', '.join(MOTORES)}.")
+    if modo not in MODOS:
+        raise HTTPException(status_code=400, detail=f"Modo inválido. Opções: {', '.join(MODOS)}.")
+
+    # A geração roda em segundo plano (jobs_escala.py); o frontend acompanha pelo id_job.
+    return await submeter_geracao(id_ministerio, request_data.ano, request_data.mes, engine, tempo_limite, tentativas, busca_local, modo)
 
 
-@app.post("/ministerios/{id_ministerio}/escala/gerar", tags=["Escala"])
-def endpoint_gerar_escala(
+class HipoteseCota(BaseModel):
+    id_servico: int
+    id_funcao: int
+    quantidade_necessaria: int = Field(ge=0)
+
+class HipoteseVoluntario(BaseModel):
+    id_voluntario: int
+    limite_escalas_mes: int | None = Field(None, ge=0)
+    funcoes: List[int] | None = None            # ids das funções
+    disponibilidade: List[int] | None = None    # ids dos serviços fixos
+    indisponibilidades: List[int] | None = None # ids dos eventos do mês
+
+class SimulacaoRequest(EscalaRequest):
+    cotas: List[HipoteseCota] = []
+    voluntarios: List[HipoteseVoluntario] = []
+
+
+@app.post("/ministerios/{id_ministerio}/escala/simular", tags=["Escala"])
+async def endpoint_simular_escala(
     id_ministerio: int,
-    request_data: EscalaRequest,
+    request_data: SimulacaoRequest,
+    engine: str = Query("greedy", description="Motor de alocação: greedy, flow ou milp"),
+    tempo_limite: float | None = Query(None, gt=0, le=60, description="Segundos para o motor flow/milp antes de usar o guloso"),
+    tentativas: int = Query(1, ge=1, le=MAX_TENTATIVAS, description="Gerações paralelas com sementes diferentes; fica a melhor"),
+    busca_local: bool = Query(True, description="Tenta preencher as vagas que o guloso deixou abertas com trocas entre alocações"),
+    modo: str = Query("completo", description="completo ou incremental (como na geração)"),
+    semente: int | None = Query(None, description="Semente do sorteio, para simulações reprodutíveis"),
     current_user: dict = Depends(get_current_user)
 ):
+    """
+    Simula a geração (com hipóteses opcionais: cotas, disponibilidade, limites...) sem gravar
+    nada e retorna a diferença para a escala publicada: vagas adicionadas, removidas e trocadas,
+    preenchimento e carga de cada voluntário.
+    """
     if current_user["id_ministerio"] != id_ministerio:
         raise HTTPException(status_code=403, detail="Acesso não autorizado")
+    if engine not in MOTORES:
+        raise HTTPException(status_code=400, detail=f"Motor inválido. Opções: {', '.join(MOTORES)}.")
+    if modo not in MODOS:
+        raise HTTPException(status_code=400, detail=f"Modo inválido. Opções: {', '.join(MODOS)}.")
+
+    resultado = await simular_escala(
+        request_data.ano, request_data.mes, id_ministerio, engine, tempo_limite, tentativas, busca_local, modo,
+        cotas=[c.model_dump() for c in request_data.cotas],
+        voluntarios=[v.model_dump() for v in request_data.voluntarios],
+        semente=semente,
+    )
+    if resultado["status"] == "error":
+        raise HTTPException(status_code=400, detail=resultado["message"])
+    return resultado
+
+
+@app.get("/ministerios/{id_ministerio}/escala/jobs/{id_job}", tags=["Escala"])
+async def endpoint_status_job_escala(id_ministerio: int, id_job: str, current_user: dict = Depends(get_current_user)):
+    """ Status, fase, contadores de progresso e, ao final, o resumo de um job de geração. """
+    if current_user["id_ministerio"] != id_ministerio:
+        raise HTTPException(status_code=403, detail="Acesso não autorizado")
+    job = await consultar_job(id_job)
+    if job is None or job["id_ministerio"] != id_ministerio:
+        raise HTTPException(status_code=404, detail="Job não encontrado.")
+    return job
 
-    try:
-        gerar_escala_automatica(request_data.ano, request_data.mes, id_ministerio)
-        return {"status": "success", "message": "Escala gerada com sucesso!"}
-    except Exception:
-        raise HTTPException(status_code=500, detail="Ocorreu um erro interno ao gerar a escala.")
+
+@app.get("/ministerios/{id_ministerio}/escala/jobs/{id_job}/rastro", tags=["Escala"])
+async def endpoint_rastro_job(id_ministerio: int, id_job: str, current_user: dict = Depends(get_current_user)):
+    """ Log da execução de um job de geração, com cada alocação (só enquanto o job está na memória do worker). """
+    if current_user["id_ministerio"] != id_ministerio:
+        raise HTTPException(status_code=403, detail="Acesso não autorizado")
+    rastro = await rastro_do_job(id_job)
+    if rastro is None or rastro["id_ministerio"] != id_ministerio:
+        raise HTTPException(status_code=404, detail="Rastro não encontrado (o job não existe ou rodou em outro worker).")
+    return rastro
+
+
+@app.get("/ministerios/{id_ministerio}/escala/{ano}/{mes}/viabilidade", tags=["Escala"])
+async def endpoint_viabilidade_escala(id_ministerio: int, ano: int, mes: int, current_user: dict = Depends(get_current_user)):
+    """
+    Quantas vagas dá para preencher, no máximo, por função e serviço (com os dados atuais) e
+    por que as vagas abertas da escala publicada estão abertas.
+    """
+    if current_user["id_ministerio"] != id_ministerio:
+        raise HTTPException(status_code=403, detail="Acesso não autorizado")
+    resultado = await analisar_escala(ano, mes, id_ministerio)
+    if resultado["status"] == "error":
+        raise HTTPException(status_code=400, detail=resultado["message"])
+    return resultado
+
+
+@app.post("/ministerios/{id_ministerio}/escala/{ano}/{mes}/reverter", tags=["Escala"])
+async def endpoint_reverter_escala(id_ministerio: int, ano: int, mes: int, current_user: dict = Depends(get_current_user)):
+    """ Volta a escala do mês para a versão publicada anterior (chamar de novo desfaz). """
+    if current_user["id_ministerio"] != id_ministerio:
+        raise HTTPException(status_code=403, detail="Acesso não autorizado")
+    id_versao = await reverter_escala_do_mes(ano, mes, id_ministerio)
+    if id_versao is None:
+        raise HTTPException(status_code=409, detail="Não há versão anterior desta escala para restaurar.")
+    return {"status": "success", "message": f"Escala de {mes}/{ano} restaurada para a versão anterior.", "id_versao": id_versao}
+
+
+@app.get("/ministerios/{id_ministerio}/escala/{ano}/{mes}/alteracoes", tags=["Escala"])
+async def endpoint_alteracoes_escala(
+    id_ministerio: int, ano: int, mes: int,
+    desde: int | None = Query(None, ge=0, description="Cursor ('versao') de uma resposta anterior; sem ele, só o cursor atual"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Só as vagas do mês que mudaram depois do cursor 'desde', com o ocupante atual, e o cursor
+    novo. Com 'recarregar' True (o mês inteiro mudou), o cliente busca o mês de novo.
+    """
+    if current_user["id_ministerio"] != id_ministerio:
+        raise HTTPException(status_code=403, detail="Acesso não autorizado")
+    resultado = await alteracoes_desde(ano, mes, id_ministerio, desde)
+    if resultado is None:
+        raise HTTPException(status_code=500, detail="Erro ao ler as alterações da escala.")
+    return resultado
+
+
+@app.post("/ministerios/{id_ministerio}/escala/{ano}/{mes}/desfazer", tags=["Escala"])
+async def endpoint_desfazer_edicao(id_ministerio: int, ano: int, mes: int, current_user: dict = Depends(get_current_user)):
+    """ Desfaz a última edição manual de vaga do mês. """
+    if current_user["id_ministerio"] != id_ministerio:
+        raise HTTPException(status_code=403, detail="Acesso não autorizado")
+    resultado = await desfazer_edicao(ano, mes, id_ministerio)
+    if resultado["status"] == "conflict":
+        raise HTTPException(status_code=409, detail=resultado["message"])
+    if resultado["status"] == "error":
+        raise HTTPException(status_code=500, detail=resultado["message"])
+    return resultado
+
+
+@app.post("/ministerios/{id_ministerio}/escala/{ano}/{mes}/refazer", tags=["Escala"])
+async def endpoint_refazer_edicao(id_ministerio: int, ano: int, mes: int, current_user: dict = Depends(get_current_user)):
+    """ Refaz a última edição desfeita (enquanto nenhuma edição nova veio depois). """
+    if current_user["id_ministerio"] != id_ministerio:
+        raise HTTPException(status_code=403, detail="Acesso não autorizado")
+    resultado = await refazer_edicao(ano, mes, id_ministerio)
+    if resultado["status"] == "conflict":
+        raise HTTPException(status_code=409, detail=resultado["message"])
+    if resultado["status"] == "error":
+        raise HTTPException(status_code=500, detail=resultado["message"])
+    return resultado
+
+
+class AusenciaRequest(BaseModel):
+    id_voluntario: int
+    ids_eventos: List[int] | None = None # None = todos os eventos do mês em que o voluntário está escalado
+
+class MudancaVaga(BaseModel):
+    id_evento: int
+    id_funcao: int
+    funcao_instancia: int
+    id_voluntario_anterior: int | None
+    id_voluntario_novo: int | None
+
+class ReparoAusenciaAplicar(BaseModel):
+    id_versao: int # versão em que o plano foi calculado
+    id_voluntario: int
+    ids_eventos: List[int] = []
+    mudancas: List[MudancaVaga]
+    registrar_indisponibilidade: bool = True
+
+
+@app.post("/ministerios/{id_ministerio}/escala/{ano}/{mes}/ausencia", tags=["Escala"])
+async def endpoint_planejar_ausencia(id_ministerio: int, ano: int, mes: int, ausencia: AusenciaRequest,
+                                     current_user: dict = Depends(get_current_user)):
+    """
+    Calcula (sem gravar) as substituições para um voluntário que não vai poder servir:
+    quem assume cada vaga dele, com trocas curtas quando ninguém livre pode assumir.
+    """
+    if current_user["id_ministerio"] != id_ministerio:
+        raise HTTPException(status_code=403, detail="Acesso não autorizado")
+    plano = await planejar_reparo_ausencia(ano, mes, id_ministerio, ausencia.id_voluntario, ausencia.ids_eventos)
+    if plano["status"] == "error":
+        raise HTTPException(status_code=400, detail=plano["message"])
+    return plano
+
+
+@app.post("/ministerios/{id_ministerio}/escala/{ano}/{mes}/ausencia/aplicar", tags=["Escala"])
+async def endpoint_aplicar_ausencia(id_ministerio: int, ano: int, mes: int, reparo: ReparoAusenciaAplicar,
+                                    current_user: dict = Depends(get_current_user)):
+    """ Grava, de uma vez, as mudanças revisadas de um plano de ausência (dá para reverter). """
+    if current_user["id_ministerio"] != id_ministerio:
+        raise HTTPException(status_code=403, detail="Acesso não autorizado")
+    resultado = await aplicar_reparo_ausencia(ano, mes, id_ministerio, reparo.id_versao, reparo.id_voluntario, reparo.ids_eventos,
+                                              [m.model_dump() for m in reparo.mudancas], reparo.registrar_indisponibilidade)
+    if resultado["status"] == "conflict":
+        raise HTTPException(status_code=409, detail=resultado["message"])
+    if resultado["status"] == "error":
+        raise HTTPException(status_code=500, detail=resultado["message"])
+    return resultado
 
 
 # --- NOVO: Modelo Pydantic para a atualização da vaga ---
@@ -559,79 +787,103 @@ class VagaUpdate(BaseModel):
     id_funcao: int
     funcao_instancia: int
     id_voluntario: int | None # Permite que seja None para deixar a vaga "VAGA"
+    fixada: bool = False # Vaga fixada: a geração (completa ou incremental) não mexe nela
 
 # ==============================================================================
 # NOVOS ENDPOINTS PARA EDIÇÃO DA ESCALA
 # ==============================================================================
 
 @app.get("/funcoes/{id_funcao}/voluntarios", tags=["Voluntários"])
-def get_voluntarios_por_funcao(id_funcao: int):
+async def get_voluntarios_por_funcao(id_funcao: int):
     """ Busca todos os voluntários aptos para exercer uma função específica. """
-    conn = ensure_connection()
-    if conn is None: return []
-    try:
-        # Precisamos de uma função no database.py para isso, vamos criá-la se não existir
-        query = """
-            SELECT v.id_voluntario, v.nome_voluntario
-            FROM voluntarios v
-            JOIN voluntario_funcoes vf ON v.id_voluntario = vf.id_voluntario
-            WHERE v.ativo = TRUE AND vf.id_funcao = %s
-            ORDER BY v.nome_voluntario;
-        """
-        df = pd.read_sql(query, conn, params=(id_funcao,))
-        return df.to_dict('records')
-    finally:
-        if conn:
-            conn.close()
+    df = await get_voluntarios_for_funcao(id_funcao)
+    return df.to_dict('records')
 
 
 @app.put("/escala/vaga", tags=["Escala"])
-def update_vaga_na_escala(vaga: VagaUpdate):
+async def update_vaga_na_escala(vaga: VagaUpdate):
     """ Atualiza uma única vaga na escala com um novo voluntário. """
     try:
-        update_escala_entry(
+        resultado = await update_escala_entry(
             id_evento=vaga.id_evento,
             id_funcao=vaga.id_funcao,
             id_voluntario=vaga.id_voluntario,
-            instancia=vaga.funcao_instancia
+            instancia=vaga.funcao_instancia,
+            fixada=vaga.fixada
         )
-        return {"status": "success", "message": "Vaga atualizada com sucesso."}
-    except Exception as e:
-        # <<<< MUDANÇA IMPORTANTE: Imprime o erro detalhado no console do backend >>>>
-        print("\n--- ERRO DETALHADO NO ENDPOINT /escala/vaga ---")
-        print(f"Tipo do Erro: {type(e)}")
-        print(f"Argumentos do Erro: {e.args}")
-        import traceback
-        traceback.print_exc() # Imprime o traceback completo
-        print("--- FIM DO ERRO DETALHADO ---\n")
-        
+    except Exception:
+        # O traceback completo vai para o log do backend
+        logger.exception("Erro no endpoint /escala/vaga (evento %s, função %s)", vaga.id_evento, vaga.id_funcao)
+        resultado = {"status": "error"}
+    if resultado["status"] == "not_found":
+        raise HTTPException(status_code=404, detail=resultado["message"])
+    if resultado["status"] != "success":
         # Continua retornando o erro 500 para o frontend
         raise HTTPException(status_code=500, detail=f"Erro interno no servidor. Verifique o console do backend.")
+    return resultado
+
+class VagasUpdate(BaseModel):
+    vagas: List[VagaUpdate] = Field(min_length=1)
+
+@app.put("/escala/vagas", tags=["Escala"])
+async def update_vagas_na_escala(lote: VagasUpdate, current_user: dict = Depends(get_current_user)):
+    """
+    Atualiza várias vagas de um mês de uma vez (uma transação). Se o lote põe alguém em uma
+    vaga fora da cota, sem a função, indisponível, em dois eventos no mesmo dia ou acima do
+    limite do mês, nada é gravado (409, com a lista de conflitos). Devolve a 'versao' do mês, o cursor de GET .../alteracoes.
+    """
+    resultado = await atualizar_vagas_em_lote(current_user["id_ministerio"], [v.model_dump() for v in lote.vagas])
+    if resultado["status"] == "conflict":
+        raise HTTPException(status_code=409, detail={"message": resultado["message"], "conflitos": resultado["conflitos"]})
+    if resultado["status"] == "error":
+        raise HTTPException(status_code=400, detail=resultado["message"])
+    return resultado
+
+@app.get("/ministerios/{id_ministerio}/escala/{ano}/{mes}/elegibilidade", tags=["Escala"])
+async def endpoint_elegibilidade_escala(id_ministerio: int, ano: int, mes: int, current_user: dict = Depends(get_current_user)):
+    """
+    Quem pode assumir cada vaga do mês agora (função, disponibilidade, indisponibilidade no
+    evento, um serviço por dia e limite do mês, como na geração), em uma resposta só: por
+    (evento, função), as instâncias abertas e os ids dos elegíveis.
+    """
+    if current_user["id_ministerio"] != id_ministerio:
+        raise HTTPException(status_code=403, detail="Acesso não autorizado")
+    resultado = await elegibilidade_do_mes(ano, mes, id_ministerio)
+    if resultado["status"] == "error":
+        raise HTTPException(status_code=500, detail=resultado["message"])
+    return resultado
 
 @app.get("/escala/vaga-elegiveis", tags=["Escala"])
-def get_voluntarios_elegiveis(id_funcao: int, id_evento: int, current_user: dict = Depends(get_current_user)):
-    """ Retorna uma lista de voluntários elegíveis para uma vaga específica. """
+async def get_voluntarios_elegiveis(id_funcao: int, id_evento: int, current_user: dict = Depends(get_current_user)):
+    """
+    Voluntários elegíveis para uma vaga específica, com as mesmas regras (e o mesmo índice) de
+    GET .../escala/{ano}/{mes}/elegibilidade, filtrado ao par (evento, função).
+    """
     id_ministerio = current_user["id_ministerio"]
-    df = get_voluntarios_elegiveis_para_vaga(id_funcao, id_evento, id_ministerio)
-    return df.to_dict('records')
+    elegiveis = await get_voluntarios_elegiveis_para_vaga(id_funcao, id_evento, id_ministerio)
+    if elegiveis is None:
+        raise HTTPException(status_code=404, detail="Evento não encontrado")
+    return elegiveis
 
 
 # ==============================================================================
 # NOVOS ENDPOINTS PARA GERAR PDF
 # ==============================================================================
 @app.get("/ministerios/{id_ministerio}/escala/{ano}/{mes}/pdf", tags=["Escala"])
-def get_escala_pdf(id_ministerio: int, ano: int, mes: int, current_user: dict = Depends(get_current_user)):
+async def get_escala_pdf(id_ministerio: int, ano: int, mes: int, current_user: dict = Depends(get_current_user)):
     if current_user["id_ministerio"] != id_ministerio:
         raise HTTPException(status_code=403, detail="Acesso não autorizado")
 
-    escala_df = get_escala_completa(ano, mes, id_ministerio)
-    servicos_df = view_all_servicos_fixos(id_ministerio)
+    escala_df, servicos_df = await asyncio.gather(
+        get_escala_completa(ano, mes, id_ministerio),
+        view_all_servicos_fixos(id_ministerio),
+    )
     
     meses_pt = { 1: "Janeiro", 2: "Fevereiro", 3: "Março", 4: "Abril", 5: "Maio", 6: "Junho",
     7: "Julho", 8: "Agosto", 9: "Setembro",10: "Outubro", 11: "Novembro", 12: "Dezembro" }
     mes_ano_str = f"{meses_pt.get(mes, '')} de {ano}"
     
-    pdf_buffer = gerar_pdf_escala(escala_df, mes_ano_str, servicos_df)
+    pdf_buffer = await executar_bloqueante(gerar_pdf_escala, escala_df, mes_ano_str, servicos_df)
     
     return StreamingResponse(pdf_buffer, media_type="application/pdf", headers={
         "Content-Disposition": f"attachment; filename=escala_{ano}_{mes}.pdf"
@@ -639,19 +891,19 @@ def get_escala_pdf(id_ministerio: int, ano: int, mes: int, current_user: dict =
 
 
 @app.get("/ministerios/{id_ministerio}/dashboard", tags=["Dashboard"])
-def get_dashboard_data(id_ministerio: int, current_user: dict = Depends(get_current_user)):
+async def get_dashboard_data(id_ministerio: int, current_user: dict = Depends(get_current_user)):
     if current_user["id_ministerio"] != id_ministerio:
         raise HTTPException(status_code=403, detail="Acesso não autorizado")
 
     # Reutiliza suas funções existentes do database.py
-    voluntarios_df = get_all_voluntarios_com_detalhes(id_ministerio)
-    grupos_df = get_all_grupos_com_membros(id_ministerio)
-    funcoes_df = view_all_funcoes(id_ministerio)
-    eventos_mes_atual_df = get_events_for_month(datetime.now().year, datetime.now().month, id_ministerio)
-    cotas_df = get_cotas_all_servicos()
+    voluntarios_df = await get_all_voluntarios_com_detalhes(id_ministerio)
+    grupos_df = await get_all_grupos_com_membros(id_ministerio)
+    funcoes_df = await view_all_funcoes(id_ministerio)
+    eventos_mes_atual_df = await get_events_for_month(datetime.now().year, datetime.now().month, id_ministerio)
+    cotas_df = await get_cotas_all_servicos()
     
     # Busca todos os voluntários (incluindo inativos) para a outra métrica
-    todos_voluntarios_com_inativos_df = view_all_voluntarios(id_ministerio, include_inactive=True)
+    todos_voluntarios_com_inativos_df = await view_all_voluntarios(id_ministerio, include_inactive=True)
     voluntarios_inativos = todos_voluntarios_com_inativos_df[todos_voluntarios_com_inativos_df['ativo'] == False]
 
     # --- LÓGICA ADICIONADA AQUI ---
@@ -0,0 +1,2 @@
+# Benchmark da geração de escala: ministérios sintéticos (sintetico.py) rodando o
+# pipeline carga -> alocação -> gravação em memória (executar.py), sem precisar de Postgres.
@@ -0,0 +1,54 @@
+# Uso:
+#   python -m backend.benchmark                          # todos os cenários, motor guloso
+#   python -m backend.benchmark -c grande -m greedy flow milp
+#   python -m backend.benchmark --limites limites.json   # sobrescreve LIMITES (mesmo formato)
+#   python -m backend.benchmark --json                   # saída para comparar entre commits
+#
+# Sai com código 1 se algum limite de regressão for estourado.
+
+import argparse
+import json
+import sys
+from dataclasses import asdict
+
+from backend.benchmark.executar import LIMITES, executar_cenario, formatar
+from backend.benchmark.sintetico import CENARIOS
+from backend.motor_escala import MOTORES, encerrar_pool_processos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m backend.benchmark", description="Benchmark da geração de escala com ministérios sintéticos.")
+    parser.add_argument("-c", "--cenarios", nargs="+", choices=sorted(CENARIOS), default=list(CENARIOS))
+    parser.add_argument("-m", "--motores", nargs="+", choices=MOTORES, default=["greedy"])
+    parser.add_argument("-t", "--tentativas", type=int, default=1)
+    parser.add_argument("--sem-busca-local", action="store_true")
+    parser.add_argument("--limites", help="arquivo JSON com limites por cenário")
+    parser.add_argument("--json", action="store_true", help="imprime os resultados em JSON")
+    args = parser.parse_args(argv)
+
+    limites = dict(LIMITES)
+    if args.limites:
+        with open(args.limites, encoding="utf-8") as arquivo:
+            limites.update(json.load(arquivo))
+
+    resultados = []
+    try:
+        for nome in args.cenarios:
+            for motor in args.motores:
+                resultados.append(executar_cenario(CENARIOS[nome], motor, args.tentativas, not args.sem_busca_local))
+    finally:
+        encerrar_pool_processos()
+
+    if args.json:
+        print(json.dumps([{**asdict(r), "preenchimento": r.preenchimento} for r in resultados], indent=2))
+    else:
+        print(formatar(resultados))
+
+    violacoes = [v for r in resultados for v in r.violacoes(limites.get(r.cenario, {}))]
+    for v in violacoes:
+        print(f"REGRESSÃO: {v}", file=sys.stderr)
+    return 1 if violacoes else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+# executar.py - Roda o pipeline de geração sobre um cenário sintético e mede cada fase
+#
+# Fases (as mesmas de database.gerar_escala_automatica, sem o Postgres):
+#   carga     - documento JSON -> SnapshotEscala (o que acontece depois da consulta única);
+#   alocacao  - motor_escala.gerar_com_motor;
+#   gravacao  - db_utils.copiar_em_lote serializando o CSV do COPY para um cursor em memória.
+
+import contextlib
+import json
+import random
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+
+from backend.benchmark.sintetico import gerar_documento
+from backend.db_utils import copiar_em_lote
+from backend.modelos_escala import SnapshotEscala
+from backend.motor_escala import gerar_com_motor, vagas_do_snapshot
+
+# Limites de regressão por cenário: tempo máximo (s) de cada fase e preenchimento mínimo.
+# Folgados de propósito (máquinas de CI variam); o que se quer pegar é a piora grosseira.
+LIMITES = {
+    "pequeno": {"carga": 0.5, "alocacao": 3.0, "gravacao": 0.5, "preenchimento": 0.70},
+    "medio": {"carga": 1.0, "alocacao": 5.0, "gravacao": 1.0, "preenchimento": 0.75},
+    "grande": {"carga": 3.0, "alocacao": 15.0, "gravacao": 2.0, "preenchimento": 0.90},
+}
+
+
+class _CursorMemoria:
+    """Faz o papel do cursor psycopg2 no COPY: consome o CSV gerado e conta as linhas."""
+
+    def __init__(self):
+        self.linhas = 0
+
+    def copy_expert(self, sql, arquivo):
+        self.linhas += arquivo.read().count("\n")
+
+
+@dataclass
+class Fase:
+    segundos: float
+    pico_kb: float
+
+
+@dataclass
+class ResultadoBenchmark:
+    cenario: str
+    motor: str
+    motor_usado: str = ""
+    voluntarios: int = 0
+    eventos: int = 0
+    vagas: int = 0
+    alocacoes: int = 0
+    fases: dict = field(default_factory=dict)
+
+    @property
+    def preenchimento(self):
+        return self.alocacoes / self.vagas if self.vagas else 1.0
+
+    def violacoes(self, limites):
+        """Lista de mensagens para cada limite estourado (vazia se está tudo dentro)."""
+        problemas = []
+        for nome, fase in self.fases.items():
+            if nome in limites and fase.segundos > limites[nome]:
+                problemas.append(f"{self.cenario}/{self.motor}: fase '{nome}' levou {fase.segundos:.3f}s (limite {limites[nome]}s)")
+        if "preenchimento" in limites and self.preenchimento < limites["preenchimento"]:
+            problemas.append(f"{self.cenario}/{self.motor}: preenchimento {self.preenchimento:.1%} (mínimo {limites['preenchimento']:.0%})")
+        return problemas
+
+
+@contextlib.contextmanager
+def _medir(fases, nome):
+    tracemalloc.reset_peak()
+    antes, _ = tracemalloc.get_traced_memory()
+    inicio = time.perf_counter()
+    yield
+    segundos = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    fases[nome] = Fase(segundos=segundos, pico_kb=(pico - antes) / 1024)
+
+
+def executar_cenario(cenario, motor="greedy", tentativas=1, busca_local=True, semente=0):
+    documento = gerar_documento(cenario)
+    texto = json.dumps(documento, default=str)
+    resultado = ResultadoBenchmark(cenario=cenario.nome, motor=motor)
+
+    tracemalloc.start()
+    try:
+        with _medir(resultado.fases, "carga"):
+            snapshot = SnapshotEscala.from_json(1, cenario.ano, cenario.mes, json.loads(texto))
+        with _medir(resultado.fases, "alocacao"):
+            escala, _, motor_usado = gerar_com_motor(snapshot, motor, rng=random.Random(semente),
+                                                     tentativas=tentativas, busca_local=busca_local)
+        with _medir(resultado.fases, "gravacao"):
+            cursor = _CursorMemoria()
+            args = [(1, e.id_evento, e.id_funcao, e.id_voluntario, e.funcao_instancia) for e in escala]
+            copiar_em_lote(cursor, "escala", ("id_versao", "id_evento", "id_funcao", "id_voluntario", "funcao_instancia"), args)
+    finally:
+        tracemalloc.stop()
+
+    resultado.motor_usado = motor_usado
+    resultado.voluntarios = len(snapshot.voluntarios)
+    resultado.eventos = len(snapshot.eventos)
+    resultado.vagas = len(vagas_do_snapshot(snapshot))
+    resultado.alocacoes = cursor.linhas
+    return resultado
+
+
+def formatar(resultados):
+    linhas = [f"{'cenário':<10} {'motor':<12} {'vol':>5} {'evt':>4} {'vagas':>6} {'aloc':>6} {'preench':>8}   "
+              f"{'carga s/KB':>14} {'alocação s/KB':>16} {'gravação s/KB':>15}"]
+    for r in resultados:
+        motor = r.motor if r.motor == r.motor_usado else f"{r.motor}>{r.motor_usado}"
+        fases = "".join(f" {r.fases[n].segundos:>7.3f}/{r.fases[n].pico_kb:<7.0f}" for n in ("carga", "alocacao", "gravacao"))
+        linhas.append(f"{r.cenario:<10} {motor:<12} {r.voluntarios:>5} {r.eventos:>4} {r.vagas:>6} {r.alocacoes:>6} {r.preenchimento:>8.1%}  {fases}")
+    return "\n".join(linhas)
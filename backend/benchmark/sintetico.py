@@ -0,0 +1,96 @@
+# sintetico.py - Gerador de ministérios sintéticos para o benchmark
+#
+# Produz o mesmo documento JSON que a consulta de database.carregar_snapshot_escala devolve,
+# então o resto do pipeline (SnapshotEscala.from_json, motor, gravação) roda sem mudanças.
+
+import calendar
+import random
+from dataclasses import dataclass
+from datetime import date
+
+DIAS_DOS_SERVICOS = (0, 3, 6, 0, 5, 2, 4, 1)  # domingo, quarta, sábado, 2º culto de domingo, ...
+
+
+@dataclass(frozen=True)
+class CenarioSintetico:
+    nome: str
+    voluntarios: int
+    servicos_por_semana: int
+    funcoes_principais: int = 4
+    vagas_por_funcao: tuple = (1, 3)           # cota (mín, máx) de cada função em cada serviço
+    fracao_em_grupos: float = 0.15
+    tamanho_grupo: tuple = (2, 3)
+    limite_mes: tuple = (1, 4)
+    funcoes_por_voluntario: tuple = (1, 3)
+    densidade_indisponibilidade: float = 0.1   # chance de um voluntário bloquear cada evento
+    fracao_disponibilidade: float = 0.6        # chance de estar disponível para cada serviço
+    ano: int = 2025
+    mes: int = 3
+    semente: int = 42
+
+
+CENARIOS = {
+    "pequeno": CenarioSintetico("pequeno", voluntarios=40, servicos_por_semana=2),
+    "medio": CenarioSintetico("medio", voluntarios=70, servicos_por_semana=4),
+    "grande": CenarioSintetico("grande", voluntarios=260, servicos_por_semana=8, funcoes_principais=6, vagas_por_funcao=(1, 4)),
+}
+
+
+def gerar_documento(cenario):
+    """Monta o documento {voluntarios, grupos, funcoes, servicos, cotas, eventos} do cenário."""
+    rng = random.Random(cenario.semente)
+
+    funcoes = [{"id_funcao": 1, "nome_funcao": "Apoio", "tipo_funcao": "APOIO", "prioridade_alocacao": 99}]
+    for i in range(cenario.funcoes_principais):
+        funcoes.append({"id_funcao": i + 2, "nome_funcao": f"Função {i + 1}", "tipo_funcao": "PRINCIPAL", "prioridade_alocacao": i + 1})
+    funcoes.sort(key=lambda f: f["nome_funcao"])
+    ids_funcoes = [f["id_funcao"] for f in funcoes]
+
+    servicos = []
+    for i in range(cenario.servicos_por_semana):
+        servicos.append({"id_servico": i + 1, "nome_servico": f"Serviço {i + 1}",
+                         "dia_da_semana": DIAS_DOS_SERVICOS[i % len(DIAS_DOS_SERVICOS)], "ativo": True})
+
+    cotas = [{"id_servico": s["id_servico"], "id_funcao": f, "quantidade_necessaria": rng.randint(*cenario.vagas_por_funcao)}
+             for s in servicos for f in ids_funcoes]
+
+    # Eventos do mês: mesma regra de database.create_events_for_month (domingo = 0).
+    eventos = []
+    _, num_dias = calendar.monthrange(cenario.ano, cenario.mes)
+    for dia in range(1, num_dias + 1):
+        data_atual = date(cenario.ano, cenario.mes, dia)
+        for s in servicos:
+            if s["dia_da_semana"] == (data_atual.weekday() + 1) % 7:
+                eventos.append({"id_evento": len(eventos) + 1, "id_servico_fixo": s["id_servico"], "data_evento": data_atual.isoformat()})
+
+    voluntarios = []
+    for i in range(1, cenario.voluntarios + 1):
+        disponibilidade = [s["id_servico"] for s in servicos if rng.random() < cenario.fracao_disponibilidade]
+        voluntarios.append({
+            "id_voluntario": i,
+            "nome_voluntario": f"Voluntário {i}",
+            "limite_escalas_mes": rng.randint(*cenario.limite_mes),
+            "nivel_experiencia": rng.choice(["Iniciante", "Intermediário", "Avançado"]),
+            "id_grupo": None,
+            "funcoes": rng.sample(ids_funcoes, min(len(ids_funcoes), rng.randint(*cenario.funcoes_por_voluntario))),
+            "disponibilidade": disponibilidade or [rng.choice(servicos)["id_servico"]],
+            "indisponibilidades": [e["id_evento"] for e in eventos if rng.random() < cenario.densidade_indisponibilidade],
+        })
+
+    grupos = []
+    sem_grupo = list(voluntarios)
+    rng.shuffle(sem_grupo)
+    alvo = int(cenario.voluntarios * cenario.fracao_em_grupos)
+    em_grupos = 0
+    while em_grupos < alvo and len(sem_grupo) >= cenario.tamanho_grupo[0]:
+        tamanho = min(rng.randint(*cenario.tamanho_grupo), len(sem_grupo))
+        id_grupo = len(grupos) + 1
+        membros = [sem_grupo.pop() for _ in range(tamanho)]
+        for m in membros:
+            m["id_grupo"] = id_grupo
+        grupos.append({"id_grupo": id_grupo, "limite_escalas_grupo": rng.randint(1, 2),
+                       "membros": sorted(m["id_voluntario"] for m in membros)})
+        em_grupos += tamanho
+
+    return {"voluntarios": voluntarios, "grupos": grupos, "funcoes": funcoes,
+            "servicos": servicos, "cotas": cotas, "eventos": eventos}
@@ -0,0 +1,277 @@
+# busca_local.py - Melhoria da escala por busca local
+#
+# Parte de uma escala pronta (normalmente a do guloso) e aplica movimentos pequenos:
+#   preencher  - um voluntário livre assume uma vaga aberta;
+#   cadeia     - (ejection chain) v sai da vaga t para assumir a vaga aberta j e um
+#                voluntário livre w assume t; resolve vagas que ninguém livre podia pegar;
+#   realocar   - v troca a sua vaga por uma vaga aberta de outro evento (equilibra lotação);
+#   transferir - a vaga de v passa para w (equilibra a carga entre voluntários);
+#   trocar     - v e w trocam de vaga entre si (não muda a pontuação; diversifica a busca).
+#
+# Pontuação (menor é melhor):
+#   PESO_VAGO * vagas abertas + PESO_CARGA * soma(carga_v²) + PESO_LOTACAO * soma(lotação_e²)
+# Com o total de alocações fixo, a soma dos quadrados só difere da variância por uma
+# constante, e cada movimento muda poucas parcelas: o delta sai em O(1) (ex: uma escala a
+# mais para v custa PESO_CARGA * (2 * carga_v + 1)).
+#
+# Alocações de grupo ficam como estão (o grupo só serve inteiro); só voluntários sem grupo
+# se movem, e só em funções PRINCIPAL / APOIO, como na fase individual do guloso.
+# As vagas de 'fixas' (fixadas pelo líder, ou mantidas na regeneração incremental) também
+# não se movem: só as vagas abertas e as preenchidas nesta geração participam.
+
+import logging
+import os
+import random
+import time
+from collections import defaultdict
+
+from backend.elegibilidade import MatrizElegibilidade
+from backend.modelos_escala import EscalaEntry, chave_da_entrada
+
+logger = logging.getLogger(__name__)
+
+PESO_VAGO = 10_000
+PESO_CARGA = 1
+PESO_LOTACAO = 1
+
+# Orçamento padrão: o que acabar primeiro.
+MAX_ITERACOES = int(os.environ.get('ESCALA_BUSCA_LOCAL_ITERACOES', 20_000))
+TEMPO_LIMITE = float(os.environ.get('ESCALA_BUSCA_LOCAL_SEGUNDOS', 2))
+
+
+class EstadoBuscaLocal:
+
+    def __init__(self, snapshot, vagas, escala, fixas=(), excluir=()):
+        self.vagas = list(vagas)
+        self.dia = [v.dia for v in self.vagas]
+        self.limite = {v.id_voluntario: v.limite_escalas_mes for v in snapshot.voluntarios}
+        # 'excluir': voluntários que não podem assumir nenhuma vaga (ex: quem avisou ausência).
+        individuais = [v for v in snapshot.voluntarios if v.id_grupo is None and v.id_voluntario not in excluir]
+        funcoes_individuais = {f.id_funcao for f in snapshot.funcoes if f.tipo_funcao in ('PRINCIPAL', 'APOIO')}
+
+        # Quem pode assumir cada vaga (parte estática), calculado por (função, evento).
+        matriz = MatrizElegibilidade(snapshot, self.vagas)
+        ids = [v.id_voluntario for v in individuais]
+        elegiveis_por_par = {}
+        for id_funcao in {v.id_funcao for v in self.vagas}:
+            if id_funcao not in funcoes_individuais or not ids:
+                continue
+            mascara = matriz.mascara_eventos(ids, id_funcao)
+            for ev in snapshot.eventos:
+                coluna = mascara[:, matriz.posicao_evento(ev)]
+                elegiveis_por_par[(id_funcao, ev.id_evento)] = tuple(ids[i] for i in coluna.nonzero()[0])
+        self.elegiveis = [elegiveis_por_par.get((v.id_funcao, v.id_evento), ()) for v in self.vagas]
+        self.elegivel = [set(e) for e in self.elegiveis]
+        self.moveis = set(ids)
+
+        self.ocupante = [None] * len(self.vagas)
+        self.carga = defaultdict(int)
+        self.lotacao = defaultdict(int)
+        self.dia_ocupado = {}                # (id_voluntario, dia) -> índice da vaga
+        self.vagas_de = defaultdict(set)     # id_voluntario -> índices das vagas
+        self._abertas = list(range(len(self.vagas)))
+        self._pos_aberta = {j: j for j in self._abertas}
+
+        por_instancia = {v.key: j for j, v in enumerate(self.vagas)}
+        for e in escala:
+            self._ocupar(por_instancia[chave_da_entrada(e)], e.id_voluntario)
+        self.fixas = {por_instancia[chave_da_entrada(e)] for e in fixas}
+
+    # --- operações básicas (mantêm todos os índices) ---
+    def _ocupar(self, j, id_voluntario):
+        self.ocupante[j] = id_voluntario
+        self.carga[id_voluntario] += 1
+        self.lotacao[self.vagas[j].id_evento] += 1
+        self.dia_ocupado[(id_voluntario, self.dia[j])] = j
+        self.vagas_de[id_voluntario].add(j)
+        pos = self._pos_aberta.pop(j)
+        ultima = self._abertas.pop()
+        if ultima != j:
+            self._abertas[pos] = ultima
+            self._pos_aberta[ultima] = pos
+
+    def _liberar(self, j):
+        id_voluntario = self.ocupante[j]
+        self.ocupante[j] = None
+        self.carga[id_voluntario] -= 1
+        self.lotacao[self.vagas[j].id_evento] -= 1
+        del self.dia_ocupado[(id_voluntario, self.dia[j])]
+        self.vagas_de[id_voluntario].discard(j)
+        self._pos_aberta[j] = len(self._abertas)
+        self._abertas.append(j)
+        return id_voluntario
+
+    @property
+    def abertas(self):
+        return self._abertas
+
+    def pontuacao(self):
+        return (PESO_VAGO * len(self._abertas)
+                + PESO_CARGA * sum(c * c for c in self.carga.values())
+                + PESO_LOTACAO * sum(l * l for l in self.lotacao.values()))
+
+    # --- viabilidade ---
+    def pode_assumir(self, id_voluntario, j, liberando=None):
+        """w pode assumir a vaga j (opcionalmente considerando que ele larga a vaga 'liberando')."""
+        if id_voluntario not in self.elegivel[j]:
+            return False
+        carga = self.carga[id_voluntario] - (1 if liberando is not None else 0)
+        if carga >= self.limite[id_voluntario]:
+            return False
+        ocupada = self.dia_ocupado.get((id_voluntario, self.dia[j]))
+        return ocupada is None or ocupada == liberando
+
+    # --- deltas O(1) ---
+    def _d_carga(self, id_voluntario, delta):
+        c = self.carga[id_voluntario]
+        return PESO_CARGA * ((c + delta) ** 2 - c * c)
+
+    def _d_lotacao(self, id_evento, delta):
+        l = self.lotacao[id_evento]
+        return PESO_LOTACAO * ((l + delta) ** 2 - l * l)
+
+    def delta_preencher(self, j, w):
+        return -PESO_VAGO + self._d_carga(w, 1) + self._d_lotacao(self.vagas[j].id_evento, 1)
+
+    def delta_realocar(self, origem, destino):
+        ev_o, ev_d = self.vagas[origem].id_evento, self.vagas[destino].id_evento
+        if ev_o == ev_d:
+            return 0
+        return self._d_lotacao(ev_o, -1) + self._d_lotacao(ev_d, 1)
+
+    def delta_transferir(self, j, w):
+        return self._d_carga(self.ocupante[j], -1) + self._d_carga(w, 1)
+
+    # --- movimentos ---
+    def melhor_preenchimento(self, j):
+        melhor = None
+        for w in self.elegiveis[j]:
+            if self.pode_assumir(w, j):
+                delta = self.delta_preencher(j, w)
+                if melhor is None or delta < melhor[0]:
+                    melhor = (delta, w)
+        return melhor
+
+    def melhor_cadeia(self, j):
+        """
+        Vaga aberta j sem ninguém livre: algum v elegível larga a vaga t (que o impedia,
+        pelo dia ou pelo limite) para assumir j, e um w livre assume t.
+        """
+        melhor = None
+        for v in self.elegiveis[j]:
+            for t in self.vagas_de[v]:
+                if t in self.fixas or not self.pode_assumir(v, j, liberando=t):
+                    continue
+                for w in self.elegiveis[t]:
+                    if w == v or not self.pode_assumir(w, t):
+                        continue
+                    # v continua com a mesma carga; w ganha uma escala; o evento de j ganha uma pessoa.
+                    delta = -PESO_VAGO + self._d_carga(w, 1) + self._d_lotacao(self.vagas[j].id_evento, 1)
+                    if melhor is None or delta < melhor[0]:
+                        melhor = (delta, v, t, w)
+        return melhor
+
+    def preencher(self, j, id_voluntario):
+        """Põe o voluntário na vaga aberta j (ex: o de melhor_preenchimento)."""
+        self._ocupar(j, id_voluntario)
+
+    def aplicar_cadeia(self, j, v, t, w):
+        self._liberar(t)
+        self._ocupar(j, v)
+        self._ocupar(t, w)
+
+    def ocupadas_moveis(self):
+        return [j for j, v in enumerate(self.ocupante) if v in self.moveis and j not in self.fixas]
+
+    def escala(self):
+        return [EscalaEntry(v.id_evento, v.id_funcao, self.ocupante[j], v.funcao_instancia)
+                for j, v in enumerate(self.vagas) if self.ocupante[j] is not None]
+
+
+def melhorar_escala(snapshot, vagas, escala, max_iteracoes=MAX_ITERACOES, tempo_limite=TEMPO_LIMITE, rng=random, fixas=()):
+    """
+    Aplica a busca local à escala e retorna a escala melhorada (lista de EscalaEntry).
+    Para no primeiro dos limites: 'max_iteracoes' movimentos tentados ou 'tempo_limite' segundos.
+    As entradas de 'fixas' (que também devem estar em 'escala') ficam onde estão.
+    """
+    estado = EstadoBuscaLocal(snapshot, vagas, escala, fixas)
+    if not estado.moveis:
+        return list(escala)
+    fim = time.monotonic() + tempo_limite
+    inicial = estado.pontuacao()
+
+    # 1. Varredura das vagas abertas: preencher direto ou por cadeia.
+    for j in list(estado.abertas):
+        if time.monotonic() > fim:
+            break
+        if estado.ocupante[j] is not None:
+            continue
+        preenchimento = estado.melhor_preenchimento(j)
+        if preenchimento is not None:
+            estado._ocupar(j, preenchimento[1])
+            continue
+        cadeia = estado.melhor_cadeia(j)
+        if cadeia is not None:
+            estado.aplicar_cadeia(j, *cadeia[1:])
+
+    # 2. Movimentos aleatórios: aceita o que melhora; trocas (delta 0) só diversificam.
+    # 'posicao' (vaga -> índice em 'ocupadas') deixa a realocação trocar a vaga na lista em O(1).
+    ocupadas = estado.ocupadas_moveis()
+    posicao = {j: i for i, j in enumerate(ocupadas)}
+    for iteracao in range(max_iteracoes):
+        if not ocupadas or (iteracao % 256 == 0 and time.monotonic() > fim):
+            break
+        j = rng.choice(ocupadas)
+        v = estado.ocupante[j]
+        if v not in estado.moveis:
+            continue
+        tipo = rng.random()
+        if tipo < 0.4 and estado.abertas:
+            destino = rng.choice(estado.abertas)
+            if estado.pode_assumir(v, destino, liberando=j) and estado.delta_realocar(j, destino) < 0:
+                estado._liberar(j)
+                estado._ocupar(destino, v)
+                ocupadas[posicao[j]] = destino
+                posicao[destino] = posicao.pop(j)
+                # A vaga que v deixou pode ser preenchida por outra pessoa.
+                preenchimento = estado.melhor_preenchimento(j)
+                if preenchimento is not None:
+                    estado._ocupar(j, preenchimento[1])
+                    posicao[j] = len(ocupadas)
+                    ocupadas.append(j)
+        elif tipo < 0.8:
+            if not estado.elegiveis[j]:
+                continue
+            w = rng.choice(estado.elegiveis[j])
+            if w != v and estado.pode_assumir(w, j) and estado.delta_transferir(j, w) < 0:
+                estado._liberar(j)
+                estado._ocupar(j, w)
+        else:
+            k = rng.choice(ocupadas)
+            w = estado.ocupante[k]
+            if k == j or w == v or w not in estado.moveis:
+                continue
+            if v in estado.elegivel[k] and w in estado.elegivel[j]:
+                estado._liberar(j)
+                estado._liberar(k)
+                if estado.pode_assumir(v, k) and estado.pode_assumir(w, j):
+                    estado._ocupar(k, v)
+                    estado._ocupar(j, w)
+                else:
+                    estado._ocupar(j, v)
+                    estado._ocupar(k, w)
+        # Depois de uma troca, uma vaga aberta pode ter ficado ao alcance de alguém.
+        if estado.abertas and iteracao % 64 == 0:
+            aberta = rng.choice(estado.abertas)
+            cadeia = estado.melhor_preenchimento(aberta) or estado.melhor_cadeia(aberta)
+            if cadeia is not None:
+                if len(cadeia) == 2:
+                    estado._ocupar(aberta, cadeia[1])
+                else:
+                    estado.aplicar_cadeia(aberta, *cadeia[1:])
+                ocupadas = estado.ocupadas_moveis()
+                posicao = {j: i for i, j in enumerate(ocupadas)}
+
+    final = estado.pontuacao()
+    logger.info("Busca local: pontuação %s -> %s, %s vagas abertas.", inicial, final, len(estado.abertas))
+    return estado.escala()
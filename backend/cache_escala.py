@@ -0,0 +1,103 @@
+# cache_escala.py - Cache da resposta de GET /ministerios/{id}/escala/{ano}/{mes}, com versão e ETag
+#
+# Montar o mês custa uma consulta grande (todas as vagas, com nomes), e a tela de geração
+# pede o mês de novo a cada vaga editada. Aqui fica o corpo JSON já serializado de cada
+# (ministério, ano, mês), validado por uma versão:
+#   - cada escrita na escala do mês (edição de vaga, geração, limpeza, reversão, reparo,
+#     criação de eventos) chama invalidar_mes() DEPOIS do commit, e a versão do mês sobe;
+#   - mudanças de cadastro que aparecem em todos os meses (cotas, serviços, funções, nomes
+#     de voluntários) chamam invalidar_tudo(), que sobe a época do processo;
+#   - uma entrada só vale se foi montada na versão e época atuais e tem menos de TTL_SEGUNDOS
+#     (o TTL limita o quanto um worker pode ficar atrás de escritas feitas em outro worker);
+#   - passando de MAX_ENTRADAS, sai a usada há mais tempo (LRU).
+# O ETag é o hash do corpo: dois workers (ou um restart) com o mesmo mês dão o mesmo ETag,
+# e um corpo diferente nunca responde 304 a um ETag antigo. As versões daqui só decidem se
+# o corpo guardado ainda vale; não entram no ETag (não veem as escritas de outros workers).
+#
+#   ESCALA_CACHE_ENTRADAS - meses em cache por processo (padrão 256; 0 desliga o cache);
+#   ESCALA_CACHE_TTL      - segundos de validade de cada entrada (padrão 60).
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+
+MAX_ENTRADAS = int(os.environ.get('ESCALA_CACHE_ENTRADAS', 256))
+TTL_SEGUNDOS = float(os.environ.get('ESCALA_CACHE_TTL', 60))
+
+_lock = threading.Lock()
+_versoes = defaultdict(int)    # (id_ministerio, ano, mes) -> versão
+_epoca = 0
+_entradas = OrderedDict()      # (id_ministerio, ano, mes) -> EntradaCache, da menos para a mais usada
+
+
+@dataclass(frozen=True)
+class EntradaCache:
+    versao: tuple
+    etag: str
+    corpo: bytes
+    criada_em: float
+
+
+def versao_do_mes(id_ministerio, ano, mes):
+    """Versão atual do mês; pegar ANTES de consultar o banco e passar a mesma para guardar()."""
+    with _lock:
+        return (_epoca, _versoes[(id_ministerio, ano, mes)])
+
+
+def invalidar_mes(id_ministerio, ano, mes):
+    with _lock:
+        chave = (id_ministerio, ano, mes)
+        _versoes[chave] += 1
+        _entradas.pop(chave, None)
+
+
+def invalidar_tudo():
+    global _epoca
+    with _lock:
+        _epoca += 1
+        _entradas.clear()
+
+
+def obter(id_ministerio, ano, mes):
+    """EntradaCache válida do mês, ou None."""
+    chave = (id_ministerio, ano, mes)
+    with _lock:
+        entrada = _entradas.get(chave)
+        if entrada is None:
+            return None
+        if entrada.versao != (_epoca, _versoes[chave]) or time.monotonic() - entrada.criada_em > TTL_SEGUNDOS:
+            del _entradas[chave]
+            return None
+        _entradas.move_to_end(chave)
+        return entrada
+
+
+def guardar(id_ministerio, ano, mes, versao, corpo):
+    """
+    Guarda o corpo montado na 'versao' (de versao_do_mes) e devolve a EntradaCache. Se o mês
+    mudou durante a consulta, a entrada é devolvida (para esta resposta) mas não fica no cache.
+    """
+    chave = (id_ministerio, ano, mes)
+    entrada = EntradaCache(versao, etag_do_corpo(corpo), corpo, time.monotonic())
+    with _lock:
+        if MAX_ENTRADAS > 0 and versao == (_epoca, _versoes[chave]):
+            _entradas[chave] = entrada
+            _entradas.move_to_end(chave)
+            while len(_entradas) > MAX_ENTRADAS:
+                _entradas.popitem(last=False)
+    return entrada
+
+
+def etag_do_corpo(corpo):
+    return f'"{hashlib.blake2b(corpo, digest_size=16).hexdigest()}"'
+
+
+def etag_confere(if_none_match, etag):
+    """True se o cabeçalho If-None-Match do cliente inclui o ETag (ou é '*')."""
+    if not if_none_match:
+        return False
+    candidatos = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidatos or etag.removeprefix("W/") in {c.removeprefix("W/") for c in candidatos}
@@ -3,73 +3,70 @@
 
 import psycopg2
 import pandas as pd
-from collections import defaultdict
+from collections import Counter, defaultdict
 from datetime import datetime, date
 import calendar
+import logging
 import random
 from werkzeug.security import generate_password_hash, check_password_hash
-from dataclasses import dataclass, field
-from typing import List, Set
 import os
 import toml
 
 # --- LÓGICA DE CONEXÃO UNIVERSAL E PURA ---
+# As conexões vêm do pool compartilhado em db_utils (checkout/devolução via 'with').
+from backend import cache_escala, indice_elegibilidade
+from backend.db_utils import get_connection, inserir_em_lote, copiar_em_lote
+from backend.modelos_escala import (
+    EscalaEntry, Vaga, Voluntario, Grupo, SnapshotEscala, chave_da_entrada, criar_estado_inicial,
+)
+from backend.motor_escala import gerar_com_motor, separar_escala_existente, validar_snapshot
+from backend.reparo_ausencia import planejar_reparo
+from backend.simulacao import aplicar_hipoteses, comparar_escalas
+from backend.diagnostico import limite_superior, motivos_das_vagas
 
+logger = logging.getLogger(__name__)
 
-def ensure_connection():
+
+def intervalo_do_mes(ano, mes):
     """
-    Cria uma conexão com o banco de dados usando a variável de ambiente DATABASE_URL.
-    Funciona tanto localmente (lendo o .env) quanto na produção (Render).
+    Retorna (primeiro_dia, primeiro_dia_do_mes_seguinte) para filtros do tipo
+    'data >= %s AND data < %s'. Ao contrário de EXTRACT(YEAR/MONTH FROM data),
+    esse intervalo semiaberto consegue usar o índice da coluna de data.
     """
-    try:
-        # Pega a única string de conexão do ambiente.
-        db_url = os.environ.get('DATABASE_URL')
-        
-        if not db_url:
-            print("ERRO CRÍTICO: A variável de ambiente DATABASE_URL não foi definida.")
-            return None
-            
-        # Conecta usando a URL, que é o método mais robusto.
-        return psycopg2.connect(db_url)
-        
-    except Exception as e:
-        print(f"ERRO DE CONEXÃO: {e}")
-        return None
-        
+    inicio = date(int(ano), int(mes), 1)
+    fim = date(inicio.year + 1, 1, 1) if inicio.month == 12 else date(inicio.year, inicio.month + 1, 1)
+    return inicio, fim
+
 # --- CORREÇÃO FINAL EM verificar_login ---
 def verificar_login(username, password):
-    conn = ensure_connection()
-    if conn is None: return None
-    id_ministerio = None
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT password_hash, id_ministerio FROM usuarios WHERE username = %s", (username,))
-            result = cur.fetchone()
-            if result:
-                password_hash_from_db, id_ministerio_from_db = result
-                if check_password_hash(password_hash_from_db, password):
-                    id_ministerio = id_ministerio_from_db
-    except Exception as e:
-        print(f"Erro durante a verificação de login: {e}")
-    finally:
-        if conn: conn.close()
-    return id_ministerio
+    with get_connection() as conn:
+        if conn is None: return None
+        id_ministerio = None
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT password_hash, id_ministerio FROM usuarios WHERE username = %s", (username,))
+                result = cur.fetchone()
+                if result:
+                    password_hash_from_db, id_ministerio_from_db = result
+                    if check_password_hash(password_hash_from_db, password):
+                        id_ministerio = id_ministerio_from_db
+        except Exception as e:
+            logger.exception("Erro durante a verificação de login")
+        return id_ministerio
 
 def criar_usuario(username, password, id_ministerio):
-    conn = ensure_connection()
-    if conn is None: return False
-    try:
-        with conn.cursor() as cur:
-            password_hash = generate_password_hash(password)
-            cur.execute("INSERT INTO usuarios (username, password_hash, id_ministerio) VALUES (%s, %s, %s)", (username, password_hash, id_ministerio))
-        conn.commit()
-        return True
-    except Exception as e:
-        conn.rollback()
-        print(f"Erro ao criar usuário: {e}")
-        return False
-    finally:
-        if conn: conn.close()
+    with get_connection() as conn:
+        if conn is None: return False
+        try:
+            with conn.cursor() as cur:
+                password_hash = generate_password_hash(password)
+                cur.execute("INSERT INTO usuarios (username, password_hash, id_ministerio) VALUES (%s, %s, %s)", (username, password_hash, id_ministerio))
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            logger.exception("Erro ao criar usuário")
+            return False
 
 # def verificar_login(username, password):
 #     """Verifica o login e retorna o id_ministerio se for válido."""
@@ -97,155 +94,111 @@ def criar_usuario(username, password, id_ministerio):
 #     return id_ministerio # Retorna o ID ou None se a senha não bateu
 
 
-@dataclass
-class EscalaEntry:
-    id_evento: int
-    id_funcao: int
-    id_voluntario: int
-    funcao_instancia: int
-
-@dataclass
-class Vaga:
-    id_evento: int
-    id_servico_fixo: int
-    data_evento_obj: object
-    id_funcao: int
-    funcao_instancia: int
-    key: str # Uma chave única para cada vaga, ex: "evento_10-funcao_1-instancia_1"
-
-@dataclass
-class Voluntario:
-    id_voluntario: int
-    nome_voluntario: str
-    limite_escalas_mes: int
-    nivel_experiencia: str
-    id_grupo: int
-    funcoes: Set[int] = field(default_factory=set)
-    disponibilidade: Set[int] = field(default_factory=set)
-    indisponibilidades: Set[int] = field(default_factory=set)
-    escalas_neste_mes: int = 0
-    dias_escalado: Set[object] = field(default_factory=set)
-
-@dataclass
-class Grupo:
-    id_grupo: int
-    limite_escalas_grupo: int
-    membros: List[Voluntario] = field(default_factory=list)
-    escalas_neste_mes: int = 0
-    representantes: List[Voluntario] = field(default_factory=list)
-    apoiadores: List[Voluntario] = field(default_factory=list)
-
 # ----- DASHBOARD -------
 def get_all_voluntarios_com_detalhes_puro(id_ministerio):
-    conn = ensure_connection()
-    if conn is None: return pd.DataFrame()
-    try:
-        query = """
-            SELECT
-                v.id_voluntario, v.nome_voluntario, v.limite_escalas_mes,
-                v.nivel_experiencia, v.id_grupo,
-                COALESCE(funcoes_agg.funcoes, '{}') AS funcoes,
-                COALESCE(disp_agg.disponibilidades, '{}') AS disponibilidade
-            FROM voluntarios v
-            LEFT JOIN (
-                SELECT id_voluntario, array_agg(id_funcao) as funcoes
-                FROM voluntario_funcoes GROUP BY id_voluntario
-            ) AS funcoes_agg ON v.id_voluntario = funcoes_agg.id_voluntario
-            LEFT JOIN (
-                SELECT id_voluntario, array_agg(id_servico) as disponibilidades
-                FROM voluntario_disponibilidade GROUP BY id_voluntario
-            ) AS disp_agg ON v.id_voluntario = disp_agg.id_voluntario
-            WHERE v.ativo = TRUE AND v.id_ministerio = %s;
-        """
-        df = pd.read_sql(query, conn, params=(id_ministerio,))
-        if not df.empty:
-            df['funcoes'] = df['funcoes'].apply(lambda arr: [int(f) for f in arr])
-            df['disponibilidade'] = df['disponibilidade'].apply(lambda arr: [int(f) for f in arr])
-        return df
-    except Exception as e:
-        print(f"Erro ao buscar dados detalhados dos voluntários: {e}")
-        return pd.DataFrame()
-    finally:
-        if conn: conn.close()
+    with get_connection() as conn:
+        if conn is None: return pd.DataFrame()
+        try:
+            query = """
+                SELECT
+                    v.id_voluntario, v.nome_voluntario, v.limite_escalas_mes,
+                    v.nivel_experiencia, v.id_grupo,
+                    COALESCE(funcoes_agg.funcoes, '{}') AS funcoes,
+                    COALESCE(disp_agg.disponibilidades, '{}') AS disponibilidade
+                FROM voluntarios v
+                LEFT JOIN (
+                    SELECT id_voluntario, array_agg(id_funcao) as funcoes
+                    FROM voluntario_funcoes GROUP BY id_voluntario
+                ) AS funcoes_agg ON v.id_voluntario = funcoes_agg.id_voluntario
+                LEFT JOIN (
+                    SELECT id_voluntario, array_agg(id_servico) as disponibilidades
+                    FROM voluntario_disponibilidade GROUP BY id_voluntario
+                ) AS disp_agg ON v.id_voluntario = disp_agg.id_voluntario
+                WHERE v.ativo = TRUE AND v.id_ministerio = %s;
+            """
+            df = pd.read_sql(query, conn, params=(id_ministerio,))
+            if not df.empty:
+                df['funcoes'] = df['funcoes'].apply(lambda arr: [int(f) for f in arr])
+                df['disponibilidade'] = df['disponibilidade'].apply(lambda arr: [int(f) for f in arr])
+            return df
+        except Exception as e:
+            logger.exception("Erro ao buscar dados detalhados dos voluntários")
+            return pd.DataFrame()
 
 
 # --- CRUD FUNÇÕES ---
 
 def view_all_funcoes(id_ministerio):
     """ Busca todas as funções de um ministério específico. """
-    conn = ensure_connection()
-    if conn is None: return pd.DataFrame()
-    query = "SELECT id_funcao, nome_funcao, tipo_funcao, prioridade_alocacao FROM funcoes WHERE id_ministerio = %s ORDER BY nome_funcao ASC"
-    return pd.read_sql(query, conn, params=(id_ministerio,))
+    with get_connection() as conn:
+        if conn is None: return pd.DataFrame()
+        query = "SELECT id_funcao, nome_funcao, tipo_funcao, prioridade_alocacao FROM funcoes WHERE id_ministerio = %s ORDER BY nome_funcao ASC"
+        return pd.read_sql(query, conn, params=(id_ministerio,))
 
 
 
 def add_funcao(nome_funcao, descricao, id_ministerio, tipo_funcao, prioridade_alocacao): # 1. Novos parâmetros adicionados
-    conn = ensure_connection()
-    if conn is None: return
-    try:
-        with conn.cursor() as cur:
-            # A lógica de verificação continua a mesma
-            cur.execute("SELECT COUNT(*) FROM funcoes WHERE nome_funcao = %s AND id_ministerio = %s", (nome_funcao, id_ministerio))
-            if cur.fetchone()[0] > 0:
+    with get_connection() as conn:
+        if conn is None: return
+        try:
+            with conn.cursor() as cur:
+                # A lógica de verificação continua a mesma
+                cur.execute("SELECT COUNT(*) FROM funcoes WHERE nome_funcao = %s AND id_ministerio = %s", (nome_funcao, id_ministerio))
+                if cur.fetchone()[0] > 0:
                 
-                return # Alterado para retornar algo que a API possa tratar
+                    return # Alterado para retornar algo que a API possa tratar
 
-            # 2. Comando INSERT atualizado para incluir as novas colunas
-            sql = """
-                INSERT INTO funcoes (nome_funcao, descricao, id_ministerio, tipo_funcao, prioridade_alocacao)
-                VALUES (%s, %s, %s, %s, %s)
-            """
+                # 2. Comando INSERT atualizado para incluir as novas colunas
+                sql = """
+                    INSERT INTO funcoes (nome_funcao, descricao, id_ministerio, tipo_funcao, prioridade_alocacao)
+                    VALUES (%s, %s, %s, %s, %s)
+                """
             
-            # 3. Novos valores passados para o execute
-            cur.execute(
-                sql,
-                (nome_funcao, descricao, id_ministerio, tipo_funcao, prioridade_alocacao)
-            )
-        conn.commit()
+                # 3. Novos valores passados para o execute
+                cur.execute(
+                    sql,
+                    (nome_funcao, descricao, id_ministerio, tipo_funcao, prioridade_alocacao)
+                )
+            conn.commit()
 
-    except Exception as e:
-        conn.rollback()
+        except Exception as e:
+            conn.rollback()
 
-        raise e
-    finally:
-        if conn:
-            conn.close()
+            raise e
 
 
 # Função para ATUALIZAR uma função existente (CORRIGIDA)
 def update_funcao(id_funcao, novo_nome, nova_descricao, novo_tipo, nova_prioridade): # 1. Novos parâmetros adicionados
-    conn = ensure_connection()
-    if conn is None: return
-    try:
-        with conn.cursor() as cur:
-            # 2. Comando UPDATE atualizado para incluir os novos campos
-            sql = """
-                UPDATE funcoes
-                SET nome_funcao = %s, descricao = %s, tipo_funcao = %s, prioridade_alocacao = %s
-                WHERE id_funcao = %s
-            """
-            # 3. Novos valores passados para o execute
-            cur.execute(sql, (novo_nome, nova_descricao, novo_tipo, nova_prioridade, id_funcao))
-        conn.commit()
+    with get_connection() as conn:
+        if conn is None: return
+        try:
+            with conn.cursor() as cur:
+                # 2. Comando UPDATE atualizado para incluir os novos campos
+                sql = """
+                    UPDATE funcoes
+                    SET nome_funcao = %s, descricao = %s, tipo_funcao = %s, prioridade_alocacao = %s
+                    WHERE id_funcao = %s
+                """
+                # 3. Novos valores passados para o execute
+                cur.execute(sql, (novo_nome, nova_descricao, novo_tipo, nova_prioridade, id_funcao))
+            conn.commit()
+            cache_escala.invalidar_tudo()
  
-    except Exception as e:
-        conn.rollback()
+        except Exception as e:
+            conn.rollback()
 
-        raise e
-    finally:
-        if conn:
-            conn.close()
+            raise e
 
 def delete_funcao(id_funcao):
-    conn = ensure_connection()
-    if conn is None: return
-    try:
-        with conn.cursor() as cur:
-            cur.execute("DELETE FROM funcoes WHERE id_funcao = %s", (id_funcao,))
-        conn.commit()
-    except Exception as e:
-        conn.rollback(); print(f"Erro ao deletar função: {e}")
+    with get_connection() as conn:
+        if conn is None: return
+        try:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM funcoes WHERE id_funcao = %s", (id_funcao,))
+            conn.commit()
+            cache_escala.invalidar_tudo()
+        except Exception as e:
+            conn.rollback(); logger.exception("Erro ao deletar função")
 
 # --- CRUD VOLUNTÁRIOS ---
 
@@ -254,52 +207,54 @@ def delete_funcao(id_funcao):
 
 
 def get_voluntario_by_id(id_voluntario):
-    conn = ensure_connection()
-    if conn is None: return None
-    # Usar SELECT * garante que a nova coluna nivel_experiencia seja incluída.
-    df = pd.read_sql(f"SELECT * FROM voluntarios WHERE id_voluntario = {id_voluntario}", conn)
-    return df.iloc[0] if not df.empty else None
+    with get_connection() as conn:
+        if conn is None: return None
+        # Usar SELECT * garante que a nova coluna nivel_experiencia seja incluída.
+        df = pd.read_sql(f"SELECT * FROM voluntarios WHERE id_voluntario = {id_voluntario}", conn)
+        return df.iloc[0] if not df.empty else None
 
 def get_voluntario_by_name(nome_voluntario):
-    conn = ensure_connection()
-    if conn is None or not nome_voluntario or nome_voluntario == "**VAGO**": return None
-    query = "SELECT id_voluntario FROM voluntarios WHERE nome_voluntario = %s"
-    df = pd.read_sql(query, conn, params=(nome_voluntario,))
-    return int(df['id_voluntario'].iloc[0]) if not df.empty else None
+    with get_connection() as conn:
+        if conn is None or not nome_voluntario or nome_voluntario == "**VAGO**": return None
+        query = "SELECT id_voluntario FROM voluntarios WHERE nome_voluntario = %s"
+        df = pd.read_sql(query, conn, params=(nome_voluntario,))
+        return int(df['id_voluntario'].iloc[0]) if not df.empty else None
 
 # Versão NOVA e CORRIGIDA (sem 'telefone')
 def update_voluntario(id_voluntario, nome, limite_mes, ativo, nivel_experiencia):
-    conn = ensure_connection()
-    if conn is None: return
-    try:
-        with conn.cursor() as cur:
-            cur.execute(
-                "UPDATE voluntarios SET nome_voluntario = %s, limite_escalas_mes = %s, ativo = %s, nivel_experiencia = %s WHERE id_voluntario = %s",
-                (nome, limite_mes, ativo, nivel_experiencia, id_voluntario)
-            )
-        conn.commit()
-    except Exception as e:
-        conn.rollback(); print(f"Erro ao atualizar voluntário: {e}")
+    with get_connection() as conn:
+        if conn is None: return
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "UPDATE voluntarios SET nome_voluntario = %s, limite_escalas_mes = %s, ativo = %s, nivel_experiencia = %s WHERE id_voluntario = %s",
+                    (nome, limite_mes, ativo, nivel_experiencia, id_voluntario)
+                )
+            conn.commit()
+            cache_escala.invalidar_tudo()
+        except Exception as e:
+            conn.rollback(); logger.exception("Erro ao atualizar voluntário")
 
 # --- CRUD VOLUNTARIO_FUNCOES ---
 def get_funcoes_of_voluntario(id_voluntario):
-    conn = ensure_connection()
-    if conn is None: return []
-    df = pd.read_sql(f"SELECT id_funcao FROM voluntario_funcoes WHERE id_voluntario = {id_voluntario}", conn)
-    return df['id_funcao'].tolist()
+    with get_connection() as conn:
+        if conn is None: return []
+        df = pd.read_sql(f"SELECT id_funcao FROM voluntario_funcoes WHERE id_voluntario = {id_voluntario}", conn)
+        return df['id_funcao'].tolist()
 
 def update_funcoes_of_voluntario(id_voluntario, lista_ids_funcoes):
-    conn = ensure_connection()
-    if conn is None: return
-    try:
-        with conn.cursor() as cur:
-            cur.execute("DELETE FROM voluntario_funcoes WHERE id_voluntario = %s", (id_voluntario,))
-            if lista_ids_funcoes:
-                args = [(id_voluntario, id_funcao) for id_funcao in lista_ids_funcoes]
-                cur.executemany("INSERT INTO voluntario_funcoes (id_voluntario, id_funcao) VALUES (%s, %s)", args)
-        conn.commit()
-    except Exception as e:
-        conn.rollback(); print(f"Erro ao atualizar funções do voluntário: {e}")
+    with get_connection() as conn:
+        if conn is None: return
+        try:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM voluntario_funcoes WHERE id_voluntario = %s", (id_voluntario,))
+                if lista_ids_funcoes:
+                    args = [(id_voluntario, id_funcao) for id_funcao in lista_ids_funcoes]
+                    inserir_em_lote(cur, "voluntario_funcoes", ("id_voluntario", "id_funcao"), args)
+            conn.commit()
+            indice_elegibilidade.invalidar()
+        except Exception as e:
+            conn.rollback(); logger.exception("Erro ao atualizar funções do voluntário")
 
 def get_voluntarios_for_funcao(id_funcao):
     # Esta função agora fica mais simples e consistente
@@ -322,309 +277,326 @@ def get_voluntarios_for_funcao(id_funcao):
 #         conn.rollback(); print(f"Erro ao adicionar serviço: {e}")
 
 def add_servico_fixo(nome, dia_da_semana, id_ministerio):
-    conn = ensure_connection()
-    if conn is None: return
-    try:
-        with conn.cursor() as cur:
-            # Verifica se o serviço já existe para o mesmo ministério
-            cur.execute("SELECT COUNT(*) FROM servicos_fixos WHERE nome_servico = %s AND id_ministerio = %s", (nome, id_ministerio))
-            if cur.fetchone()[0] > 0:
-                print(f"O serviço '{nome}' já existe neste ministério.")
-                return
-
-            # Insere o novo registro com o id_ministerio
-            cur.execute(
-                "INSERT INTO servicos_fixos (nome_servico, dia_da_semana, id_ministerio) VALUES (%s, %s, %s)",
-                (nome, dia_da_semana, id_ministerio)
-            )
-        conn.commit()
+    with get_connection() as conn:
+        if conn is None: return
+        try:
+            with conn.cursor() as cur:
+                # Verifica se o serviço já existe para o mesmo ministério
+                cur.execute("SELECT COUNT(*) FROM servicos_fixos WHERE nome_servico = %s AND id_ministerio = %s", (nome, id_ministerio))
+                if cur.fetchone()[0] > 0:
+                    logger.warning("O serviço '%s' já existe neste ministério.", nome)
+                    return
+
+                # Insere o novo registro com o id_ministerio
+                cur.execute(
+                    "INSERT INTO servicos_fixos (nome_servico, dia_da_semana, id_ministerio) VALUES (%s, %s, %s)",
+                    (nome, dia_da_semana, id_ministerio)
+                )
+            conn.commit()
         
-    except Exception as e:
-        conn.rollback()
-        print(f"Erro ao adicionar serviço: {e}")
+        except Exception as e:
+            conn.rollback()
+            logger.exception("Erro ao adicionar serviço")
 
 def view_all_servicos_fixos(id_ministerio):
     """ Busca todos os serviços fixos de um ministério específico. """
-    conn = ensure_connection()
-    if conn is None: return pd.DataFrame()
-    query = "SELECT * FROM servicos_fixos WHERE ativo = TRUE AND id_ministerio = %s ORDER BY dia_da_semana, nome_servico ASC"
-    return pd.read_sql(query, conn, params=(id_ministerio,))
+    with get_connection() as conn:
+        if conn is None: return pd.DataFrame()
+        query = "SELECT * FROM servicos_fixos WHERE ativo = TRUE AND id_ministerio = %s ORDER BY dia_da_semana, nome_servico ASC"
+        return pd.read_sql(query, conn, params=(id_ministerio,))
 
 
 def update_servico_fixo(id_servico, nome, dia_da_semana, ativo):
-    conn = ensure_connection()
-    if conn is None: return
-    try:
-        with conn.cursor() as cur:
-            cur.execute("UPDATE servicos_fixos SET nome_servico = %s, dia_da_semana = %s, ativo = %s WHERE id_servico = %s", (nome, dia_da_semana, ativo, id_servico))
-        conn.commit()
+    with get_connection() as conn:
+        if conn is None: return
+        try:
+            with conn.cursor() as cur:
+                cur.execute("UPDATE servicos_fixos SET nome_servico = %s, dia_da_semana = %s, ativo = %s WHERE id_servico = %s", (nome, dia_da_semana, ativo, id_servico))
+            conn.commit()
+            cache_escala.invalidar_tudo()
         
-    except Exception as e:
-        conn.rollback(); print(f"Erro ao atualizar serviço: {e}")
+        except Exception as e:
+            conn.rollback(); logger.exception("Erro ao atualizar serviço")
 
 def delete_servico_fixo(id_servico):
-    conn = ensure_connection()
-    if conn is None: return
-    try:
-        with conn.cursor() as cur:
-            cur.execute("DELETE FROM servicos_fixos WHERE id_servico = %s", (id_servico,))
-        conn.commit()
+    with get_connection() as conn:
+        if conn is None: return
+        try:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM servicos_fixos WHERE id_servico = %s", (id_servico,))
+            conn.commit()
+            cache_escala.invalidar_tudo()
         
-    except Exception as e:
-        conn.rollback(); print(f"Erro ao deletar serviço: {e}")
+        except Exception as e:
+            conn.rollback(); logger.exception("Erro ao deletar serviço")
 
 # --- CRUD VOLUNTARIO_DISPONIBILIDADE ---
 def get_disponibilidade_of_voluntario(id_voluntario):
-    conn = ensure_connection()
-    if conn is None: return []
-    df = pd.read_sql(f"SELECT id_servico FROM voluntario_disponibilidade WHERE id_voluntario = {id_voluntario}", conn)
-    return df['id_servico'].tolist()
+    with get_connection() as conn:
+        if conn is None: return []
+        df = pd.read_sql(f"SELECT id_servico FROM voluntario_disponibilidade WHERE id_voluntario = {id_voluntario}", conn)
+        return df['id_servico'].tolist()
 
 def update_disponibilidade_of_voluntario(id_voluntario, lista_ids_servicos):
-    conn = ensure_connection()
-    if conn is None: return
-    try:
-        with conn.cursor() as cur:
-            cur.execute("DELETE FROM voluntario_disponibilidade WHERE id_voluntario = %s", (id_voluntario,))
-            if lista_ids_servicos:
-                args = [(id_voluntario, id_servico) for id_servico in lista_ids_servicos]
-                cur.executemany("INSERT INTO voluntario_disponibilidade (id_voluntario, id_servico) VALUES (%s, %s)", args)
-        conn.commit()
-    except Exception as e:
-        conn.rollback(); print(f"Erro ao atualizar disponibilidade: {e}")
+    with get_connection() as conn:
+        if conn is None: return
+        try:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM voluntario_disponibilidade WHERE id_voluntario = %s", (id_voluntario,))
+                if lista_ids_servicos:
+                    args = [(id_voluntario, id_servico) for id_servico in lista_ids_servicos]
+                    inserir_em_lote(cur, "voluntario_disponibilidade", ("id_voluntario", "id_servico"), args)
+            conn.commit()
+            indice_elegibilidade.invalidar()
+        except Exception as e:
+            conn.rollback(); logger.exception("Erro ao atualizar disponibilidade")
 
 def update_apenas_disponibilidade(id_voluntario, lista_ids_servicos):
-    conn = ensure_connection()
-    if conn is None: return
-    try:
-        with conn.cursor() as cur:
-            cur.execute("DELETE FROM voluntario_disponibilidade WHERE id_voluntario = %s", (id_voluntario,))
-            if lista_ids_servicos:
-                args = [(id_voluntario, id_servico) for id_servico in lista_ids_servicos]
-                cur.executemany("INSERT INTO voluntario_disponibilidade (id_voluntario, id_servico) VALUES (%s, %s)", args)
-        conn.commit()
-    except Exception as e:
-        conn.rollback(); print(f"Erro ao atualizar disponibilidade: {e}")
+    with get_connection() as conn:
+        if conn is None: return
+        try:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM voluntario_disponibilidade WHERE id_voluntario = %s", (id_voluntario,))
+                if lista_ids_servicos:
+                    args = [(id_voluntario, id_servico) for id_servico in lista_ids_servicos]
+                    inserir_em_lote(cur, "voluntario_disponibilidade", ("id_voluntario", "id_servico"), args)
+            conn.commit()
+            indice_elegibilidade.invalidar()
+        except Exception as e:
+            conn.rollback(); logger.exception("Erro ao atualizar disponibilidade")
 
 # --- CRUD VOLUNTARIO_INDISPONIBILIDADE ---
 def get_indisponibilidade_eventos(id_voluntario, ano, mes):
     """ Busca os IDs dos eventos específicos de indisponibilidade para um voluntário. """
-    conn = ensure_connection()
-    if conn is None: return []
-    query = """
-    SELECT vi.id_evento
-    FROM voluntario_indisponibilidade_eventos vi
-    JOIN eventos e ON vi.id_evento = e.id_evento
-    WHERE vi.id_voluntario = %s
-      AND EXTRACT(YEAR FROM e.data_evento) = %s
-      AND EXTRACT(MONTH FROM e.data_evento) = %s
-    """
-    df = pd.read_sql(query, conn, params=(id_voluntario, ano, mes))
-    return df['id_evento'].tolist()
+    with get_connection() as conn:
+        if conn is None: return []
+        query = """
+        SELECT vi.id_evento
+        FROM voluntario_indisponibilidade_eventos vi
+        JOIN eventos e ON vi.id_evento = e.id_evento
+        WHERE vi.id_voluntario = %s
+          AND e.data_evento >= %s AND e.data_evento < %s
+        """
+        df = pd.read_sql(query, conn, params=(id_voluntario, *intervalo_do_mes(ano, mes)))
+        return df['id_evento'].tolist()
 
 def update_indisponibilidade_eventos(id_voluntario, ano, mes, lista_ids_eventos):
     """ Atualiza os eventos de indisponibilidade, limpando os antigos do mês e inserindo os novos. """
-    conn = ensure_connection()
-    if conn is None: return False
-    try:
-        with conn.cursor() as cur:
-            cur.execute("""
-                DELETE FROM voluntario_indisponibilidade_eventos
-                WHERE id_voluntario = %s AND id_evento IN (
-                    SELECT id_evento FROM eventos
-                    WHERE EXTRACT(YEAR FROM data_evento) = %s AND EXTRACT(MONTH FROM data_evento) = %s
-                )
-            """, (id_voluntario, ano, mes))
-
-            if lista_ids_eventos:
-                args = [(id_voluntario, id_evento) for id_evento in lista_ids_eventos]
-                cur.executemany("""
-                    INSERT INTO voluntario_indisponibilidade_eventos (id_voluntario, id_evento)
-                    VALUES (%s, %s)
-                """, args)
-        conn.commit()
-        return True
-    except Exception as e:
-        conn.rollback()
-        print(f"Erro ao atualizar indisponibilidades: {e}")
-        return False
-    finally:
-        if conn:
-            conn.close()
+    with get_connection() as conn:
+        if conn is None: return False
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    DELETE FROM voluntario_indisponibilidade_eventos
+                    WHERE id_voluntario = %s AND id_evento IN (
+                        SELECT id_evento FROM eventos
+                        WHERE data_evento >= %s AND data_evento < %s
+                    )
+                """, (id_voluntario, *intervalo_do_mes(ano, mes)))
+
+                if lista_ids_eventos:
+                    args = [(id_voluntario, id_evento) for id_evento in lista_ids_eventos]
+                    inserir_em_lote(cur, "voluntario_indisponibilidade_eventos", ("id_voluntario", "id_evento"), args)
+            conn.commit()
+            indice_elegibilidade.invalidar()
+            return True
+        except Exception as e:
+            conn.rollback()
+            logger.exception("Erro ao atualizar indisponibilidades")
+            return False
 
 # ----- MINISTERIOS ------
 
 def get_all_ministerios():
-    conn = ensure_connection()
-    if conn is None: return pd.DataFrame()
-    try:
-        query = "SELECT id_ministerio, nome_ministerio FROM ministerios ORDER BY nome_ministerio"
-        return pd.read_sql(query, conn)
-    except Exception as e:
-        print(f"Erro ao buscar ministérios: {e}")
-        return pd.DataFrame()
-    finally:
-        if conn: conn.close()
+    with get_connection() as conn:
+        if conn is None: return pd.DataFrame()
+        try:
+            query = "SELECT id_ministerio, nome_ministerio FROM ministerios ORDER BY nome_ministerio"
+            return pd.read_sql(query, conn)
+        except Exception as e:
+            logger.exception("Erro ao buscar ministérios")
+            return pd.DataFrame()
 
 
 # --- CRUD GRUPOS ---
 def get_all_grupos_com_membros(id_ministerio, _cache_buster=None):
     """ Retorna um DataFrame com os grupos e seus membros FILTRADOS POR MINISTÉRIO. """
-    conn = ensure_connection()
-    if conn is None: return pd.DataFrame()
+    with get_connection() as conn:
+        if conn is None: return pd.DataFrame()
     
-    try:
-        query = """
-        SELECT
-            gv.id_grupo, gv.nome_grupo, gv.limite_escalas_grupo,
-            COALESCE(membros.lista_membros, 'Nenhum membro vinculado') as membros
-        FROM grupos_vinculados gv
-        LEFT JOIN (
-            SELECT 
-                id_grupo, 
-                STRING_AGG(nome_voluntario, ', ' ORDER BY nome_voluntario) as lista_membros
-            FROM voluntarios
-            WHERE id_grupo IS NOT NULL
-            GROUP BY id_grupo
-        ) as membros ON gv.id_grupo = membros.id_grupo
-        WHERE gv.id_ministerio = %s
-        ORDER BY gv.nome_grupo;
-        """
-        df = pd.read_sql(query, conn, params=(id_ministerio,))
-        return df
-    except Exception as e:
-        print(f"Erro em get_all_grupos_com_membros: {e}")
-        return pd.DataFrame()
-    finally:
-        # Garante que a conexão seja fechada, mesmo que ocorra um erro.
-        if conn:
-            conn.close()
+        try:
+            query = """
+            SELECT
+                gv.id_grupo, gv.nome_grupo, gv.limite_escalas_grupo,
+                COALESCE(membros.lista_membros, 'Nenhum membro vinculado') as membros
+            FROM grupos_vinculados gv
+            LEFT JOIN (
+                SELECT 
+                    id_grupo, 
+                    STRING_AGG(nome_voluntario, ', ' ORDER BY nome_voluntario) as lista_membros
+                FROM voluntarios
+                WHERE id_grupo IS NOT NULL
+                GROUP BY id_grupo
+            ) as membros ON gv.id_grupo = membros.id_grupo
+            WHERE gv.id_ministerio = %s
+            ORDER BY gv.nome_grupo;
+            """
+            df = pd.read_sql(query, conn, params=(id_ministerio,))
+            return df
+        except Exception as e:
+            logger.exception("Erro em get_all_grupos_com_membros")
+            return pd.DataFrame()
 
 def get_voluntarios_sem_grupo(id_ministerio):
     """ Retorna voluntários sem grupo que pertencem ao ministério especificado. """
-    conn = ensure_connection()
-    if conn is None: return pd.DataFrame()
+    with get_connection() as conn:
+        if conn is None: return pd.DataFrame()
     
-    try:
-        query = """
-            SELECT id_voluntario, nome_voluntario 
-            FROM voluntarios 
-            WHERE ativo = TRUE 
-              AND id_grupo IS NULL 
-              AND id_ministerio = %s 
-            ORDER BY nome_voluntario
-        """
-        df = pd.read_sql(query, conn, params=(id_ministerio,))
-        return df
-    except Exception as e:
-        print(f"Erro em get_voluntarios_sem_grupo: {e}")
-        return pd.DataFrame()
-    finally:
-        # Garante que a conexão seja fechada.
-        if conn:
-            conn.close()
+        try:
+            query = """
+                SELECT id_voluntario, nome_voluntario 
+                FROM voluntarios 
+                WHERE ativo = TRUE 
+                  AND id_grupo IS NULL 
+                  AND id_ministerio = %s 
+                ORDER BY nome_voluntario
+            """
+            df = pd.read_sql(query, conn, params=(id_ministerio,))
+            return df
+        except Exception as e:
+            logger.exception("Erro em get_voluntarios_sem_grupo")
+            return pd.DataFrame()
 
 def get_voluntarios_do_grupo(id_grupo):
-    conn = ensure_connection()
-    if conn is None: return pd.DataFrame()
-    return pd.read_sql(f"SELECT id_voluntario, nome_voluntario FROM voluntarios WHERE ativo = TRUE AND id_grupo = {id_grupo} ORDER BY nome_voluntario", conn)
+    with get_connection() as conn:
+        if conn is None: return pd.DataFrame()
+        return pd.read_sql(f"SELECT id_voluntario, nome_voluntario FROM voluntarios WHERE ativo = TRUE AND id_grupo = {id_grupo} ORDER BY nome_voluntario", conn)
+
+def get_grupo_by_id(id_grupo):
+    """ Busca os dados de um grupo vinculado. Retorna um DataFrame vazio se não existir. """
+    with get_connection() as conn:
+        if conn is None: return None
+        return pd.read_sql("SELECT * FROM grupos_vinculados WHERE id_grupo = %s", conn, params=(id_grupo,))
 
 # Adicione id_ministerio como um novo parâmetro
 def create_grupo(nome_grupo, ids_membros, id_ministerio, limite_grupo):
-    conn = ensure_connection()
-    if conn is None: return
-    try:
-        with conn.cursor() as cur:
-            # SQL atualizado para inserir o limite
-            sql_insert = "INSERT INTO grupos_vinculados (nome_grupo, id_ministerio, limite_escalas_grupo) VALUES (%s, %s, %s) RETURNING id_grupo"
-            cur.execute(sql_insert, (nome_grupo, id_ministerio, limite_grupo))
-            id_novo_grupo = cur.fetchone()[0]
-            cur.execute("UPDATE voluntarios SET id_grupo = %s WHERE id_voluntario IN %s", (id_novo_grupo, tuple(ids_membros)))
-        conn.commit()
-    except Exception as e:
-        conn.rollback(); print(f"Erro ao criar grupo: {e}")
+    with get_connection() as conn:
+        if conn is None: return
+        try:
+            with conn.cursor() as cur:
+                # SQL atualizado para inserir o limite
+                sql_insert = "INSERT INTO grupos_vinculados (nome_grupo, id_ministerio, limite_escalas_grupo) VALUES (%s, %s, %s) RETURNING id_grupo"
+                cur.execute(sql_insert, (nome_grupo, id_ministerio, limite_grupo))
+                id_novo_grupo = cur.fetchone()[0]
+                cur.execute("UPDATE voluntarios SET id_grupo = %s WHERE id_voluntario IN %s", (id_novo_grupo, tuple(ids_membros)))
+            conn.commit()
+        except Exception as e:
+            conn.rollback(); logger.exception("Erro ao criar grupo")
 
 def update_grupo(id_grupo, novo_nome, ids_membros_novos, novo_limite):
-    conn = ensure_connection()
-    if conn is None: return
-    try:
-        with conn.cursor() as cur:
-            # SQL atualizado para o novo limite
-            cur.execute("UPDATE grupos_vinculados SET nome_grupo = %s, limite_escalas_grupo = %s WHERE id_grupo = %s", (novo_nome, novo_limite, id_grupo))
-            cur.execute("UPDATE voluntarios SET id_grupo = NULL WHERE id_grupo = %s", (id_grupo,))
-            if ids_membros_novos:
-                cur.execute("UPDATE voluntarios SET id_grupo = %s WHERE id_voluntario IN %s", (id_grupo, tuple(ids_membros_novos)))
-        conn.commit()
-    except Exception as e:
-        conn.rollback(); print(f"Erro ao atualizar grupo: {e}")
+    with get_connection() as conn:
+        if conn is None: return
+        try:
+            with conn.cursor() as cur:
+                # SQL atualizado para o novo limite
+                cur.execute("UPDATE grupos_vinculados SET nome_grupo = %s, limite_escalas_grupo = %s WHERE id_grupo = %s", (novo_nome, novo_limite, id_grupo))
+                cur.execute("UPDATE voluntarios SET id_grupo = NULL WHERE id_grupo = %s", (id_grupo,))
+                if ids_membros_novos:
+                    cur.execute("UPDATE voluntarios SET id_grupo = %s WHERE id_voluntario IN %s", (id_grupo, tuple(ids_membros_novos)))
+            conn.commit()
+        except Exception as e:
+            conn.rollback(); logger.exception("Erro ao atualizar grupo")
 
 
 def delete_grupo(id_grupo):
-    conn = ensure_connection()
-    if conn is None: return
-    try:
-        with conn.cursor() as cur:
-            cur.execute("UPDATE voluntarios SET id_grupo = NULL WHERE id_grupo = %s", (id_grupo,))
-            cur.execute("DELETE FROM grupos_vinculados WHERE id_grupo = %s", (id_grupo,))
-        conn.commit()
-    except Exception as e:
-        conn.rollback(); print(f"Erro ao deletar grupo: {e}")
+    with get_connection() as conn:
+        if conn is None: return
+        try:
+            with conn.cursor() as cur:
+                cur.execute("UPDATE voluntarios SET id_grupo = NULL WHERE id_grupo = %s", (id_grupo,))
+                cur.execute("DELETE FROM grupos_vinculados WHERE id_grupo = %s", (id_grupo,))
+            conn.commit()
+        except Exception as e:
+            conn.rollback(); logger.exception("Erro ao deletar grupo")
 
 # --- CRUD COTAS ---
 def get_cotas_all_servicos():
-    conn = ensure_connection()
-    if conn is None: return pd.DataFrame()
-    return pd.read_sql("SELECT * FROM servico_funcao_cotas", conn)
+    with get_connection() as conn:
+        if conn is None: return pd.DataFrame()
+        return pd.read_sql("SELECT * FROM servico_funcao_cotas", conn)
 
 def get_cotas_for_servico(id_servico):
-    conn = ensure_connection()
-    if conn is None: return {}
-    df = pd.read_sql(f"SELECT id_funcao, quantidade_necessaria FROM servico_funcao_cotas WHERE id_servico = {id_servico}", conn)
-    return df.set_index('id_funcao')['quantidade_necessaria'].to_dict()
+    with get_connection() as conn:
+        if conn is None: return {}
+        df = pd.read_sql(f"SELECT id_funcao, quantidade_necessaria FROM servico_funcao_cotas WHERE id_servico = {id_servico}", conn)
+        return df.set_index('id_funcao')['quantidade_necessaria'].to_dict()
 
 def update_cotas_servico(id_servico, cotas_dict):
-    conn = ensure_connection()
-    if conn is None: return
-    try:
-        with conn.cursor() as cur:
-            cur.execute("DELETE FROM servico_funcao_cotas WHERE id_servico = %s", (id_servico,))
-            args = [(id_servico, id_f, qtd) for id_f, qtd in cotas_dict.items() if qtd > 0]
-            if args:
-                cur.executemany("INSERT INTO servico_funcao_cotas (id_servico, id_funcao, quantidade_necessaria) VALUES (%s, %s, %s)", args)
-        conn.commit()
-    except Exception as e:
-        conn.rollback(); print(f"Erro ao atualizar cotas: {e}")
+    with get_connection() as conn:
+        if conn is None: return
+        try:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM servico_funcao_cotas WHERE id_servico = %s", (id_servico,))
+                args = [(id_servico, id_f, qtd) for id_f, qtd in cotas_dict.items() if qtd > 0]
+                if args:
+                    inserir_em_lote(cur, "servico_funcao_cotas", ("id_servico", "id_funcao", "quantidade_necessaria"), args)
+            conn.commit()
+            # As cotas valem para todos os meses do serviço.
+            cache_escala.invalidar_tudo()
+        except Exception as e:
+            conn.rollback(); logger.exception("Erro ao atualizar cotas")
 
 
 
 def add_voluntario(nome, limite_mes, nivel_experiencia, id_ministerio):
     """ Adiciona um voluntário associado a um ministério e retorna o ID. """
-    conn = ensure_connection()
-    if conn is None: return None
-    try:
-        with conn.cursor() as cur:
-            cur.execute(
-                "INSERT INTO voluntarios (nome_voluntario, limite_escalas_mes, nivel_experiencia, id_ministerio) VALUES (%s, %s, %s, %s) RETURNING id_voluntario", 
-                (nome, limite_mes, nivel_experiencia, id_ministerio)
-            )
-            id_novo_voluntario = cur.fetchone()[0]
+    with get_connection() as conn:
+        if conn is None: return None
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "INSERT INTO voluntarios (nome_voluntario, limite_escalas_mes, nivel_experiencia, id_ministerio) VALUES (%s, %s, %s, %s) RETURNING id_voluntario", 
+                    (nome, limite_mes, nivel_experiencia, id_ministerio)
+                )
+                id_novo_voluntario = cur.fetchone()[0]
+                conn.commit()
+                indice_elegibilidade.invalidar()
+                return id_novo_voluntario
+        except Exception as e:
+            conn.rollback()
+            logger.exception("Erro ao adicionar voluntário")
+            return None
+
+def inativar_voluntario(id_voluntario):
+    """
+    Marca um voluntário como inativo (exclusão lógica).
+    Retorna True se inativou, False se o voluntário não existe e None em erro de conexão.
+    """
+    with get_connection() as conn:
+        if conn is None: return None
+        try:
+            with conn.cursor() as cur:
+                cur.execute("UPDATE voluntarios SET ativo = FALSE WHERE id_voluntario = %s", (id_voluntario,))
+                if cur.rowcount == 0:
+                    conn.rollback()
+                    return False
             conn.commit()
-            return id_novo_voluntario
-    except Exception as e:
-        conn.rollback()
-        print(f"Erro ao adicionar voluntário: {e}")
-        return None
+            indice_elegibilidade.invalidar()
+            return True
+        except Exception as e:
+            conn.rollback()
+            raise e
 
 def view_all_voluntarios(id_ministerio, include_inactive=False):
     """ Busca todos os voluntários de um ministério específico. """
-    conn = ensure_connection()
-    if conn is None: return pd.DataFrame()
-    query = "SELECT * FROM voluntarios WHERE id_ministerio = %s"
-    params = [id_ministerio]
-    if not include_inactive:
-        query += " AND ativo = TRUE"
-    query += " ORDER BY nome_voluntario ASC"
-    return pd.read_sql(query, conn, params=params)
+    with get_connection() as conn:
+        if conn is None: return pd.DataFrame()
+        query = "SELECT * FROM voluntarios WHERE id_ministerio = %s"
+        params = [id_ministerio]
+        if not include_inactive:
+            query += " AND ativo = TRUE"
+        query += " ORDER BY nome_voluntario ASC"
+        return pd.read_sql(query, conn, params=params)
 
 
 def get_all_voluntarios_com_detalhes(id_ministerio, include_inactive=False):
@@ -632,80 +604,64 @@ def get_all_voluntarios_com_detalhes(id_ministerio, include_inactive=False):
     Busca TODOS os dados (nome, nível, funções, dias) para a tabela principal.
     Aceita filtro de inativos.
     """
-    conn = ensure_connection()
-    if conn is None: return pd.DataFrame()
-    try:
-        # Define se filtramos apenas ativos ou pegamos tudo
-        filtro_ativo = "" if include_inactive else "AND v.ativo = TRUE"
+    with get_connection() as conn:
+        if conn is None: return pd.DataFrame()
+        try:
+            # Define se filtramos apenas ativos ou pegamos tudo
+            filtro_ativo = "" if include_inactive else "AND v.ativo = TRUE"
         
-        query = f"""
-            SELECT
-                v.id_voluntario, 
-                v.nome_voluntario, 
-                v.limite_escalas_mes,
-                v.nivel_experiencia, 
-                v.id_grupo,
-                v.ativo,
-                v.data_inativacao, -- IMPORTANTE: Trazendo a data para o Dashboard
-                COALESCE(funcoes_agg.funcoes, '{{}}') AS funcoes,
-                COALESCE(disp_agg.disponibilidades, '{{}}') AS disponibilidade
-            FROM voluntarios v
-            LEFT JOIN (
-                SELECT id_voluntario, array_agg(id_funcao) as funcoes
-                FROM voluntario_funcoes GROUP BY id_voluntario
-            ) AS funcoes_agg ON v.id_voluntario = funcoes_agg.id_voluntario
-            LEFT JOIN (
-                SELECT id_voluntario, array_agg(id_servico) as disponibilidades
-                FROM voluntario_disponibilidade GROUP BY id_voluntario
-            ) AS disp_agg ON v.id_voluntario = disp_agg.id_voluntario
-            WHERE v.id_ministerio = %s {filtro_ativo}
-            ORDER BY v.nome_voluntario ASC;
-        """
-        df = pd.read_sql(query, conn, params=(id_ministerio,))
+            query = f"""
+                SELECT
+                    v.id_voluntario, 
+                    v.nome_voluntario, 
+                    v.limite_escalas_mes,
+                    v.nivel_experiencia, 
+                    v.id_grupo,
+                    v.ativo,
+                    v.data_inativacao, -- IMPORTANTE: Trazendo a data para o Dashboard
+                    COALESCE(funcoes_agg.funcoes, '{{}}') AS funcoes,
+                    COALESCE(disp_agg.disponibilidades, '{{}}') AS disponibilidade
+                FROM voluntarios v
+                LEFT JOIN (
+                    SELECT id_voluntario, array_agg(id_funcao) as funcoes
+                    FROM voluntario_funcoes GROUP BY id_voluntario
+                ) AS funcoes_agg ON v.id_voluntario = funcoes_agg.id_voluntario
+                LEFT JOIN (
+                    SELECT id_voluntario, array_agg(id_servico) as disponibilidades
+                    FROM voluntario_disponibilidade GROUP BY id_voluntario
+                ) AS disp_agg ON v.id_voluntario = disp_agg.id_voluntario
+                WHERE v.id_ministerio = %s {filtro_ativo}
+                ORDER BY v.nome_voluntario ASC;
+            """
+            df = pd.read_sql(query, conn, params=(id_ministerio,))
 
-        if not df.empty:
-            # Converte os arrays do PostgreSQL (que vêm como listas de strings ou ints) para lista de inteiros puros
-            # Isso corrige o bug do filtro (0) no frontend
-            df['funcoes'] = df['funcoes'].apply(lambda arr: [int(f) for f in arr] if arr else [])
-            df['disponibilidade'] = df['disponibilidade'].apply(lambda arr: [int(f) for f in arr] if arr else [])
+            if not df.empty:
+                # Converte os arrays do PostgreSQL (que vêm como listas de strings ou ints) para lista de inteiros puros
+                # Isso corrige o bug do filtro (0) no frontend
+                df['funcoes'] = df['funcoes'].apply(lambda arr: [int(f) for f in arr] if arr else [])
+                df['disponibilidade'] = df['disponibilidade'].apply(lambda arr: [int(f) for f in arr] if arr else [])
 
-        return df
-    except Exception as e:
-        print(f"Erro ao buscar dados detalhados dos voluntários: {e}")
-        return pd.DataFrame()
-    finally:
-        if conn: conn.close()
+            return df
+        except Exception as e:
+            logger.exception("Erro ao buscar dados detalhados dos voluntários")
+            return pd.DataFrame()
 
 
 
 def get_events_for_month(ano, mes, id_ministerio):
     """ Busca os eventos de um ministério específico. """
-    conn = ensure_connection()
-    if conn is None: return pd.DataFrame()
-    query = """
-        SELECT e.id_evento, e.id_servico_fixo, e.data_evento, sf.nome_servico 
-        FROM eventos e 
-        JOIN servicos_fixos sf ON e.id_servico_fixo = sf.id_servico 
-        WHERE EXTRACT(YEAR FROM e.data_evento) = %s 
-          AND EXTRACT(MONTH FROM e.data_evento) = %s
-          AND sf.id_ministerio = %s
-        ORDER BY e.data_evento ASC
-    """
-    return pd.read_sql(query, conn, params=(ano, mes, id_ministerio))
-
-
+    with get_connection() as conn:
+        if conn is None: return pd.DataFrame()
+        query = """
+            SELECT e.id_evento, e.id_servico_fixo, e.data_evento, sf.nome_servico 
+            FROM eventos e 
+            JOIN servicos_fixos sf ON e.id_servico_fixo = sf.id_servico 
+            WHERE e.data_evento >= %s AND e.data_evento < %s
+              AND sf.id_ministerio = %s
+            ORDER BY e.data_evento ASC
+        """
+        return pd.read_sql(query, conn, params=(*intervalo_do_mes(ano, mes), id_ministerio))
 
-def update_escala_entry(id_evento, id_funcao, id_voluntario, instancia):
-    conn = ensure_connection()
-    if conn is None: return
-    try:
-        with conn.cursor() as cur:
-            cur.execute("DELETE FROM escala WHERE id_evento = %s AND id_funcao = %s AND funcao_instancia = %s", (id_evento, id_funcao, instancia))
-            if id_voluntario is not None:
-                cur.execute("INSERT INTO escala (id_evento, id_funcao, id_voluntario, funcao_instancia) VALUES (%s, %s, %s, %s)", (id_evento, id_funcao, id_voluntario, instancia))
-        conn.commit()
-    except Exception as e:
-        conn.rollback(); print(f"Erro ao salvar alteração na escala: {e}")
 
 # -------------------- INDISPONIBILIDADE DOS VOLUNTARIOS --------------------
 
@@ -713,103 +669,268 @@ def update_escala_entry(id_evento, id_funcao, id_voluntario, instancia):
 
 def get_indisponibilidade_por_mes(id_voluntario, ano, mes):
     """Busca as datas de indisponibilidade de um voluntário para um mês específico."""
-    conn = ensure_connection()
-    if conn is None: return []
-    try:
-        query = """
-            SELECT data_indisponivel FROM voluntario_indisponibilidade_datas
-            WHERE id_voluntario = %s 
-              AND EXTRACT(YEAR FROM data_indisponivel) = %s
-              AND EXTRACT(MONTH FROM data_indisponivel) = %s;
-        """
-        df = pd.read_sql(query, conn, params=(id_voluntario, ano, mes))
-        # Retorna a lista de datas no formato 'YYYY-MM-DD'
-        return [d.strftime('%Y-%m-%d') for d in df['data_indisponivel']]
-    except Exception as e:
-        print(f"Erro ao buscar indisponibilidades: {e}")
-        return []
-    finally:
-        if conn: conn.close()
+    with get_connection() as conn:
+        if conn is None: return []
+        try:
+            query = """
+                SELECT data_indisponivel FROM voluntario_indisponibilidade_datas
+                WHERE id_voluntario = %s 
+                  AND data_indisponivel >= %s AND data_indisponivel < %s;
+            """
+            df = pd.read_sql(query, conn, params=(id_voluntario, *intervalo_do_mes(ano, mes)))
+            # Retorna a lista de datas no formato 'YYYY-MM-DD'
+            return [d.strftime('%Y-%m-%d') for d in df['data_indisponivel']]
+        except Exception as e:
+            logger.exception("Erro ao buscar indisponibilidades")
+            return []
 
 def update_indisponibilidade_por_mes(id_voluntario, ano, mes, lista_datas):
     """
     Atualiza as indisponibilidades de um voluntário para um mês.
     Primeiro apaga as datas antigas do mês e depois insere as novas.
     """
-    conn = ensure_connection()
-    if conn is None: return False
-    try:
-        with conn.cursor() as cur:
-            # 1. Limpa as indisponibilidades antigas apenas para o mês em questão
-            cur.execute("""
-                DELETE FROM voluntario_indisponibilidade_datas
-                WHERE id_voluntario = %s 
-                  AND EXTRACT(YEAR FROM data_indisponivel) = %s 
-                  AND EXTRACT(MONTH FROM data_indisponivel) = %s;
-            """, (id_voluntario, ano, mes))
-
-            # 2. Insere as novas datas, se houver alguma
-            if lista_datas:
-                dados_para_inserir = [(id_voluntario, data) for data in lista_datas]
-                sql_insert = "INSERT INTO voluntario_indisponibilidade_datas (id_voluntario, data_indisponivel) VALUES (%s, %s)"
-                cur.executemany(sql_insert, dados_para_inserir)
-        conn.commit()
-        return True
-    except Exception as e:
-        conn.rollback()
-        print(f"Erro ao atualizar indisponibilidades: {e}")
-        return False
-    finally:
-        if conn: conn.close()
+    with get_connection() as conn:
+        if conn is None: return False
+        try:
+            with conn.cursor() as cur:
+                # 1. Limpa as indisponibilidades antigas apenas para o mês em questão
+                cur.execute("""
+                    DELETE FROM voluntario_indisponibilidade_datas
+                    WHERE id_voluntario = %s 
+                      AND data_indisponivel >= %s AND data_indisponivel < %s;
+                """, (id_voluntario, *intervalo_do_mes(ano, mes)))
+
+                # 2. Insere as novas datas, se houver alguma
+                if lista_datas:
+                    dados_para_inserir = [(id_voluntario, data) for data in lista_datas]
+                    inserir_em_lote(cur, "voluntario_indisponibilidade_datas", ("id_voluntario", "data_indisponivel"), dados_para_inserir)
+            conn.commit()
+            indice_elegibilidade.invalidar()
+            return True
+        except Exception as e:
+            conn.rollback()
+            logger.exception("Erro ao atualizar indisponibilidades")
+            return False
 
 
 def get_indisponibilidade_datas(id_voluntario, ano, mes):
     """ Busca as datas específicas em que um voluntário está indisponível em um mês. """
-    conn = ensure_connection()
-    if conn is None: return []
-    query = "SELECT data_indisponivel FROM voluntario_indisponibilidade_datas WHERE id_voluntario = %s AND EXTRACT(YEAR FROM data_indisponivel) = %s AND EXTRACT(MONTH FROM data_indisponivel) = %s"
-    df = pd.read_sql(query, conn, params=(id_voluntario, ano, mes))
-    return [d.date() for d in pd.to_datetime(df['data_indisponivel'])]
+    with get_connection() as conn:
+        if conn is None: return []
+        query = "SELECT data_indisponivel FROM voluntario_indisponibilidade_datas WHERE id_voluntario = %s AND data_indisponivel >= %s AND data_indisponivel < %s"
+        df = pd.read_sql(query, conn, params=(id_voluntario, *intervalo_do_mes(ano, mes)))
+        return [d.date() for d in pd.to_datetime(df['data_indisponivel'])]
 
 def update_indisponibilidade_datas(id_voluntario, ano, mes, datas_indisponiveis):
     """ Atualiza a lista de datas de indisponibilidade para um voluntário em um mês. """
-    conn = ensure_connection()
-    if conn is None: return
-    try:
-        with conn.cursor() as cur:
-            # 1. Limpa as indisponibilidades antigas apenas para o mês em questão
-            cur.execute("DELETE FROM voluntario_indisponibilidade_datas WHERE id_voluntario = %s AND EXTRACT(YEAR FROM data_indisponivel) = %s AND EXTRACT(MONTH FROM data_indisponivel) = %s", (id_voluntario, ano, mes))
-            # 2. Insere as novas datas
-            if datas_indisponiveis:
-                args = [(id_voluntario, data) for data in datas_indisponiveis]
-                cur.executemany("INSERT INTO voluntario_indisponibilidade_data (id_voluntario, data_indisponivel) VALUES (%s, %s)", args)
-        conn.commit()
-    except Exception as e:
-        conn.rollback(); print(f"Erro ao atualizar indisponibilidade: {e}")
+    with get_connection() as conn:
+        if conn is None: return
+        try:
+            with conn.cursor() as cur:
+                # 1. Limpa as indisponibilidades antigas apenas para o mês em questão
+                cur.execute("DELETE FROM voluntario_indisponibilidade_datas WHERE id_voluntario = %s AND data_indisponivel >= %s AND data_indisponivel < %s", (id_voluntario, *intervalo_do_mes(ano, mes)))
+                # 2. Insere as novas datas
+                if datas_indisponiveis:
+                    args = [(id_voluntario, data) for data in datas_indisponiveis]
+                    inserir_em_lote(cur, "voluntario_indisponibilidade_datas", ("id_voluntario", "data_indisponivel"), args)
+            conn.commit()
+            indice_elegibilidade.invalidar()
+        except Exception as e:
+            conn.rollback(); logger.exception("Erro ao atualizar indisponibilidade")
+
+def travar_escala_do_mes(cur, ano, mes, id_ministerio):
+    """
+    Advisory lock (de transação) da escala de um mês de um ministério: quem vai apagar e
+    regravar o mês pega este lock antes, então duas escritas do mesmo mês, mesmo vindas de
+    workers diferentes, nunca se intercalam. É liberado no commit/rollback.
+    """
+    cur.execute("SELECT pg_advisory_xact_lock(hashtextextended(%s, 0))", (f"escala:{id_ministerio}:{ano}:{mes}",))
+
+
+# --- VERSÕES DA ESCALA (rascunho / publicação) ---
+# As linhas da tabela 'escala' pertencem a uma versão (escala_versoes). Uma geração grava
+# tudo em uma versão nova, que ninguém lê enquanto é rascunho; publicar é trocar o ponteiro
+# do mês em 'escala_publicada', uma transação curta. As leituras usam a view 'escala_vigente'
+# (só as linhas das versões publicadas), então nunca veem um mês vazio ou pela metade.
+# A versão anterior fica guardada: reverter_escala_do_mes volta para ela na hora.
+
+def criar_versao_escala(cur, ano, mes, id_ministerio, origem):
+    """Cria uma versão (rascunho) vazia do mês e retorna o id_versao."""
+    cur.execute(
+        "INSERT INTO escala_versoes (id_ministerio, ano, mes, origem) VALUES (%s, %s, %s, %s) RETURNING id_versao",
+        (id_ministerio, ano, mes, origem)
+    )
+    return cur.fetchone()[0]
+
+
+def publicar_versao_escala(cur, ano, mes, id_ministerio, id_versao):
+    """
+    Aponta o mês para 'id_versao' (a publicada até aqui vira a anterior) e descarta as versões
+    que não são nem uma nem outra. Chamar com o lock do mês (travar_escala_do_mes).
+    """
+    cur.execute("""
+        INSERT INTO escala_publicada (id_ministerio, ano, mes, id_versao)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (id_ministerio, ano, mes) DO UPDATE
+        SET id_versao = EXCLUDED.id_versao, id_versao_anterior = escala_publicada.id_versao, atualizado_em = now()
+    """, (id_ministerio, ano, mes, id_versao))
+    cur.execute("UPDATE escala_versoes SET publicada_em = now() WHERE id_versao = %s", (id_versao,))
+    # No diário, a troca de versão é uma alteração do mês inteiro (quem acompanha recarrega).
+    cur.execute("""
+        INSERT INTO escala_alteracoes (id_ministerio, ano, mes, id_versao, origem)
+        SELECT %s, %s, %s, id_versao, origem FROM escala_versoes WHERE id_versao = %s
+    """, (id_ministerio, ano, mes, id_versao))
+    # Rascunhos recentes podem ser de uma geração ainda gravando; só os velhos são descartados.
+    cur.execute("""
+        DELETE FROM escala_versoes v
+        USING escala_publicada p
+        WHERE p.id_ministerio = %s AND p.ano = %s AND p.mes = %s
+          AND v.id_ministerio = p.id_ministerio AND v.ano = p.ano AND v.mes = p.mes
+          AND v.id_versao <> p.id_versao AND v.id_versao IS DISTINCT FROM p.id_versao_anterior
+          AND (v.publicada_em IS NOT NULL OR v.criado_em < now() - interval '1 hour')
+    """, (id_ministerio, ano, mes))
+
+
+def versao_publicada(cur, ano, mes, id_ministerio):
+    """
+    id_versao publicado do mês; se o mês ainda não tem escala, cria e publica uma versão vazia
+    (origem 'vazia', para a linha dela no diário não passar por edição de vaga).
+    """
+    cur.execute("SELECT id_versao FROM escala_publicada WHERE id_ministerio = %s AND ano = %s AND mes = %s",
+                (id_ministerio, ano, mes))
+    row = cur.fetchone()
+    if row:
+        return row[0]
+    id_versao = criar_versao_escala(cur, ano, mes, id_ministerio, "vazia")
+    publicar_versao_escala(cur, ano, mes, id_ministerio, id_versao)
+    return id_versao
+
+
+# --- DIÁRIO DE ALTERAÇÕES (escala_alteracoes) ---
+# Toda escrita na escala do mês acrescenta linhas ao diário, dentro da mesma transação e com
+# o lock do mês: edições de vaga ganham uma linha com o ocupante anterior e o novo, trocas de
+# versão (geração, limpeza, reversão, reparo, eventos recriados) uma linha sem vaga. Como as
+# escritas do mês são serializadas pelo lock, os id_alteracao do mês ficam visíveis em ordem
+# e o maior deles serve de cursor para o cliente (alteracoes_desde). Desfazer/refazer andam
+# pelas linhas 'edicao' da versão publicada.
+
+def registrar_alteracao(cur, ano, mes, id_ministerio, id_versao, origem, vaga=None, anterior=(None, False), nova=(None, False)):
+    """Acrescenta uma linha ao diário do mês; 'vaga' = (id_evento, id_funcao, funcao_instancia), None = mês inteiro."""
+    id_evento, id_funcao, instancia = vaga or (None, None, None)
+    cur.execute("""
+        INSERT INTO escala_alteracoes (id_ministerio, ano, mes, id_versao, origem, id_evento, id_funcao, funcao_instancia,
+                                       id_voluntario_anterior, fixada_anterior, id_voluntario_novo, fixada_nova)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        RETURNING id_alteracao
+    """, (id_ministerio, ano, mes, id_versao, origem, id_evento, id_funcao, instancia, *anterior, *nova))
+    return cur.fetchone()[0]
+
+
+def ocupante_da_vaga(cur, id_versao, id_evento, id_funcao, instancia):
+    """(id_voluntario, fixada) da vaga na versão; (None, False) se está vazia."""
+    cur.execute(
+        "SELECT id_voluntario, fixada FROM escala WHERE id_versao = %s AND id_evento = %s AND id_funcao = %s AND funcao_instancia = %s",
+        (id_versao, id_evento, id_funcao, instancia)
+    )
+    row = cur.fetchone()
+    return (row[0], bool(row[1])) if row and row[0] is not None else (None, False)
+
+
+# Upsert de vagas; conta com o índice único uq_escala_versao_vaga (migração 7).
+_UPSERT_VAGA = "ON CONFLICT (id_versao, id_evento, id_funcao, funcao_instancia) DO UPDATE SET id_voluntario = EXCLUDED.id_voluntario, fixada = EXCLUDED.fixada"
+
+
+def gravar_vaga(cur, id_versao, id_evento, id_funcao, instancia, id_voluntario, fixada=False):
+    """Troca o ocupante da vaga na versão (id_voluntario None = vaga vazia)."""
+    if id_voluntario is None:
+        cur.execute(
+            "DELETE FROM escala WHERE id_versao = %s AND id_evento = %s AND id_funcao = %s AND funcao_instancia = %s",
+            (id_versao, id_evento, id_funcao, instancia)
+        )
+    else:
+        cur.execute(
+            "INSERT INTO escala (id_versao, id_evento, id_funcao, id_voluntario, funcao_instancia, fixada) VALUES (%s, %s, %s, %s, %s, %s) "
+            + _UPSERT_VAGA,
+            (id_versao, id_evento, id_funcao, id_voluntario, instancia, fixada)
+        )
+
+
+def ler_escala_publicada(cur, ano, mes, id_ministerio):
+    """(id_versao, [(EscalaEntry, fixada)]) da versão publicada do mês; id_versao é None se o mês não tem escala."""
+    cur.execute("SELECT id_versao FROM escala_publicada WHERE id_ministerio = %s AND ano = %s AND mes = %s",
+                (id_ministerio, ano, mes))
+    row = cur.fetchone()
+    if row is None:
+        return None, []
+    cur.execute("""
+        SELECT id_evento, id_funcao, id_voluntario, funcao_instancia, fixada
+        FROM escala WHERE id_versao = %s AND id_voluntario IS NOT NULL
+    """, (row[0],))
+    return row[0], [(EscalaEntry(id_evento, id_funcao, id_voluntario, instancia), fixada)
+                    for id_evento, id_funcao, id_voluntario, instancia, fixada in cur.fetchall()]
+
+
+def carregar_escala_publicada(ano, mes, id_ministerio, com_versao=False):
+    """
+    Alocações da versão publicada do mês como [(EscalaEntry, fixada)]; None em caso de erro.
+    Com 'com_versao', retorna (id_versao, alocações), para conferir depois se o mês mudou.
+    """
+    with get_connection() as conn:
+        if conn is None: return None
+        try:
+            with conn.cursor() as cur:
+                id_versao, existentes = ler_escala_publicada(cur, ano, mes, id_ministerio)
+            conn.commit()
+            return (id_versao, existentes) if com_versao else existentes
+        except Exception as e:
+            conn.rollback()
+            logger.exception("Erro ao carregar a escala publicada de %s/%s", mes, ano)
+            return None
+
 
 def apagar_escala_do_mes(ano, mes, id_ministerio):
-    """ Apaga a escala de um mês para um ministério específico. """
-    conn = ensure_connection()
-    if conn is None: return
-    try:
-        with conn.cursor() as cur:
-            # Query atualizada para deletar a escala APENAS de eventos
-            # que pertencem a serviços do ministério correto, usando um JOIN.
-            delete_query = """
-                DELETE FROM escala 
-                WHERE id_evento IN (
-                    SELECT e.id_evento FROM eventos e
-                    JOIN servicos_fixos sf ON e.id_servico_fixo = sf.id_servico
-                    WHERE EXTRACT(YEAR FROM e.data_evento) = %s 
-                      AND EXTRACT(MONTH FROM e.data_evento) = %s
-                      AND sf.id_ministerio = %s
-                )
-            """
-            cur.execute(delete_query, (ano, mes, id_ministerio))
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        print(f"Erro ao limpar escala antiga: {e}")
+    """ Apaga a escala de um mês para um ministério específico (publica uma versão vazia; dá para reverter). """
+    with get_connection() as conn:
+        if conn is None: return
+        try:
+            with conn.cursor() as cur:
+                travar_escala_do_mes(cur, ano, mes, id_ministerio)
+                id_versao = criar_versao_escala(cur, ano, mes, id_ministerio, "limpeza")
+                publicar_versao_escala(cur, ano, mes, id_ministerio, id_versao)
+            conn.commit()
+            cache_escala.invalidar_mes(id_ministerio, ano, mes)
+        except Exception as e:
+            conn.rollback()
+            logger.exception("Erro ao limpar escala antiga")
+
+
+def reverter_escala_do_mes(ano, mes, id_ministerio):
+    """
+    Volta o mês para a versão publicada anterior (e a atual passa a ser a anterior, então
+    chamar de novo desfaz a reversão). Retorna o id_versao agora publicado, ou None se não há
+    versão anterior.
+    """
+    with get_connection() as conn:
+        if conn is None: return None
+        try:
+            with conn.cursor() as cur:
+                travar_escala_do_mes(cur, ano, mes, id_ministerio)
+                cur.execute("""
+                    UPDATE escala_publicada
+                    SET id_versao = id_versao_anterior, id_versao_anterior = id_versao, atualizado_em = now()
+                    WHERE id_ministerio = %s AND ano = %s AND mes = %s AND id_versao_anterior IS NOT NULL
+                    RETURNING id_versao
+                """, (id_ministerio, ano, mes))
+                row = cur.fetchone()
+                if row:
+                    registrar_alteracao(cur, ano, mes, id_ministerio, row[0], "reversao")
+            conn.commit()
+            cache_escala.invalidar_mes(id_ministerio, ano, mes)
+            return row[0] if row else None
+        except Exception as e:
+            conn.rollback()
+            logger.exception("Erro ao reverter a escala de %s/%s", mes, ano)
+            return None
 
 
 def alocar_grupos(vagas_df, voluntarios_df, vinculos, contagem_escalas_mes, escalados_por_data):
@@ -888,108 +1009,167 @@ def alocar_grupos(vagas_df, voluntarios_df, vinculos, contagem_escalas_mes, esca
 
 
 def create_events_for_month(ano, mes, id_ministerio):
-    conn = ensure_connection()
-    if conn is None: return False
     # Filtra os serviços fixos pelo ministério antes de criar os eventos
+    # (antes do checkout, para não segurar duas conexões do pool ao mesmo tempo)
     servicos_fixos = view_all_servicos_fixos(id_ministerio)
     if servicos_fixos.empty:
-        print("Nenhum serviço fixo cadastrado para este ministério."); return False
-    try:
-        with conn.cursor() as cur:
-            # Apaga apenas eventos do ministério em questão
-            cur.execute("""
-                DELETE FROM eventos WHERE EXTRACT(YEAR FROM data_evento) = %s 
-                AND EXTRACT(MONTH FROM data_evento) = %s 
-                AND id_servico_fixo IN (SELECT id_servico FROM servicos_fixos WHERE id_ministerio = %s)
-            """, (ano, mes, id_ministerio))
+        logger.warning("Nenhum serviço fixo cadastrado para este ministério."); return False
+    with get_connection() as conn:
+        if conn is None: return False
+        try:
+            with conn.cursor() as cur:
+                travar_escala_do_mes(cur, ano, mes, id_ministerio)
+                # Apaga apenas eventos do ministério em questão
+                cur.execute("""
+                    DELETE FROM eventos WHERE data_evento >= %s AND data_evento < %s
+                    AND id_servico_fixo IN (SELECT id_servico FROM servicos_fixos WHERE id_ministerio = %s)
+                """, (*intervalo_do_mes(ano, mes), id_ministerio))
             
-            _, num_dias = calendar.monthrange(ano, mes)
-            for dia in range(1, num_dias + 1):
-                data_atual = datetime(ano, mes, dia).date()
-                dia_da_semana_ajustado = (data_atual.weekday() + 1) % 7
-                for _, servico in servicos_fixos.iterrows():
-                    if servico['dia_da_semana'] == dia_da_semana_ajustado:
-                        cur.execute("INSERT INTO eventos (id_servico_fixo, data_evento) VALUES (%s, %s)", (int(servico['id_servico']), data_atual))
-            conn.commit()
-        return True
-    except Exception as e:
-        conn.rollback(); print(f"Erro ao criar eventos: {e}"); return False
+                servicos_por_dia = defaultdict(list)
+                for id_servico, dia_da_semana in zip(servicos_fixos['id_servico'], servicos_fixos['dia_da_semana']):
+                    servicos_por_dia[int(dia_da_semana)].append(int(id_servico))
+
+                novos_eventos = []
+                _, num_dias = calendar.monthrange(ano, mes)
+                for dia in range(1, num_dias + 1):
+                    data_atual = datetime(ano, mes, dia).date()
+                    dia_da_semana_ajustado = (data_atual.weekday() + 1) % 7
+                    for id_servico in servicos_por_dia.get(dia_da_semana_ajustado, []):
+                        novos_eventos.append((id_servico, data_atual))
+
+                # Todos os eventos do mês em um único INSERT
+                inserir_em_lote(cur, "eventos", ("id_servico_fixo", "data_evento"), novos_eventos)
+                # Eventos recriados têm ids novos: para quem acompanha o diário, o mês inteiro mudou.
+                cur.execute("SELECT id_versao FROM escala_publicada WHERE id_ministerio = %s AND ano = %s AND mes = %s",
+                            (id_ministerio, ano, mes))
+                row = cur.fetchone()
+                registrar_alteracao(cur, ano, mes, id_ministerio, row[0] if row else None, "eventos")
+                conn.commit()
+            cache_escala.invalidar_mes(id_ministerio, ano, mes)
+            return True
+        except Exception as e:
+            conn.rollback(); logger.exception("Erro ao criar eventos"); return False
 
 
 
 
 # =========================================================================
-# Nova Função de Carregamento de Dados
-# Substitua sua antiga get_all_voluntarios_com_detalhes por esta
+# Carregamento dos dados da geração: uma consulta, um ministério, um mês
 # =========================================================================
+_QUERY_SNAPSHOT_ESCALA = """
+    WITH eventos_mes AS (
+        SELECT e.id_evento, e.id_servico_fixo, e.data_evento
+        FROM eventos e
+        JOIN servicos_fixos sf ON sf.id_servico = e.id_servico_fixo
+        WHERE sf.id_ministerio = %(id_ministerio)s
+          AND e.data_evento >= %(inicio)s AND e.data_evento < %(fim)s
+    ),
+    vols AS (
+        SELECT id_voluntario, nome_voluntario, limite_escalas_mes, nivel_experiencia, id_grupo
+        FROM voluntarios
+        WHERE ativo = TRUE AND id_ministerio = %(id_ministerio)s
+    )
+    SELECT json_build_object(
+        'voluntarios', (
+            SELECT COALESCE(json_agg(json_build_object(
+                'id_voluntario', v.id_voluntario,
+                'nome_voluntario', v.nome_voluntario,
+                'limite_escalas_mes', v.limite_escalas_mes,
+                'nivel_experiencia', v.nivel_experiencia,
+                'id_grupo', v.id_grupo,
+                'funcoes', ARRAY(SELECT vf.id_funcao FROM voluntario_funcoes vf
+                                 WHERE vf.id_voluntario = v.id_voluntario),
+                'disponibilidade', ARRAY(SELECT vd.id_servico FROM voluntario_disponibilidade vd
+                                         WHERE vd.id_voluntario = v.id_voluntario),
+                'indisponibilidades', ARRAY(SELECT vi.id_evento
+                                            FROM voluntario_indisponibilidade_eventos vi
+                                            JOIN eventos_mes em ON em.id_evento = vi.id_evento
+                                            WHERE vi.id_voluntario = v.id_voluntario)
+            ) ORDER BY v.id_voluntario), '[]'::json)
+            FROM vols v
+        ),
+        'grupos', (
+            SELECT COALESCE(json_agg(json_build_object(
+                'id_grupo', g.id_grupo,
+                'limite_escalas_grupo', g.limite_escalas_grupo,
+                'membros', ARRAY(SELECT v.id_voluntario FROM vols v
+                                 WHERE v.id_grupo = g.id_grupo ORDER BY v.id_voluntario)
+            ) ORDER BY g.id_grupo), '[]'::json)
+            FROM grupos_vinculados g
+            WHERE g.id_ministerio = %(id_ministerio)s
+        ),
+        'funcoes', (
+            SELECT COALESCE(json_agg(json_build_object(
+                'id_funcao', f.id_funcao,
+                'nome_funcao', f.nome_funcao,
+                'tipo_funcao', f.tipo_funcao,
+                'prioridade_alocacao', f.prioridade_alocacao
+            ) ORDER BY f.nome_funcao), '[]'::json)
+            FROM funcoes f
+            WHERE f.id_ministerio = %(id_ministerio)s
+        ),
+        'servicos', (
+            SELECT COALESCE(json_agg(json_build_object(
+                'id_servico', sf.id_servico,
+                'nome_servico', sf.nome_servico,
+                'dia_da_semana', sf.dia_da_semana,
+                'ativo', sf.ativo
+            ) ORDER BY sf.id_servico), '[]'::json)
+            FROM servicos_fixos sf
+            WHERE sf.id_ministerio = %(id_ministerio)s
+        ),
+        'cotas', (
+            SELECT COALESCE(json_agg(json_build_object(
+                'id_servico', c.id_servico,
+                'id_funcao', c.id_funcao,
+                'quantidade_necessaria', c.quantidade_necessaria
+            ) ORDER BY c.id_servico, c.id_funcao), '[]'::json)
+            FROM servico_funcao_cotas c
+            JOIN servicos_fixos sf ON sf.id_servico = c.id_servico
+            WHERE sf.id_ministerio = %(id_ministerio)s
+        ),
+        'eventos', (
+            SELECT COALESCE(json_agg(json_build_object(
+                'id_evento', em.id_evento,
+                'id_servico_fixo', em.id_servico_fixo,
+                'data_evento', em.data_evento
+            ) ORDER BY em.data_evento, em.id_evento), '[]'::json)
+            FROM eventos_mes em
+        )
+    )
+"""
+
+def carregar_snapshot_escala(id_ministerio, ano, mes):
+    """
+    Carrega, em UMA ida ao banco, tudo o que a geração precisa para um ministério em um mês:
+    voluntários ativos (com funções, disponibilidade e indisponibilidades do mês), grupos,
+    funções, serviços, cotas e eventos. Todas as tabelas são filtradas pelo ministério.
+    Retorna um SnapshotEscala imutável, ou None em caso de erro.
+    """
+    inicio, fim = intervalo_do_mes(ano, mes)
+    with get_connection() as conn:
+        if conn is None: return None
+        try:
+            with conn.cursor() as cur:
+                cur.execute(_QUERY_SNAPSHOT_ESCALA, {"id_ministerio": id_ministerio, "inicio": inicio, "fim": fim})
+                dados = cur.fetchone()[0]
+            conn.rollback()
+            return SnapshotEscala.from_json(id_ministerio, ano, mes, dados)
+        except Exception as e:
+            conn.rollback()
+            logger.exception("Erro CRÍTICO ao carregar dados")
+            return None
+
+
 def carregar_dados_para_escala(id_ministerio, ano, mes):
     """
     Carrega todos os dados necessários do banco e os transforma em objetos Python,
     incluindo disponibilidades e indisponibilidades.
+    Mantida por compatibilidade: agora é só o snapshot convertido no estado mutável.
     """
-    conn = ensure_connection()
-    if conn is None: return {}, {}
-
-    try:
-        query_vols = "SELECT * FROM voluntarios WHERE ativo = TRUE AND id_ministerio = %s"
-        voluntarios_raw = pd.read_sql(query_vols, conn, params=(id_ministerio,))
-        
-        query_funcoes = "SELECT id_voluntario, id_funcao FROM voluntario_funcoes"
-        funcoes_map_df = pd.read_sql(query_funcoes, conn)
-        funcoes_map = funcoes_map_df.groupby('id_voluntario')['id_funcao'].apply(set).to_dict()
-
-        query_disp = "SELECT id_voluntario, id_servico FROM voluntario_disponibilidade"
-        disp_map_df = pd.read_sql(query_disp, conn)
-        disp_map = disp_map_df.groupby('id_voluntario')['id_servico'].apply(set).to_dict()
-
-        # Busca indisponibilidades de eventos para o mês específico
-        query_indisp = """
-            SELECT vi.id_voluntario, vi.id_evento
-            FROM voluntario_indisponibilidade_eventos vi
-            JOIN eventos e ON vi.id_evento = e.id_evento
-            WHERE vi.id_voluntario IS NOT NULL
-              AND EXTRACT(YEAR FROM e.data_evento) = %s 
-              AND EXTRACT(MONTH FROM e.data_evento) = %s
-        """
-        indisp_map_df = pd.read_sql(query_indisp, conn, params=(ano, mes))
-        indisp_map = indisp_map_df.groupby('id_voluntario')['id_evento'].apply(set).to_dict()
-
-        voluntarios_map = {}
-        for _, row in voluntarios_raw.iterrows():
-            vol_id = int(row['id_voluntario'])
-            voluntarios_map[vol_id] = Voluntario(
-                id_voluntario=vol_id,
-                nome_voluntario=str(row['nome_voluntario']),
-                limite_escalas_mes=int(row['limite_escalas_mes']),
-                nivel_experiencia=str(row['nivel_experiencia']),
-                id_grupo=int(row['id_grupo']) if pd.notna(row['id_grupo']) else None,
-                funcoes=funcoes_map.get(vol_id, set()),
-                disponibilidade=disp_map.get(vol_id, set()),
-                indisponibilidades=indisp_map.get(vol_id, set())
-            )
-
-        query_grupos = "SELECT * FROM grupos_vinculados WHERE id_ministerio = %s"
-        grupos_raw = pd.read_sql(query_grupos, conn, params=(id_ministerio,))
-        
-        grupos_map = {}
-        for _, row in grupos_raw.iterrows():
-            grupo_id = int(row['id_grupo'])
-            grupos_map[grupo_id] = Grupo(
-                id_grupo=grupo_id,
-                limite_escalas_grupo=int(row['limite_escalas_grupo'])
-            )
-        
-        for vol in voluntarios_map.values():
-            if vol.id_grupo and vol.id_grupo in grupos_map:
-                grupos_map[vol.id_grupo].membros.append(vol)
-
-        return voluntarios_map, grupos_map
-
-    except Exception as e:
-        print(f"ERRO CRÍTICO ao carregar dados: {e}")
-        return {}, {}
-    finally:
-        if conn: conn.close()
+    snapshot = carregar_snapshot_escala(id_ministerio, ano, mes)
+    if snapshot is None: return {}, {}
+    return criar_estado_inicial(snapshot)
 
 
 # Em database.py
@@ -998,12 +1178,16 @@ def get_escala_completa(ano, mes, id_ministerio):
     """
     VERSÃO DINÂMICA: Constrói a escala completa incluindo o TIPO e a PRIORIDADE de cada função,
     tornando a exportação para PDF mais inteligente.
+    Uma linha por vaga (evento x função x instância), já ordenada, com o voluntário da
+    escala publicada naquela instância ou vazia.
     """
-    conn = ensure_connection()
-    if conn is None: return pd.DataFrame()
+    with get_connection() as conn:
+        if conn is None: return pd.DataFrame()
 
-    try:
-        # A query agora busca também o tipo e a prioridade da função
+        # As vagas são expandidas no próprio banco: generate_series(1, quantidade_necessaria)
+        # dá as instâncias de cada cota, e a escala publicada entra pela vaga exata
+        # (evento, função, instância), pelo índice idx_escala_evento_funcao_instancia.
+        # A ordem é a da montagem antiga em pandas (data, serviço, prioridade, instância).
         query = """
             SELECT 
                 e.id_evento,
@@ -1013,67 +1197,27 @@ def get_escala_completa(ano, mes, id_ministerio):
                 f.nome_funcao,
                 f.tipo_funcao,
                 f.prioridade_alocacao,
-                sfc.quantidade_necessaria,
+                inst.funcao_instancia,
                 v.id_voluntario,
-                v.nome_voluntario
+                v.nome_voluntario,
+                COALESCE(esc.fixada, FALSE) AS fixada
             FROM servicos_fixos sf
             JOIN eventos e ON sf.id_servico = e.id_servico_fixo
             JOIN servico_funcao_cotas sfc ON sf.id_servico = sfc.id_servico
             JOIN funcoes f ON sfc.id_funcao = f.id_funcao
-            LEFT JOIN escala esc ON e.id_evento = esc.id_evento AND f.id_funcao = esc.id_funcao
+            CROSS JOIN LATERAL generate_series(1, sfc.quantidade_necessaria) AS inst(funcao_instancia)
+            LEFT JOIN escala_vigente esc
+                   ON esc.id_evento = e.id_evento
+                  AND esc.id_funcao = f.id_funcao
+                  AND esc.funcao_instancia = inst.funcao_instancia
             LEFT JOIN voluntarios v ON esc.id_voluntario = v.id_voluntario
             WHERE sf.id_ministerio = %(id_ministerio)s
-              AND EXTRACT(YEAR FROM e.data_evento) = %(ano)s
-              AND EXTRACT(MONTH FROM e.data_evento) = %(mes)s
-            ORDER BY e.data_evento, sf.nome_servico, f.prioridade_alocacao, f.nome_funcao;
+              AND e.data_evento >= %(inicio)s AND e.data_evento < %(fim)s
+            ORDER BY e.data_evento, sf.nome_servico, f.prioridade_alocacao, inst.funcao_instancia, e.id_evento, f.id_funcao;
         """
-        
-        # Esta query mais complexa já constrói a base da escala, incluindo vagas vazias
-        # A lógica de preenchimento de instância precisa ser feita em Python
-        df_base = pd.read_sql(query, conn, params={'id_ministerio': id_ministerio, 'ano': ano, 'mes': mes})
+        inicio, fim = intervalo_do_mes(ano, mes)
+        return pd.read_sql(query, conn, params={'id_ministerio': id_ministerio, 'inicio': inicio, 'fim': fim})
 
-        if df_base.empty:
-            return pd.DataFrame()
-
-        escala_final = []
-        # Agrupa por evento e função para expandir as cotas
-        for group_keys, group_df in df_base.groupby(['id_evento', 'id_funcao']):
-            id_evento, id_funcao = group_keys
-            
-            primeira_linha = group_df.iloc[0]
-            quantidade = primeira_linha['quantidade_necessaria']
-            
-            voluntarios_alocados = group_df.dropna(subset=['id_voluntario'])
-            
-            for i in range(1, quantidade + 1):
-                vaga = {
-                    "id_evento": int(id_evento),
-                    "data_evento": primeira_linha['data_evento'],
-                    "nome_servico": primeira_linha['nome_servico'],
-                    "id_funcao": int(id_funcao),
-                    "nome_funcao": primeira_linha['nome_funcao'],
-                    "tipo_funcao": primeira_linha['tipo_funcao'],
-                    "prioridade_alocacao": primeira_linha['prioridade_alocacao'],
-                    "funcao_instancia": i,
-                    "id_voluntario": None,
-                    "nome_voluntario": None
-                }
-                
-                if i <= len(voluntarios_alocados):
-                    voluntario = voluntarios_alocados.iloc[i-1]
-                    vaga['id_voluntario'] = int(voluntario['id_voluntario'])
-                    vaga['nome_voluntario'] = voluntario['nome_voluntario']
-                
-                escala_final.append(vaga)
-        
-        if not escala_final: return pd.DataFrame()
-        
-        df_final = pd.DataFrame(escala_final)
-        df_final = df_final.sort_values(by=['data_evento', 'nome_servico', 'prioridade_alocacao', 'funcao_instancia'])
-        return df_final
-
-    finally:
-        if conn: conn.close()
 
 
 # def get_escala_completa(ano, mes, id_ministerio):
@@ -1144,160 +1288,136 @@ def get_escala_completa(ano, mes, id_ministerio):
 
 
 
-def gerar_escala_automatica(ano, mes, id_ministerio):
-    print(f"\n--- INICIANDO GERAÇÃO DA ESCALA PARA {mes}/{ano} [BALANCEAMENTO POR EVENTO] ---")
+def calcular_escala(snapshot, existentes, motor="greedy", tempo_limite=None, tentativas=1, busca_local=True, progresso=None,
+                    modo="completo", rng=random):
+    """
+    A parte da geração que roda em memória: decide o que fica da escala 'existentes' (lista de
+    (EscalaEntry, fixada)) conforme o modo e chama o motor. Não grava nada.
+    Retorna (escala_final, motor_usado, resumo); o resumo traz as contagens, o teto de vagas
+    preenchíveis calculado antes do motor e os motivos das vagas que ficaram abertas
+    (diagnostico.py).
+    """
+    incremental = modo == "incremental"
+    mantidas, invalidadas = separar_escala_existente(snapshot, existentes if incremental else [(e, f) for e, f in existentes if f])
+    if progresso: progresso("viabilidade")
+    viabilidade = limite_superior(snapshot, mantidas)
+    escala_final, vagas_abertas, motor_usado = gerar_com_motor(snapshot, motor, tempo_limite, rng=rng, tentativas=tentativas,
+                                                               busca_local=busca_local, progresso=progresso,
+                                                               escala_fixa=mantidas, incremental=incremental)
+    resumo = {"vagas_abertas": len(vagas_abertas), "mantidas": len(mantidas), "invalidadas": len(invalidadas),
+              "viabilidade": viabilidade, "diagnostico": motivos_das_vagas(snapshot, escala_final)}
+    return escala_final, motor_usado, resumo
+
+
+def gerar_escala_automatica(ano, mes, id_ministerio, motor="greedy", tempo_limite=None, tentativas=1, busca_local=True, progresso=None,
+                            modo="completo"):
+    """
+    Gera e grava a escala do mês. 'progresso' (opcional) é o callback progresso(fase, **contadores)
+    dos jobs (jobs_escala.py); as fases são carga, as do motor (motor_escala.py) e gravacao.
+    As vagas fixadas da escala publicada ficam sempre; com modo="incremental", também tudo o
+    que continua válido, e só as vagas vazias ou invalidadas são preenchidas de novo.
+    """
+    logger.info("Gerando a escala de %s/%s.", mes, ano)
 
     # --- 1. SETUP E CARGA DE DADOS ---
-    apagar_escala_do_mes(ano, mes, id_ministerio)
-    eventos = get_events_for_month(ano, mes, id_ministerio)
-    if eventos.empty: return {"status": "info", "message": "Não há eventos criados para este mês."}
-    voluntarios_map, grupos_map = carregar_dados_para_escala(id_ministerio, ano, mes)
-    if not voluntarios_map: return {"status": "error", "message": "Nenhum voluntário ativo encontrado."}
-    funcoes_df = view_all_funcoes(id_ministerio)
-    funcoes_map = funcoes_df.set_index('id_funcao')['nome_funcao'].to_dict()
-    servicos_map = view_all_servicos_fixos(id_ministerio).set_index('id_servico')['nome_servico'].to_dict()
-    cotas = get_cotas_all_servicos()
-    try:
-        id_apoio = funcoes_df[funcoes_df['tipo_funcao'] == 'APOIO']['id_funcao'].iloc[0]
-        funcoes_principais = funcoes_df[funcoes_df['tipo_funcao'] == 'PRINCIPAL'].sort_values('prioridade_alocacao')
-    except IndexError: return {"status": "error", "message": "Funções essenciais como 'APOIO' ou do tipo 'PRINCIPAL' não encontradas."}
-    
-    vagas_abertas = {}
-    eventos['data_evento_obj'] = pd.to_datetime(eventos['data_evento']).dt.date
-    for _, ev in eventos.iterrows():
-        ev_cotas = cotas[cotas['id_servico'] == ev['id_servico_fixo']]
-        for _, cota in ev_cotas.iterrows():
-            id_funcao_cota = int(cota['id_funcao'])
-            if id_funcao_cota in funcoes_map:
-                for i in range(1, int(cota['quantidade_necessaria']) + 1):
-                    vaga_key = f"ev{ev['id_evento']}-func{id_funcao_cota}-inst{i}"
-                    vagas_abertas[vaga_key] = Vaga(id_evento=int(ev['id_evento']), id_servico_fixo=int(ev['id_servico_fixo']), data_evento_obj=ev['data_evento_obj'], id_funcao=id_funcao_cota, funcao_instancia=i, key=vaga_key)
-
-    escala_final = []
-    # MUDANÇA 1: O contador agora é por evento, não por dia.
-    staff_por_evento = defaultdict(int)
-
-    # --- FUNÇÕES INTERNAS ---
-    def get_motivo_rejeicao(voluntario, vaga):
-        if vaga.data_evento_obj in voluntario.dias_escalado: return f"já está escalado neste dia."
-        if vaga.id_funcao not in voluntario.funcoes: return f"não possui a função '{funcoes_map.get(vaga.id_funcao)}' em seu perfil."
-        if vaga.id_servico_fixo not in voluntario.disponibilidade: return f"não tem disponibilidade para o serviço '{servicos_map.get(vaga.id_servico_fixo)}'."
-        if vaga.id_evento in voluntario.indisponibilidades: return f"declarou indisponibilidade específica para esta data."
-        if voluntario.escalas_neste_mes >= voluntario.limite_escalas_mes: return f"já atingiu seu limite de {voluntario.limite_escalas_mes} escalas/mês."
-        return None
-
-    def voluntario_pode_servir(voluntario, vaga):
-        return get_motivo_rejeicao(voluntario, vaga) is None
-
-    def alocar(voluntario, vaga):
-        nonlocal escala_final, vagas_abertas
-        escala_final.append(EscalaEntry(vaga.id_evento, vaga.id_funcao, voluntario.id_voluntario, vaga.funcao_instancia))
-        voluntario.escalas_neste_mes += 1
-        voluntario.dias_escalado.add(vaga.data_evento_obj)
-        # MUDANÇA 2: Incrementa o contador do evento específico.
-        staff_por_evento[vaga.id_evento] += 1
-        if vaga.key in vagas_abertas: del vagas_abertas[vaga.key]
-        print(f"ALOCADO: '{voluntario.nome_voluntario}' na função '{funcoes_map.get(vaga.id_funcao)}' no dia {vaga.data_evento_obj}")
-
-    # --- FASE 1: GRUPOS ---
-    print("--- FASE 1: Alocando Grupos ---")
-    grupos_para_alocar = list(grupos_map.values())
-    random.shuffle(grupos_para_alocar)
-
-    for grupo in grupos_para_alocar:
-        if grupo.escalas_neste_mes >= grupo.limite_escalas_grupo: continue
-        
-        lista_de_eventos = eventos.to_dict('records')
-        # MUDANÇA 3: A ordenação agora é pela lotação de cada evento.
-        lista_de_eventos.sort(key=lambda ev: staff_por_evento[ev['id_evento']])
-        
-        grupo_foi_alocado = False
-
-        for evento in lista_de_eventos:
-            id_do_evento_atual = evento['id_evento']
-            data_do_evento_atual = evento['data_evento_obj']
-            
-            membros = grupo.membros
-            if not membros: continue
-            nome_primeiro_membro = membros[0].nome_voluntario
-            
-            if any(data_do_evento_atual in m.dias_escalado for m in membros): continue
-            if not all(m.escalas_neste_mes < m.limite_escalas_mes for m in membros): continue
-
-            vagas_no_evento = [v for v in vagas_abertas.values() if v.id_evento == id_do_evento_atual]
-            
-            potenciais_alocacoes = []
-            vagas_ja_usadas_neste_teste = set()
-            motivo_falha = None
-            
-            for membro in membros:
-                encontrou_vaga_para_membro = False
-                for vaga in vagas_no_evento:
-                    if vaga.key in vagas_ja_usadas_neste_teste: continue
-                    if vaga.id_funcao in membro.funcoes and voluntario_pode_servir(membro, vaga):
-                        potenciais_alocacoes.append({'membro': membro, 'vaga': vaga})
-                        vagas_ja_usadas_neste_teste.add(vaga.key)
-                        encontrou_vaga_para_membro = True
-                        break
-                if not encontrou_vaga_para_membro:
-                    motivo_falha = f"não foi possível encontrar uma vaga compatível para '{membro.nome_voluntario}'."
-                    vaga_teste = Vaga(id_evento=id_do_evento_atual, id_servico_fixo=evento['id_servico_fixo'], data_evento_obj=data_do_evento_atual, id_funcao=list(membro.funcoes)[0] if membro.funcoes else 0, funcao_instancia=0, key='')
-                    detalhe_rejeicao = get_motivo_rejeicao(membro, vaga_teste)
-                    if detalhe_rejeicao: motivo_falha += f" Causa provável: {detalhe_rejeicao}"
-                    break
-
-            if motivo_falha is None:
-                for alocacao in potenciais_alocacoes: alocar(alocacao['membro'], alocacao['vaga'])
-                grupo.escalas_neste_mes += 1
-                grupo_foi_alocado = True
-                break
-            else:
-                print(f"DEBUG: Grupo de '{nome_primeiro_membro}' falhou no evento de {servicos_map.get(evento['id_servico_fixo'])} em {data_do_evento_atual}. Motivo: {motivo_falha}")
-
-    # --- FASE 2: INDIVIDUAIS ---
-    print("--- FASE 2: Alocando Individuais ---")
-    
-    def alocar_fase(candidatos, vagas_filtro):
-        random.shuffle(candidatos)
-        for voluntario in candidatos:
-            if voluntario.escalas_neste_mes >= voluntario.limite_escalas_mes: continue
-            vagas_possiveis = [v for v in vagas_abertas.values() if vagas_filtro(v) and voluntario_pode_servir(voluntario, v)]
-            if not vagas_possiveis: continue
-            # MUDANÇA 4: A ordenação aqui também passa a ser por evento.
-            vagas_possiveis.sort(key=lambda v: staff_por_evento[v.id_evento])
-            melhor_vaga = vagas_possiveis[0]
-            alocar(voluntario, melhor_vaga)
-
-    voluntarios_sem_grupo = [v for v in voluntarios_map.values() if v.id_grupo is None]
-    max_escalas = max((v.limite_escalas_mes for v in voluntarios_sem_grupo), default=0) if voluntarios_sem_grupo else 0
-
-    for i in range(max_escalas):
-        print(f"  - Rodada de alocação individual {i+1}/{max_escalas}")
-        for _, funcao in funcoes_principais.iterrows():
-            candidatos = [v for v in voluntarios_sem_grupo if funcao['id_funcao'] in v.funcoes]
-            alocar_fase(candidatos, lambda v: v.id_funcao == funcao['id_funcao'])
-        candidatos_apoio = [v for v in voluntarios_sem_grupo if id_apoio in v.funcoes]
-        alocar_fase(candidatos_apoio, lambda v: v.id_funcao == id_apoio)
+    if progresso: progresso("carga")
+    snapshot = carregar_snapshot_escala(id_ministerio, ano, mes)
+    if snapshot is None: return {"status": "error", "message": "Não foi possível carregar os dados do ministério."}
+    erro = validar_snapshot(snapshot)
+    if erro: return erro
+    # Cursor do diário antes da leitura: edições de vaga mudam a versão publicada sem trocar o id_versao.
+    cursor = alteracoes_desde(ano, mes, id_ministerio)
+    lida = carregar_escala_publicada(ano, mes, id_ministerio, com_versao=True)
+    if cursor is None or lida is None: return {"status": "error", "message": "Não foi possível carregar a escala atual do mês."}
+    id_versao_lida, existentes = lida
+    incremental = modo == "incremental"
+    fixadas = {(e.id_evento, e.id_funcao, e.funcao_instancia, e.id_voluntario) for e, f in existentes if f}
+
+    # --- 2. ALOCAÇÃO (motor_escala.py) ---
+    escala_final, motor_usado, resumo = calcular_escala(
+        snapshot, existentes, motor, tempo_limite, tentativas, busca_local, progresso, modo)
 
     # --- FINAL DA FUNÇÃO ---
-    if vagas_abertas: print(f"\nAVISO: {len(vagas_abertas)} vagas não puderam ser preenchidas e ficarão como 'VAGO'.")
-    print("\n--- GERAÇÃO DA ESCALA CONCLUÍDA ---\n")
-    if escala_final:
-        print(f"Total de {len(escala_final)} alocações.")
-        args = [(e.id_evento, e.id_funcao, e.id_voluntario, e.funcao_instancia) for e in escala_final]
-        conn = ensure_connection()
+    if resumo["vagas_abertas"]: logger.warning("%s vagas não puderam ser preenchidas e ficarão como 'VAGO'.", resumo['vagas_abertas'])
+    logger.info("Escala de %s/%s gerada: %s alocações.", mes, ano, len(escala_final))
+    if progresso: progresso("gravacao", alocacoes=len(escala_final))
+
+    # --- 3. GRAVAÇÃO (rascunho + publicação) ---
+    # As linhas vão para uma versão nova, invisível até a publicação; publicar é só trocar o
+    # ponteiro do mês, sob o lock do mês. Quem lê vê a escala antiga inteira até esse commit.
+    with get_connection() as conn:
+        if conn is None: return {"status": "error", "message": "Não foi possível conectar ao banco de dados para salvar a escala."}
         try:
             with conn.cursor() as cur:
-                cur.executemany("INSERT INTO escala (id_evento, id_funcao, id_voluntario, funcao_instancia) VALUES (%s, %s, %s, %s)", args)
+                id_versao = criar_versao_escala(cur, ano, mes, id_ministerio, "geracao_incremental" if incremental else "geracao")
+                args = [(id_versao, e.id_evento, e.id_funcao, e.id_voluntario, e.funcao_instancia,
+                         (e.id_evento, e.id_funcao, e.funcao_instancia, e.id_voluntario) in fixadas) for e in escala_final]
+                copiar_em_lote(cur, "escala", ("id_versao", "id_evento", "id_funcao", "id_voluntario", "funcao_instancia", "fixada"), args)
             conn.commit()
-            return {"status": "success", "message": f"Escala com {len(escala_final)} alocações gerada e salva com sucesso!"}
+            with conn.cursor() as cur:
+                travar_escala_do_mes(cur, ano, mes, id_ministerio)
+                # O motor rodou sobre a escala lida no início; se outra versão foi publicada ou
+                # alguma vaga foi editada nesse meio tempo, publicar por cima perderia essas mudanças.
+                cur.execute("""
+                    SELECT (SELECT id_versao FROM escala_publicada WHERE id_ministerio = %(m)s AND ano = %(a)s AND mes = %(n)s),
+                           (SELECT COALESCE(MAX(id_alteracao), 0) FROM escala_alteracoes
+                            WHERE id_ministerio = %(m)s AND ano = %(a)s AND mes = %(n)s)
+                """, {"m": id_ministerio, "a": ano, "n": mes})
+                if cur.fetchone() != (id_versao_lida, cursor["versao"]):
+                    cur.execute("DELETE FROM escala_versoes WHERE id_versao = %s", (id_versao,))
+                    conn.commit()
+                    return {"status": "conflict",
+                            "message": "A escala do mês mudou durante a geração; nada foi gravado. Gere novamente."}
+                publicar_versao_escala(cur, ano, mes, id_ministerio, id_versao)
+            conn.commit()
+            cache_escala.invalidar_mes(id_ministerio, ano, mes)
         except Exception as e:
-            conn.rollback(); print(f"ERRO AO SALVAR ESCALA: {e}")
+            conn.rollback(); logger.exception("Erro ao salvar a escala")
             return {"status": "error", "message": f"Erro ao salvar escala: {e}"}
-        finally:
-            if conn: conn.close()
-    else:
-        return {"status": "info", "message": "Nenhuma alocação foi possível."}
+    if not escala_final:
+        return {"status": "info", "message": "Nenhuma alocação foi possível.", "id_versao": id_versao, **resumo}
+    return {"status": "success", "message": f"Escala com {len(escala_final)} alocações gerada e salva com sucesso!",
+            "motor": motor_usado, "modo": modo, "alocacoes": len(escala_final), "id_versao": id_versao, **resumo}
+
+
+def simular_escala(ano, mes, id_ministerio, motor="greedy", tempo_limite=None, tentativas=1, busca_local=True, modo="completo",
+                   cotas=(), voluntarios=(), semente=None):
+    """
+    Roda a geração em memória, opcionalmente com hipóteses (ver simulacao.aplicar_hipoteses),
+    e devolve a diferença para a escala publicada. Não grava nem trava nada. Com 'semente',
+    a simulação é reprodutível (bom para comparar hipóteses entre si).
+    """
+    snapshot_atual = carregar_snapshot_escala(id_ministerio, ano, mes)
+    if snapshot_atual is None: return {"status": "error", "message": "Não foi possível carregar os dados do ministério."}
+    try:
+        snapshot = aplicar_hipoteses(snapshot_atual, cotas, voluntarios)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    erro = validar_snapshot(snapshot)
+    if erro: return erro
+    existentes = carregar_escala_publicada(ano, mes, id_ministerio)
+    if existentes is None: return {"status": "error", "message": "Não foi possível carregar a escala atual do mês."}
+
+    rng = random.Random(semente) if semente is not None else random
+    escala_final, motor_usado, resumo = calcular_escala(
+        snapshot, existentes, motor, tempo_limite, tentativas, busca_local, modo=modo, rng=rng)
+    diferenca = comparar_escalas(snapshot, [e for e, _ in existentes], escala_final, snapshot_antes=snapshot_atual)
+    return {"status": "success", "motor": motor_usado, "modo": modo, "alocacoes": len(escala_final), **resumo, **diferenca}
+
+
+def analisar_escala(ano, mes, id_ministerio):
+    """
+    Diagnóstico do mês sem rodar o motor: o teto de vagas preenchíveis (mantendo as fixadas,
+    como faria uma geração completa) e os motivos das vagas abertas da escala publicada.
+    """
+    snapshot = carregar_snapshot_escala(id_ministerio, ano, mes)
+    if snapshot is None: return {"status": "error", "message": "Não foi possível carregar os dados do ministério."}
+    existentes = carregar_escala_publicada(ano, mes, id_ministerio)
+    if existentes is None: return {"status": "error", "message": "Não foi possível carregar a escala atual do mês."}
+    publicada, _ = separar_escala_existente(snapshot, [(e, True) for e, _ in existentes])
+    fixadas, _ = separar_escala_existente(snapshot, [(e, f) for e, f in existentes if f])
+    return {"status": "success", "viabilidade": limite_superior(snapshot, fixadas),
+            "diagnostico": motivos_das_vagas(snapshot, publicada)}
 
 
 def get_vinculos_para_escala():
@@ -1306,114 +1426,507 @@ def get_vinculos_para_escala():
     Esta função é otimizada para o gerador de escala.
     Retorna uma lista de listas, ex: [[10, 15], [21, 22, 23]]
     """
-    conn = ensure_connection()
-    if conn is None: 
-        return []
+    with get_connection() as conn:
+        if conn is None: 
+            return []
     
-    try:
-        # Busca apenas voluntários ativos que pertencem a um grupo
-        query = """
-            SELECT id_grupo, id_voluntario
-            FROM voluntarios
-            WHERE id_grupo IS NOT NULL AND ativo = TRUE
-            ORDER BY id_grupo;
-        """
-        df = pd.read_sql(query, conn)
+        try:
+            # Busca apenas voluntários ativos que pertencem a um grupo
+            query = """
+                SELECT id_grupo, id_voluntario
+                FROM voluntarios
+                WHERE id_grupo IS NOT NULL AND ativo = TRUE
+                ORDER BY id_grupo;
+            """
+            df = pd.read_sql(query, conn)
         
-        # A linha abaixo precisa estar indentada corretamente
-        if df.empty:
-            return []
+            # A linha abaixo precisa estar indentada corretamente
+            if df.empty:
+                return []
             
-        # Agrupa os IDs de voluntário pelo ID do grupo e converte para o formato de lista de listas
-        vinculos = df.groupby('id_grupo')['id_voluntario'].apply(list).tolist()
-        return vinculos
-    except Exception as e:
-        # Em uma API, é melhor imprimir o erro no console do que usar print
-        print(f"Erro ao buscar vínculos para a escala: {e}")
-        return []
-    finally:
-        if conn:
-            conn.close()
+            # Agrupa os IDs de voluntário pelo ID do grupo e converte para o formato de lista de listas
+            vinculos = df.groupby('id_grupo')['id_voluntario'].apply(list).tolist()
+            return vinculos
+        except Exception as e:
+            # Em uma API, é melhor imprimir o erro no console do que usar print
+            logger.exception("Erro ao buscar vínculos para a escala")
+            return []
 
 
 
 
 def update_apenas_disponibilidade(id_voluntario, lista_ids_servicos):
     """ Atualiza apenas a disponibilidade de um voluntário. """
-    conn = ensure_connection()
-    if conn is None: return
-    try:
-        with conn.cursor() as cur:
-            cur.execute("DELETE FROM voluntario_disponibilidade WHERE id_voluntario = %s", (id_voluntario,))
-            if lista_ids_servicos:
-                args = [(id_voluntario, id_servico) for id_servico in lista_ids_servicos]
-                cur.executemany("INSERT INTO voluntario_disponibilidade (id_voluntario, id_servico) VALUES (%s, %s)", args)
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        print(f"Erro ao atualizar disponibilidade: {e}")
+    with get_connection() as conn:
+        if conn is None: return
+        try:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM voluntario_disponibilidade WHERE id_voluntario = %s", (id_voluntario,))
+                if lista_ids_servicos:
+                    args = [(id_voluntario, id_servico) for id_servico in lista_ids_servicos]
+                    inserir_em_lote(cur, "voluntario_disponibilidade", ("id_voluntario", "id_servico"), args)
+            conn.commit()
+            indice_elegibilidade.invalidar()
+        except Exception as e:
+            conn.rollback()
+            logger.exception("Erro ao atualizar disponibilidade")
 
 # Substitua a antiga 'update_escala_entry' por esta nova versão
-def update_escala_entry(id_evento, id_funcao, id_voluntario, instancia):
+def update_escala_entry(id_evento, id_funcao, id_voluntario, instancia, fixada=False):
     """
     Atualiza ou insere uma única entrada na escala, usando a 'instancia' da função.
-    Se id_voluntario for None, a vaga é limpa (deletada).
+    Se id_voluntario for None, a vaga é limpa (deletada). Com 'fixada', a geração (completa
+    ou incremental) mantém a vaga como está.
+    Retorna {"status": "success" | "not_found" (evento não existe) | "error", "message"}.
     """
-    conn = ensure_connection()
-    if conn is None: return
-    try:
-        with conn.cursor() as cur:
-            # Primeiro, deleta a entrada antiga para esta vaga específica (evento + função + instância)
-            cur.execute(
-                "DELETE FROM escala WHERE id_evento = %s AND id_funcao = %s AND funcao_instancia = %s",
-                (id_evento, id_funcao, instancia)
-            )
-            # Se um novo voluntário foi selecionado (não é "Vago"), insere a nova entrada
-            if id_voluntario is not None:
-                cur.execute(
-                    "INSERT INTO escala (id_evento, id_funcao, id_voluntario, funcao_instancia) VALUES (%s, %s, %s, %s)",
-                    (id_evento, id_funcao, id_voluntario, instancia)
-                )
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        print(f"Erro ao salvar alteração na escala: {e}")
-        print(f"ERRO DETALHADO [update_escala_entry]: {e}")
+    with get_connection() as conn:
+        if conn is None: return {"status": "error", "message": "Falha na conexão com o banco de dados."}
+        try:
+            with conn.cursor() as cur:
+                # A edição vale para a versão publicada do mês do evento.
+                cur.execute("""
+                    SELECT EXTRACT(YEAR FROM e.data_evento)::int, EXTRACT(MONTH FROM e.data_evento)::int, sf.id_ministerio
+                    FROM eventos e JOIN servicos_fixos sf ON sf.id_servico = e.id_servico_fixo
+                    WHERE e.id_evento = %s
+                """, (id_evento,))
+                linha = cur.fetchone()
+                if linha is None:
+                    conn.rollback()
+                    return {"status": "not_found", "message": f"Evento {id_evento} não encontrado."}
+                ano, mes, id_ministerio = linha
+                travar_escala_do_mes(cur, ano, mes, id_ministerio)
+                id_versao = versao_publicada(cur, ano, mes, id_ministerio)
+                anterior = ocupante_da_vaga(cur, id_versao, id_evento, id_funcao, instancia)
+                nova = (id_voluntario, bool(fixada) if id_voluntario is not None else False)
+                # Vaga "Vago" (id_voluntario None) fica só apagada
+                gravar_vaga(cur, id_versao, id_evento, id_funcao, instancia, id_voluntario, fixada)
+                if nova != anterior:
+                    registrar_alteracao(cur, ano, mes, id_ministerio, id_versao, "edicao", (id_evento, id_funcao, instancia), anterior, nova)
+            conn.commit()
+            cache_escala.invalidar_mes(id_ministerio, ano, mes)
+            return {"status": "success", "message": "Vaga atualizada com sucesso."}
+        except Exception as e:
+            conn.rollback()
+            logger.exception("Erro ao salvar alteração na escala")
+            return {"status": "error", "message": "Erro ao salvar alteração na escala."}
+
+def _conflitos_do_lote(ocupantes, mudadas, datas, voluntarios, cotas, funcoes, indisponibilidades):
+    """
+    Conflitos que as vagas 'mudadas' criam na escala resultante 'ocupantes' ({vaga: (id_voluntario,
+    fixada)}). Para cada vaga que o lote preenche: instância fora da cota do serviço ('cotas':
+    {(id_evento, id_funcao): quantidade}), voluntário sem a função ('funcoes': {(id_voluntario,
+    id_funcao)}), indisponível no evento ('indisponibilidades': {(id_voluntario, id_evento)}, já
+    com as datas bloqueadas) ou em duas vagas no mesmo dia; e voluntário acima do limite do mês.
+    Só entram os voluntários que o lote põe em alguma vaga; o que já estava assim fica como está.
+    """
+    por_dia = Counter((id_voluntario, datas.get(vaga[0])) for vaga, (id_voluntario, _) in ocupantes.items())
+    carga = Counter(id_voluntario for id_voluntario, _ in ocupantes.values())
+    conflitos = []
+    for vaga in mudadas:
+        id_voluntario = ocupantes.get(vaga, (None, False))[0]
+        if id_voluntario is None:
+            continue
+        id_evento, id_funcao, instancia = vaga
+        nome, _ = voluntarios[id_voluntario]
+        base = {"id_evento": id_evento, "id_funcao": id_funcao, "funcao_instancia": instancia,
+                "data_evento": datas[id_evento].isoformat(), "id_voluntario": id_voluntario, "nome_voluntario": nome}
+        if not 1 <= instancia <= cotas.get((id_evento, id_funcao), 0):
+            conflitos.append({"tipo": "vaga_inexistente", **base,
+                              "message": f"O evento de {datas[id_evento]:%d/%m} não tem a vaga {instancia} desta função."})
+        if (id_voluntario, id_funcao) not in funcoes:
+            conflitos.append({"tipo": "funcao", **base, "message": f"{nome} não tem esta função no perfil."})
+        if (id_voluntario, id_evento) in indisponibilidades:
+            conflitos.append({"tipo": "indisponivel", **base,
+                              "message": f"{nome} marcou indisponibilidade para {datas[id_evento]:%d/%m}."})
+        if por_dia[(id_voluntario, datas[id_evento])] > 1:
+            conflitos.append({"tipo": "mesmo_dia", **base,
+                              "message": f"{nome} já está escalado(a) em outro evento em {datas[id_evento]:%d/%m}."})
+    for id_voluntario in sorted({ocupantes[vaga][0] for vaga in mudadas if vaga in ocupantes}):
+        nome, limite = voluntarios[id_voluntario]
+        if limite is not None and carga[id_voluntario] > limite:
+            conflitos.append({"tipo": "limite", "id_voluntario": id_voluntario, "nome_voluntario": nome,
+                              "escalas": carga[id_voluntario], "limite_escalas_mes": limite,
+                              "message": f"{nome} ficaria com {carga[id_voluntario]} escalas no mês (limite {limite})."})
+    return conflitos
+
+
+def atualizar_vagas_em_lote(id_ministerio, vagas):
+    """
+    Aplica várias edições de vaga (dicts com id_evento, id_funcao, funcao_instancia,
+    id_voluntario e fixada) na versão publicada do mês, em uma transação: apaga as que ficam
+    vazias, faz upsert das outras e registra no diário. Todas as vagas precisam ser de eventos
+    do ministério em um mesmo mês, e os voluntários, ativos do ministério. Antes de gravar,
+    confere o resultado de uma vez (vaga dentro da cota, função, indisponibilidade, mesmo dia,
+    limite do mês; ver _conflitos_do_lote); havendo conflito, nada é gravado e volta status
+    "conflict" com a lista.
+    No sucesso, devolve 'versao', o cursor do diário do mês depois do lote (ver alteracoes_desde).
+    """
+    chaves = [(v["id_evento"], v["id_funcao"], v["funcao_instancia"]) for v in vagas]
+    if not chaves:
+        return {"status": "error", "message": "Nenhuma vaga enviada."}
+    if len(set(chaves)) != len(chaves):
+        return {"status": "error", "message": "A mesma vaga aparece mais de uma vez no lote."}
+    novas = {k: (v["id_voluntario"], bool(v.get("fixada")) if v["id_voluntario"] is not None else False) for k, v in zip(chaves, vagas)}
+
+    with get_connection() as conn:
+        if conn is None: return {"status": "error", "message": "Não foi possível conectar ao banco de dados."}
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT e.id_evento, e.data_evento FROM eventos e JOIN servicos_fixos sf ON sf.id_servico = e.id_servico_fixo
+                    WHERE e.id_evento = ANY(%s) AND sf.id_ministerio = %s
+                """, (list({k[0] for k in chaves}), id_ministerio))
+                datas = dict(cur.fetchall())
+                desconhecidos = sorted({k[0] for k in chaves} - set(datas))
+                meses = {(d.year, d.month) for d in datas.values()}
+                if desconhecidos or len(meses) != 1:
+                    conn.rollback()
+                    motivo = f"Eventos não encontrados neste ministério: {desconhecidos}." if desconhecidos else "As vagas do lote precisam ser de um mesmo mês."
+                    return {"status": "error", "message": motivo}
+                ano, mes = meses.pop()
+
+                travar_escala_do_mes(cur, ano, mes, id_ministerio)
+                id_versao = versao_publicada(cur, ano, mes, id_ministerio)
+                _, existentes = ler_escala_publicada(cur, ano, mes, id_ministerio)
+                ocupantes = {chave_da_entrada(e): (e.id_voluntario, bool(fixada)) for e, fixada in existentes}
+                anteriores = {k: ocupantes.get(k, (None, False)) for k in chaves}
+                mudadas = [k for k in chaves if novas[k] != anteriores[k]]
+                for k in mudadas:
+                    if novas[k][0] is None:
+                        ocupantes.pop(k, None)
+                    else:
+                        ocupantes[k] = novas[k]
+
+                # Datas de todo o mês (o choque de dia pode ser com uma vaga fora do lote) e os voluntários que o lote escala.
+                cur.execute("""
+                    SELECT e.id_evento, e.data_evento FROM eventos e JOIN servicos_fixos sf ON sf.id_servico = e.id_servico_fixo
+                    WHERE sf.id_ministerio = %s AND e.data_evento >= %s AND e.data_evento < %s
+                """, (id_ministerio, *intervalo_do_mes(ano, mes)))
+                datas.update(cur.fetchall())
+                escalados = list({ocupantes[k][0] for k in mudadas if k in ocupantes})
+                cur.execute("""
+                    SELECT id_voluntario, nome_voluntario, limite_escalas_mes FROM voluntarios
+                    WHERE id_voluntario = ANY(%s) AND id_ministerio = %s AND ativo = TRUE
+                """, (escalados, id_ministerio))
+                voluntarios = {id_voluntario: (nome, limite) for id_voluntario, nome, limite in cur.fetchall()}
+                if set(escalados) - set(voluntarios):
+                    conn.rollback()
+                    return {"status": "error",
+                            "message": f"Voluntários não encontrados neste ministério (ou inativos): {sorted(set(escalados) - set(voluntarios))}."}
+
+                # Regras da vaga para os voluntários do lote: cota do serviço, funções e indisponibilidades (eventos e datas).
+                eventos_do_lote = list({k[0] for k in chaves})
+                cur.execute("""
+                    SELECT e.id_evento, c.id_funcao, c.quantidade_necessaria
+                    FROM eventos e JOIN servico_funcao_cotas c ON c.id_servico = e.id_servico_fixo
+                    WHERE e.id_evento = ANY(%s)
+                """, (eventos_do_lote,))
+                cotas = {(id_evento, id_funcao): quantidade for id_evento, id_funcao, quantidade in cur.fetchall()}
+                cur.execute("SELECT id_voluntario, id_funcao FROM voluntario_funcoes WHERE id_voluntario = ANY(%s)", (escalados,))
+                funcoes = set(cur.fetchall())
+                cur.execute("""
+                    SELECT id_voluntario, id_evento FROM voluntario_indisponibilidade_eventos
+                    WHERE id_voluntario = ANY(%s) AND id_evento = ANY(%s)
+                """, (escalados, eventos_do_lote))
+                indisponibilidades = set(cur.fetchall())
+                cur.execute("""
+                    SELECT id_voluntario, data_indisponivel FROM voluntario_indisponibilidade_datas
+                    WHERE id_voluntario = ANY(%s) AND data_indisponivel >= %s AND data_indisponivel < %s
+                """, (escalados, *intervalo_do_mes(ano, mes)))
+                datas_bloqueadas = set(cur.fetchall())
+                indisponibilidades |= {(id_voluntario, id_evento) for id_voluntario in escalados for id_evento in eventos_do_lote
+                                       if (id_voluntario, datas[id_evento]) in datas_bloqueadas}
+                conflitos = _conflitos_do_lote(ocupantes, mudadas, datas, voluntarios, cotas, funcoes, indisponibilidades)
+                if conflitos:
+                    conn.rollback()
+                    return {"status": "conflict", "message": f"{len(conflitos)} conflito(s) no lote; nada foi gravado.", "conflitos": conflitos}
+
+                vazias = [k for k in mudadas if novas[k][0] is None]
+                if vazias:
+                    cur.execute("""
+                        DELETE FROM escala esc
+                        USING unnest(%s::int[], %s::int[], %s::int[]) AS v(id_evento, id_funcao, funcao_instancia)
+                        WHERE esc.id_versao = %s AND esc.id_evento = v.id_evento
+                          AND esc.id_funcao = v.id_funcao AND esc.funcao_instancia = v.funcao_instancia
+                    """, ([k[0] for k in vazias], [k[1] for k in vazias], [k[2] for k in vazias], id_versao))
+                inserir_em_lote(cur, "escala", ("id_versao", "id_evento", "id_funcao", "id_voluntario", "funcao_instancia", "fixada"),
+                                [(id_versao, k[0], k[1], novas[k][0], k[2], novas[k][1]) for k in mudadas if novas[k][0] is not None],
+                                sufixo=_UPSERT_VAGA)
+                inserir_em_lote(cur, "escala_alteracoes",
+                                ("id_ministerio", "ano", "mes", "id_versao", "origem", "id_evento", "id_funcao", "funcao_instancia",
+                                 "id_voluntario_anterior", "fixada_anterior", "id_voluntario_novo", "fixada_nova"),
+                                [(id_ministerio, ano, mes, id_versao, "edicao", *k, *anteriores[k], *novas[k]) for k in mudadas])
+                cur.execute("SELECT COALESCE(MAX(id_alteracao), 0) FROM escala_alteracoes WHERE id_ministerio = %s AND ano = %s AND mes = %s",
+                            (id_ministerio, ano, mes))
+                versao = cur.fetchone()[0]
+            conn.commit()
+            if mudadas:
+                cache_escala.invalidar_mes(id_ministerio, ano, mes)
+        except Exception as e:
+            conn.rollback()
+            logger.exception("Erro ao salvar o lote de vagas")
+            return {"status": "error", "message": f"Erro ao salvar as vagas: {e}"}
+    return {"status": "success", "message": f"{len(mudadas)} vagas atualizadas.", "ano": ano, "mes": mes,
+            "versao": versao, "alteradas": len(mudadas)}
+
+
+def alteracoes_desde(ano, mes, id_ministerio, desde=None):
+    """
+    Vagas do mês que mudaram depois do cursor 'desde' (um id_alteracao devolvido antes), com
+    o ocupante atual: {versao, recarregar, mudancas}. 'versao' é o cursor para a próxima
+    chamada. 'recarregar' vem True quando o mês inteiro mudou nesse meio tempo (geração,
+    reversão, eventos...) ou o cursor não é deste mês; aí o cliente busca o mês de novo.
+    Sem 'desde', só o cursor atual (pegar ANTES de buscar o mês). None em caso de erro.
+    """
+    with get_connection() as conn:
+        if conn is None: return None
+        try:
+            with conn.cursor() as cur:
+                # Uma consulta só: o cursor e os ocupantes saem da mesma foto do banco.
+                cur.execute("""
+                    WITH diario AS (
+                        SELECT id_alteracao, id_evento, id_funcao, funcao_instancia FROM escala_alteracoes
+                        WHERE id_ministerio = %(id_ministerio)s AND ano = %(ano)s AND mes = %(mes)s
+                    ),
+                    novas AS (
+                        SELECT * FROM diario WHERE %(desde)s IS NOT NULL AND id_alteracao > %(desde)s
+                    ),
+                    vagas AS (
+                        SELECT DISTINCT id_evento, id_funcao, funcao_instancia FROM novas WHERE id_evento IS NOT NULL
+                    )
+                    SELECT
+                        (SELECT COALESCE(MAX(id_alteracao), 0) FROM diario) AS versao,
+                        EXISTS (SELECT 1 FROM novas WHERE id_evento IS NULL) AS mes_inteiro,
+                        va.id_evento, va.id_funcao, va.funcao_instancia,
+                        esc.id_voluntario, vol.nome_voluntario, COALESCE(esc.fixada, FALSE) AS fixada
+                    FROM (SELECT 1) AS um
+                    LEFT JOIN vagas va ON TRUE
+                    LEFT JOIN escala_vigente esc
+                        ON esc.id_evento = va.id_evento AND esc.id_funcao = va.id_funcao AND esc.funcao_instancia = va.funcao_instancia
+                    LEFT JOIN voluntarios vol ON vol.id_voluntario = esc.id_voluntario
+                    ORDER BY va.id_evento, va.id_funcao, va.funcao_instancia
+                """, {"id_ministerio": id_ministerio, "ano": ano, "mes": mes, "desde": desde})
+                rows = cur.fetchall()
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.exception("Erro ao ler o diário da escala de %s/%s", mes, ano)
+            return None
+    versao, mes_inteiro = rows[0][0], rows[0][1]
+    recarregar = desde is not None and (mes_inteiro or desde > versao)
+    mudancas = [] if recarregar else [
+        {"id_evento": id_evento, "id_funcao": id_funcao, "funcao_instancia": instancia,
+         "id_voluntario": id_voluntario, "nome_voluntario": nome, "fixada": fixada}
+        for _, _, id_evento, id_funcao, instancia, id_voluntario, nome, fixada in rows if id_evento is not None
+    ]
+    return {"versao": versao, "recarregar": recarregar, "mudancas": mudancas}
+
+
+def _desfazer_ou_refazer(ano, mes, id_ministerio, refazer):
+    """
+    Desfaz a última edição manual ativa da versão publicada do mês, ou refaz a última desfeita
+    (só enquanto nenhuma edição nova veio depois dela). A vaga precisa estar como a edição
+    deixou (ou, para refazer, como estava antes dela); senão, status "conflict".
+    """
+    acao = "refazer" if refazer else "desfazer"
+    with get_connection() as conn:
+        if conn is None: return {"status": "error", "message": "Não foi possível conectar ao banco de dados."}
+        try:
+            with conn.cursor() as cur:
+                travar_escala_do_mes(cur, ano, mes, id_ministerio)
+                cur.execute("SELECT id_versao FROM escala_publicada WHERE id_ministerio = %s AND ano = %s AND mes = %s",
+                            (id_ministerio, ano, mes))
+                row = cur.fetchone()
+                id_versao = row[0] if row else None
+                if refazer:
+                    # A desfeita mais antiga depois da última edição ativa: a pilha de refazer.
+                    cur.execute("""
+                        SELECT id_alteracao, id_evento, id_funcao, funcao_instancia,
+                               id_voluntario_anterior, fixada_anterior, id_voluntario_novo, fixada_nova
+                        FROM escala_alteracoes
+                        WHERE id_versao = %(id_versao)s AND origem = 'edicao' AND id_evento IS NOT NULL AND desfeita
+                          AND id_alteracao > COALESCE((
+                              SELECT MAX(id_alteracao) FROM escala_alteracoes
+                              WHERE id_versao = %(id_versao)s AND origem = 'edicao' AND id_evento IS NOT NULL AND NOT desfeita
+                          ), 0)
+                        ORDER BY id_alteracao LIMIT 1
+                    """, {"id_versao": id_versao})
+                else:
+                    cur.execute("""
+                        SELECT id_alteracao, id_evento, id_funcao, funcao_instancia,
+                               id_voluntario_anterior, fixada_anterior, id_voluntario_novo, fixada_nova
+                        FROM escala_alteracoes
+                        WHERE id_versao = %s AND origem = 'edicao' AND id_evento IS NOT NULL AND NOT desfeita
+                        ORDER BY id_alteracao DESC LIMIT 1
+                    """, (id_versao,))
+                row = cur.fetchone()
+                if row is None:
+                    conn.rollback()
+                    return {"status": "conflict", "message": f"Não há edição para {acao} nesta escala."}
+                id_alteracao, id_evento, id_funcao, instancia = row[:4]
+                anterior, nova = (row[4], bool(row[5])), (row[6], bool(row[7]))
+                de, para = (anterior, nova) if refazer else (nova, anterior)
+                if ocupante_da_vaga(cur, id_versao, id_evento, id_funcao, instancia) != de:
+                    conn.rollback()
+                    return {"status": "conflict", "message": f"A vaga mudou depois da edição; não dá para {acao}."}
+
+                gravar_vaga(cur, id_versao, id_evento, id_funcao, instancia, *para)
+                cur.execute("UPDATE escala_alteracoes SET desfeita = %s WHERE id_alteracao = %s", (not refazer, id_alteracao))
+                versao = registrar_alteracao(cur, ano, mes, id_ministerio, id_versao, acao, (id_evento, id_funcao, instancia), de, para)
+            conn.commit()
+            cache_escala.invalidar_mes(id_ministerio, ano, mes)
+        except Exception as e:
+            conn.rollback()
+            logger.exception("Erro ao %s a edição da escala de %s/%s", acao, mes, ano)
+            return {"status": "error", "message": f"Erro ao {acao} a edição: {e}"}
+    return {"status": "success", "versao": versao,
+            "vaga": {"id_evento": id_evento, "id_funcao": id_funcao, "funcao_instancia": instancia,
+                     "id_voluntario": para[0], "fixada": para[1]}}
+
+
+def desfazer_edicao(ano, mes, id_ministerio):
+    """ Desfaz a última edição manual de vaga do mês (ver _desfazer_ou_refazer). """
+    return _desfazer_ou_refazer(ano, mes, id_ministerio, refazer=False)
+
+
+def refazer_edicao(ano, mes, id_ministerio):
+    """ Refaz a última edição desfeita do mês (ver _desfazer_ou_refazer). """
+    return _desfazer_ou_refazer(ano, mes, id_ministerio, refazer=True)
+
+
+def planejar_reparo_ausencia(ano, mes, id_ministerio, id_voluntario, ids_eventos=None):
+    """
+    Plano de substituição para um voluntário que não vai poder servir nos 'ids_eventos' do mês
+    (None = em todos em que está escalado); ver reparo_ausencia.py. Não grava nada: o plano
+    volta com o id_versao em que foi calculado, para aplicar_reparo_ausencia conferir.
+    """
+    snapshot = carregar_snapshot_escala(id_ministerio, ano, mes)
+    if snapshot is None: return {"status": "error", "message": "Não foi possível carregar os dados do ministério."}
+    with get_connection() as conn:
+        if conn is None: return {"status": "error", "message": "Não foi possível conectar ao banco de dados."}
+        try:
+            with conn.cursor() as cur:
+                id_versao, existentes = ler_escala_publicada(cur, ano, mes, id_ministerio)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.exception("Erro ao carregar a escala publicada de %s/%s", mes, ano)
+            return {"status": "error", "message": f"Erro ao carregar a escala do mês: {e}"}
+    if id_versao is None:
+        return {"status": "error", "message": f"Não há escala publicada para {mes}/{ano}."}
+    plano = planejar_reparo(snapshot, existentes, id_voluntario, ids_eventos)
+    return {"status": "success", "id_versao": id_versao, **plano}
+
+
+def aplicar_reparo_ausencia(ano, mes, id_ministerio, id_versao, id_voluntario, ids_eventos, mudancas, registrar_indisponibilidade=True):
+    """
+    Grava, em uma transação, as 'mudancas' de um plano de planejar_reparo_ausencia (dicts com
+    id_evento, id_funcao, funcao_instancia, id_voluntario_anterior e id_voluntario_novo): copia
+    a versão publicada para uma nova, aplica as mudanças e publica (dá para reverter). Com
+    'registrar_indisponibilidade', os eventos também ficam marcados como indisponíveis para o
+    voluntário, para a próxima geração não escalá-lo de volta.
+    As mudanças não são aceitas como vêm: o plano é recalculado aqui, sobre a escala atual, e
+    cada mudança enviada precisa ser uma das dele (o cliente pode deixar mudanças de fora, não
+    inventar outras). Retorna status "conflict" se a escala mudou desde o plano (outra versão
+    publicada, ou alguma das vagas com outro ocupante) ou se alguma mudança não está no plano.
+    """
+    def passo(m):
+        return (m["id_evento"], m["id_funcao"], m["funcao_instancia"], m["id_voluntario_anterior"], m["id_voluntario_novo"])
+
+    snapshot = carregar_snapshot_escala(id_ministerio, ano, mes)
+    if snapshot is None: return {"status": "error", "message": "Não foi possível carregar os dados do ministério."}
+    with get_connection() as conn:
+        if conn is None: return {"status": "error", "message": "Não foi possível conectar ao banco de dados."}
+        try:
+            with conn.cursor() as cur:
+                travar_escala_do_mes(cur, ano, mes, id_ministerio)
+                id_atual, existentes = ler_escala_publicada(cur, ano, mes, id_ministerio)
+                if id_atual is None or id_atual != id_versao:
+                    conn.rollback()
+                    return {"status": "conflict", "message": "A escala mudou desde que o plano foi calculado. Calcule o plano de novo."}
+                # planejar_reparo é determinístico: com a mesma escala, sai o mesmo plano.
+                plano = planejar_reparo(snapshot, existentes, id_voluntario, ids_eventos or None)
+                permitidas = {passo(m) for m in plano["mudancas"]}
+                if len({passo(m)[:3] for m in mudancas}) != len(mudancas) or any(passo(m) not in permitidas for m in mudancas):
+                    conn.rollback()
+                    return {"status": "conflict", "message": "As mudanças não conferem com o plano para a escala atual. Calcule o plano de novo."}
+
+                if mudancas:
+                    id_versao = criar_versao_escala(cur, ano, mes, id_ministerio, "reparo_ausencia")
+                    cur.execute("""
+                        INSERT INTO escala (id_versao, id_evento, id_funcao, id_voluntario, funcao_instancia, fixada)
+                        SELECT %s, id_evento, id_funcao, id_voluntario, funcao_instancia, fixada FROM escala WHERE id_versao = %s
+                    """, (id_versao, id_atual))
+                    cur.execute("""
+                        DELETE FROM escala esc
+                        USING unnest(%s::int[], %s::int[], %s::int[]) AS v(id_evento, id_funcao, funcao_instancia)
+                        WHERE esc.id_versao = %s AND esc.id_evento = v.id_evento
+                          AND esc.id_funcao = v.id_funcao AND esc.funcao_instancia = v.funcao_instancia
+                    """, ([m["id_evento"] for m in mudancas], [m["id_funcao"] for m in mudancas],
+                          [m["funcao_instancia"] for m in mudancas], id_versao))
+                    args = [(id_versao, m["id_evento"], m["id_funcao"], m["id_voluntario_novo"], m["funcao_instancia"], False)
+                            for m in mudancas if m["id_voluntario_novo"] is not None]
+                    if args:
+                        inserir_em_lote(cur, "escala", ("id_versao", "id_evento", "id_funcao", "id_voluntario", "funcao_instancia", "fixada"), args)
+                    publicar_versao_escala(cur, ano, mes, id_ministerio, id_versao)
+
+                if registrar_indisponibilidade and ids_eventos:
+                    # Só eventos do mês e do ministério; os que já estavam marcados ficam como estão.
+                    cur.execute("""
+                        INSERT INTO voluntario_indisponibilidade_eventos (id_voluntario, id_evento)
+                        SELECT %s, e.id_evento
+                        FROM eventos e JOIN servicos_fixos sf ON sf.id_servico = e.id_servico_fixo
+                        WHERE e.id_evento = ANY(%s) AND sf.id_ministerio = %s AND e.data_evento >= %s AND e.data_evento < %s
+                          AND NOT EXISTS (
+                              SELECT 1 FROM voluntario_indisponibilidade_eventos i
+                              WHERE i.id_voluntario = %s AND i.id_evento = e.id_evento
+                          )
+                    """, (id_voluntario, list(ids_eventos), id_ministerio, *intervalo_do_mes(ano, mes), id_voluntario))
+                    indisponibilidade_nova = cur.rowcount > 0
+                else:
+                    indisponibilidade_nova = False
+            conn.commit()
+            cache_escala.invalidar_mes(id_ministerio, ano, mes)
+            if indisponibilidade_nova:
+                indice_elegibilidade.invalidar()
+        except Exception as e:
+            conn.rollback()
+            logger.exception("Erro ao aplicar o reparo da escala de %s/%s", mes, ano)
+            return {"status": "error", "message": f"Erro ao aplicar as substituições: {e}"}
+    return {"status": "success", "message": f"{len(mudancas)} vagas atualizadas.", "id_versao": id_versao, "mudancas": len(mudancas)}
+
 
 def get_voluntarios_for_funcao(id_funcao):
     """
     Busca todos os voluntários ativos que estão aptos a exercer uma função específica.
     Esta função agora verifica a tabela de junção 'voluntario_funcoes'.
     """
-    conn = ensure_connection()
-    if conn is None:
-        return pd.DataFrame()
-    try:
-        # Esta query junta as tabelas para encontrar todos os voluntários
-        # que têm um vínculo com o id_funcao fornecido.
-        query = """
-            SELECT v.id_voluntario, v.nome_voluntario
-            FROM voluntarios v
-            JOIN voluntario_funcoes vf ON v.id_voluntario = vf.id_voluntario
-            WHERE v.ativo = TRUE AND vf.id_funcao = %s
-            ORDER BY v.nome_voluntario;
-        """
-        df = pd.read_sql(query, conn, params=(id_funcao,))
-        return df
-    except Exception as e:
-        print(f"Erro ao buscar voluntários para a função {id_funcao}: {e}")
-        return pd.DataFrame()
-    finally:
-        if conn:
-            conn.close()
+    with get_connection() as conn:
+        if conn is None:
+            return pd.DataFrame()
+        try:
+            # Esta query junta as tabelas para encontrar todos os voluntários
+            # que têm um vínculo com o id_funcao fornecido.
+            query = """
+                SELECT v.id_voluntario, v.nome_voluntario
+                FROM voluntarios v
+                JOIN voluntario_funcoes vf ON v.id_voluntario = vf.id_voluntario
+                WHERE v.ativo = TRUE AND vf.id_funcao = %s
+                ORDER BY v.nome_voluntario;
+            """
+            df = pd.read_sql(query, conn, params=(id_funcao,))
+            return df
+        except Exception as e:
+            logger.exception("Erro ao buscar voluntários para a função %s", id_funcao)
+            return pd.DataFrame()
 
 def get_voluntario_by_name(nome_voluntario):
     """ Busca um voluntário pelo nome para encontrar seu ID. """
-    conn = ensure_connection()
-    if conn is None or not nome_voluntario: return None
-    query = "SELECT id_voluntario FROM voluntarios WHERE nome_voluntario = %s"
-    df = pd.read_sql(query, conn, params=(nome_voluntario,))
-    return int(df['id_voluntario'].iloc[0]) if not df.empty else None
+    with get_connection() as conn:
+        if conn is None or not nome_voluntario: return None
+        query = "SELECT id_voluntario FROM voluntarios WHERE nome_voluntario = %s"
+        df = pd.read_sql(query, conn, params=(nome_voluntario,))
+        return int(df['id_voluntario'].iloc[0]) if not df.empty else None
 
 # Adicione v.nivel_experiencia ao SELECT
 
@@ -1422,72 +1935,111 @@ def atualizar_funcoes_do_voluntario(id_voluntario, nova_lista_de_ids_funcoes):
     """
     Sincroniza as funções de um voluntário usando a estratégia 'Apagar e Recriar'.
     """
-    conn = ensure_connection()
-    if conn is None: return
-    try:
-        with conn.cursor() as cur:
-            # Passo 1: Apagar TODOS os vínculos de função antigos deste voluntário.
-            cur.execute("DELETE FROM voluntario_funcoes WHERE id_voluntario = %s", (id_voluntario,))
-
-            # Passo 2: Inserir os novos vínculos, se houver algum.
-            if nova_lista_de_ids_funcoes:
-                # Prepara os dados para uma inserção em massa
-                dados_para_inserir = [(id_voluntario, id_funcao) for id_funcao in nova_lista_de_ids_funcoes]
+    with get_connection() as conn:
+        if conn is None: return
+        try:
+            with conn.cursor() as cur:
+                # Passo 1: Apagar TODOS os vínculos de função antigos deste voluntário.
+                cur.execute("DELETE FROM voluntario_funcoes WHERE id_voluntario = %s", (id_voluntario,))
+
+                # Passo 2: Inserir os novos vínculos, se houver algum.
+                if nova_lista_de_ids_funcoes:
+                    # Prepara os dados para uma inserção em massa
+                    dados_para_inserir = [(id_voluntario, id_funcao) for id_funcao in nova_lista_de_ids_funcoes]
                 
-                # Comando de inserção
-                sql_insert = "INSERT INTO voluntario_funcoes (id_voluntario, id_funcao) VALUES (%s, %s)"
-                cur.executemany(sql_insert, dados_para_inserir)
+                    # Inserção em massa: um único INSERT com várias linhas
+                    inserir_em_lote(cur, "voluntario_funcoes", ("id_voluntario", "id_funcao"), dados_para_inserir)
         
-        conn.commit() # Efetiva as alterações (DELETE e INSERTs)
+            conn.commit() # Efetiva as alterações (DELETE e INSERTs)
+            indice_elegibilidade.invalidar()
         
-    except Exception as e:
-        conn.rollback() # Desfaz tudo em caso de erro
-        print(f"Erro ao atualizar as funções do voluntário: {e}")
-    finally:
-        if conn:
-            conn.close()
+        except Exception as e:
+            conn.rollback() # Desfaz tudo em caso de erro
+            logger.exception("Erro ao atualizar as funções do voluntário")
+
+def _datas_indisponiveis_do_mes(id_ministerio, ano, mes):
+    """Pares (id_voluntario, data) de voluntario_indisponibilidade_datas do mês, para o ministério; None em caso de erro."""
+    with get_connection() as conn:
+        if conn is None: return None
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT vid.id_voluntario, vid.data_indisponivel
+                    FROM voluntario_indisponibilidade_datas vid
+                    JOIN voluntarios v ON v.id_voluntario = vid.id_voluntario
+                    WHERE v.id_ministerio = %s AND vid.data_indisponivel >= %s AND vid.data_indisponivel < %s
+                """, (id_ministerio, *intervalo_do_mes(ano, mes)))
+                pares = cur.fetchall()
+            conn.rollback()
+            return pares
+        except Exception as e:
+            conn.rollback()
+            logger.exception("Erro ao carregar as datas indisponíveis de %s/%s", mes, ano)
+            return None
+
+
+def elegibilidade_do_mes(ano, mes, id_ministerio):
+    """
+    Quem pode assumir cada vaga do mês, com as mesmas regras da geração mais as datas
+    indisponíveis (ver indice_elegibilidade.py). Usa o índice do mês em memória, atualizado
+    só com as vagas que mudaram no diário desde a última consulta; monta de novo se o mês
+    inteiro mudou. As idas ao banco ficam fora do lock do índice.
+    """
+    indice = indice_elegibilidade.obter(id_ministerio, ano, mes)
+    if indice is not None:
+        alteracoes = alteracoes_desde(ano, mes, id_ministerio, indice.versao)
+        if alteracoes is None:
+            return {"status": "error", "message": "Não foi possível ler as alterações da escala."}
+        if not alteracoes["recarregar"]:
+            with indice.lock:
+                indice.aplicar(alteracoes["mudancas"], alteracoes["versao"])
+                return {"status": "success", **indice.como_dict()}
+
+    # O cursor vem antes dos dados: o que mudar no meio volta na próxima consulta (e reaplicar é inofensivo).
+    validade = indice_elegibilidade.validade_atual(id_ministerio, ano, mes)
+    cursor = alteracoes_desde(ano, mes, id_ministerio)
+    snapshot = carregar_snapshot_escala(id_ministerio, ano, mes)
+    existentes = carregar_escala_publicada(ano, mes, id_ministerio)
+    datas = _datas_indisponiveis_do_mes(id_ministerio, ano, mes)
+    if cursor is None or snapshot is None or existentes is None or datas is None:
+        return {"status": "error", "message": "Não foi possível carregar os dados do ministério."}
+    indice = indice_elegibilidade.IndiceMes(snapshot, [e for e, _ in existentes], cursor["versao"], datas)
+    resposta = indice.como_dict()
+    indice_elegibilidade.guardar(id_ministerio, ano, mes, indice, validade)
+    return {"status": "success", **resposta}
+
 
 def get_voluntarios_elegiveis_para_vaga(id_funcao: int, id_evento: int, id_ministerio: int):
     """
-    Busca voluntários elegíveis para uma vaga específica, considerando:
-    1. Função correta.
-    2. Disponibilidade para o evento (não marcado como indisponível).
-    3. Não estar escalado em outra função no mesmo dia do evento.
+    Voluntários que podem assumir uma vaga (evento, função), por nome: o par da
+    elegibilidade_do_mes do mês do evento, então as regras são as mesmas do editor e da
+    geração (função, disponibilidade para o serviço, indisponibilidades, um serviço por dia e
+    limite do mês). Lista de {id_voluntario, nome_voluntario}; None se o evento não é do
+    ministério; lista vazia se não foi possível consultar.
     """
-    conn = ensure_connection()
-    if conn is None:
-        return pd.DataFrame()
-    try:
-        query = """
-        SELECT v.id_voluntario, v.nome_voluntario
-        FROM voluntarios v
-        -- 1. Garante que o voluntário PODE exercer a função
-        JOIN voluntario_funcoes vf ON v.id_voluntario = vf.id_voluntario
-        -- Subquery para pegar a data do evento alvo
-        CROSS JOIN (SELECT data_evento FROM eventos WHERE id_evento = %(id_evento)s) as evento_alvo
-        WHERE
-            v.ativo = TRUE
-            AND v.id_ministerio = %(id_ministerio)s
-            AND vf.id_funcao = %(id_funcao)s
-            -- 2. Garante que o voluntário NÃO está na lista de indisponibilidade para este evento
-            AND v.id_voluntario NOT IN (
-                SELECT id_voluntario FROM voluntario_indisponibilidade_datas
-                WHERE data_indisponivel = evento_alvo.data_evento
-            )
-            -- 3. Garante que o voluntário NÃO está escalado em NENHUM evento no mesmo dia
-            AND v.id_voluntario NOT IN (
-                SELECT e.id_voluntario
-                FROM escala e
-                JOIN eventos ev ON e.id_evento = ev.id_evento
-                WHERE ev.data_evento = evento_alvo.data_evento
-            )
-        ORDER BY v.nome_voluntario;
-        """
-        params = {'id_funcao': id_funcao, 'id_evento': id_evento, 'id_ministerio': id_ministerio}
-        df = pd.read_sql(query, conn, params=params)
-        return df
-    finally:
-        if conn:
-            conn.close()
-
-            
\ No newline at end of file
+    with get_connection() as conn:
+        if conn is None:
+            return []
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT EXTRACT(YEAR FROM e.data_evento)::int, EXTRACT(MONTH FROM e.data_evento)::int
+                    FROM eventos e JOIN servicos_fixos sf ON sf.id_servico = e.id_servico_fixo
+                    WHERE e.id_evento = %s AND sf.id_ministerio = %s
+                """, (id_evento, id_ministerio))
+                linha = cur.fetchone()
+            conn.rollback()
+        except Exception as e:
+            conn.rollback()
+            logger.exception("Erro ao buscar o evento %s", id_evento)
+            return []
+    if linha is None:
+        return None
+    resultado = elegibilidade_do_mes(linha[0], linha[1], id_ministerio)
+    if resultado["status"] != "success":
+        return []
+    nomes = {v["id_voluntario"]: v["nome_voluntario"] for v in resultado["voluntarios"]}
+    par = next((v for v in resultado["vagas"] if v["id_evento"] == id_evento and v["id_funcao"] == id_funcao), None)
+    return [{"id_voluntario": i, "nome_voluntario": nomes[i]} for i in (par["elegiveis"] if par else [])]
+
+        
\ No newline at end of file
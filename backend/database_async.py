@@ -0,0 +1,125 @@
+# database_async.py - Camada assíncrona de acesso a dados para os endpoints da API
+#
+# Espelha a API de database.py (mesmos nomes e assinaturas), mas cada função é "awaitable".
+# O driver (psycopg2) e o pandas.read_sql são bloqueantes, então as chamadas rodam em um
+# executor dedicado com o mesmo número de threads que o pool de conexões tem de conexões:
+# o event loop nunca fica parado esperando o banco, nenhuma thread fica esperando por uma
+# conexão do pool, e as requisições excedentes esperam como corrotinas (baratas), não como
+# threads do threadpool do Starlette.
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from backend import database, db_utils, jobs_escala
+
+_executor_db = ThreadPoolExecutor(max_workers=db_utils.POOL_MAX_CONEXOES, thread_name_prefix="db")
+# Simulações rodam o motor (CPU, segundos) na requisição; ficam fora do executor do banco
+# para não segurar as threads que servem as consultas.
+_executor_simulacao = ThreadPoolExecutor(max_workers=jobs_escala.MAX_JOBS_SIMULTANEOS, thread_name_prefix="simulacao")
+
+
+def _assincrona(func, executor=_executor_db):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+    return wrapper
+
+
+async def executar_bloqueante(func, *args, **kwargs):
+    """Roda trabalho bloqueante que não usa o banco (ex: desenhar o PDF) fora do event loop."""
+    return await asyncio.to_thread(func, *args, **kwargs)
+
+
+# --- AUTENTICAÇÃO ---
+verificar_login_puro = _assincrona(db_utils.verificar_login_puro)
+criar_usuario_puro = _assincrona(db_utils.criar_usuario_puro)
+verificar_login = _assincrona(database.verificar_login)
+criar_usuario = _assincrona(database.criar_usuario)
+
+# --- MINISTÉRIOS / DASHBOARD ---
+get_all_ministerios = _assincrona(database.get_all_ministerios)
+get_all_voluntarios_com_detalhes_puro = _assincrona(database.get_all_voluntarios_com_detalhes_puro)
+
+# --- FUNÇÕES ---
+view_all_funcoes = _assincrona(database.view_all_funcoes)
+add_funcao = _assincrona(database.add_funcao)
+update_funcao = _assincrona(database.update_funcao)
+delete_funcao = _assincrona(database.delete_funcao)
+
+# --- VOLUNTÁRIOS ---
+get_voluntario_by_id = _assincrona(database.get_voluntario_by_id)
+get_voluntario_by_name = _assincrona(database.get_voluntario_by_name)
+add_voluntario = _assincrona(database.add_voluntario)
+update_voluntario = _assincrona(database.update_voluntario)
+inativar_voluntario = _assincrona(database.inativar_voluntario)
+view_all_voluntarios = _assincrona(database.view_all_voluntarios)
+get_all_voluntarios_com_detalhes = _assincrona(database.get_all_voluntarios_com_detalhes)
+get_voluntarios_for_funcao = _assincrona(database.get_voluntarios_for_funcao)
+get_funcoes_of_voluntario = _assincrona(database.get_funcoes_of_voluntario)
+update_funcoes_of_voluntario = _assincrona(database.update_funcoes_of_voluntario)
+atualizar_funcoes_do_voluntario = _assincrona(database.atualizar_funcoes_do_voluntario)
+get_disponibilidade_of_voluntario = _assincrona(database.get_disponibilidade_of_voluntario)
+update_disponibilidade_of_voluntario = _assincrona(database.update_disponibilidade_of_voluntario)
+update_apenas_disponibilidade = _assincrona(database.update_apenas_disponibilidade)
+
+# --- INDISPONIBILIDADES ---
+get_indisponibilidade_eventos = _assincrona(database.get_indisponibilidade_eventos)
+update_indisponibilidade_eventos = _assincrona(database.update_indisponibilidade_eventos)
+get_indisponibilidade_por_mes = _assincrona(database.get_indisponibilidade_por_mes)
+update_indisponibilidade_por_mes = _assincrona(database.update_indisponibilidade_por_mes)
+get_indisponibilidade_datas = _assincrona(database.get_indisponibilidade_datas)
+update_indisponibilidade_datas = _assincrona(database.update_indisponibilidade_datas)
+
+# --- SERVIÇOS E COTAS ---
+add_servico_fixo = _assincrona(database.add_servico_fixo)
+view_all_servicos_fixos = _assincrona(database.view_all_servicos_fixos)
+update_servico_fixo = _assincrona(database.update_servico_fixo)
+delete_servico_fixo = _assincrona(database.delete_servico_fixo)
+get_cotas_all_servicos = _assincrona(database.get_cotas_all_servicos)
+get_cotas_for_servico = _assincrona(database.get_cotas_for_servico)
+update_cotas_servico = _assincrona(database.update_cotas_servico)
+
+# --- GRUPOS ---
+get_all_grupos_com_membros = _assincrona(database.get_all_grupos_com_membros)
+get_voluntarios_sem_grupo = _assincrona(database.get_voluntarios_sem_grupo)
+get_voluntarios_do_grupo = _assincrona(database.get_voluntarios_do_grupo)
+get_grupo_by_id = _assincrona(database.get_grupo_by_id)
+create_grupo = _assincrona(database.create_grupo)
+update_grupo = _assincrona(database.update_grupo)
+delete_grupo = _assincrona(database.delete_grupo)
+get_vinculos_para_escala = _assincrona(database.get_vinculos_para_escala)
+
+# --- EVENTOS E ESCALA ---
+get_events_for_month = _assincrona(database.get_events_for_month)
+create_events_for_month = _assincrona(database.create_events_for_month)
+apagar_escala_do_mes = _assincrona(database.apagar_escala_do_mes)
+reverter_escala_do_mes = _assincrona(database.reverter_escala_do_mes)
+get_escala_completa = _assincrona(database.get_escala_completa)
+update_escala_entry = _assincrona(database.update_escala_entry)
+atualizar_vagas_em_lote = _assincrona(database.atualizar_vagas_em_lote)
+alteracoes_desde = _assincrona(database.alteracoes_desde)
+desfazer_edicao = _assincrona(database.desfazer_edicao)
+refazer_edicao = _assincrona(database.refazer_edicao)
+planejar_reparo_ausencia = _assincrona(database.planejar_reparo_ausencia)
+aplicar_reparo_ausencia = _assincrona(database.aplicar_reparo_ausencia)
+get_voluntarios_elegiveis_para_vaga = _assincrona(database.get_voluntarios_elegiveis_para_vaga)
+elegibilidade_do_mes = _assincrona(database.elegibilidade_do_mes)
+carregar_snapshot_escala = _assincrona(database.carregar_snapshot_escala)
+carregar_dados_para_escala = _assincrona(database.carregar_dados_para_escala)
+simular_escala = _assincrona(database.simular_escala, _executor_simulacao)
+analisar_escala = _assincrona(database.analisar_escala, _executor_simulacao)
+
+# --- JOBS DA GERAÇÃO (a geração em si roda no pool de jobs_escala.py) ---
+submeter_geracao = _assincrona(jobs_escala.submeter_geracao)
+consultar_job = _assincrona(jobs_escala.consultar_job)
+rastro_do_job = _assincrona(jobs_escala.rastro_do_job)
+marcar_jobs_abandonados = _assincrona(jobs_escala.marcar_jobs_abandonados)
+
+
+def encerrar_executores():
+    """Chamado no desligamento da API, antes de fechar o pool."""
+    jobs_escala.encerrar_jobs()
+    _executor_simulacao.shutdown(wait=False, cancel_futures=True)
+    _executor_db.shutdown(wait=True)
@@ -1,87 +1,315 @@
 import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
 import pandas as pd
 import toml
 import os
+import io
+import csv
+import logging
+import threading
+import time
+import traceback
+from contextlib import contextmanager
 from werkzeug.security import generate_password_hash, check_password_hash
 
-# --- LÓGICA DE CONEXÃO UNIVERSAL E PURA ---
-_db_credentials = None
+logger = logging.getLogger(__name__)
 
-def ensure_connection():
+# --- POOL DE CONEXÕES COMPARTILHADO ---
+# Todas as funções de acesso a dados pegam emprestada uma conexão deste pool
+# (via get_connection) em vez de abrir uma conexão TLS nova a cada chamada.
+POOL_MIN_CONEXOES = int(os.environ.get('DB_POOL_MIN', 1))
+POOL_MAX_CONEXOES = int(os.environ.get('DB_POOL_MAX', 5))
+POOL_TIMEOUT_CHECKOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+POOL_LIMITE_VAZAMENTO = float(os.environ.get('DB_POOL_LEAK_SECONDS', 30))
+POOL_INTERVALO_HEALTHCHECK = float(os.environ.get('DB_POOL_HEALTHCHECK_SECONDS', 30))
+
+
+class PoolEsgotadoError(Exception):
+    """Nenhuma conexão foi devolvida ao pool dentro do tempo limite de checkout."""
+
+
+class PoolFechadoError(Exception):
+    """checkout() depois de fechar() (ex: durante o desligamento do processo)."""
+
+
+class PoolDeConexoes:
+    """
+    Pool limitado de conexões psycopg2, seguro para uso entre threads.
+    - checkout() bloqueia até haver uma conexão livre (ou estoura o timeout).
+    - checkin() desfaz transações esquecidas abertas e devolve a conexão.
+    - Conexões paradas há mais de 'intervalo_healthcheck' segundos são testadas com SELECT 1.
+    - Conexões emprestadas há mais de 'limite_vazamento' segundos são reportadas com a pilha de quem as pegou.
+    - fechar() fecha as livres na hora e as emprestadas quando voltam no checkin().
     """
-    Cria uma conexão com o banco de dados usando a variável de ambiente DATABASE_URL.
+
+    def __init__(self, dsn, minimo=POOL_MIN_CONEXOES, maximo=POOL_MAX_CONEXOES,
+                 timeout=POOL_TIMEOUT_CHECKOUT, limite_vazamento=POOL_LIMITE_VAZAMENTO,
+                 intervalo_healthcheck=POOL_INTERVALO_HEALTHCHECK):
+        self._dsn = dsn
+        self._maximo = max(1, maximo)
+        self._timeout = timeout
+        self._limite_vazamento = limite_vazamento
+        self._intervalo_healthcheck = intervalo_healthcheck
+        self._cond = threading.Condition()
+        self._livres = []          # [(conn, instante_da_devolucao)]
+        self._emprestadas = {}     # id(conn) -> [conn, instante_do_checkout, pilha, ja_reportada]
+        self._total = 0
+        self._fechado = False
+        for _ in range(min(minimo, self._maximo)):
+            self._livres.append((psycopg2.connect(dsn), time.monotonic()))
+            self._total += 1
+
+    def checkout(self):
+        limite = time.monotonic() + self._timeout
+        with self._cond:
+            while True:
+                if self._fechado:
+                    raise PoolFechadoError("O pool de conexões foi fechado.")
+                self._reportar_vazamentos()
+                if self._livres:
+                    conn, devolvida_em = self._livres.pop()
+                    break
+                if self._total < self._maximo:
+                    self._total += 1
+                    conn, devolvida_em = None, None
+                    break
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    raise PoolEsgotadoError(
+                        f"Nenhuma das {self._maximo} conexões do pool foi liberada em {self._timeout}s."
+                    )
+                self._cond.wait(restante)
+
+        # Conectar e testar fora do lock para não travar as outras threads.
+        try:
+            if conn is not None and not self._saudavel(conn, devolvida_em):
+                self._fechar(conn)
+                conn = None
+            if conn is None:
+                conn = psycopg2.connect(self._dsn)
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            fechado = self._fechado
+            if fechado:
+                self._total -= 1
+            else:
+                pilha = traceback.extract_stack(limit=10)[:-1]
+                self._emprestadas[id(conn)] = [conn, time.monotonic(), pilha, False]
+        if fechado:
+            # fechar() rodou enquanto a conexão era aberta ou testada fora do lock.
+            self._fechar(conn)
+            raise PoolFechadoError("O pool de conexões foi fechado.")
+        return conn
+
+    def checkin(self, conn):
+        descartar = bool(conn.closed)
+        if not descartar:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                descartar = True
+
+        with self._cond:
+            self._emprestadas.pop(id(conn), None)
+            descartar = descartar or self._fechado
+            if descartar:
+                self._total -= 1
+            else:
+                self._livres.append((conn, time.monotonic()))
+            self._cond.notify()
+        if descartar:
+            self._fechar(conn)
+
+    def _saudavel(self, conn, devolvida_em):
+        if conn.closed:
+            return False
+        if time.monotonic() - devolvida_em < self._intervalo_healthcheck:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _reportar_vazamentos(self):
+        """Chamado com o lock adquirido. Reporta cada conexão presa apenas uma vez."""
+        agora = time.monotonic()
+        for registro in self._emprestadas.values():
+            _, desde, pilha, ja_reportada = registro
+            if not ja_reportada and agora - desde > self._limite_vazamento:
+                registro[3] = True
+                origem = ''.join(traceback.format_list(pilha))
+                logger.warning("Conexão emprestada há %.1fs sem devolução. Possível vazamento em:\n%s", agora - desde, origem)
+
+    @staticmethod
+    def _fechar(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def status(self):
+        with self._cond:
+            self._reportar_vazamentos()
+            return {
+                "maximo": self._maximo,
+                "abertas": self._total,
+                "livres": len(self._livres),
+                "emprestadas": len(self._emprestadas),
+            }
+
+    def fechar(self):
+        """Fecha as conexões livres; as emprestadas são fechadas no checkin(). Novos checkouts falham."""
+        with self._cond:
+            self._fechado = True
+            for conn, _ in self._livres:
+                self._fechar(conn)
+            self._total -= len(self._livres)
+            self._livres.clear()
+            self._cond.notify_all()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    Cria (uma única vez por processo) o pool a partir da variável de ambiente DATABASE_URL.
     Funciona tanto localmente (lendo o .env) quanto na produção (Render).
     """
+    global _pool
+    if _pool is not None:
+        return _pool
+    with _pool_lock:
+        if _pool is None:
+            db_url = os.environ.get('DATABASE_URL')
+            if not db_url:
+                logger.error("A variável de ambiente DATABASE_URL não foi definida.")
+                return None
+            _pool = PoolDeConexoes(db_url)
+    return _pool
+
+
+@contextmanager
+def get_connection():
+    """
+    Empresta uma conexão do pool e a devolve ao final do bloco 'with'.
+    Entrega None se não for possível conectar, mantendo o padrão 'if conn is None' das funções.
+    """
+    conn = None
+    pool = None
     try:
-        # Pega a única string de conexão do ambiente.
-        db_url = os.environ.get('DATABASE_URL')
-        
-        # =========== LOG DE DIAGNÓSTICO ===========
-        print("--- INICIANDO TENTATIVA DE CONEXÃO ---")
-        print(f"DATABASE_URL lida do ambiente: {db_url}")
-        # ==========================================
-
-        if not db_url:
-            print("ERRO CRÍTICO: A variável de ambiente DATABASE_URL não foi definida ou não foi encontrada.")
-            return None
-            
-        # Conecta usando a URL, que é o método mais robusto.
-        return psycopg2.connect(db_url)
-        
+        pool = get_pool()
+        if pool is not None:
+            conn = pool.checkout()
     except Exception as e:
-        print(f"ERRO DE CONEXÃO AO TENTAR USAR A URL: {e}")
-        return None
+        logger.error("Erro de conexão com o banco: %s", e)
+    try:
+        yield conn
+    finally:
+        if conn is not None:
+            pool.checkin(conn)
+
+
+def fechar_pool():
+    """Fecha as conexões livres do pool (usado no desligamento da API)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.fechar()
+            _pool = None
+
+# --- ESCRITA EM LOTE ---
+# Substituem o executemany (um INSERT e uma ida ao banco por linha) por uma única
+# instrução. Não fazem commit: rodam dentro da transação de quem chamou.
+
+def inserir_em_lote(cur, tabela, colunas, linhas, sufixo="", pagina=1000):
+    """
+    INSERT de várias linhas com um único VALUES (a cada 'pagina' linhas).
+    'sufixo' permite acrescentar ON CONFLICT ... / RETURNING ...; com RETURNING,
+    retorna as linhas devolvidas pelo banco.
+    """
+    linhas = list(linhas)
+    if not linhas:
+        return []
+    sql = f"INSERT INTO {tabela} ({', '.join(colunas)}) VALUES %s {sufixo}"
+    return psycopg2.extras.execute_values(cur, sql, linhas, page_size=pagina, fetch='RETURNING' in sufixo.upper())
+
+
+def copiar_em_lote(cur, tabela, colunas, linhas):
+    """
+    Grava as linhas com COPY ... FROM STDIN: uma única ida ao banco, qualquer que seja o volume.
+    Para inserções simples (sem ON CONFLICT / RETURNING). Retorna o número de linhas gravadas.
+    """
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, lineterminator='\n')
+    total = 0
+    for linha in linhas:
+        # No formato CSV do COPY, campo vazio sem aspas é NULL.
+        escritor.writerow(['' if valor is None else valor for valor in linha])
+        total += 1
+    if total == 0:
+        return 0
+    buffer.seek(0)
+    cur.copy_expert(f"COPY {tabela} ({', '.join(colunas)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    return total
 
 # --- FUNÇÕES DE AUTENTICAÇÃO PURAS ---
 
 def verificar_login_puro(username, password):
     """Verifica o login e retorna o id_ministerio. Sem dependências do Streamlit."""
-    conn = ensure_connection()
-    if conn is None: return None
-    
-    id_ministerio = None
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT password_hash, id_ministerio FROM usuarios WHERE username = %s", (username,))
-            result = cur.fetchone()
-            if result:
-                password_hash_from_db, id_ministerio_from_db = result
-                if check_password_hash(password_hash_from_db, password):
-                    id_ministerio = id_ministerio_from_db
-    except Exception as e:
-        print(f"Erro durante a verificação de login: {e}")
-        return None
-    finally:
-        if conn: conn.close()
-    return id_ministerio
+    with get_connection() as conn:
+        if conn is None: return None
+
+        id_ministerio = None
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT password_hash, id_ministerio FROM usuarios WHERE username = %s", (username,))
+                result = cur.fetchone()
+                if result:
+                    password_hash_from_db, id_ministerio_from_db = result
+                    if check_password_hash(password_hash_from_db, password):
+                        id_ministerio = id_ministerio_from_db
+        except Exception as e:
+            logger.exception("Erro durante a verificação de login")
+            return None
+        return id_ministerio
 
 def criar_usuario_puro(username, password, id_ministerio):
     """Cria um novo usuário. Sem dependências do Streamlit."""
-    conn = ensure_connection()
-    if conn is None: return False
-    try:
-        with conn.cursor() as cur:
-            password_hash = generate_password_hash(password)
-            cur.execute(
-                "INSERT INTO usuarios (username, password_hash, id_ministerio) VALUES (%s, %s, %s)",
-                (username, password_hash, id_ministerio)
-            )
-        conn.commit()
-        return True
-    except Exception as e:
-        conn.rollback()
-        print(f"Erro ao criar usuário: {e}")
-        return False
+    with get_connection() as conn:
+        if conn is None: return False
+        try:
+            with conn.cursor() as cur:
+                password_hash = generate_password_hash(password)
+                cur.execute(
+                    "INSERT INTO usuarios (username, password_hash, id_ministerio) VALUES (%s, %s, %s)",
+                    (username, password_hash, id_ministerio)
+                )
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            logger.exception("Erro ao criar usuário")
+            return False
 
 def get_all_ministerios_puro():
     """Busca todos os ministérios. Sem dependências do Streamlit."""
-    conn = ensure_connection()
-    if conn is None: return pd.DataFrame()
-    try:
-        query = "SELECT id_ministerio, nome_ministerio FROM ministerios ORDER BY nome_ministerio"
-        return pd.read_sql(query, conn)
-    except Exception as e:
-        print(f"Erro ao buscar ministérios: {e}")
-        return pd.DataFrame()
-    finally:
-        if conn: conn.close()
\ No newline at end of file
+    with get_connection() as conn:
+        if conn is None: return pd.DataFrame()
+        try:
+            query = "SELECT id_ministerio, nome_ministerio FROM ministerios ORDER BY nome_ministerio"
+            return pd.read_sql(query, conn)
+        except Exception as e:
+            logger.exception("Erro ao buscar ministérios")
+            return pd.DataFrame()
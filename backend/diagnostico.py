@@ -0,0 +1,166 @@
+# diagnostico.py - Viabilidade da escala e motivos das vagas que ficaram abertas
+#
+#   limite_superior     - antes do motor: quantas vagas, no máximo, dá para preencher em cada
+#                         (função, serviço) e no mês todo. É um fluxo máximo bipartido:
+#                             origem -> voluntário          (capacidade: escalas que ainda pode fazer)
+#                             voluntário -> (voluntário, dia) (1: um serviço por dia)
+#                             (voluntário, dia) -> (função, evento) se elegível
+#                             (função, evento) -> destino    (vagas abertas do par)
+#                         Relaxa as regras de grupo (tudo ou nada, limite do grupo), então
+#                         nenhum motor passa desse número; se a escala ficou longe dele, o
+#                         problema é o motor, se ficou perto, são os dados (cotas, limites...).
+#   motivos_das_vagas   - depois do motor: por que cada vaga aberta ficou aberta, pelo primeiro
+#                         filtro que zera os candidatos (MOTIVOS, na ordem).
+#
+# Candidatos seguem as regras do guloso: individuais só em funções PRINCIPAL / APOIO, membros
+# de grupo em qualquer função do perfil.
+
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from backend.elegibilidade import MatrizElegibilidade
+from backend.modelos_escala import chave_da_entrada
+from backend.motor_escala import vagas_do_snapshot
+
+MOTIVOS = {
+    "sem_funcao": "Nenhum voluntário ativo tem a função.",
+    "disponibilidade": "Quem tem a função não está disponível para o serviço ou marcou indisponibilidade no evento.",
+    "limite": "Todos os disponíveis já atingiram o limite de escalas do mês.",
+    "mesmo_dia": "Todos os disponíveis dentro do limite já servem em outro evento no mesmo dia.",
+    "grupo": "Só membros de grupo poderiam assumir, e o grupo só serve inteiro.",
+    "sem_troca": "Há quem possa assumir; o motor não chegou a essa vaga (tente a busca local ou mais tentativas).",
+}
+
+
+def _candidatos_por_funcao(snapshot):
+    individuais = {f.id_funcao for f in snapshot.funcoes if f.tipo_funcao in ('PRINCIPAL', 'APOIO')}
+    candidatos = defaultdict(list)
+    for v in snapshot.voluntarios:
+        for id_funcao in v.funcoes:
+            if v.id_grupo is not None or id_funcao in individuais:
+                candidatos[id_funcao].append(v)
+    return candidatos
+
+
+def _fluxo_maximo(arestas, capacidade_par, restante):
+    """Valor do fluxo máximo da rede descrita no topo do arquivo; arestas = [(id_voluntario, dia, par)]."""
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import maximum_flow
+
+    nos = {"origem": 0, "destino": 1}
+    de, para, capacidade = [], [], []
+
+    def no(chave):
+        """Índice do nó e se ele acabou de ser criado (para ligar os arcos de capacidade uma só vez)."""
+        novo = chave not in nos
+        if novo:
+            nos[chave] = len(nos)
+        return nos[chave], novo
+
+    def arco(a, b, c):
+        de.append(a)
+        para.append(b)
+        capacidade.append(c)
+
+    for id_voluntario, dia, par in arestas:
+        v, novo = no(("v", id_voluntario))
+        if novo:
+            arco(0, v, restante[id_voluntario])
+        d, novo = no(("d", id_voluntario, dia))
+        if novo:
+            arco(v, d, 1)
+        p, novo = no(("p", par))
+        if novo:
+            arco(p, 1, capacidade_par[par])
+        arco(d, p, 1)
+    if not de:
+        return 0
+    grafo = csr_matrix((np.array(capacidade, dtype=np.int32), (de, para)), shape=(len(nos), len(nos)))
+    return int(maximum_flow(grafo, 0, 1).flow_value)
+
+
+def limite_superior(snapshot, escala_fixa=()):
+    """
+    Teto de vagas preenchíveis do mês e de cada (função, serviço), contando 'escala_fixa'
+    (as alocações que ficam) como já preenchidas.
+    """
+    vagas = vagas_do_snapshot(snapshot)
+    fixas = {chave_da_entrada(e) for e in escala_fixa}
+    abertas = Counter((v.id_funcao, v.id_evento) for v in vagas if v.key not in fixas)
+    servico_do_evento = {ev.id_evento: ev.id_servico_fixo for ev in snapshot.eventos}
+    fixas_por_par = Counter((id_funcao, servico_do_evento.get(id_evento)) for id_evento, id_funcao, _ in fixas)
+
+    matriz = MatrizElegibilidade(snapshot, vagas)
+    matriz.registrar_escala(escala_fixa)
+    ids = [v.id_voluntario for v in snapshot.voluntarios]
+    restante = dict(zip(ids, (max(0, int(r)) for r in matriz.restante[matriz.linhas(ids)]))) if ids else {}
+
+    # Arestas (voluntário, dia) -> (função, evento), separadas por (função, serviço).
+    arestas = defaultdict(list)
+    for id_funcao, candidatos in _candidatos_por_funcao(snapshot).items():
+        mascara = matriz.mascara_eventos([v.id_voluntario for v in candidatos], id_funcao)
+        for i, e in zip(*mascara.nonzero()):
+            ev = snapshot.eventos[e]
+            if (id_funcao, ev.id_evento) in abertas:
+                arestas[(id_funcao, ev.id_servico_fixo)].append((candidatos[i].id_voluntario, ev.data_evento, (id_funcao, ev.id_evento)))
+
+    nomes_funcoes = {f.id_funcao: f.nome_funcao for f in snapshot.funcoes}
+    nomes_servicos = {s.id_servico: s.nome_servico for s in snapshot.servicos}
+    vagas_por_par = Counter((v.id_funcao, v.id_servico_fixo) for v in vagas)
+    por_funcao_servico = []
+    for (id_funcao, id_servico), total in sorted(vagas_por_par.items()):
+        fluxo = _fluxo_maximo(arestas.get((id_funcao, id_servico), ()), abertas, restante)
+        por_funcao_servico.append({
+            "id_funcao": id_funcao, "nome_funcao": nomes_funcoes.get(id_funcao),
+            "id_servico": id_servico, "nome_servico": nomes_servicos.get(id_servico),
+            "vagas": total, "maximo": fixas_por_par[(id_funcao, id_servico)] + fluxo,
+        })
+
+    todas = [a for lista in arestas.values() for a in lista]
+    return {
+        "vagas": len(vagas),
+        "fixas": len(fixas),
+        "maximo": len(fixas) + _fluxo_maximo(todas, abertas, restante),
+        "por_funcao_servico": por_funcao_servico,
+    }
+
+
+def motivos_das_vagas(snapshot, escala):
+    """
+    Motivo de cada vaga que 'escala' deixou aberta, agregado: total por motivo e a lista por
+    (evento, função) com quantas vagas ficaram abertas e o motivo.
+    """
+    vagas = vagas_do_snapshot(snapshot)
+    ocupadas = {chave_da_entrada(e) for e in escala}
+    abertas = Counter((v.id_evento, v.id_funcao) for v in vagas if v.key not in ocupadas)
+    eventos = {ev.id_evento: ev for ev in snapshot.eventos}
+    carga = Counter(e.id_voluntario for e in escala)
+    dias = {(e.id_voluntario, eventos[e.id_evento].data_evento) for e in escala if e.id_evento in eventos}
+    candidatos_por_funcao = _candidatos_por_funcao(snapshot)
+    nomes_funcoes = {f.id_funcao: f.nome_funcao for f in snapshot.funcoes}
+
+    por_motivo = Counter()
+    detalhes = []
+    for (id_evento, id_funcao), quantidade in sorted(abertas.items(), key=lambda item: (eventos[item[0][0]].data_evento, item[0])):
+        ev = eventos[id_evento]
+        candidatos = candidatos_por_funcao.get(id_funcao, [])
+        disponiveis = [v for v in candidatos if ev.id_servico_fixo in v.disponibilidade and id_evento not in v.indisponibilidades]
+        no_limite = [v for v in disponiveis if carga[v.id_voluntario] < v.limite_escalas_mes]
+        livres = [v for v in no_limite if (v.id_voluntario, ev.data_evento) not in dias]
+        if not candidatos: motivo = "sem_funcao"
+        elif not disponiveis: motivo = "disponibilidade"
+        elif not no_limite: motivo = "limite"
+        elif not livres: motivo = "mesmo_dia"
+        elif all(v.id_grupo is not None for v in livres): motivo = "grupo"
+        else: motivo = "sem_troca"
+        por_motivo[motivo] += quantidade
+        detalhes.append({"id_evento": id_evento, "data_evento": ev.data_evento.isoformat(), "id_funcao": id_funcao,
+                         "nome_funcao": nomes_funcoes.get(id_funcao), "vagas_abertas": quantidade, "motivo": motivo,
+                         "candidatos": len(candidatos), "disponiveis": len(disponiveis), "livres": len(livres)})
+
+    return {
+        "vagas_abertas": sum(abertas.values()),
+        "por_motivo": [{"motivo": m, "descricao": MOTIVOS[m], "vagas": por_motivo[m]} for m in MOTIVOS if por_motivo[m]],
+        "vagas": detalhes,
+    }
@@ -0,0 +1,148 @@
+# elegibilidade.py - Matriz de elegibilidade voluntários x vagas
+#
+# Calculada uma vez por execução do motor a partir do snapshot, em forma fatorada:
+#   tem_funcao[v, f]  = o voluntário v tem a função f no perfil;
+#   apto_evento[v, e] = está disponível para o serviço do evento e não declarou
+#                       indisponibilidade para ele.
+# Todas as vagas de uma mesma função em um mesmo evento são equivalentes, então
+# elegível[v, vaga] = tem_funcao[v, funcao(vaga)] & apto_evento[v, evento(vaga)]; a matriz
+# completa (voluntários x vagas) só é montada quando alguém pede tudo de uma vez.
+# As restrições que mudam durante a geração (um serviço por dia, limite mensal) ficam em
+# dois arrays pequenos (dia_ocupado[v, d] e restante[v]), atualizados a cada alocação e
+# aplicados como máscara na hora da consulta.
+
+import numpy as np
+
+from backend.modelos_escala import IndicesSnapshot
+
+
+class MatrizElegibilidade:
+
+    def __init__(self, snapshot, vagas, indices=None):
+        # Linhas e colunas seguem as posições densas de IndicesSnapshot (as mesmas das bitmasks do estado).
+        indices = indices or IndicesSnapshot.do_snapshot(snapshot)
+        voluntarios = snapshot.voluntarios
+        self.ids_voluntarios = np.array([v.id_voluntario for v in voluntarios], dtype=np.int64)
+        self._pos_voluntario = indices.voluntarios
+
+        eventos = snapshot.eventos
+        self._pos_evento = indices.eventos
+        dias = sorted(set(indices.dias))
+        pos_dia = {d: i for i, d in enumerate(dias)}
+        self._pos_funcao = indices.funcoes
+        pos_servico = indices.servicos
+
+        n_vol = len(voluntarios)
+        self.tem_funcao = np.zeros((n_vol, len(self._pos_funcao)), dtype=bool)
+        disponivel = np.zeros((n_vol, len(pos_servico)), dtype=bool)
+        indisponivel = np.zeros((n_vol, len(eventos)), dtype=bool)
+        # Preenchimento em uma única atribuição por matriz, a partir dos pares (linha, coluna).
+        pares = [(i, self._pos_funcao[f]) for i, v in enumerate(voluntarios) for f in v.funcoes]
+        self.tem_funcao[tuple(np.array(pares, dtype=np.intp).reshape(-1, 2).T)] = True
+        pares = [(i, pos_servico[s]) for i, v in enumerate(voluntarios) for s in v.disponibilidade]
+        disponivel[tuple(np.array(pares, dtype=np.intp).reshape(-1, 2).T)] = True
+        pares = [(i, self._pos_evento[e]) for i, v in enumerate(voluntarios) for e in v.indisponibilidades if e in self._pos_evento]
+        indisponivel[tuple(np.array(pares, dtype=np.intp).reshape(-1, 2).T)] = True
+
+        servico_do_evento = np.array([pos_servico[ev.id_servico_fixo] for ev in eventos], dtype=np.intp)
+        self.apto_evento = disponivel[:, servico_do_evento] & ~indisponivel      # (voluntários, eventos)
+        self._dia_do_evento = np.array([pos_dia[d] for d in indices.dias], dtype=np.intp)
+
+        self._vagas = list(vagas)
+        self._pos_vaga = {vaga.key: j for j, vaga in enumerate(self._vagas)}
+        self._evento_da_vaga = np.array([self._pos_evento[vaga.id_evento] for vaga in self._vagas], dtype=np.intp)
+        self._funcao_da_vaga = np.array([self._pos_funcao[vaga.id_funcao] for vaga in self._vagas], dtype=np.intp)
+
+        self.dia_ocupado = np.zeros((n_vol, len(dias)), dtype=bool)
+        self.restante = np.array([v.limite_escalas_mes for v in voluntarios], dtype=np.int64)
+
+    def registrar(self, id_voluntario, vaga):
+        """Aplica as restrições dinâmicas depois de uma alocação."""
+        i = self._pos_voluntario[id_voluntario]
+        self.dia_ocupado[i, self._dia_do_evento[self._pos_evento[vaga.id_evento]]] = True
+        self.restante[i] -= 1
+
+    def liberar(self, id_voluntario, vaga, dia_livre=True):
+        """Desfaz registrar() (o voluntário saiu da vaga); 'dia_livre' = não serve em outro evento do dia."""
+        i = self._pos_voluntario[id_voluntario]
+        if dia_livre:
+            self.dia_ocupado[i, self._dia_do_evento[self._pos_evento[vaga.id_evento]]] = False
+        self.restante[i] += 1
+
+    def bloquear(self, pares):
+        """Tira a aptidão dos pares (id_voluntario, id_evento) do snapshot (ex: indisponibilidade por data)."""
+        pares = [(self._pos_voluntario[v], self._pos_evento[e]) for v, e in pares
+                 if v in self._pos_voluntario and e in self._pos_evento]
+        self.apto_evento[tuple(np.array(pares, dtype=np.intp).reshape(-1, 2).T)] = False
+
+    def registrar_escala(self, escala):
+        """Registra alocações que já existem (ex: as vagas fixadas); ignora quem não está no snapshot."""
+        for entrada in escala:
+            if entrada.id_voluntario in self._pos_voluntario:
+                self.registrar(entrada.id_voluntario, entrada)
+
+    def pode_servir(self, id_voluntario, vaga):
+        i = self._pos_voluntario[id_voluntario]
+        e = self._pos_evento[vaga.id_evento]
+        return bool(self.restante[i] > 0
+                    and self.tem_funcao[i, self._pos_funcao[vaga.id_funcao]]
+                    and self.apto_evento[i, e]
+                    and not self.dia_ocupado[i, self._dia_do_evento[e]])
+
+    def linhas(self, ids_voluntarios):
+        """Posições dos voluntários na matriz (para as consultas em bloco)."""
+        return np.array([self._pos_voluntario[v] for v in ids_voluntarios], dtype=np.intp)
+
+    def todos_livres(self, linhas, evento):
+        """True se nenhum dos voluntários já serve no dia do evento e todos ainda têm escalas no mês."""
+        dia = self._dia_do_evento[self._pos_evento[evento.id_evento]]
+        return not self.dia_ocupado[linhas, dia].any() and bool((self.restante[linhas] > 0).all())
+
+    def mascara_eventos(self, ids_voluntarios, id_funcao):
+        """
+        Elegibilidade atual de vários voluntários para as vagas de UMA função, em uma só
+        operação: matriz (candidatos x eventos), indexada por posicao_evento().
+        A linha de um voluntário só muda quando ele mesmo é alocado.
+        """
+        linhas = self.linhas(ids_voluntarios)
+        f = self._pos_funcao.get(id_funcao)
+        if f is None:
+            return np.zeros((len(linhas), len(self._pos_evento)), dtype=bool)
+        return (self.apto_evento[linhas]
+                & ~self.dia_ocupado[linhas][:, self._dia_do_evento]
+                & (self.tem_funcao[linhas, f] & (self.restante[linhas] > 0))[:, None])
+
+    def posicao_evento(self, vaga):
+        return self._pos_evento[vaga.id_evento]
+
+    def mascara_vagas(self):
+        """Matriz (voluntários x vagas) com a elegibilidade atual de todos para todas as vagas."""
+        return (self.tem_funcao[:, self._funcao_da_vaga]
+                & self.apto_evento[:, self._evento_da_vaga]
+                & ~self.dia_ocupado[:, self._dia_do_evento[self._evento_da_vaga]]
+                & (self.restante > 0)[:, None])
+
+    def mascara_pares(self, pares):
+        """
+        Elegibilidade atual (voluntários x pares) para os pares (id_evento, id_funcao); as
+        vagas de um mesmo par são equivalentes, então é a coluna de elegiveis() de cada uma.
+        """
+        e = np.array([self._pos_evento[id_evento] for id_evento, _ in pares], dtype=np.intp)
+        f = np.array([self._pos_funcao[id_funcao] for _, id_funcao in pares], dtype=np.intp)
+        return (self.tem_funcao[:, f]
+                & self.apto_evento[:, e]
+                & ~self.dia_ocupado[:, self._dia_do_evento[e]]
+                & (self.restante > 0)[:, None])
+
+    def posicao_vaga(self, vaga):
+        """Coluna da vaga em mascara_vagas()."""
+        return self._pos_vaga[vaga.key]
+
+    def elegiveis(self, vaga):
+        """Ids dos voluntários que podem assumir a vaga agora."""
+        e = self._pos_evento[vaga.id_evento]
+        coluna = (self.tem_funcao[:, self._pos_funcao[vaga.id_funcao]]
+                  & self.apto_evento[:, e]
+                  & ~self.dia_ocupado[:, self._dia_do_evento[e]]
+                  & (self.restante > 0))
+        return self.ids_voluntarios[coluna]
@@ -0,0 +1,169 @@
+# indice_elegibilidade.py - Elegibilidade de todas as vagas de um mês, para o editor da escala
+#
+# O editor abre a lista de quem pode assumir uma vaga. Em vez de uma consulta por vaga, um
+# IndiceMes guarda, por (ministério, ano, mês), a MatrizElegibilidade do snapshot da geração
+# (função, disponibilidade para o serviço, indisponibilidade no evento) com as alocações da
+# escala publicada registradas (dia ocupado e escalas restantes no mês), mais as datas em que
+# o voluntário se declarou indisponível (voluntario_indisponibilidade_datas), que valem para
+# todos os eventos do dia. Quem consulta (database.elegibilidade_do_mes):
+#   - com um índice válido, lê só o diário desde o cursor do índice (alteracoes_desde), fora
+#     do lock do índice, e aplica as vagas que mudaram: tira o ocupante antigo, registra o novo;
+#   - se o mês inteiro mudou (geração, reversão, eventos recriados), monta de novo.
+# Mudanças de cadastro: as que já sobem a época do cache_escala (funções, serviços, cotas,
+# dados do voluntário) e as que só mexem na elegibilidade (funções, disponibilidade,
+# indisponibilidades e datas indisponíveis do voluntário, voluntário novo ou inativado),
+# que chamam invalidar().
+# TTL_SEGUNDOS limita o atraso para cadastros mudados em outro worker.
+#
+#   ESCALA_INDICE_MESES - índices em memória por processo (padrão 32; 0 desliga);
+#   ESCALA_INDICE_TTL   - segundos de validade de cada índice (padrão 300).
+
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+
+import numpy as np
+
+from backend import cache_escala
+from backend.elegibilidade import MatrizElegibilidade
+from backend.modelos_escala import EscalaEntry, chave_da_entrada
+from backend.motor_escala import vagas_do_snapshot
+
+MAX_MESES = int(os.environ.get('ESCALA_INDICE_MESES', 32))
+TTL_SEGUNDOS = float(os.environ.get('ESCALA_INDICE_TTL', 300))
+
+_lock = threading.Lock()
+_epoca = 0
+_indices = OrderedDict()   # (id_ministerio, ano, mes) -> (validade, criado_em, IndiceMes), do menos para o mais usado
+
+
+class IndiceMes:
+    """Elegibilidade do mês com as alocações atuais; 'versao' é o cursor do diário já aplicado."""
+
+    def __init__(self, snapshot, escala, versao, datas_indisponiveis=()):
+        """'datas_indisponiveis': pares (id_voluntario, data) do mês; bloqueiam todos os eventos da data."""
+        self.snapshot = snapshot
+        self.versao = versao
+        self.lock = threading.Lock()   # aplicar() e como_dict() de requisições concorrentes
+        self.vagas = vagas_do_snapshot(snapshot)
+        self.matriz = MatrizElegibilidade(snapshot, self.vagas)
+        self._voluntarios = {v.id_voluntario for v in snapshot.voluntarios}
+        self._dias = {ev.id_evento: ev.data_evento for ev in snapshot.eventos}
+        eventos_do_dia = defaultdict(list)
+        for ev in snapshot.eventos:
+            eventos_do_dia[ev.data_evento].append(ev.id_evento)
+        self.matriz.bloquear([(id_voluntario, id_evento) for id_voluntario, data in datas_indisponiveis
+                              for id_evento in eventos_do_dia.get(data, ())])
+        self._reservas = Counter()     # (id_voluntario, dia) -> vagas em que serve no dia
+        self.ocupantes = {}            # (id_evento, id_funcao, funcao_instancia) -> EscalaEntry
+        for entrada in escala:
+            self._ocupar(entrada)
+
+    def _conta(self, entrada):
+        """Só alocações de voluntários ativos em eventos do snapshot entram nas restrições."""
+        return entrada.id_voluntario in self._voluntarios and entrada.id_evento in self._dias
+
+    def _ocupar(self, entrada):
+        self.ocupantes[chave_da_entrada(entrada)] = entrada
+        if self._conta(entrada):
+            self._reservas[(entrada.id_voluntario, self._dias[entrada.id_evento])] += 1
+            self.matriz.registrar(entrada.id_voluntario, entrada)
+
+    def _desocupar(self, chave):
+        entrada = self.ocupantes.pop(chave, None)
+        if entrada is not None and self._conta(entrada):
+            dia = (entrada.id_voluntario, self._dias[entrada.id_evento])
+            self._reservas[dia] -= 1
+            self.matriz.liberar(entrada.id_voluntario, entrada, dia_livre=self._reservas[dia] == 0)
+
+    def aplicar(self, mudancas, versao):
+        """
+        Aplica as vagas de alteracoes_desde (ocupante atual de cada uma) e avança o cursor.
+        Leituras feitas fora do lock podem chegar fora de ordem: uma que não passa do cursor
+        atual é ignorada; uma mais nova cobre tudo desde o seu 'desde', que é <= o cursor.
+        """
+        if versao <= self.versao:
+            return
+        for m in mudancas:
+            chave = (m["id_evento"], m["id_funcao"], m["funcao_instancia"])
+            self._desocupar(chave)
+            if m["id_voluntario"] is not None:
+                self._ocupar(EscalaEntry(m["id_evento"], m["id_funcao"], m["id_voluntario"], m["funcao_instancia"]))
+        self.versao = versao
+
+    def como_dict(self):
+        """
+        Para cada (evento, função) com vagas no mês: as instâncias abertas e os ids de quem pode
+        assumir agora (por nome); mais os voluntários, com escalas no mês e limite.
+        """
+        voluntarios = self.snapshot.voluntarios
+        ordem = np.array(sorted(range(len(voluntarios)), key=lambda i: (voluntarios[i].nome_voluntario or "", voluntarios[i].id_voluntario)),
+                         dtype=np.intp)
+        pares = list(dict.fromkeys((v.id_evento, v.id_funcao) for v in self.vagas))
+        abertas = defaultdict(list)
+        for v in self.vagas:
+            if v.key not in self.ocupantes:
+                abertas[(v.id_evento, v.id_funcao)].append(v.funcao_instancia)
+        if pares and len(ordem):
+            mascara = self.matriz.mascara_pares(pares)[ordem]
+            ids = self.matriz.ids_voluntarios[ordem]
+            elegiveis = [ids[mascara[:, j]].tolist() for j in range(len(pares))]
+        else:
+            elegiveis = [[] for _ in pares]
+        return {
+            "ano": self.snapshot.ano,
+            "mes": self.snapshot.mes,
+            "versao": self.versao,
+            "voluntarios": [
+                {"id_voluntario": voluntarios[i].id_voluntario, "nome_voluntario": voluntarios[i].nome_voluntario,
+                 "escalas": int(voluntarios[i].limite_escalas_mes - self.matriz.restante[i]),
+                 "limite_escalas_mes": voluntarios[i].limite_escalas_mes}
+                for i in ordem
+            ],
+            "vagas": [
+                {"id_evento": id_evento, "id_funcao": id_funcao, "instancias_abertas": abertas.get((id_evento, id_funcao), []),
+                 "elegiveis": lista}
+                for (id_evento, id_funcao), lista in zip(pares, elegiveis)
+            ],
+        }
+
+
+def validade_atual(id_ministerio, ano, mes):
+    """Pegar ANTES de carregar os dados do índice e passar a mesma para guardar()."""
+    with _lock:
+        return (cache_escala.versao_do_mes(id_ministerio, ano, mes)[0], _epoca)
+
+
+def invalidar():
+    """Cadastro que muda a elegibilidade de todos os meses (ex: disponibilidade de um voluntário)."""
+    global _epoca
+    with _lock:
+        _epoca += 1
+        _indices.clear()
+
+
+def obter(id_ministerio, ano, mes):
+    """IndiceMes válido do mês, ou None."""
+    chave = (id_ministerio, ano, mes)
+    validade = validade_atual(id_ministerio, ano, mes)
+    with _lock:
+        item = _indices.get(chave)
+        if item is None:
+            return None
+        if item[0] != validade or time.monotonic() - item[1] > TTL_SEGUNDOS:
+            del _indices[chave]
+            return None
+        _indices.move_to_end(chave)
+        return item[2]
+
+
+def guardar(id_ministerio, ano, mes, indice, validade):
+    """Guarda o índice montado na 'validade' (de validade_atual); se o cadastro mudou nesse meio tempo, não guarda."""
+    chave = (id_ministerio, ano, mes)
+    with _lock:
+        if MAX_MESES > 0 and validade == (cache_escala.versao_do_mes(id_ministerio, ano, mes)[0], _epoca):
+            _indices[chave] = (validade, time.monotonic(), indice)
+            _indices.move_to_end(chave)
+            while len(_indices) > MAX_MESES:
+                _indices.popitem(last=False)
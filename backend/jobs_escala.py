@@ -0,0 +1,406 @@
+# jobs_escala.py - Fila de jobs da geração de escala
+#
+# POST /escala/gerar só cria o job e devolve o id; a geração (database.gerar_escala_automatica)
+# roda em um pool de threads deste processo, e o frontend consulta GET /escala/jobs/{id_job}
+# até o status virar 'concluido' ou 'erro'.
+#
+# Status: pendente -> executando -> concluido | erro
+# Fases (durante 'executando'): carga, grupos, individuais (ou tentativas, no best-of-N),
+# busca_local, otimizacao (motores flow/milp) e gravacao.
+#
+# O estado vive em memória (consulta barata, sem ir ao banco) e é espelhado na tabela
+# 'jobs_escala' (migração 2) a cada mudança de status/fase e, no meio de uma fase, no
+# máximo a cada INTERVALO_GRAVACAO segundos. Assim o job continua consultável por outro
+# worker do gunicorn e depois de um restart.
+#
+# Single-flight: só existe uma geração ativa por (ministério, ano, mês). Um segundo pedido
+# (clique duplo, dois líderes) recebe o job que já está rodando, com 'reaproveitado': True,
+# e acompanha o mesmo resultado. Neste processo isso é decidido em memória; entre workers,
+# pelo índice único parcial da tabela (migração 3). A gravação em si ainda passa pelo
+# advisory lock do mês (database.travar_escala_do_mes).
+#
+# Dono: cada processo tem um id (DONO), gravado nos jobs que cria, e uma thread que a cada
+# INTERVALO_BATIMENTO segundos renova a linha dele em 'jobs_escala_donos' (migração 8). Um
+# job 'pendente'/'executando' cujo dono não bate há BATIMENTOS_PERDIDOS intervalos morreu
+# com o processo: vira 'erro' na subida da API, a cada batimento de qualquer processo e
+# antes de criar um job do mesmo mês. Depois de um crash, o mês fica preso por segundos.
+#
+# Rastro: o log de cada execução (registro.capturar_rastro), com as alocações em nível DEBUG,
+# fica no job em memória e sai em GET /escala/jobs/{id_job}/rastro; não vai para o banco.
+
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+from psycopg2.extras import Json
+
+from backend import database
+from backend.db_utils import get_connection
+from backend.registro import capturar_rastro
+
+logger = logging.getLogger(__name__)
+
+# A geração é longa e usa CPU; poucas ao mesmo tempo, em threads próprias, para não
+# ocupar as que atendem as consultas curtas da API.
+MAX_JOBS_SIMULTANEOS = int(os.environ.get('ESCALA_JOBS_SIMULTANEOS', 2))
+INTERVALO_GRAVACAO = 1.0
+# Jobs terminados que ficam em memória; os mais antigos continuam no banco.
+MAX_JOBS_EM_MEMORIA = 200
+# Batimento do processo dono dos jobs; sem batimento por BATIMENTOS_PERDIDOS intervalos, o dono morreu.
+INTERVALO_BATIMENTO = float(os.environ.get('ESCALA_JOBS_BATIMENTO', 10))
+BATIMENTOS_PERDIDOS = 3
+DONO = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+STATUS_FINAIS = ("concluido", "erro")
+# Contadores que valem para o job inteiro; os demais (rodada, grupos, ...) são da fase.
+_CONTADORES_GERAIS = ("vagas", "alocacoes")
+
+_executor_jobs = ThreadPoolExecutor(max_workers=MAX_JOBS_SIMULTANEOS, thread_name_prefix="job-escala")
+_jobs = {}
+_em_andamento = {}        # (id_ministerio, ano, mes) -> JobEscala ativo neste processo
+_trava_submissao = threading.Lock()   # serializa as submissões deste processo (só a ida ao banco)
+_lock = threading.Lock()
+_parar_batimento = threading.Event()
+_thread_batimento = None
+
+
+def _agora():
+    return datetime.now(timezone.utc)
+
+
+@dataclass
+class JobEscala:
+    id_job: str
+    id_ministerio: int
+    ano: int
+    mes: int
+    parametros: dict = field(default_factory=dict)
+    status: str = "pendente"
+    fase: str | None = None
+    progresso: dict = field(default_factory=dict)
+    resultado: dict | None = None
+    erro: str | None = None
+    criado_em: datetime = field(default_factory=_agora)
+    iniciado_em: datetime | None = None
+    concluido_em: datetime | None = None
+    gravado_em: float = field(default=0.0, repr=False)
+    # Registros de log da execução (registro.capturar_rastro); só em memória, não vão ao banco.
+    rastro: list | None = field(default=None, repr=False)
+
+    @property
+    def chave(self):
+        return (self.id_ministerio, self.ano, self.mes)
+
+    def como_dict(self):
+        return {
+            "id_job": self.id_job,
+            "id_ministerio": self.id_ministerio,
+            "ano": self.ano,
+            "mes": self.mes,
+            "parametros": dict(self.parametros),
+            "status": self.status,
+            "fase": self.fase,
+            "progresso": dict(self.progresso),
+            "resultado": self.resultado,
+            "erro": self.erro,
+            "criado_em": self.criado_em,
+            "iniciado_em": self.iniciado_em,
+            "concluido_em": self.concluido_em,
+        }
+
+
+# --- PERSISTÊNCIA ---
+
+_COLUNAS = ("id_job", "id_ministerio", "ano", "mes", "parametros", "status", "fase", "progresso",
+            "resultado", "erro", "criado_em", "iniciado_em", "concluido_em")
+
+
+# Jobs sem dono (criados antes da migração 8) também contam como órfãos.
+_SQL_MARCAR_ABANDONADOS = """
+    UPDATE jobs_escala j
+    SET status = 'erro', erro = 'A geração foi interrompida (o servidor reiniciou). Gere novamente.',
+        concluido_em = now(), atualizado_em = now()
+    WHERE status IN ('pendente', 'executando')
+      AND NOT EXISTS (
+          SELECT 1 FROM jobs_escala_donos d
+          WHERE d.dono = j.dono AND d.visto_em > now() - make_interval(secs => %s)
+      )
+"""
+
+_SQL_BATIMENTO = """
+    INSERT INTO jobs_escala_donos (dono) VALUES (%s)
+    ON CONFLICT (dono) DO UPDATE SET visto_em = now()
+"""
+
+
+def _limite_batimento():
+    return INTERVALO_BATIMENTO * BATIMENTOS_PERDIDOS
+
+
+def _inserir(job):
+    """
+    Grava o job novo. Se outro worker já tem uma geração ativa do mesmo mês (o índice
+    único parcial recusa a linha), não grava e retorna o estado daquele job; senão, None.
+    """
+    with get_connection() as conn:
+        if conn is None:
+            logger.warning("Job %s não foi gravado no banco (sem conexão).", job.id_job)
+            return None
+        try:
+            with conn.cursor() as cur:
+                # Um job órfão do mesmo mês não pode bloquear a geração nova.
+                cur.execute(_SQL_BATIMENTO, (DONO,))
+                cur.execute(_SQL_MARCAR_ABANDONADOS + " AND id_ministerio = %s AND ano = %s AND mes = %s",
+                            (_limite_batimento(), *job.chave))
+                cur.execute(
+                    """INSERT INTO jobs_escala (id_job, id_ministerio, ano, mes, parametros, status, criado_em, dono)
+                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                       ON CONFLICT DO NOTHING
+                       RETURNING id_job""",
+                    (job.id_job, job.id_ministerio, job.ano, job.mes, Json(job.parametros), job.status, job.criado_em, DONO)
+                )
+                inserido = cur.fetchone() is not None
+                existente = None
+                if not inserido:
+                    cur.execute(
+                        f"""SELECT {', '.join(_COLUNAS)} FROM jobs_escala
+                            WHERE id_ministerio = %s AND ano = %s AND mes = %s AND status IN ('pendente', 'executando')""",
+                        job.chave
+                    )
+                    linha = cur.fetchone()
+                    existente = dict(zip(_COLUNAS, linha)) if linha else None
+            conn.commit()
+            return existente
+        except Exception as e:
+            conn.rollback()
+            logger.exception("Não foi possível gravar o job %s", job.id_job)
+            return None
+
+
+def _gravar(dados):
+    """Grava o estado do job ('dados' é um como_dict(), tirado sob o lock)."""
+    with get_connection() as conn:
+        if conn is None:
+            return
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """UPDATE jobs_escala
+                       SET status = %s, fase = %s, progresso = %s, resultado = %s, erro = %s,
+                           iniciado_em = %s, concluido_em = %s, atualizado_em = now()
+                       WHERE id_job = %s""",
+                    (dados["status"], dados["fase"], Json(dados["progresso"]),
+                     Json(dados["resultado"]) if dados["resultado"] is not None else None,
+                     dados["erro"], dados["iniciado_em"], dados["concluido_em"], dados["id_job"])
+                )
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.exception("Não foi possível atualizar o job %s", dados['id_job'])
+
+
+def _ler(id_job):
+    with get_connection() as conn:
+        if conn is None:
+            return None
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT {', '.join(_COLUNAS)} FROM jobs_escala WHERE id_job = %s", (id_job,))
+                linha = cur.fetchone()
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.exception("Erro ao consultar o job %s", id_job)
+            return None
+    return dict(zip(_COLUNAS, linha)) if linha else None
+
+
+def _bater():
+    """Renova o batimento deste processo e marca como erro os jobs de donos mortos. Retorna quantos."""
+    with get_connection() as conn:
+        if conn is None:
+            return 0
+        try:
+            with conn.cursor() as cur:
+                cur.execute(_SQL_BATIMENTO, (DONO,))
+                cur.execute(_SQL_MARCAR_ABANDONADOS, (_limite_batimento(),))
+                total = cur.rowcount
+                # Donos mortos há mais de um dia já não têm jobs ativos.
+                cur.execute("DELETE FROM jobs_escala_donos WHERE visto_em < now() - interval '1 day'")
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.exception("Não foi possível verificar os jobs abandonados")
+            return 0
+    if total:
+        logger.info("%s job(s) de geração interrompido(s) marcado(s) como erro.", total)
+    return total
+
+
+def _batimentos():
+    while not _parar_batimento.wait(INTERVALO_BATIMENTO):
+        try:
+            _bater()
+        except Exception:
+            logger.exception("Erro no batimento dos jobs de geração")
+
+
+def marcar_jobs_abandonados():
+    """
+    Chamado no início da API: registra este processo como dono, marca como erro os jobs
+    'pendente'/'executando' cujo dono não bate mais (o processo que os rodava caiu) e
+    inicia a thread de batimento, que repete isso a cada INTERVALO_BATIMENTO segundos.
+    """
+    global _thread_batimento
+    total = _bater()
+    with _lock:
+        if _thread_batimento is None:
+            _parar_batimento.clear()
+            _thread_batimento = threading.Thread(target=_batimentos, name="batimento-jobs", daemon=True)
+            _thread_batimento.start()
+    return total
+
+
+# --- EXECUÇÃO ---
+
+def _atualizar(job, forcar=False, **campos):
+    """Aplica 'campos' ao job e grava no banco se for mudança de status/fase ou se já deu o intervalo."""
+    with _lock:
+        for nome, valor in campos.items():
+            setattr(job, nome, valor)
+        agora = time.monotonic()
+        if not forcar and agora - job.gravado_em < INTERVALO_GRAVACAO:
+            return
+        job.gravado_em = agora
+        dados = job.como_dict()
+    _gravar(dados)
+
+
+def _callback_progresso(job):
+    def progresso(fase, **contadores):
+        with _lock:
+            mudou_fase = fase != job.fase
+            if mudou_fase:
+                job.progresso = {k: v for k, v in job.progresso.items() if k in _CONTADORES_GERAIS}
+            novo = {**job.progresso, **contadores}
+        _atualizar(job, forcar=mudou_fase, fase=fase, progresso=novo)
+    return progresso
+
+
+def _executar(job):
+    try:
+        with capturar_rastro(id_job=job.id_job) as rastro:
+            try:
+                _rodar(job)
+            finally:
+                job.rastro = rastro.linhas
+    finally:
+        with _lock:
+            if _em_andamento.get(job.chave) is job:
+                del _em_andamento[job.chave]
+
+
+def _rodar(job):
+    _atualizar(job, forcar=True, status="executando", iniciado_em=_agora())
+    try:
+        resultado = database.gerar_escala_automatica(job.ano, job.mes, job.id_ministerio,
+                                                     progresso=_callback_progresso(job), **job.parametros)
+    except Exception:
+        logger.exception("Erro no job de geração %s", job.id_job)
+        _atualizar(job, forcar=True, status="erro", erro="Ocorreu um erro interno ao gerar a escala.", concluido_em=_agora())
+        return
+    if resultado.get("status") in ("error", "conflict"):
+        _atualizar(job, forcar=True, status="erro", resultado=resultado, erro=resultado["message"], concluido_em=_agora())
+    else:
+        _atualizar(job, forcar=True, status="concluido", resultado=resultado, concluido_em=_agora())
+
+
+def _descartar_antigos():
+    """Mantém em memória só os MAX_JOBS_EM_MEMORIA jobs terminados mais recentes (chamar com _lock)."""
+    terminados = [j for j in _jobs.values() if j.status in STATUS_FINAIS]
+    for job in terminados[:max(0, len(terminados) - MAX_JOBS_EM_MEMORIA)]:
+        del _jobs[job.id_job]
+
+
+def submeter_geracao(id_ministerio, ano, mes, motor="greedy", tempo_limite=None, tentativas=1, busca_local=True, modo="completo"):
+    """
+    Cria o job, enfileira a geração e retorna o estado inicial (como_dict) sem esperar.
+    Se o mês já tem uma geração ativa, retorna o job dela (com os parâmetros dela) em vez
+    de criar outro; 'reaproveitado' diz qual dos dois casos foi.
+    """
+    chave = (id_ministerio, ano, mes)
+    # A trava cobre a ida ao banco: pedidos simultâneos neste processo esperam aqui e
+    # depois encontram o job em _em_andamento. Uma só para todos os meses: a submissão
+    # é um INSERT curto, e assim não sobra uma trava por mês já gerado.
+    with _trava_submissao:
+        with _lock:
+            ativo = _em_andamento.get(chave)
+            if ativo is not None and ativo.status not in STATUS_FINAIS:
+                return {**ativo.como_dict(), "reaproveitado": True}
+
+        parametros = {"motor": motor, "tempo_limite": tempo_limite, "tentativas": tentativas, "busca_local": busca_local, "modo": modo}
+        job = JobEscala(id_job=uuid.uuid4().hex, id_ministerio=id_ministerio, ano=ano, mes=mes, parametros=parametros)
+        existente = _inserir(job)
+        if existente is not None:
+            logger.info("Geração de %s/%s já está rodando em outro worker (job %s).", mes, ano, existente['id_job'])
+            return {**existente, "reaproveitado": True}
+
+        with _lock:
+            _descartar_antigos()
+            _jobs[job.id_job] = job
+            _em_andamento[chave] = job
+            dados = job.como_dict()
+        _executor_jobs.submit(_executar, job)
+    return {**dados, "reaproveitado": False}
+
+
+def consultar_job(id_job):
+    """Estado do job (como_dict), da memória ou, se ele rodou em outro processo, do banco; None se não existe."""
+    with _lock:
+        job = _jobs.get(id_job)
+        if job is not None:
+            return job.como_dict()
+    return _ler(id_job)
+
+
+def rastro_do_job(id_job):
+    """
+    Registros de log da execução do job (inclusive os DEBUG de cada alocação), em ordem.
+    None se o job não está na memória deste processo (rodou em outro worker ou antes de um restart);
+    lista vazia se ainda não terminou.
+    """
+    with _lock:
+        job = _jobs.get(id_job)
+        if job is None:
+            return None
+        return {"id_job": job.id_job, "id_ministerio": job.id_ministerio, "status": job.status, "linhas": job.rastro or []}
+
+
+def encerrar_jobs():
+    """
+    Chamado no desligamento da API: descarta os pendentes, espera os que estão rodando, para
+    o batimento e tira este processo dos donos, o que já leva os pendentes descartados a 'erro'.
+    """
+    global _thread_batimento
+    _executor_jobs.shutdown(wait=True, cancel_futures=True)
+    _parar_batimento.set()
+    if _thread_batimento is not None:
+        _thread_batimento.join()
+        _thread_batimento = None
+    with get_connection() as conn:
+        if conn is None:
+            return
+        try:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM jobs_escala_donos WHERE dono = %s", (DONO,))
+                cur.execute(_SQL_MARCAR_ABANDONADOS, (_limite_batimento(),))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            logger.exception("Não foi possível encerrar os jobs deste processo")
@@ -0,0 +1,275 @@
+# migrations.py - Migrações versionadas do esquema do banco
+#
+# Cada migração tem um número de versão, uma descrição e uma lista de comandos SQL.
+# As versões já aplicadas ficam registradas na tabela 'schema_migrations'; só as
+# pendentes rodam, cada uma na sua própria transação.
+#
+# Uso manual:  python -m backend.migrations
+# A API também aplica as pendentes ao iniciar (ver api.py).
+
+import logging
+
+from backend.db_utils import get_connection
+
+logger = logging.getLogger(__name__)
+
+# Chave fixa do advisory lock: impede que dois workers do gunicorn migrem ao mesmo tempo.
+_LOCK_MIGRACOES = 7_301_001
+
+MIGRACOES = [
+    (
+        1,
+        "Índices dos caminhos quentes (eventos do mês, escala, cotas, voluntários)",
+        [
+            "CREATE INDEX IF NOT EXISTS idx_eventos_data_evento ON eventos (data_evento)",
+            "CREATE INDEX IF NOT EXISTS idx_escala_evento_funcao_instancia ON escala (id_evento, id_funcao, funcao_instancia)",
+            "CREATE INDEX IF NOT EXISTS idx_voluntario_funcoes_funcao ON voluntario_funcoes (id_funcao)",
+            "CREATE INDEX IF NOT EXISTS idx_voluntarios_ministerio_ativo ON voluntarios (id_ministerio, ativo)",
+            "CREATE INDEX IF NOT EXISTS idx_vol_indisp_eventos_evento ON voluntario_indisponibilidade_eventos (id_evento)",
+            "CREATE INDEX IF NOT EXISTS idx_vol_indisp_datas_voluntario_data ON voluntario_indisponibilidade_datas (id_voluntario, data_indisponivel)",
+        ],
+    ),
+    (
+        2,
+        "Tabela de jobs da geração de escala (ver jobs_escala.py)",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS jobs_escala (
+                id_job TEXT PRIMARY KEY,
+                id_ministerio INTEGER NOT NULL,
+                ano INTEGER NOT NULL,
+                mes INTEGER NOT NULL,
+                parametros JSONB NOT NULL DEFAULT '{}',
+                status TEXT NOT NULL,
+                fase TEXT,
+                progresso JSONB NOT NULL DEFAULT '{}',
+                resultado JSONB,
+                erro TEXT,
+                criado_em TIMESTAMPTZ NOT NULL DEFAULT now(),
+                iniciado_em TIMESTAMPTZ,
+                concluido_em TIMESTAMPTZ,
+                atualizado_em TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_jobs_escala_ministerio_criado ON jobs_escala (id_ministerio, criado_em DESC)",
+            "CREATE INDEX IF NOT EXISTS idx_jobs_escala_status ON jobs_escala (status) WHERE status IN ('pendente', 'executando')",
+        ],
+    ),
+    (
+        3,
+        "No máximo um job de geração ativo por ministério e mês",
+        [
+            # Se já houver duplicados, fica o mais recente; os outros viram erro.
+            """
+            UPDATE jobs_escala j
+            SET status = 'erro', erro = 'Substituído por outra geração do mesmo mês.', concluido_em = now(), atualizado_em = now()
+            WHERE status IN ('pendente', 'executando')
+              AND EXISTS (
+                  SELECT 1 FROM jobs_escala o
+                  WHERE o.id_ministerio = j.id_ministerio AND o.ano = j.ano AND o.mes = j.mes
+                    AND o.status IN ('pendente', 'executando') AND o.criado_em > j.criado_em
+              )
+            """,
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS uq_jobs_escala_mes_ativo ON jobs_escala (id_ministerio, ano, mes)
+            WHERE status IN ('pendente', 'executando')
+            """,
+        ],
+    ),
+    (
+        4,
+        "Versões da escala: rascunho, ponteiro da versão publicada e view escala_vigente",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS escala_versoes (
+                id_versao BIGSERIAL PRIMARY KEY,
+                id_ministerio INTEGER NOT NULL,
+                ano INTEGER NOT NULL,
+                mes INTEGER NOT NULL,
+                origem TEXT NOT NULL,
+                criado_em TIMESTAMPTZ NOT NULL DEFAULT now(),
+                publicada_em TIMESTAMPTZ
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_escala_versoes_mes ON escala_versoes (id_ministerio, ano, mes)",
+            """
+            CREATE TABLE IF NOT EXISTS escala_publicada (
+                id_ministerio INTEGER NOT NULL,
+                ano INTEGER NOT NULL,
+                mes INTEGER NOT NULL,
+                id_versao BIGINT NOT NULL REFERENCES escala_versoes (id_versao),
+                id_versao_anterior BIGINT REFERENCES escala_versoes (id_versao) ON DELETE SET NULL,
+                atualizado_em TIMESTAMPTZ NOT NULL DEFAULT now(),
+                PRIMARY KEY (id_ministerio, ano, mes)
+            )
+            """,
+            "ALTER TABLE escala ADD COLUMN IF NOT EXISTS id_versao BIGINT REFERENCES escala_versoes (id_versao) ON DELETE CASCADE",
+            # A escala que já existe vira a versão publicada do seu mês.
+            """
+            INSERT INTO escala_versoes (id_ministerio, ano, mes, origem, publicada_em)
+            SELECT DISTINCT sf.id_ministerio, EXTRACT(YEAR FROM e.data_evento)::int, EXTRACT(MONTH FROM e.data_evento)::int, 'migracao', now()
+            FROM escala esc
+            JOIN eventos e ON e.id_evento = esc.id_evento
+            JOIN servicos_fixos sf ON sf.id_servico = e.id_servico_fixo
+            WHERE esc.id_versao IS NULL
+            """,
+            """
+            UPDATE escala esc SET id_versao = v.id_versao
+            FROM eventos e
+            JOIN servicos_fixos sf ON sf.id_servico = e.id_servico_fixo
+            JOIN escala_versoes v ON v.origem = 'migracao' AND v.id_ministerio = sf.id_ministerio
+                 AND v.ano = EXTRACT(YEAR FROM e.data_evento)::int AND v.mes = EXTRACT(MONTH FROM e.data_evento)::int
+            WHERE e.id_evento = esc.id_evento AND esc.id_versao IS NULL
+            """,
+            """
+            INSERT INTO escala_publicada (id_ministerio, ano, mes, id_versao)
+            SELECT id_ministerio, ano, mes, id_versao FROM escala_versoes WHERE origem = 'migracao'
+            ON CONFLICT DO NOTHING
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_escala_versao_evento ON escala (id_versao, id_evento)",
+            """
+            CREATE OR REPLACE VIEW escala_vigente AS
+            SELECT esc.* FROM escala esc
+            JOIN escala_publicada p ON p.id_versao = esc.id_versao
+            """,
+        ],
+    ),
+    (
+        5,
+        "Vagas fixadas na escala (mantidas pela regeneração)",
+        [
+            "ALTER TABLE escala ADD COLUMN IF NOT EXISTS fixada BOOLEAN NOT NULL DEFAULT FALSE",
+            # A view lista as colunas de quando foi criada; recriada para incluir 'fixada'.
+            """
+            CREATE OR REPLACE VIEW escala_vigente AS
+            SELECT esc.* FROM escala esc
+            JOIN escala_publicada p ON p.id_versao = esc.id_versao
+            """,
+        ],
+    ),
+    (
+        6,
+        "Diário de alterações da escala (GET .../alteracoes, desfazer e refazer)",
+        [
+            # Só acrescenta linhas. id_versao sem FK: o diário fica quando a versão é descartada.
+            # Linhas sem vaga (id_evento NULL) marcam trocas do mês inteiro (geração, reversão...).
+            """
+            CREATE TABLE IF NOT EXISTS escala_alteracoes (
+                id_alteracao BIGSERIAL PRIMARY KEY,
+                id_ministerio INTEGER NOT NULL,
+                ano INTEGER NOT NULL,
+                mes INTEGER NOT NULL,
+                id_versao BIGINT,
+                origem TEXT NOT NULL,
+                id_evento INTEGER,
+                id_funcao INTEGER,
+                funcao_instancia INTEGER,
+                id_voluntario_anterior INTEGER,
+                fixada_anterior BOOLEAN NOT NULL DEFAULT FALSE,
+                id_voluntario_novo INTEGER,
+                fixada_nova BOOLEAN NOT NULL DEFAULT FALSE,
+                desfeita BOOLEAN NOT NULL DEFAULT FALSE,
+                criado_em TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_escala_alteracoes_mes ON escala_alteracoes (id_ministerio, ano, mes, id_alteracao)",
+            "CREATE INDEX IF NOT EXISTS idx_escala_alteracoes_edicoes ON escala_alteracoes (id_versao, id_alteracao) WHERE origem = 'edicao'",
+        ],
+    ),
+    (
+        7,
+        "Uma linha por vaga em cada versão da escala (upsert de PUT /escala/vagas)",
+        [
+            # Duplicatas antigas (DELETE + INSERT concorrentes antes do lock do mês): fica a
+            # linha com voluntário, e entre iguais a gravada por último.
+            """
+            DELETE FROM escala a
+            USING escala b
+            WHERE a.id_versao = b.id_versao AND a.id_evento = b.id_evento
+              AND a.id_funcao = b.id_funcao AND a.funcao_instancia = b.funcao_instancia
+              AND a.ctid <> b.ctid
+              AND ((a.id_voluntario IS NULL AND b.id_voluntario IS NOT NULL)
+                   OR ((a.id_voluntario IS NULL) = (b.id_voluntario IS NULL) AND a.ctid < b.ctid))
+            """,
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_escala_versao_vaga ON escala (id_versao, id_evento, id_funcao, funcao_instancia)",
+        ],
+    ),
+    (
+        8,
+        "Dono (processo) de cada job de geração, com batimento, para achar jobs órfãos",
+        [
+            "ALTER TABLE jobs_escala ADD COLUMN IF NOT EXISTS dono TEXT",
+            """
+            CREATE TABLE IF NOT EXISTS jobs_escala_donos (
+                dono TEXT PRIMARY KEY,
+                visto_em TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+            """,
+        ],
+    ),
+]
+
+
+def versoes_aplicadas(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            versao INTEGER PRIMARY KEY,
+            descricao TEXT NOT NULL,
+            aplicada_em TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+    cur.execute("SELECT versao FROM schema_migrations")
+    return {row[0] for row in cur.fetchall()}
+
+
+def aplicar_migracoes():
+    """
+    Aplica as migrações pendentes em ordem de versão.
+    Retorna a lista de versões aplicadas nesta chamada (vazia se já estava tudo em dia).
+    """
+    aplicadas_agora = []
+    with get_connection() as conn:
+        if conn is None:
+            logger.error("Não foi possível conectar para aplicar as migrações.")
+            return aplicadas_agora
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_lock(%s)", (_LOCK_MIGRACOES,))
+                ja_aplicadas = versoes_aplicadas(cur)
+            conn.commit()
+
+            for versao, descricao, comandos in sorted(MIGRACOES, key=lambda m: m[0]):
+                if versao in ja_aplicadas:
+                    continue
+                try:
+                    with conn.cursor() as cur:
+                        for comando in comandos:
+                            cur.execute(comando)
+                        cur.execute(
+                            "INSERT INTO schema_migrations (versao, descricao) VALUES (%s, %s)",
+                            (versao, descricao)
+                        )
+                    conn.commit()
+                    aplicadas_agora.append(versao)
+                    logger.info("Migração %s aplicada: %s", versao, descricao)
+                except Exception:
+                    conn.rollback()
+                    logger.exception("Erro ao aplicar a migração %s (%s)", versao, descricao)
+                    break
+        finally:
+            try:
+                conn.rollback()
+                with conn.cursor() as cur:
+                    cur.execute("SELECT pg_advisory_unlock(%s)", (_LOCK_MIGRACOES,))
+                conn.commit()
+            except Exception:
+                logger.warning("Não foi possível liberar o lock de migrações.", exc_info=True)
+    return aplicadas_agora
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    versoes = aplicar_migracoes()
+    print(f"Migrações aplicadas: {versoes}" if versoes else "Nenhuma migração pendente.")
@@ -0,0 +1,259 @@
+# modelos_escala.py - Tipos de dados usados na geração da escala
+#
+# - O "snapshot" é a entrada da geração: tudo o que o motor precisa saber sobre UM ministério
+#   em UM mês, carregado do banco de uma só vez (ver database.carregar_snapshot_escala).
+#   É imutável (dataclasses frozen + tuplas/frozensets), então pode ser compartilhado entre
+#   execuções e enviado para outros processos sem cópias defensivas.
+# - Voluntario / Grupo / Vaga / EscalaEntry são o estado mutável de UMA execução do motor,
+#   criado a partir do snapshot por criar_estado_inicial(), em forma compacta (ver abaixo).
+
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+
+# --- SNAPSHOT (entrada imutável da geração) ---
+
+@dataclass(frozen=True)
+class VoluntarioSnapshot:
+    id_voluntario: int
+    nome_voluntario: str
+    limite_escalas_mes: int
+    nivel_experiencia: str
+    id_grupo: Optional[int]
+    funcoes: FrozenSet[int] = frozenset()
+    disponibilidade: FrozenSet[int] = frozenset()   # ids dos serviços fixos em que pode servir
+    indisponibilidades: FrozenSet[int] = frozenset()  # ids dos eventos do mês em que NÃO pode servir
+
+@dataclass(frozen=True)
+class GrupoSnapshot:
+    id_grupo: int
+    limite_escalas_grupo: int
+    membros: Tuple[int, ...] = ()  # ids dos voluntários ativos do grupo
+
+@dataclass(frozen=True)
+class FuncaoSnapshot:
+    id_funcao: int
+    nome_funcao: str
+    tipo_funcao: str
+    prioridade_alocacao: int
+
+@dataclass(frozen=True)
+class ServicoSnapshot:
+    id_servico: int
+    nome_servico: str
+    dia_da_semana: int
+    ativo: bool
+
+@dataclass(frozen=True)
+class EventoSnapshot:
+    id_evento: int
+    id_servico_fixo: int
+    data_evento: date
+
+@dataclass(frozen=True)
+class CotaSnapshot:
+    id_servico: int
+    id_funcao: int
+    quantidade_necessaria: int
+
+@dataclass(frozen=True)
+class SnapshotEscala:
+    id_ministerio: int
+    ano: int
+    mes: int
+    voluntarios: Tuple[VoluntarioSnapshot, ...]
+    grupos: Tuple[GrupoSnapshot, ...]
+    funcoes: Tuple[FuncaoSnapshot, ...]       # ordenadas por nome_funcao
+    servicos: Tuple[ServicoSnapshot, ...]
+    eventos: Tuple[EventoSnapshot, ...]       # ordenados por data_evento
+    cotas: Tuple[CotaSnapshot, ...]
+
+    @classmethod
+    def from_json(cls, id_ministerio, ano, mes, dados):
+        """Monta o snapshot a partir do documento JSON devolvido pela consulta única."""
+        return cls(
+            id_ministerio=id_ministerio,
+            ano=ano,
+            mes=mes,
+            voluntarios=tuple(
+                VoluntarioSnapshot(
+                    id_voluntario=int(v['id_voluntario']),
+                    nome_voluntario=str(v['nome_voluntario']),
+                    limite_escalas_mes=int(v['limite_escalas_mes'] or 0),
+                    nivel_experiencia=str(v['nivel_experiencia']),
+                    id_grupo=int(v['id_grupo']) if v['id_grupo'] is not None else None,
+                    funcoes=frozenset(int(f) for f in v['funcoes'] or ()),
+                    disponibilidade=frozenset(int(s) for s in v['disponibilidade'] or ()),
+                    indisponibilidades=frozenset(int(e) for e in v['indisponibilidades'] or ()),
+                )
+                for v in dados['voluntarios']
+            ),
+            grupos=tuple(
+                GrupoSnapshot(
+                    id_grupo=int(g['id_grupo']),
+                    limite_escalas_grupo=int(g['limite_escalas_grupo'] or 0),
+                    membros=tuple(int(m) for m in g['membros'] or ()),
+                )
+                for g in dados['grupos']
+            ),
+            funcoes=tuple(
+                FuncaoSnapshot(
+                    id_funcao=int(f['id_funcao']),
+                    nome_funcao=str(f['nome_funcao']),
+                    tipo_funcao=str(f['tipo_funcao']),
+                    prioridade_alocacao=int(f['prioridade_alocacao'] or 0),
+                )
+                for f in dados['funcoes']
+            ),
+            servicos=tuple(
+                ServicoSnapshot(
+                    id_servico=int(s['id_servico']),
+                    nome_servico=str(s['nome_servico']),
+                    dia_da_semana=int(s['dia_da_semana']),
+                    ativo=bool(s['ativo']),
+                )
+                for s in dados['servicos']
+            ),
+            eventos=tuple(
+                EventoSnapshot(
+                    id_evento=int(e['id_evento']),
+                    id_servico_fixo=int(e['id_servico_fixo']),
+                    data_evento=date.fromisoformat(str(e['data_evento'])[:10]),
+                )
+                for e in dados['eventos']
+            ),
+            cotas=tuple(
+                CotaSnapshot(
+                    id_servico=int(c['id_servico']),
+                    id_funcao=int(c['id_funcao']),
+                    quantidade_necessaria=int(c['quantidade_necessaria']),
+                )
+                for c in dados['cotas']
+            ),
+        )
+
+
+# --- ESTADO MUTÁVEL DE UMA EXECUÇÃO ---
+# Registros com __slots__ (sem __dict__ por instância) e só inteiros: chaves de vaga são
+# tuplas (id_evento, id_funcao, funcao_instancia), dias são ordinais (date.toordinal()) e
+# os conjuntos de funções / serviços / eventos de cada voluntário são bitmasks sobre as
+# posições densas de IndicesSnapshot. Vários ministérios gerando ao mesmo tempo no mesmo
+# worker ocupam bem menos memória, e testar "tem a função?" é um AND de inteiros.
+
+@dataclass(frozen=True, slots=True)
+class IndicesSnapshot:
+    """Posições densas (0..n-1) dos ids do snapshot, na ordem em que aparecem nele."""
+    voluntarios: Dict[int, int]
+    funcoes: Dict[int, int]
+    servicos: Dict[int, int]
+    eventos: Dict[int, int]
+    dias: Tuple[int, ...]   # dia (ordinal) de cada evento, pela posição do evento
+
+    @classmethod
+    def do_snapshot(cls, snapshot):
+        def posicoes(ids):
+            return {i: p for p, i in enumerate(dict.fromkeys(ids))}
+        return cls(
+            voluntarios=posicoes(v.id_voluntario for v in snapshot.voluntarios),
+            funcoes=posicoes([f.id_funcao for f in snapshot.funcoes] + [f for v in snapshot.voluntarios for f in sorted(v.funcoes)]),
+            servicos=posicoes([s.id_servico for s in snapshot.servicos] + [ev.id_servico_fixo for ev in snapshot.eventos]
+                              + [s for v in snapshot.voluntarios for s in sorted(v.disponibilidade)]),
+            eventos=posicoes(ev.id_evento for ev in snapshot.eventos),
+            dias=tuple(ev.data_evento.toordinal() for ev in snapshot.eventos),
+        )
+
+    @staticmethod
+    def _mascara(posicoes, ids):
+        mascara = 0
+        for i in ids:
+            p = posicoes.get(i)
+            if p is not None:
+                mascara |= 1 << p
+        return mascara
+
+    def mascara_funcoes(self, ids):
+        return self._mascara(self.funcoes, ids)
+
+    def mascara_servicos(self, ids):
+        return self._mascara(self.servicos, ids)
+
+    def mascara_eventos(self, ids):
+        return self._mascara(self.eventos, ids)
+
+    def bit_funcao(self, id_funcao):
+        """Bit da função nas máscaras (0 se nenhum voluntário nem função do ministério a tem)."""
+        p = self.funcoes.get(id_funcao)
+        return 0 if p is None else 1 << p
+
+@dataclass(slots=True)
+class EscalaEntry:
+    id_evento: int
+    id_funcao: int
+    id_voluntario: int
+    funcao_instancia: int
+
+@dataclass(slots=True)
+class Vaga:
+    id_evento: int
+    id_servico_fixo: int
+    dia: int                # data do evento como ordinal (date.fromordinal(dia) volta à data)
+    id_funcao: int
+    funcao_instancia: int
+    key: Tuple[int, int, int]  # (id_evento, id_funcao, funcao_instancia), a mesma chave de EscalaEntry
+
+@dataclass(slots=True)
+class Voluntario:
+    id_voluntario: int
+    posicao: int            # posição densa (IndicesSnapshot.voluntarios)
+    nome_voluntario: str
+    limite_escalas_mes: int
+    nivel_experiencia: str
+    id_grupo: Optional[int]
+    funcoes: int = 0             # bitmask de IndicesSnapshot.funcoes
+    disponibilidade: int = 0     # bitmask de IndicesSnapshot.servicos
+    indisponibilidades: int = 0  # bitmask de IndicesSnapshot.eventos
+    escalas_neste_mes: int = 0
+
+@dataclass(slots=True)
+class Grupo:
+    id_grupo: int
+    limite_escalas_grupo: int
+    membros: List[Voluntario] = field(default_factory=list)
+    escalas_neste_mes: int = 0
+
+
+def chave_da_entrada(entrada):
+    """Chave da vaga ocupada por uma EscalaEntry (igual a Vaga.key)."""
+    return (entrada.id_evento, entrada.id_funcao, entrada.funcao_instancia)
+
+
+def criar_estado_inicial(snapshot, indices=None):
+    """
+    Cria os objetos mutáveis (Voluntario / Grupo) de uma execução a partir do snapshot.
+    Retorna (voluntarios_map, grupos_map), indexados pelo id.
+    """
+    indices = indices or IndicesSnapshot.do_snapshot(snapshot)
+    voluntarios_map = {
+        v.id_voluntario: Voluntario(
+            id_voluntario=v.id_voluntario,
+            posicao=indices.voluntarios[v.id_voluntario],
+            nome_voluntario=v.nome_voluntario,
+            limite_escalas_mes=v.limite_escalas_mes,
+            nivel_experiencia=v.nivel_experiencia,
+            id_grupo=v.id_grupo,
+            funcoes=indices.mascara_funcoes(v.funcoes),
+            disponibilidade=indices.mascara_servicos(v.disponibilidade),
+            indisponibilidades=indices.mascara_eventos(v.indisponibilidades),
+        )
+        for v in snapshot.voluntarios
+    }
+    grupos_map = {
+        g.id_grupo: Grupo(
+            id_grupo=g.id_grupo,
+            limite_escalas_grupo=g.limite_escalas_grupo,
+            membros=[voluntarios_map[m] for m in g.membros if m in voluntarios_map],
+        )
+        for g in snapshot.grupos
+    }
+    return voluntarios_map, grupos_map
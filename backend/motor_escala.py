@@ -0,0 +1,484 @@
+# motor_escala.py - Motor de geração da escala (sem acesso ao banco)
+#
+# Recebe um SnapshotEscala (ver modelos_escala.py) e devolve as alocações. Quem carrega o
+# snapshot e grava o resultado é database.gerar_escala_automatica.
+#
+# Fases:
+#   1. Grupos: cada grupo (em ordem aleatória) é alocado inteiro no evento menos lotado
+#      em que todos os membros cabem.
+#   2. Individuais: em rodadas, cada função PRINCIPAL (por prioridade) e depois o APOIO;
+#      cada voluntário pega a vaga compatível do evento menos lotado.
+#
+# Escala fixa: gerar_com_motor pode receber alocações que devem ficar como estão (vagas
+# fixadas pelo líder e, na regeneração incremental, tudo o que continua válido; ver
+# separar_escala_existente). Elas entram antes da fase 1, contando para limites, dias e
+# lotação, e os motores só preenchem as vagas restantes.
+#
+# Progresso: as funções aceitam um callback progresso(fase, **contadores), chamado na
+# thread do motor a cada grupo, rodada ou tentativa (usado pelos jobs, ver jobs_escala.py).
+
+import logging
+import multiprocessing
+import os
+import random
+import time
+from bisect import bisect_left, insort
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from backend.busca_local import MAX_ITERACOES as MAX_ITERACOES_BUSCA_LOCAL, melhorar_escala
+from backend.elegibilidade import MatrizElegibilidade
+from backend.modelos_escala import EscalaEntry, IndicesSnapshot, Vaga, chave_da_entrada, criar_estado_inicial
+from backend.motor_otimo import alocar_por_fluxo, alocar_por_milp
+
+logger = logging.getLogger(__name__)
+
+# Tempo máximo (segundos) para os motores de otimização antes de ficar com o guloso.
+TEMPO_LIMITE_PADRAO = float(os.environ.get('ESCALA_TEMPO_LIMITE', 10))
+
+
+def _sem_progresso(fase, **contadores):
+    pass
+
+
+def compilar_cotas(snapshot, funcoes_validas):
+    """
+    Compila as cotas uma única vez por serviço: {id_servico: ((id_funcao, quantidade), ...)}.
+    Cotas de funções que não existem no ministério são descartadas.
+    """
+    modelos = defaultdict(list)
+    for cota in snapshot.cotas:
+        if cota.id_funcao in funcoes_validas and cota.quantidade_necessaria > 0:
+            modelos[cota.id_servico].append((cota.id_funcao, cota.quantidade_necessaria))
+    return {id_servico: tuple(itens) for id_servico, itens in modelos.items()}
+
+
+def vagas_do_snapshot(snapshot):
+    funcoes_validas = {f.id_funcao for f in snapshot.funcoes}
+    return criar_vagas(snapshot, compilar_cotas(snapshot, funcoes_validas))
+
+
+def criar_vagas(snapshot, modelos_cotas):
+    """Expande os modelos de cota em vagas, na ordem evento -> cota -> instância."""
+    vagas = []
+    for ev in snapshot.eventos:
+        dia = ev.data_evento.toordinal()
+        for id_funcao, quantidade in modelos_cotas.get(ev.id_servico_fixo, ()):
+            for i in range(1, quantidade + 1):
+                vagas.append(Vaga(id_evento=ev.id_evento, id_servico_fixo=ev.id_servico_fixo, dia=dia, id_funcao=id_funcao,
+                                  funcao_instancia=i, key=(ev.id_evento, id_funcao, i)))
+    return vagas
+
+
+class IndiceVagas:
+    """
+    Vagas abertas indexadas por evento e por função, com a lotação de cada evento.
+
+    Para cada função, os eventos que ainda têm vaga dela ficam em "níveis" de lotação
+    ({lotação: [posições dos eventos, em ordem]}). Alocar em um evento só move esse evento
+    para o nível seguinte em cada função; nada é varrido nem reordenado por inteiro.
+    A ordem de desempate é a de criação das vagas (data do evento, cota, instância).
+    """
+
+    def __init__(self, vagas):
+        self.staff_por_evento = defaultdict(int)
+        self._vagas = {}                                  # key -> Vaga (ordem de criação)
+        self._por_evento = defaultdict(dict)              # id_evento -> {key: Vaga}
+        self._por_funcao_evento = defaultdict(dict)       # (id_funcao, id_evento) -> {key: Vaga}
+        self._funcoes_do_evento = defaultdict(set)        # id_evento -> {id_funcao com vaga aberta}
+        self._posicao_evento = {}                         # id_evento -> posição na ordem de criação
+        self._eventos = []                                # posição -> id_evento
+        self._niveis = defaultdict(lambda: defaultdict(list))  # id_funcao -> lotação -> [posições]
+        for vaga in vagas:
+            self._adicionar(vaga)
+
+    def _adicionar(self, vaga):
+        if vaga.id_evento not in self._posicao_evento:
+            self._posicao_evento[vaga.id_evento] = len(self._eventos)
+            self._eventos.append(vaga.id_evento)
+        self._vagas[vaga.key] = vaga
+        self._por_evento[vaga.id_evento][vaga.key] = vaga
+        par = (vaga.id_funcao, vaga.id_evento)
+        if not self._por_funcao_evento[par]:
+            self._funcoes_do_evento[vaga.id_evento].add(vaga.id_funcao)
+            lotacao = self.staff_por_evento[vaga.id_evento]
+            insort(self._niveis[vaga.id_funcao][lotacao], self._posicao_evento[vaga.id_evento])
+        self._por_funcao_evento[par][vaga.key] = vaga
+
+    def _tirar_do_nivel(self, id_funcao, id_evento, lotacao):
+        nivel = self._niveis[id_funcao][lotacao]
+        posicao = self._posicao_evento[id_evento]
+        del nivel[bisect_left(nivel, posicao)]
+        if not nivel:
+            del self._niveis[id_funcao][lotacao]
+
+    def __len__(self):
+        return len(self._vagas)
+
+    def __bool__(self):
+        return bool(self._vagas)
+
+    def __contains__(self, key):
+        return key in self._vagas
+
+    def values(self):
+        return self._vagas.values()
+
+    def abertas_no_evento(self, id_evento):
+        """Vagas abertas de um evento, na ordem de criação."""
+        return list(self._por_evento.get(id_evento, {}).values())
+
+    def melhor_vaga(self, id_funcao, aceita):
+        """
+        Primeira vaga aberta da função, do evento menos lotado, que 'aceita(vaga)' aprova.
+        Como todas as vagas de uma mesma função em um mesmo evento são equivalentes para
+        um voluntário, basta testar a primeira de cada evento.
+        """
+        niveis = self._niveis.get(id_funcao)
+        if not niveis:
+            return None
+        for lotacao in sorted(niveis):
+            for posicao in niveis[lotacao]:
+                candidatas = self._por_funcao_evento[(id_funcao, self._eventos[posicao])]
+                vaga = next(iter(candidatas.values()))
+                if aceita(vaga):
+                    return vaga
+        return None
+
+    def ocupar(self, vaga):
+        """Remove a vaga e soma 1 à lotação do evento, atualizando os níveis no lugar."""
+        if vaga.key not in self._vagas:
+            return
+        id_evento = vaga.id_evento
+        lotacao = self.staff_por_evento[id_evento]
+        del self._vagas[vaga.key]
+        del self._por_evento[id_evento][vaga.key]
+        par = (vaga.id_funcao, id_evento)
+        del self._por_funcao_evento[par][vaga.key]
+        if not self._por_funcao_evento[par]:
+            self._funcoes_do_evento[id_evento].discard(vaga.id_funcao)
+            self._tirar_do_nivel(vaga.id_funcao, id_evento, lotacao)
+
+        self.staff_por_evento[id_evento] = lotacao + 1
+        posicao = self._posicao_evento[id_evento]
+        for id_funcao in self._funcoes_do_evento[id_evento]:
+            self._tirar_do_nivel(id_funcao, id_evento, lotacao)
+            insort(self._niveis[id_funcao][lotacao + 1], posicao)
+
+
+def validar_snapshot(snapshot):
+    """Retorna a mensagem de status se o snapshot não permite gerar a escala, ou None."""
+    if not snapshot.eventos:
+        return {"status": "info", "message": "Não há eventos criados para este mês."}
+    if not snapshot.voluntarios:
+        return {"status": "error", "message": "Nenhum voluntário ativo encontrado."}
+    if not any(f.tipo_funcao == 'APOIO' for f in snapshot.funcoes):
+        return {"status": "error", "message": "Funções essenciais como 'APOIO' ou do tipo 'PRINCIPAL' não encontradas."}
+    return None
+
+
+def separar_escala_existente(snapshot, existentes):
+    """
+    Divide a escala gravada do mês, uma lista de (EscalaEntry, fixada), em (mantidas, invalidadas).
+    Fixadas ficam sempre que a vaga ainda existe (a cota pode ter diminuído); as outras só se
+    o voluntário continua ativo, com a função, disponível para o serviço, sem indisponibilidade
+    no evento, sem outra vaga no mesmo dia e dentro do limite mensal. As fixadas contam
+    primeiro para o limite e para o dia.
+    """
+    vagas = {v.key: v for v in vagas_do_snapshot(snapshot)}
+    voluntarios = {v.id_voluntario: v for v in snapshot.voluntarios}
+    carga = defaultdict(int)
+    dias = set()
+    usadas = set()
+    mantidas, invalidadas = [], []
+    for entrada, fixada in sorted(existentes, key=lambda item: not item[1]):
+        chave = chave_da_entrada(entrada)
+        vaga = vagas.get(chave)
+        voluntario = voluntarios.get(entrada.id_voluntario)
+        valida = vaga is not None and chave not in usadas and (fixada or (
+            voluntario is not None
+            and entrada.id_funcao in voluntario.funcoes
+            and vaga.id_servico_fixo in voluntario.disponibilidade
+            and entrada.id_evento not in voluntario.indisponibilidades
+            and (entrada.id_voluntario, vaga.dia) not in dias
+            and carga[entrada.id_voluntario] < voluntario.limite_escalas_mes
+        ))
+        if not valida:
+            invalidadas.append(entrada)
+            continue
+        mantidas.append(entrada)
+        usadas.add(chave)
+        carga[entrada.id_voluntario] += 1
+        dias.add((entrada.id_voluntario, vaga.dia))
+    return mantidas, invalidadas
+
+
+def gerar_alocacoes(snapshot, rng=random, progresso=None, escala_fixa=()):
+    """
+    Executa as fases de alocação sobre o snapshot (que deve ter passado por validar_snapshot).
+    Retorna (escala_final, vagas_abertas): a lista de EscalaEntry (começando por 'escala_fixa')
+    e o índice com as vagas que ficaram sem ninguém.
+    """
+    progresso = progresso or _sem_progresso
+    indices = IndicesSnapshot.do_snapshot(snapshot)
+    voluntarios_map, grupos_map = criar_estado_inicial(snapshot, indices)
+    eventos = snapshot.eventos
+    funcoes_map = {f.id_funcao: f.nome_funcao for f in snapshot.funcoes}
+    id_apoio = next(f.id_funcao for f in snapshot.funcoes if f.tipo_funcao == 'APOIO')
+    funcoes_principais = sorted((f for f in snapshot.funcoes if f.tipo_funcao == 'PRINCIPAL'), key=lambda f: f.prioridade_alocacao)
+
+    vagas = vagas_do_snapshot(snapshot)
+    vagas_abertas = IndiceVagas(vagas)
+    matriz = MatrizElegibilidade(snapshot, vagas, indices)
+    staff_por_evento = vagas_abertas.staff_por_evento
+    escala_final = []
+
+    # --- FUNÇÕES INTERNAS ---
+    def alocar(voluntario, vaga):
+        escala_final.append(EscalaEntry(vaga.id_evento, vaga.id_funcao, voluntario.id_voluntario, vaga.funcao_instancia))
+        voluntario.escalas_neste_mes += 1
+        matriz.registrar(voluntario.id_voluntario, vaga)
+        vagas_abertas.ocupar(vaga)
+        logger.debug("ALOCADO: '%s' na função '%s' no evento %s", voluntario.nome_voluntario, funcoes_map.get(vaga.id_funcao), vaga.id_evento)
+
+    # --- ESCALA FIXA ---
+    if escala_fixa:
+        por_instancia = {v.key: v for v in vagas}
+        for entrada in escala_fixa:
+            escala_final.append(entrada)
+            vaga = por_instancia[chave_da_entrada(entrada)]
+            vagas_abertas.ocupar(vaga)
+            voluntario = voluntarios_map.get(entrada.id_voluntario)
+            if voluntario is not None:
+                voluntario.escalas_neste_mes += 1
+                matriz.registrar(voluntario.id_voluntario, vaga)
+        # Cada evento em que membros do grupo já servem conta como uma escala do grupo.
+        for grupo in grupos_map.values():
+            ids_membros = {m.id_voluntario for m in grupo.membros}
+            grupo.escalas_neste_mes += len({e.id_evento for e in escala_fixa if e.id_voluntario in ids_membros})
+
+    # --- FASE 1: GRUPOS ---
+    logger.debug("Fase 1: alocando grupos")
+    grupos_para_alocar = list(grupos_map.values())
+    rng.shuffle(grupos_para_alocar)
+    progresso("grupos", vagas=len(vagas), alocacoes=0, grupos=0, total_grupos=len(grupos_para_alocar))
+
+    for n_grupo, grupo in enumerate(grupos_para_alocar, 1):
+        progresso("grupos", alocacoes=len(escala_final), grupos=n_grupo)
+        if grupo.escalas_neste_mes >= grupo.limite_escalas_grupo: continue
+        linhas_membros = matriz.linhas([m.id_voluntario for m in grupo.membros])
+
+        # A ordenação é pela lotação de cada evento.
+        lista_de_eventos = sorted(eventos, key=lambda ev: staff_por_evento[ev.id_evento])
+
+        for evento in lista_de_eventos:
+            id_do_evento_atual = evento.id_evento
+
+            membros = grupo.membros
+            if not membros: continue
+
+            # Mesmo dia e limite mensal de todos os membros, de uma vez, pela matriz.
+            if not matriz.todos_livres(linhas_membros, evento): continue
+
+            vagas_no_evento = vagas_abertas.abertas_no_evento(id_do_evento_atual)
+
+            potenciais_alocacoes = []
+            vagas_ja_usadas_neste_teste = set()
+
+            # Tudo ou nada: se algum membro não acha vaga compatível, o grupo tenta o próximo evento.
+            # (Os motivos das vagas que sobram saem de diagnostico.motivos_das_vagas, no fim.)
+            for membro in membros:
+                vaga_do_membro = next((vaga for vaga in vagas_no_evento
+                                       if vaga.key not in vagas_ja_usadas_neste_teste and matriz.pode_servir(membro.id_voluntario, vaga)), None)
+                if vaga_do_membro is None:
+                    break
+                potenciais_alocacoes.append({'membro': membro, 'vaga': vaga_do_membro})
+                vagas_ja_usadas_neste_teste.add(vaga_do_membro.key)
+            else:
+                for alocacao in potenciais_alocacoes: alocar(alocacao['membro'], alocacao['vaga'])
+                grupo.escalas_neste_mes += 1
+                break
+
+    # --- FASE 2: INDIVIDUAIS ---
+    logger.debug("Fase 2: alocando individuais")
+
+    def alocar_fase(candidatos, id_funcao):
+        rng.shuffle(candidatos)
+        # Elegibilidade de todos os candidatos calculada de uma vez: cada voluntário passa
+        # uma única vez pela fase, e só a alocação dele mesmo mudaria a sua linha.
+        elegibilidade = matriz.mascara_eventos([v.id_voluntario for v in candidatos], id_funcao)
+        for voluntario, mascara in zip(candidatos, elegibilidade):
+            if voluntario.escalas_neste_mes >= voluntario.limite_escalas_mes: continue
+            if not mascara.any(): continue
+            # Vaga da função no evento menos lotado em que o voluntário pode servir.
+            melhor_vaga = vagas_abertas.melhor_vaga(id_funcao, lambda v: mascara[matriz.posicao_evento(v)])
+            if melhor_vaga is not None:
+                alocar(voluntario, melhor_vaga)
+
+    voluntarios_sem_grupo = [v for v in voluntarios_map.values() if v.id_grupo is None]
+    max_escalas = max((v.limite_escalas_mes for v in voluntarios_sem_grupo), default=0)
+
+    for i in range(max_escalas):
+        logger.debug("Rodada de alocação individual %s/%s", i+1, max_escalas)
+        progresso("individuais", alocacoes=len(escala_final), rodada=i + 1, rodadas=max_escalas)
+        for funcao in funcoes_principais:
+            bit = indices.bit_funcao(funcao.id_funcao)
+            candidatos = [v for v in voluntarios_sem_grupo if v.funcoes & bit]
+            alocar_fase(candidatos, funcao.id_funcao)
+        bit_apoio = indices.bit_funcao(id_apoio)
+        candidatos_apoio = [v for v in voluntarios_sem_grupo if v.funcoes & bit_apoio]
+        alocar_fase(candidatos_apoio, id_apoio)
+
+    progresso("individuais", alocacoes=len(escala_final))
+    return escala_final, vagas_abertas
+
+
+# --- ESCOLHA DO MOTOR ---
+# "greedy" é o algoritmo acima; os outros (motor_otimo.py) partem do resultado dele e só
+# são usados se preencherem pelo menos tantas vagas quanto ele, dentro do tempo limite.
+MOTORES_OTIMOS = {
+    "flow": alocar_por_fluxo,
+    "milp": alocar_por_milp,
+}
+MOTORES = ("greedy", *MOTORES_OTIMOS)
+# "completo" refaz o mês mantendo só as vagas fixadas; "incremental" mantém tudo o que
+# continua válido e preenche só as vagas vazias ou invalidadas.
+MODOS = ("completo", "incremental")
+
+
+def indice_das_vagas_abertas(snapshot, escala):
+    """IndiceVagas com as vagas do snapshot que 'escala' não preencheu."""
+    vagas_abertas = IndiceVagas(vagas_do_snapshot(snapshot))
+    por_instancia = {v.key: v for v in vagas_abertas.values()}
+    for entrada in escala:
+        vagas_abertas.ocupar(por_instancia[chave_da_entrada(entrada)])
+    return vagas_abertas
+
+
+# --- MÚLTIPLAS TENTATIVAS (best-of-N) ---
+# O guloso depende da ordem aleatória; em vez de o usuário clicar "Gerar" várias vezes,
+# rodamos N sementes em paralelo sobre o mesmo snapshot e ficamos com a melhor escala.
+# Processos (e não threads) porque o motor é CPU puro em Python; contexto "spawn" para
+# não herdar conexões do pool nem locks das threads da API.
+MAX_TENTATIVAS = 32
+_pool_processos = None
+
+
+def pontuar_escala(snapshot, escala):
+    """
+    Pontuação para comparar escalas (maior é melhor):
+    (vagas preenchidas, grupos escalados, -variância da carga entre os voluntários).
+    """
+    grupo_de = {v.id_voluntario: v.id_grupo for v in snapshot.voluntarios}
+    colocacoes_grupo = len({(grupo_de[e.id_voluntario], e.id_evento) for e in escala if grupo_de.get(e.id_voluntario) is not None})
+    carga = defaultdict(int)
+    for e in escala:
+        carga[e.id_voluntario] += 1
+    cargas = [carga[v.id_voluntario] for v in snapshot.voluntarios]
+    media = sum(cargas) / len(cargas) if cargas else 0
+    variancia = sum((c - media) ** 2 for c in cargas) / len(cargas) if cargas else 0
+    return (len(escala), colocacoes_grupo, -round(variancia, 9))
+
+
+def _executar_tentativa(snapshot, semente, escala_fixa=()):
+    """Roda em um processo do pool: uma geração gulosa com a semente dada."""
+    escala, _ = gerar_alocacoes(snapshot, random.Random(semente), escala_fixa=escala_fixa)
+    return pontuar_escala(snapshot, escala), semente, escala
+
+
+def _get_pool_processos():
+    global _pool_processos
+    if _pool_processos is None:
+        _pool_processos = ProcessPoolExecutor(max_workers=os.cpu_count() or 1, mp_context=multiprocessing.get_context("spawn"))
+    return _pool_processos
+
+
+def encerrar_pool_processos():
+    """Chamado no desligamento da API."""
+    global _pool_processos
+    if _pool_processos is not None:
+        _pool_processos.shutdown(wait=True)
+        _pool_processos = None
+
+
+def melhor_de_n(snapshot, tentativas, rng=random, progresso=None, escala_fixa=()):
+    """
+    Roda 'tentativas' gerações gulosas com sementes diferentes e retorna a melhor como
+    (escala, semente). Se o pool de processos não estiver disponível, roda em sequência.
+    """
+    progresso = progresso or _sem_progresso
+    base = rng.randrange(2**31)
+    sementes = [base + i for i in range(tentativas)]
+    vagas = len(vagas_do_snapshot(snapshot))
+
+    def concluida(resultados):
+        progresso("tentativas", vagas=vagas, alocacoes=max(len(r[2]) for r in resultados),
+                  tentativas=len(resultados), total_tentativas=tentativas)
+
+    progresso("tentativas", vagas=vagas, alocacoes=0, tentativas=0, total_tentativas=tentativas)
+    resultados = []
+    try:
+        pool = _get_pool_processos()
+        # O callback não atravessa processos: o progresso aqui é por tentativa concluída.
+        for futuro in as_completed([pool.submit(_executar_tentativa, snapshot, s, escala_fixa) for s in sementes]):
+            resultados.append(futuro.result())
+            concluida(resultados)
+    except Exception as e:
+        logger.warning("Pool de processos indisponível (%s); rodando as tentativas em sequência.", e)
+        resultados = []
+        for semente in sementes:
+            resultados.append(_executar_tentativa(snapshot, semente, escala_fixa))
+            concluida(resultados)
+    # Empate: fica a primeira semente, para o resultado ser reproduzível.
+    pontuacao, semente, escala = max(resultados, key=lambda r: (r[0], -sementes.index(r[1])))
+    logger.info("Melhor de %s tentativas: semente %s, pontuação %s.", tentativas, semente, pontuacao)
+    return escala, semente
+
+
+def gerar_com_motor(snapshot, motor="greedy", tempo_limite=None, rng=random, tentativas=1, busca_local=True, progresso=None,
+                    escala_fixa=(), incremental=False):
+    """
+    Gera as alocações com o motor pedido, mantendo 'escala_fixa' como está.
+    Com incremental, a busca local só preenche vagas abertas (sem os movimentos de
+    equilíbrio), para a regeneração parcial ser rápida.
+    Com tentativas > 1, o ponto de partida é a melhor de N gerações gulosas (melhor_de_n).
+    Com busca_local, o resultado do guloso passa pela busca local (busca_local.py).
+    Retorna (escala_final, vagas_abertas, motor_usado); motor_usado é "greedy" quando o
+    motor pedido falhou, estourou o tempo ou preencheu menos vagas que o guloso.
+    """
+    if motor not in MOTORES:
+        raise ValueError(f"Motor de escala desconhecido: '{motor}'. Opções: {', '.join(MOTORES)}.")
+    if not 1 <= tentativas <= MAX_TENTATIVAS:
+        raise ValueError(f"O número de tentativas deve estar entre 1 e {MAX_TENTATIVAS}.")
+    progresso = progresso or _sem_progresso
+    inicio = time.monotonic()
+    if tentativas > 1:
+        escala_gulosa, _ = melhor_de_n(snapshot, tentativas, rng, progresso, escala_fixa)
+        abertas_gulosa = indice_das_vagas_abertas(snapshot, escala_gulosa)
+    else:
+        escala_gulosa, abertas_gulosa = gerar_alocacoes(snapshot, rng, progresso, escala_fixa)
+    if busca_local:
+        progresso("busca_local", alocacoes=len(escala_gulosa))
+        escala_gulosa = melhorar_escala(snapshot, vagas_do_snapshot(snapshot), escala_gulosa, rng=rng, fixas=escala_fixa,
+                                        max_iteracoes=0 if incremental else MAX_ITERACOES_BUSCA_LOCAL)
+        abertas_gulosa = indice_das_vagas_abertas(snapshot, escala_gulosa)
+        progresso("busca_local", alocacoes=len(escala_gulosa))
+    if motor == "greedy":
+        return escala_gulosa, abertas_gulosa, "greedy"
+
+    tempo_limite = TEMPO_LIMITE_PADRAO if tempo_limite is None else tempo_limite
+    restante = tempo_limite - (time.monotonic() - inicio)
+    escala = None
+    if restante > 0:
+        progresso("otimizacao", alocacoes=len(escala_gulosa), motor=motor)
+        try:
+            escala = MOTORES_OTIMOS[motor](snapshot, vagas_do_snapshot(snapshot), escala_gulosa, restante, escala_fixa)
+        except ImportError as e:
+            logger.warning("Motor '%s' indisponível (%s); usando o guloso.", motor, e)
+        except Exception:
+            logger.exception("Erro no motor '%s'; usando o guloso.", motor)
+    if escala is None or len(escala) < len(escala_gulosa):
+        return escala_gulosa, abertas_gulosa, "greedy"
+
+    logger.info("Motor '%s' preencheu %s vagas (guloso: %s).", motor, len(escala), len(escala_gulosa))
+    return escala, indice_das_vagas_abertas(snapshot, escala), motor
@@ -0,0 +1,242 @@
+# motor_otimo.py - Motores de alocação por otimização (alternativas ao guloso)
+#
+#   flow: os grupos ficam onde o guloso os colocou; os voluntários individuais são
+#         distribuídos por um fluxo de custo mínimo (resolvido como programa linear: a
+#         matriz de restrições é de rede, então a solução ótima já sai inteira).
+#   milp: grupos e individuais no mesmo modelo inteiro (um grupo só serve inteiro, em
+#         até 'limite_escalas_grupo' eventos).
+#
+# Em ambos: cada vaga preenchida vale PESO_VAGA (+ um bônus pela prioridade da função) e
+# a k-ésima escala de um voluntário / o k-ésimo escalado de um evento custam k, o que
+# espalha a carga entre os voluntários e equilibra a lotação dos eventos, como o guloso.
+#
+# Usam o HiGHS do scipy (instalável com pip, roda local). Sem scipy, ou se o solver não
+# achar solução dentro do tempo, as funções retornam None e quem chamou usa o guloso.
+
+import logging
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from backend.elegibilidade import MatrizElegibilidade
+from backend.modelos_escala import EscalaEntry
+
+logger = logging.getLogger(__name__)
+
+PESO_VAGA = 10_000
+
+
+def _pesos_das_funcoes(snapshot):
+    """Peso de preencher uma vaga de cada função que o guloso aloca individualmente."""
+    principais = sorted((f for f in snapshot.funcoes if f.tipo_funcao == 'PRINCIPAL'), key=lambda f: f.prioridade_alocacao)
+    id_apoio = next(f.id_funcao for f in snapshot.funcoes if f.tipo_funcao == 'APOIO')
+    pesos = {id_apoio: PESO_VAGA}
+    for rank, funcao in enumerate(principais):
+        pesos[funcao.id_funcao] = PESO_VAGA + 10 * (len(principais) - rank)
+    return pesos
+
+
+class _Modelo:
+    """Variáveis e restrições do problema, montadas como listas esparsas (linha, coluna, valor)."""
+
+    def __init__(self):
+        self.custos = []
+        self.inteiras = []
+        self.superior = []
+        self._linhas_eq, self._linhas_ub = [], []
+
+    def variavel(self, custo, inteira=False, superior=1.0):
+        self.custos.append(custo)
+        self.inteiras.append(1 if inteira else 0)
+        self.superior.append(superior)
+        return len(self.custos) - 1
+
+    def igual_a_zero(self, termos):
+        self._linhas_eq.append(termos)
+
+    def no_maximo(self, termos, limite):
+        self._linhas_ub.append((termos, limite))
+
+    @staticmethod
+    def _matriz(linhas, n_colunas):
+        from scipy.sparse import csr_matrix
+        dados, ids_linha, ids_coluna = [], [], []
+        for i, termos in enumerate(linhas):
+            for coluna, valor in termos:
+                ids_linha.append(i)
+                ids_coluna.append(coluna)
+                dados.append(valor)
+        return csr_matrix((dados, (ids_linha, ids_coluna)), shape=(len(linhas), n_colunas))
+
+    def matrizes(self):
+        n = len(self.custos)
+        a_eq = self._matriz(self._linhas_eq, n)
+        a_ub = self._matriz([termos for termos, _ in self._linhas_ub], n)
+        b_ub = np.array([limite for _, limite in self._linhas_ub], dtype=float)
+        return np.array(self.custos, dtype=float), a_eq, a_ub, b_ub
+
+
+def _montar(snapshot, vagas, escala_fixa, com_grupos):
+    """
+    Monta o modelo para as vagas que 'escala_fixa' deixou livres.
+    Retorna (modelo, arcos, livres), onde arcos[i] = (id_voluntario, id_funcao, id_evento)
+    da variável i e livres[(id_funcao, id_evento)] = instâncias ainda sem ninguém.
+    """
+    pesos = _pesos_das_funcoes(snapshot)
+    ocupadas = {(e.id_evento, e.id_funcao, e.funcao_instancia) for e in escala_fixa}
+    carga_fixa = Counter(e.id_voluntario for e in escala_fixa)
+    livres = defaultdict(list)
+    for vaga in vagas:
+        if (vaga.id_evento, vaga.id_funcao, vaga.funcao_instancia) not in ocupadas:
+            livres[(vaga.id_funcao, vaga.id_evento)].append(vaga.funcao_instancia)
+    lotacao_inicial = Counter(e.id_evento for e in escala_fixa)
+
+    grupo_de = {v.id_voluntario: v.id_grupo for v in snapshot.voluntarios if v.id_grupo is not None}
+    # Eventos em que o grupo já serve pela escala fixa contam no limite do grupo.
+    eventos_fixos = defaultdict(set)
+    for e in escala_fixa:
+        if e.id_voluntario in grupo_de:
+            eventos_fixos[grupo_de[e.id_voluntario]].add(e.id_evento)
+    limite_grupo = {g.id_grupo: g.limite_escalas_grupo - len(eventos_fixos[g.id_grupo]) for g in snapshot.grupos}
+    grupos_validos = {g.id_grupo: g for g in snapshot.grupos if g.membros and limite_grupo[g.id_grupo] > 0} if com_grupos else {}
+    individuais = [v for v in snapshot.voluntarios if v.id_grupo is None]
+    membros = [v for v in snapshot.voluntarios if v.id_grupo in grupos_validos]
+    grupo_do_membro = {v.id_voluntario: v.id_grupo for v in membros}
+
+    matriz = MatrizElegibilidade(snapshot, vagas)
+    matriz.registrar_escala(escala_fixa)
+    eventos = snapshot.eventos
+    modelo = _Modelo()
+    arcos = []
+    por_voluntario = defaultdict(list)
+    por_voluntario_dia = defaultdict(list)
+    por_vaga = defaultdict(list)
+    por_evento = defaultdict(list)
+    por_membro_evento = defaultdict(list)
+
+    for id_funcao in sorted({f for f, _ in livres}):
+        # Individuais só nas funções que o guloso aloca individualmente; membros de grupo
+        # em qualquer função do perfil (como na fase de grupos).
+        candidatos = ([v for v in individuais if id_funcao in pesos] if id_funcao in pesos else []) + membros
+        if not candidatos:
+            continue
+        mascara = matriz.mascara_eventos([v.id_voluntario for v in candidatos], id_funcao)
+        for c, e in zip(*np.nonzero(mascara)):
+            evento = eventos[e]
+            if (id_funcao, evento.id_evento) not in livres:
+                continue
+            voluntario = candidatos[c]
+            x = modelo.variavel(-pesos.get(id_funcao, PESO_VAGA), inteira=True)
+            arcos.append((voluntario.id_voluntario, id_funcao, evento.id_evento))
+            por_voluntario[voluntario.id_voluntario].append(x)
+            por_voluntario_dia[(voluntario.id_voluntario, evento.data_evento)].append(x)
+            por_vaga[(id_funcao, evento.id_evento)].append(x)
+            por_evento[evento.id_evento].append(x)
+            if voluntario.id_voluntario in grupo_do_membro:
+                por_membro_evento[(voluntario.id_voluntario, evento.id_evento)].append(x)
+
+    # Limite mensal, com custo crescente por escala (espalha a carga); a escala fixa já conta.
+    limites = {v.id_voluntario: v.limite_escalas_mes for v in snapshot.voluntarios}
+    for id_voluntario, xs in por_voluntario.items():
+        ja = carga_fixa[id_voluntario]
+        cargas = [modelo.variavel(k) for k in range(ja + 1, min(limites[id_voluntario], ja + len(xs)) + 1)]
+        modelo.igual_a_zero([(x, 1) for x in xs] + [(s, -1) for s in cargas])
+    # Lotação do evento, com custo crescente por pessoa (equilibra os eventos).
+    for id_evento, xs in por_evento.items():
+        base = lotacao_inicial[id_evento]
+        capacidade = sum(len(livres[(f, ev)]) for f, ev in livres if ev == id_evento)
+        lotacoes = [modelo.variavel(base + k) for k in range(1, capacidade + 1)]
+        modelo.igual_a_zero([(x, 1) for x in xs] + [(t, -1) for t in lotacoes])
+    # Um serviço por dia.
+    for xs in por_voluntario_dia.values():
+        modelo.no_maximo([(x, 1) for x in xs], 1)
+    # Quantidade de vagas livres de cada função em cada evento.
+    for chave, xs in por_vaga.items():
+        modelo.no_maximo([(x, 1) for x in xs], len(livres[chave]))
+
+    # Grupos: um membro só serve em um evento se o grupo inteiro servir nele.
+    if grupos_validos:
+        membros_por_grupo = defaultdict(list)
+        for v in membros:
+            membros_por_grupo[v.id_grupo].append(v.id_voluntario)
+        for id_grupo, grupo in grupos_validos.items():
+            ys = []
+            for evento in eventos:
+                y = modelo.variavel(0, inteira=True)
+                ys.append(y)
+                for id_membro in membros_por_grupo[id_grupo]:
+                    xs = por_membro_evento.get((id_membro, evento.id_evento), [])
+                    modelo.igual_a_zero([(x, 1) for x in xs] + [(y, -1)])
+            modelo.no_maximo([(y, 1) for y in ys], limite_grupo[id_grupo])
+
+    return modelo, arcos, livres
+
+
+def _entradas(arcos, valores, livres):
+    """Converte a solução em EscalaEntry, numerando as instâncias livres de cada vaga."""
+    escolhidos = sorted(arco for arco, valor in zip(arcos, valores) if valor > 0.5)
+    proximas = {chave: iter(sorted(instancias)) for chave, instancias in livres.items()}
+    entradas = []
+    for id_voluntario, id_funcao, id_evento in escolhidos:
+        instancia = next(proximas[(id_funcao, id_evento)], None)
+        if instancia is None:
+            return None  # solução violou a capacidade: descarta
+        entradas.append(EscalaEntry(id_evento, id_funcao, id_voluntario, instancia))
+    return entradas
+
+
+def alocar_por_fluxo(snapshot, vagas, escala_gulosa, tempo_limite, escala_fixa=()):
+    """
+    Mantém 'escala_fixa' (vagas fixadas) e as alocações de grupo do guloso e redistribui os
+    individuais por fluxo de custo mínimo. Retorna a lista completa de EscalaEntry, ou None.
+    """
+    from scipy.optimize import linprog
+
+    grupos = {v.id_voluntario for v in snapshot.voluntarios if v.id_grupo is not None}
+    chaves_fixas = {(e.id_evento, e.id_funcao, e.funcao_instancia) for e in escala_fixa}
+    escala_fixa = list(escala_fixa) + [e for e in escala_gulosa if e.id_voluntario in grupos
+                                       and (e.id_evento, e.id_funcao, e.funcao_instancia) not in chaves_fixas]
+    modelo, arcos, livres = _montar(snapshot, vagas, escala_fixa, com_grupos=False)
+    if not arcos:
+        return list(escala_fixa)
+    c, a_eq, a_ub, b_ub = modelo.matrizes()
+    resultado = linprog(
+        c, A_ub=a_ub, b_ub=b_ub, A_eq=a_eq, b_eq=np.zeros(a_eq.shape[0]),
+        bounds=list(zip([0] * len(c), modelo.superior)), method='highs-ds',
+        options={'time_limit': max(tempo_limite, 0.1)},
+    )
+    if resultado.status != 0 or resultado.x is None:
+        logger.warning("Motor 'flow' sem solução (%s)", resultado.message)
+        return None
+    valores = resultado.x[:len(arcos)]
+    if np.any((valores > 1e-6) & (valores < 1 - 1e-6)):
+        logger.warning("Motor 'flow' devolveu solução fracionária; descartada.")
+        return None
+    entradas = _entradas(arcos, valores, livres)
+    return None if entradas is None else escala_fixa + entradas
+
+
+def alocar_por_milp(snapshot, vagas, escala_gulosa, tempo_limite, escala_fixa=()):
+    """Otimiza grupos e individuais juntos em volta de 'escala_fixa'. Retorna a lista de EscalaEntry, ou None."""
+    from scipy.optimize import Bounds, LinearConstraint, milp
+
+    escala_fixa = list(escala_fixa)
+    modelo, arcos, livres = _montar(snapshot, vagas, escala_fixa, com_grupos=True)
+    if not arcos:
+        return escala_fixa
+    c, a_eq, a_ub, b_ub = modelo.matrizes()
+    restricoes = []
+    if a_eq.shape[0]:
+        restricoes.append(LinearConstraint(a_eq, 0, 0))
+    if a_ub.shape[0]:
+        restricoes.append(LinearConstraint(a_ub, -np.inf, b_ub))
+    resultado = milp(
+        c, constraints=restricoes, integrality=np.array(modelo.inteiras),
+        bounds=Bounds(0, np.array(modelo.superior)),
+        options={'time_limit': max(tempo_limite, 0.1)},
+    )
+    if resultado.x is None:
+        logger.warning("Motor 'milp' sem solução (%s)", resultado.message)
+        return None
+    entradas = _entradas(arcos, resultado.x[:len(arcos)], livres)
+    return None if entradas is None else escala_fixa + entradas
@@ -0,0 +1,170 @@
+# registro.py - Logging da API: níveis, fila (emitir não bloqueia), segredos mascarados e rastros
+#
+# configurar_logging() (chamado uma vez, no import da api, depois do .env) liga o logger "backend" a um
+# QueueHandler: quem loga só põe o registro em uma fila, e uma thread (QueueListener) formata
+# e escreve no stdout. Sob o gunicorn, nenhuma thread de requisição ou de geração fica
+# esperando o terminal.
+#   ESCALA_LOG_NIVEL   - nível do que vai para o stdout (padrão INFO; DEBUG mostra cada alocação);
+#   ESCALA_LOG_FORMATO - "texto" (padrão) ou "json" (uma linha JSON por registro, com os campos extras).
+# Senhas em URLs de banco, password=..., tokens Bearer e JWTs são mascarados antes de sair.
+#
+# Rastro: dentro de 'with capturar_rastro(...) as rastro', os registros da thread atual,
+# inclusive os DEBUG (que não vão para o stdout), ficam em memória em rastro.linhas, até
+# MAX_LINHAS_RASTRO. Os jobs de geração guardam o rastro da execução (jobs_escala.py).
+# Sem configurar_logging() (scripts, benchmark), o logging fica no padrão do Python e os
+# DEBUG do motor nem chegam a ser montados.
+
+import contextlib
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+from collections import deque
+from datetime import datetime, timezone
+
+MAX_LINHAS_RASTRO = int(os.environ.get('ESCALA_LOG_LINHAS_RASTRO', 5000))
+
+_SEGREDOS = (
+    (re.compile(r"(\b[a-z][a-z0-9+.-]*://[^:/\s@]+:)[^@\s]+@", re.IGNORECASE), r"\1***@"),
+    (re.compile(r"\b(password|passwd|pwd|senha)(\s*[=:]\s*)('[^']*'|\"[^\"]*\"|[^\s&;,]+)", re.IGNORECASE), r"\1\2***"),
+    (re.compile(r"\b(Bearer\s+)[A-Za-z0-9._~+/=-]+", re.IGNORECASE), r"\1***"),
+    (re.compile(r"\beyJ[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+"), "***"),
+)
+
+# Atributos que todo LogRecord tem; o resto veio de 'extra=' (ou do contexto do rastro).
+_ATRIBUTOS_PADRAO = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_rastro_atual = contextvars.ContextVar("rastro_escala", default=None)
+_listener = None
+
+
+def mascarar(texto):
+    """Texto com os segredos conhecidos trocados por ***."""
+    for padrao, troca in _SEGREDOS:
+        texto = padrao.sub(troca, texto)
+    return texto
+
+
+def _extras(record):
+    return {k: v for k, v in vars(record).items() if k not in _ATRIBUTOS_PADRAO}
+
+
+class Rastro:
+    """Registros de uma execução, em memória (os mais antigos saem depois de 'maximo')."""
+
+    def __init__(self, contexto=None, maximo=MAX_LINHAS_RASTRO):
+        self.contexto = dict(contexto or {})
+        self._linhas = deque(maxlen=maximo)
+        self.descartadas = 0
+
+    def adicionar(self, record):
+        if len(self._linhas) == self._linhas.maxlen:
+            self.descartadas += 1
+        self._linhas.append({
+            "instante": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "nivel": record.levelname,
+            "origem": record.name,
+            "mensagem": mascarar(record.getMessage()),
+        })
+
+    @property
+    def linhas(self):
+        return list(self._linhas)
+
+
+@contextlib.contextmanager
+def capturar_rastro(**contexto):
+    """
+    Guarda em um Rastro os registros emitidos por esta thread dentro do bloco. Os campos de
+    'contexto' (ex: id_job) também entram em cada registro que vai para o stdout.
+    """
+    rastro = Rastro(contexto)
+    token = _rastro_atual.set(rastro)
+    try:
+        yield rastro
+    finally:
+        _rastro_atual.reset(token)
+
+
+class _HandlerRastro(logging.Handler):
+    """
+    Primeiro handler do logger 'backend' (nível DEBUG): guarda o registro no rastro ativo da
+    thread e copia o contexto dele para o registro, antes de ele ir para a fila.
+    """
+
+    def emit(self, record):
+        rastro = _rastro_atual.get()
+        if rastro is None:
+            return
+        for chave, valor in rastro.contexto.items():
+            if not hasattr(record, chave):
+                setattr(record, chave, valor)
+        rastro.adicionar(record)
+
+
+class _QueueHandlerMascarado(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # prepare() já junta mensagem, argumentos e traceback em record.msg (tudo texto).
+        record = super().prepare(record)
+        record.msg = mascarar(record.msg)
+        return record
+
+
+class _FormatoTexto(logging.Formatter):
+    def format(self, record):
+        texto = super().format(record)
+        extras = _extras(record)
+        if extras:
+            texto += " " + " ".join(f"{k}={v}" for k, v in extras.items())
+        return texto
+
+
+class _FormatoJson(logging.Formatter):
+    def format(self, record):
+        return json.dumps({
+            "instante": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "nivel": record.levelname,
+            "origem": record.name,
+            "mensagem": record.getMessage(),
+            **_extras(record),
+        }, ensure_ascii=False, default=str)
+
+
+def configurar_logging(nivel=None, formato=None):
+    """
+    Liga o logger 'backend' à fila e inicia a thread que escreve no stdout (só na primeira
+    chamada). Sem argumentos, usa ESCALA_LOG_NIVEL e ESCALA_LOG_FORMATO (lidos agora, depois do .env).
+    """
+    global _listener
+    if _listener is not None:
+        return
+    nivel = (nivel or os.environ.get('ESCALA_LOG_NIVEL', 'INFO')).upper()
+    formato = (formato or os.environ.get('ESCALA_LOG_FORMATO', 'texto')).lower()
+    saida = logging.StreamHandler(sys.stdout)
+    saida.setFormatter(_FormatoJson() if formato == "json" else _FormatoTexto("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    fila = queue.SimpleQueue()
+    handler = _QueueHandlerMascarado(fila)
+    handler.setLevel(nivel)
+
+    logger = logging.getLogger("backend")
+    # O logger deixa passar DEBUG para o rastro; o que vai para o stdout é filtrado no handler da fila.
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(_HandlerRastro(logging.DEBUG))
+    logger.addHandler(handler)
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(fila, saida, respect_handler_level=True)
+    _listener.start()
+
+
+def encerrar_logging():
+    """Esvazia a fila e para a thread de escrita (desligamento da API)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
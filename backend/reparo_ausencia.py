@@ -0,0 +1,117 @@
+# reparo_ausencia.py - Substitutos para um voluntário que avisou ausência no mês já publicado
+#
+# Em vez de regerar o mês (ou o líder procurar vaga por vaga em /escala/vaga-elegiveis),
+# procura o menor conjunto de mudanças que cobre as vagas que o voluntário deixa:
+#   substituir - um voluntário livre assume a vaga (1 mudança);
+#   cadeia     - v larga a vaga t para assumir a vaga deixada e um w livre assume t
+#                (2 mudanças; resolve quando ninguém livre podia pegar a vaga).
+# Roda em memória sobre o snapshot do mês e a escala publicada, com o estado da busca local
+# (busca_local.EstadoBuscaLocal): mesmas regras de função, disponibilidade, indisponibilidade,
+# mesmo dia e limite mensal da geração. Fora as cadeias, nada se move; vagas fixadas nunca.
+#
+# O resultado é só um plano (lista de mudanças por vaga); quem grava é
+# database.aplicar_reparo_ausencia, em uma transação.
+
+from dataclasses import replace
+from datetime import date
+
+from backend.busca_local import EstadoBuscaLocal
+from backend.modelos_escala import chave_da_entrada
+from backend.motor_escala import vagas_do_snapshot
+
+
+def _mudanca(nomes, vaga, chave, anterior, novo, tipo):
+    nomes_voluntarios, nomes_funcoes = nomes
+    id_evento, id_funcao, instancia = chave
+    return {
+        "id_evento": id_evento,
+        "id_funcao": id_funcao,
+        "funcao_instancia": instancia,
+        "data_evento": date.fromordinal(vaga.dia).isoformat() if vaga else None,
+        "nome_funcao": nomes_funcoes.get(id_funcao),
+        "id_voluntario_anterior": anterior,
+        "nome_voluntario_anterior": nomes_voluntarios.get(anterior),
+        "id_voluntario_novo": novo,
+        "nome_voluntario_novo": nomes_voluntarios.get(novo),
+        "tipo": tipo,
+    }
+
+
+def planejar_reparo(snapshot, existentes, id_voluntario, ids_eventos=None):
+    """
+    Planeja a cobertura das vagas de 'id_voluntario' nos eventos 'ids_eventos' (None = todos
+    os eventos do mês em que ele está escalado). 'existentes' é a escala publicada, uma lista
+    de (EscalaEntry, fixada). Retorna o plano: as mudanças por vaga (tipo "substituicao",
+    "cadeia" ou "sem_substituto") e os totais.
+    """
+    escala = [e for e, _ in existentes]
+    if ids_eventos is None:
+        ids_eventos = {e.id_evento for e in escala if e.id_voluntario == id_voluntario}
+    ids_eventos = set(ids_eventos)
+
+    # A ausência vira indisponibilidade no snapshot, então as regras da geração já a respeitam.
+    snapshot = replace(snapshot, voluntarios=tuple(
+        replace(v, indisponibilidades=v.indisponibilidades | ids_eventos) if v.id_voluntario == id_voluntario else v
+        for v in snapshot.voluntarios
+    ))
+    vagas = vagas_do_snapshot(snapshot)
+    por_instancia = {v.key: j for j, v in enumerate(vagas)}
+
+    # Só entra no estado o que cabe em uma vaga atual; o resto da escala fica como está.
+    # Um voluntário com duas vagas no mesmo dia (edição manual) não é movido por cadeia.
+    mantidas, fixas, saindo = [], [], []
+    usadas, dias = set(), set()
+    for entrada, fixada in existentes:
+        j = por_instancia.get(chave_da_entrada(entrada))
+        if entrada.id_voluntario == id_voluntario and entrada.id_evento in ids_eventos:
+            saindo.append((entrada, j))
+            continue
+        if j is None or j in usadas:
+            continue
+        usadas.add(j)
+        mantidas.append(entrada)
+        dia = (entrada.id_voluntario, vagas[j].dia)
+        if fixada or dia in dias:
+            fixas.append(entrada)
+        dias.add(dia)
+
+    estado = EstadoBuscaLocal(snapshot, vagas, mantidas, fixas, excluir={id_voluntario})
+    anterior = list(estado.ocupante)
+    lacunas = {j for _, j in saindo if j is not None and j not in usadas}
+    for j in lacunas:
+        anterior[j] = id_voluntario
+
+    # As vagas com menos candidatos primeiro, para ninguém "gastar" o único substituto de outra.
+    tipos = {}
+    for j in sorted(lacunas, key=lambda j: len(estado.elegiveis[j])):
+        preenchimento = estado.melhor_preenchimento(j)
+        if preenchimento is not None:
+            estado.preencher(j, preenchimento[1])
+            tipos[j] = "substituicao"
+            continue
+        cadeia = estado.melhor_cadeia(j)
+        if cadeia is not None:
+            _, v, t, w = cadeia
+            estado.aplicar_cadeia(j, v, t, w)
+            tipos[j] = tipos[t] = "cadeia"
+        else:
+            tipos[j] = "sem_substituto"
+
+    nomes = ({v.id_voluntario: v.nome_voluntario for v in snapshot.voluntarios},
+             {f.id_funcao: f.nome_funcao for f in snapshot.funcoes})
+    mudancas = [_mudanca(nomes, vagas[j], vagas[j].key, anterior[j], estado.ocupante[j], tipo) for j, tipo in tipos.items()]
+    # Vaga que já não existe (a cota diminuiu) ou que outra linha ocupa: o voluntário só sai.
+    for entrada, j in saindo:
+        if j is None or j in usadas:
+            mudancas.append(_mudanca(nomes, vagas[j] if j is not None else None, chave_da_entrada(entrada), id_voluntario, None, "sem_substituto"))
+    mudancas.sort(key=lambda m: (m["data_evento"] or "", m["id_evento"], m["id_funcao"], m["funcao_instancia"]))
+
+    sem_substituto = sum(1 for m in mudancas if m["tipo"] == "sem_substituto")
+    return {
+        "id_voluntario": id_voluntario,
+        "ids_eventos": sorted(ids_eventos),
+        "vagas_deixadas": len(saindo),
+        "cobertas": len(saindo) - sem_substituto,
+        "sem_substituto": sem_substituto,
+        "mudancas": mudancas,
+    }
@@ -0,0 +1,110 @@
+# simulacao.py - Simulação da geração ("e se...?") sem gravar nada
+#
+# O líder quer saber o que a geração faria antes de trocar a escala publicada, ou o que
+# mudaria com uma hipótese: mais uma vaga de uma função em um serviço, um voluntário com
+# outra disponibilidade, outro limite mensal...
+#   aplicar_hipoteses - devolve um snapshot novo com as hipóteses (o snapshot é imutável);
+#   comparar_escalas  - diferença vaga a vaga entre a escala publicada e a simulada, com o
+#                       preenchimento e a carga de cada voluntário antes e depois.
+# Quem roda o motor é database.simular_escala.
+
+from collections import Counter
+from dataclasses import replace
+
+from backend.modelos_escala import CotaSnapshot
+from backend.motor_escala import vagas_do_snapshot
+
+# Campos de VoluntarioSnapshot que uma hipótese pode trocar (os de conjunto viram frozenset).
+CAMPOS_VOLUNTARIO = ("limite_escalas_mes", "funcoes", "disponibilidade", "indisponibilidades")
+
+
+def aplicar_hipoteses(snapshot, cotas=(), voluntarios=()):
+    """
+    'cotas': dicts {id_servico, id_funcao, quantidade_necessaria}, que substituem a cota do par
+    (ou a criam). 'voluntarios': dicts com id_voluntario e os CAMPOS_VOLUNTARIO a trocar (os
+    ausentes ou None ficam como estão). Levanta ValueError para ids que não são do ministério.
+    """
+    servicos = {s.id_servico for s in snapshot.servicos}
+    funcoes = {f.id_funcao for f in snapshot.funcoes}
+    novas_cotas = {(c.id_servico, c.id_funcao): c for c in snapshot.cotas}
+    for cota in cotas:
+        if cota["id_servico"] not in servicos or cota["id_funcao"] not in funcoes:
+            raise ValueError(f"Cota hipotética para serviço/função que não existe: {cota['id_servico']}/{cota['id_funcao']}.")
+        novas_cotas[(cota["id_servico"], cota["id_funcao"])] = CotaSnapshot(cota["id_servico"], cota["id_funcao"], cota["quantidade_necessaria"])
+
+    trocas = {h["id_voluntario"]: h for h in voluntarios}
+    desconhecidos = set(trocas) - {v.id_voluntario for v in snapshot.voluntarios}
+    if desconhecidos:
+        raise ValueError(f"Voluntários não encontrados (ou inativos): {sorted(desconhecidos)}.")
+    novos_voluntarios = []
+    for v in snapshot.voluntarios:
+        hipotese = trocas.get(v.id_voluntario)
+        if hipotese:
+            campos = {c: hipotese[c] for c in CAMPOS_VOLUNTARIO if hipotese.get(c) is not None}
+            for c in ("funcoes", "disponibilidade", "indisponibilidades"):
+                if c in campos:
+                    campos[c] = frozenset(campos[c])
+            v = replace(v, **campos)
+        novos_voluntarios.append(v)
+
+    return replace(snapshot, cotas=tuple(novas_cotas.values()), voluntarios=tuple(novos_voluntarios))
+
+
+def comparar_escalas(snapshot, antes, depois, snapshot_antes=None):
+    """
+    Diferença entre duas escalas do mês (listas de EscalaEntry): as vagas adicionadas
+    (estavam vazias), removidas (ficaram vazias) e trocadas (outro voluntário), o
+    preenchimento de cada uma e a carga de cada voluntário que tem escala em alguma delas.
+    'snapshot_antes' é o snapshot sem as hipóteses (as vagas de 'antes'); padrão: 'snapshot'.
+    """
+    def chave(e):
+        return e.id_evento, e.id_funcao, e.funcao_instancia
+
+    snapshot_antes = snapshot_antes or snapshot
+    ocupante_antes = {chave(e): e.id_voluntario for e in antes}
+    ocupante_depois = {chave(e): e.id_voluntario for e in depois}
+    datas = {ev.id_evento: ev.data_evento.isoformat() for ev in snapshot.eventos}
+    nomes = {v.id_voluntario: v.nome_voluntario for v in snapshot.voluntarios}
+    nomes_funcoes = {f.id_funcao: f.nome_funcao for f in snapshot.funcoes}
+
+    mudancas = []
+    for k in sorted(set(ocupante_antes) | set(ocupante_depois), key=lambda k: (datas.get(k[0], ""), *k)):
+        anterior, novo = ocupante_antes.get(k), ocupante_depois.get(k)
+        if anterior == novo:
+            continue
+        tipo = "adicionada" if anterior is None else "removida" if novo is None else "trocada"
+        mudancas.append({
+            "id_evento": k[0], "id_funcao": k[1], "funcao_instancia": k[2],
+            "data_evento": datas.get(k[0]), "nome_funcao": nomes_funcoes.get(k[1]),
+            "id_voluntario_anterior": anterior, "nome_voluntario_anterior": nomes.get(anterior),
+            "id_voluntario_novo": novo, "nome_voluntario_novo": nomes.get(novo),
+            "tipo": tipo,
+        })
+
+    vagas_antes = {chave(v) for v in vagas_do_snapshot(snapshot_antes)}
+    vagas_depois = {chave(v) for v in vagas_do_snapshot(snapshot)}
+    preenchidas_antes = len(vagas_antes & set(ocupante_antes))
+    preenchidas_depois = len(vagas_depois & set(ocupante_depois))
+    por_tipo = Counter(m["tipo"] for m in mudancas)
+
+    carga_antes = Counter(ocupante_antes.values())
+    carga_depois = Counter(ocupante_depois.values())
+    limites = {v.id_voluntario: v.limite_escalas_mes for v in snapshot.voluntarios}
+    carga = [
+        {"id_voluntario": id_voluntario, "nome_voluntario": nomes.get(id_voluntario), "limite_escalas_mes": limites.get(id_voluntario),
+         "antes": carga_antes[id_voluntario], "depois": carga_depois[id_voluntario]}
+        for id_voluntario in sorted(set(carga_antes) | set(carga_depois), key=lambda i: (nomes.get(i) or "", i))
+    ]
+
+    return {
+        "resumo": {
+            "vagas_antes": len(vagas_antes), "vagas_depois": len(vagas_depois),
+            "preenchidas_antes": preenchidas_antes, "preenchidas_depois": preenchidas_depois,
+            "preenchimento_antes": round(preenchidas_antes / len(vagas_antes), 4) if vagas_antes else 1.0,
+            "preenchimento_depois": round(preenchidas_depois / len(vagas_depois), 4) if vagas_depois else 1.0,
+            "adicionadas": por_tipo["adicionada"], "removidas": por_tipo["removida"], "trocadas": por_tipo["trocada"],
+            "iguais": len(set(ocupante_antes.items()) & set(ocupante_depois.items())),
+        },
+        "mudancas": mudancas,
+        "carga": carga,
+    }
@@ -10,18 +10,44 @@ import './GerarEscalaPage.css';
 const meses = { 1: "Janeiro", 2: "Fevereiro", 3: "Março", 4: "Abril", 5: "Maio", 6: "Junho", 7: "Julho", 8: "Agosto", 9: "Setembro", 10: "Outubro", 11: "Novembro", 12: "Dezembro" };
 const anos = [new Date().getFullYear(), new Date().getFullYear() + 1];
 const getSlotKey = (item) => `${item.id_evento}-${item.id_funcao}-${item.funcao_instancia}`;
+const INTERVALO_POLLING_MS = 1000;
+const descricaoFases = {
+    carga: "Carregando dados do ministério",
+    viabilidade: "Calculando quantas vagas dá para preencher",
+    grupos: "Alocando grupos",
+    individuais: "Alocando voluntários individuais",
+    tentativas: "Comparando tentativas",
+    busca_local: "Preenchendo vagas com trocas",
+    otimizacao: "Otimizando a escala",
+    gravacao: "Salvando a escala",
+};
+const esperar = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+const descreverProgresso = (job) => {
+    if (!job || job.status === 'pendente') return "Na fila para gerar a escala...";
+    const p = job.progresso || {};
+    let texto = descricaoFases[job.fase] || "O algoritmo está trabalhando...";
+    if (job.fase === 'grupos' && p.total_grupos) texto += ` (${p.grupos}/${p.total_grupos})`;
+    if (job.fase === 'individuais' && p.rodadas) texto += ` (rodada ${p.rodada}/${p.rodadas})`;
+    if (job.fase === 'tentativas' && p.total_tentativas) texto += ` (${p.tentativas}/${p.total_tentativas})`;
+    if (p.vagas) texto += ` - ${p.alocacoes || 0} de ${p.vagas} vagas preenchidas`;
+    return texto;
+};
 
 function GerarEscalaPage() {
     const [selectedMes, setSelectedMes] = useState(new Date().getMonth() + 1);
     const [selectedAno, setSelectedAno] = useState(new Date().getFullYear());
     const [escala, setEscala] = useState([]);
+    const [versaoEscala, setVersaoEscala] = useState(null); // cursor do diário de alterações do mês
     const [voluntarios, setVoluntarios] = useState([]);
     const [loading, setLoading] = useState(false);
     const [generating, setGenerating] = useState(false);
+    const [jobGeracao, setJobGeracao] = useState(null);
     const [creatingEvents, setCreatingEvents] = useState(false); 
     const [error, setError] = useState(null);
     const [editingSlotKey, setEditingSlotKey] = useState(null);
     const [availableVolunteers, setAvailableVolunteers] = useState([]);
+    const [elegibilidade, setElegibilidade] = useState(null); // quem pode assumir cada (evento, função), na versaoEscala atual
     const [actionToConfirm, setActionToConfirm] = useState(null);
     const [isConfirmModalOpen, setIsConfirmModalOpen] = useState(false);
     
@@ -32,15 +58,37 @@ function GerarEscalaPage() {
         fetchData();
     }, [selectedMes, selectedAno]);
 
+    // Elegibilidade do mês inteiro em uma chamada (índice em memória no backend, mesmas regras da geração),
+    // guardada por (evento, função). Só é buscada de novo quando a escala muda (carga do mês ou alterações).
+    const carregarElegibilidade = async () => {
+        try {
+            const idMinisterio = 1;
+            const { data } = await api.get(`/ministerios/${idMinisterio}/escala/${selectedAno}/${selectedMes}/elegibilidade`);
+            const nomes = new Map(data.voluntarios.map(v => [v.id_voluntario, v.nome_voluntario]));
+            const porPar = new Map(data.vagas.map(v => [`${v.id_evento}-${v.id_funcao}`,
+                v.elegiveis.map(id => ({ id_voluntario: id, nome_voluntario: nomes.get(id) }))]));
+            setElegibilidade(porPar);
+            return porPar;
+        } catch (err) {
+            setElegibilidade(null);
+            return null;
+        }
+    };
+
     const fetchData = async () => {
         setLoading(true);
         setError(null);
+        setElegibilidade(null);
         try {
             const idMinisterio = 1;
+            // O cursor vem antes do mês: o que mudar entre as duas leituras aparece na próxima consulta de alterações.
+            const resAlteracoes = await api.get(`/ministerios/${idMinisterio}/escala/${selectedAno}/${selectedMes}/alteracoes`);
             const [resEscala, resVoluntarios] = await Promise.all([
                 api.get(`/ministerios/${idMinisterio}/escala/${selectedAno}/${selectedMes}`),
-                api.get(`/ministerios/${idMinisterio}/voluntarios?inativos=false`)
+                api.get(`/ministerios/${idMinisterio}/voluntarios?inativos=false`),
+                carregarElegibilidade()
             ]);
+            setVersaoEscala(resAlteracoes.data.versao);
             setEscala(resEscala.data);
             setVoluntarios(resVoluntarios.data);
         } catch (err) {
@@ -51,6 +99,38 @@ function GerarEscalaPage() {
         }
     };
 
+    // Depois de uma edição, busca só as vagas que mudaram desde o cursor e troca essas no estado;
+    // se o mês inteiro mudou (geração, reversão...), recarrega tudo.
+    const aplicarAlteracoes = async () => {
+        const idMinisterio = 1;
+        const { data } = await api.get(`/ministerios/${idMinisterio}/escala/${selectedAno}/${selectedMes}/alteracoes`, {
+            params: { desde: versaoEscala ?? 0 }
+        });
+        if (data.recarregar || versaoEscala === null) {
+            await fetchData();
+            return;
+        }
+        const mudancas = new Map(data.mudancas.map(m => [getSlotKey(m), m]));
+        setEscala(atual => atual.map(item => {
+            const m = mudancas.get(getSlotKey(item));
+            return m ? { ...item, id_voluntario: m.id_voluntario, nome_voluntario: m.nome_voluntario, fixada: m.fixada } : item;
+        }));
+        if (data.versao !== versaoEscala) {
+            await carregarElegibilidade();
+        }
+        setVersaoEscala(data.versao);
+    };
+
+    const handleDesfazerRefazer = async (acao) => {
+        try {
+            const idMinisterio = 1;
+            await api.post(`/ministerios/${idMinisterio}/escala/${selectedAno}/${selectedMes}/${acao}`);
+            await aplicarAlteracoes();
+        } catch (err) {
+            setError(err.response?.data?.detail || `Falha ao ${acao} a edição.`);
+        }
+    };
+
     const handleCreateEvents = async () => {
       try {
         const idMinisterio = 1;
@@ -64,16 +144,32 @@ function GerarEscalaPage() {
       }
     };
 
-    const handleGerarEscala = async () => {
+    // A geração roda em segundo plano no backend: o POST devolve o job e a página
+    // consulta o status até ele terminar, mostrando a fase e o progresso.
+    // modo 'incremental' mantém o que continua válido e só preenche as vagas vazias.
+    const handleGerarEscala = async (modo = 'completo') => {
+      setGenerating(true);
+      setError(null);
       try {
         const idMinisterio = 1;
-        await api.post(`/ministerios/${idMinisterio}/escala/gerar`, {
+        const resposta = await api.post(`/ministerios/${idMinisterio}/escala/gerar`, {
           ano: selectedAno,
           mes: selectedMes,
-        });
+        }, { params: { modo } });
+        let job = resposta.data;
+        setJobGeracao(job);
+        while (job.status !== 'concluido' && job.status !== 'erro') {
+          await esperar(INTERVALO_POLLING_MS);
+          job = (await api.get(`/ministerios/${idMinisterio}/escala/jobs/${job.id_job}`)).data;
+          setJobGeracao(job);
+        }
+        if (job.status === 'erro') throw new Error(job.erro);
       } catch (err) {
-        setError("Ocorreu um erro ao gerar a escala.");
+        setError(err.message && !err.response ? err.message : "Ocorreu um erro ao gerar a escala.");
         throw err;
+      } finally {
+        setGenerating(false);
+        setJobGeracao(null);
       }
     };
 
@@ -94,8 +190,16 @@ function GerarEscalaPage() {
         if (actionToConfirm === 'generateScale') {
             return {
                 title: 'Confirmar Geração de Escala',
-                message: `Tem certeza que deseja gerar uma nova escala para ${meses[selectedMes]}/${selectedAno}? A escala atual (se existir) será apagada.`,
-                action: handleGerarEscala,
+                message: `Tem certeza que deseja gerar uma nova escala para ${meses[selectedMes]}/${selectedAno}? A escala atual (se existir) será substituída, exceto as vagas fixadas (📌).`,
+                action: () => handleGerarEscala('completo'),
+                onSuccess: fetchData
+            };
+        }
+        if (actionToConfirm === 'refillScale') {
+            return {
+                title: 'Preencher Vagas em Aberto',
+                message: `Preencher as vagas vazias de ${meses[selectedMes]}/${selectedAno}? As alocações que continuam válidas (e as fixadas) ficam como estão.`,
+                action: () => handleGerarEscala('incremental'),
                 onSuccess: fetchData
             };
         }
@@ -133,15 +237,13 @@ function GerarEscalaPage() {
     const handleEditSlot = async (item) => {
         if (editingSlotKey) return;
         try {
-            const response = await api.get(`/escala/vaga-elegiveis`, {
-                params: {
-                    id_funcao: item.id_funcao,
-                    id_evento: item.id_evento
-                }
-            });
+            // Consulta local na elegibilidade do mês; só vai ao backend se ela ainda não foi carregada.
+            const porPar = elegibilidade ?? await carregarElegibilidade();
+            if (!porPar) throw new Error("elegibilidade indisponível");
+            const elegiveis = [...(porPar.get(`${item.id_evento}-${item.id_funcao}`) ?? [])];
 
-            const currentVolunteerInList = response.data.some(v => v.id_voluntario === item.id_voluntario);
-            let finalVolunteerList = response.data;
+            const currentVolunteerInList = elegiveis.some(v => v.id_voluntario === item.id_voluntario);
+            let finalVolunteerList = elegiveis;
             if (item.id_voluntario && !currentVolunteerInList) {
                 finalVolunteerList.unshift({ id_voluntario: item.id_voluntario, nome_voluntario: item.nome_voluntario });
             }
@@ -153,6 +255,21 @@ function GerarEscalaPage() {
         }
     };
 
+    const handleToggleFixada = async (item) => {
+        try {
+            await api.put(`/escala/vaga`, {
+                id_evento: item.id_evento,
+                id_funcao: item.id_funcao,
+                funcao_instancia: item.funcao_instancia,
+                id_voluntario: item.id_voluntario,
+                fixada: !item.fixada,
+            });
+            await aplicarAlteracoes();
+        } catch (err) {
+            setError("Falha ao fixar a vaga.");
+        }
+    };
+
     const handleUpdateSlot = async (e, item) => {
         const novoVoluntarioId = e.target.value ? parseInt(e.target.value) : null;
         const vagaParaAtualizar = {
@@ -164,7 +281,7 @@ function GerarEscalaPage() {
         try {
             await api.put(`/escala/vaga`, vagaParaAtualizar);
             setEditingSlotKey(null);
-            await fetchData();
+            await aplicarAlteracoes();
         } catch (err) {
             setError("Falha ao atualizar a vaga.");
             setEditingSlotKey(null);
@@ -215,7 +332,7 @@ function GerarEscalaPage() {
     }, [voluntarios, voluntarioContagemMap]);
 
     const renderContent = () => {
-        if (loading || generating) return <Spinner text={generating ? "O algoritmo está trabalhando... Isso pode levar alguns segundos." : "Carregando escala..."} />;
+        if (loading || generating) return <Spinner text={generating ? descreverProgresso(jobGeracao) : "Carregando escala..."} />;
         if (error) return <p className="error-message">{error}</p>;
         if (Object.keys(escalaAgrupadaPorServico).length === 0) return <div className="spinner-container"><p>Nenhuma escala encontrada. Selecione o período e clique em "Gerar Escala Automática".</p></div>;
         
@@ -259,6 +376,15 @@ function GerarEscalaPage() {
                                                             {contagem && item.nome_voluntario && ` (${contagem.escalado_vezes}/${contagem.limite})`}
                                                         </span>
                                                     )}
+                                                    {item.id_voluntario && editingSlotKey !== currentSlotKey && (
+                                                        <span
+                                                            onClick={() => handleToggleFixada(item)}
+                                                            title={item.fixada ? "Vaga fixada: a geração não mexe nela. Clique para soltar." : "Fixar vaga"}
+                                                            style={{ cursor: 'pointer', marginLeft: '0.25rem', opacity: item.fixada ? 1 : 0.25 }}
+                                                        >
+                                                            📌
+                                                        </span>
+                                                    )}
                                                 </div>
                                             );
                                         })}
@@ -300,9 +426,18 @@ function GerarEscalaPage() {
                 <button onClick={() => openConfirmModal('createEvents')} disabled={loading} className="add-btn" style={{backgroundColor: '#17a2b8'}}>
                     Criar Eventos do Mês
                 </button>
-                <button onClick={() => openConfirmModal('generateScale')} disabled={loading} className="add-btn">
+                <button onClick={() => openConfirmModal('generateScale')} disabled={loading || generating} className="add-btn">
                     Gerar Escala Automática
                 </button>
+                <button onClick={() => openConfirmModal('refillScale')} disabled={escala.length === 0 || loading || generating} className="add-btn" style={{backgroundColor: '#28a745'}}>
+                    Preencher Vagas em Aberto
+                </button>
+                <button onClick={() => handleDesfazerRefazer('desfazer')} disabled={escala.length === 0 || loading || generating} className="add-btn" style={{backgroundColor: '#6c757d'}}>
+                    Desfazer
+                </button>
+                <button onClick={() => handleDesfazerRefazer('refazer')} disabled={escala.length === 0 || loading || generating} className="add-btn" style={{backgroundColor: '#6c757d'}}>
+                    Refazer
+                </button>
                 {/* BOTÃO MODIFICADO */}
                 <button 
                     onClick={handleDownloadPdf} 
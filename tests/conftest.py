@@ -0,0 +1,58 @@
+# conftest.py - Dados comuns dos testes: os ministérios sintéticos do benchmark
+#
+# Os testes cobrem só os módulos puros (motor, busca local, caches, índice de elegibilidade);
+# nada aqui abre conexão com o banco.
+
+import json
+from collections import Counter
+
+import pytest
+
+from backend.benchmark.sintetico import CENARIOS, gerar_documento
+from backend.modelos_escala import SnapshotEscala, chave_da_entrada
+from backend.motor_escala import vagas_do_snapshot
+
+
+def snapshot_do_cenario(nome):
+    """SnapshotEscala do cenário sintético, pelo mesmo caminho do JSON que vem do banco."""
+    cenario = CENARIOS[nome]
+    documento = json.loads(json.dumps(gerar_documento(cenario), default=str))
+    return SnapshotEscala.from_json(1, cenario.ano, cenario.mes, documento)
+
+
+@pytest.fixture(scope="session")
+def snapshot_pequeno():
+    return snapshot_do_cenario("pequeno")
+
+
+@pytest.fixture(scope="session")
+def snapshot_medio():
+    return snapshot_do_cenario("medio")
+
+
+def violacoes(snapshot, escala):
+    """Regras da geração que a escala quebra (lista vazia = escala válida)."""
+    voluntarios = {v.id_voluntario: v for v in snapshot.voluntarios}
+    eventos = {ev.id_evento: ev for ev in snapshot.eventos}
+    vagas = {v.key for v in vagas_do_snapshot(snapshot)}
+    erros = []
+    chaves = Counter(chave_da_entrada(e) for e in escala)
+    erros += [f"vaga {k} ocupada {n} vezes" for k, n in chaves.items() if n > 1]
+    por_dia = Counter()
+    carga = Counter()
+    for e in escala:
+        v, ev = voluntarios[e.id_voluntario], eventos[e.id_evento]
+        if chave_da_entrada(e) not in vagas:
+            erros.append(f"{e} fora das vagas do mês")
+        if e.id_funcao not in v.funcoes:
+            erros.append(f"{e}: voluntário sem a função")
+        if ev.id_servico_fixo not in v.disponibilidade:
+            erros.append(f"{e}: voluntário indisponível para o serviço")
+        if e.id_evento in v.indisponibilidades:
+            erros.append(f"{e}: voluntário indisponível no evento")
+        por_dia[(e.id_voluntario, ev.data_evento)] += 1
+        carga[e.id_voluntario] += 1
+    erros += [f"voluntário {v} em {n} vagas em {d}" for (v, d), n in por_dia.items() if n > 1]
+    erros += [f"voluntário {v} com {n} escalas (limite {voluntarios[v].limite_escalas_mes})"
+              for v, n in carga.items() if n > voluntarios[v].limite_escalas_mes]
+    return erros
@@ -0,0 +1,23 @@
+import random
+
+from backend.busca_local import melhorar_escala
+from backend.modelos_escala import chave_da_entrada
+from backend.motor_escala import gerar_alocacoes, pontuar_escala, vagas_do_snapshot
+from tests.conftest import violacoes
+
+
+def test_busca_local_nao_piora_e_respeita_as_regras(snapshot_medio):
+    vagas = vagas_do_snapshot(snapshot_medio)
+    gulosa, _ = gerar_alocacoes(snapshot_medio, random.Random(3))
+    melhorada = melhorar_escala(snapshot_medio, vagas, gulosa, rng=random.Random(3))
+    assert violacoes(snapshot_medio, melhorada) == []
+    assert pontuar_escala(snapshot_medio, melhorada) >= pontuar_escala(snapshot_medio, gulosa)
+
+
+def test_busca_local_mantem_as_vagas_fixas(snapshot_medio):
+    vagas = vagas_do_snapshot(snapshot_medio)
+    gulosa, _ = gerar_alocacoes(snapshot_medio, random.Random(3))
+    fixas = gulosa[::5]
+    melhorada = melhorar_escala(snapshot_medio, vagas, gulosa, rng=random.Random(3), fixas=fixas)
+    assert {(chave_da_entrada(e), e.id_voluntario) for e in fixas} <= {(chave_da_entrada(e), e.id_voluntario) for e in melhorada}
+    assert violacoes(snapshot_medio, melhorada) == []
@@ -0,0 +1,84 @@
+import pytest
+
+from backend import cache_escala
+
+
+@pytest.fixture(autouse=True)
+def cache_vazio(monkeypatch):
+    monkeypatch.setattr(cache_escala, "_entradas", type(cache_escala._entradas)())
+    monkeypatch.setattr(cache_escala, "_versoes", type(cache_escala._versoes)(int))
+
+
+def test_guarda_e_obtem_na_mesma_versao():
+    versao = cache_escala.versao_do_mes(1, 2025, 3)
+    entrada = cache_escala.guardar(1, 2025, 3, versao, b'{"a": 1}')
+    assert cache_escala.obter(1, 2025, 3) is entrada
+    assert cache_escala.obter(1, 2025, 4) is None
+
+
+def test_invalidar_mes_descarta_so_o_mes():
+    for mes in (3, 4):
+        cache_escala.guardar(1, 2025, mes, cache_escala.versao_do_mes(1, 2025, mes), b"{}")
+    cache_escala.invalidar_mes(1, 2025, 3)
+    assert cache_escala.obter(1, 2025, 3) is None
+    assert cache_escala.obter(1, 2025, 4) is not None
+
+
+def test_invalidar_tudo_sobe_a_epoca():
+    versao = cache_escala.versao_do_mes(1, 2025, 3)
+    cache_escala.guardar(1, 2025, 3, versao, b"{}")
+    cache_escala.invalidar_tudo()
+    assert cache_escala.obter(1, 2025, 3) is None
+    assert cache_escala.versao_do_mes(1, 2025, 3) != versao
+
+
+def test_corpo_montado_durante_uma_escrita_nao_fica_no_cache():
+    versao = cache_escala.versao_do_mes(1, 2025, 3)
+    cache_escala.invalidar_mes(1, 2025, 3)
+    entrada = cache_escala.guardar(1, 2025, 3, versao, b"{}")
+    assert entrada.corpo == b"{}"
+    assert cache_escala.obter(1, 2025, 3) is None
+
+
+def test_ttl(monkeypatch):
+    cache_escala.guardar(1, 2025, 3, cache_escala.versao_do_mes(1, 2025, 3), b"{}")
+    monkeypatch.setattr(cache_escala, "TTL_SEGUNDOS", -1)
+    assert cache_escala.obter(1, 2025, 3) is None
+
+
+def test_lru_descarta_o_usado_ha_mais_tempo(monkeypatch):
+    monkeypatch.setattr(cache_escala, "MAX_ENTRADAS", 2)
+    for mes in (1, 2):
+        cache_escala.guardar(1, 2025, mes, cache_escala.versao_do_mes(1, 2025, mes), b"{}")
+    cache_escala.obter(1, 2025, 1)
+    cache_escala.guardar(1, 2025, 3, cache_escala.versao_do_mes(1, 2025, 3), b"{}")
+    assert cache_escala.obter(1, 2025, 2) is None
+    assert cache_escala.obter(1, 2025, 1) is not None
+    assert cache_escala.obter(1, 2025, 3) is not None
+
+
+def test_cache_desligado(monkeypatch):
+    monkeypatch.setattr(cache_escala, "MAX_ENTRADAS", 0)
+    cache_escala.guardar(1, 2025, 3, cache_escala.versao_do_mes(1, 2025, 3), b"{}")
+    assert cache_escala.obter(1, 2025, 3) is None
+
+
+def test_etag_depende_so_do_corpo():
+    assert cache_escala.etag_do_corpo(b'{"a": 1}') == cache_escala.etag_do_corpo(b'{"a": 1}')
+    assert cache_escala.etag_do_corpo(b'{"a": 1}') != cache_escala.etag_do_corpo(b'{"a": 2}')
+    a = cache_escala.guardar(1, 2025, 3, cache_escala.versao_do_mes(1, 2025, 3), b"{}")
+    cache_escala.invalidar_tudo()
+    b = cache_escala.guardar(1, 2025, 3, cache_escala.versao_do_mes(1, 2025, 3), b"{}")
+    assert a.etag == b.etag
+
+
+@pytest.mark.parametrize("cabecalho, confere", [
+    (None, False),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"x", "abc"', True),
+    ("*", True),
+    ('"abd"', False),
+])
+def test_etag_confere(cabecalho, confere):
+    assert cache_escala.etag_confere(cabecalho, '"abc"') is confere
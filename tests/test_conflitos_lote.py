@@ -0,0 +1,44 @@
+from datetime import date
+
+from backend.database import _conflitos_do_lote
+
+DATAS = {10: date(2025, 3, 2), 11: date(2025, 3, 2), 12: date(2025, 3, 5)}
+VOLUNTARIOS = {1: ("Ana", 2), 2: ("Bia", 1), 3: ("Caio", None)}
+COTAS = {(10, 1): 2, (11, 1): 1, (12, 1): 1}
+FUNCOES = {(1, 1), (2, 1)}
+
+
+def _tipos(ocupantes, mudadas, indisponibilidades=()):
+    conflitos = _conflitos_do_lote(ocupantes, mudadas, DATAS, VOLUNTARIOS, COTAS, FUNCOES, set(indisponibilidades))
+    return sorted((c["tipo"], c["id_voluntario"]) for c in conflitos)
+
+
+def test_lote_valido():
+    ocupantes = {(10, 1, 1): (1, False), (12, 1, 1): (2, False)}
+    assert _tipos(ocupantes, list(ocupantes)) == []
+
+
+def test_vaga_inexistente_e_funcao():
+    ocupantes = {(10, 1, 3): (1, False), (12, 1, 1): (3, False)}
+    assert _tipos(ocupantes, list(ocupantes)) == [("funcao", 3), ("vaga_inexistente", 1)]
+
+
+def test_indisponivel():
+    ocupantes = {(12, 1, 1): (1, False)}
+    assert _tipos(ocupantes, list(ocupantes), {(1, 12)}) == [("indisponivel", 1)]
+
+
+def test_mesmo_dia_e_limite():
+    ocupantes = {(10, 1, 1): (2, False), (11, 1, 1): (2, False)}
+    assert _tipos(ocupantes, [(11, 1, 1)]) == [("limite", 2), ("mesmo_dia", 2)]
+
+
+def test_so_as_vagas_do_lote_sao_conferidas():
+    # A vaga já ocupada fora do lote tem conflito, mas o lote só esvazia outra vaga.
+    ocupantes = {(10, 1, 3): (3, False)}
+    assert _tipos(ocupantes, [(12, 1, 1)]) == []
+
+
+def test_limite_nulo_nao_limita():
+    ocupantes = {(10, 1, 1): (3, False), (12, 1, 1): (3, False)}
+    assert [t for t in _tipos(ocupantes, list(ocupantes)) if t[0] == "limite"] == []
@@ -0,0 +1,115 @@
+import threading
+import time
+
+import psycopg2.extensions
+import pytest
+
+from backend import db_utils
+from backend.db_utils import PoolDeConexoes, PoolEsgotadoError, PoolFechadoError
+
+
+class ConexaoFalsa:
+    def __init__(self):
+        self.closed = 0
+        self.rollbacks = 0
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def abertas(monkeypatch):
+    """Conexões criadas pelo pool, na ordem."""
+    lista = []
+
+    def conectar(dsn):
+        lista.append(ConexaoFalsa())
+        return lista[-1]
+
+    monkeypatch.setattr(db_utils.psycopg2, "connect", conectar)
+    return lista
+
+
+def test_checkin_devolve_a_conexao_para_o_proximo_checkout(abertas):
+    pool = PoolDeConexoes("dsn", minimo=0, maximo=2)
+    conn = pool.checkout()
+    pool.checkin(conn)
+    assert pool.checkout() is conn
+    assert len(abertas) == 1
+
+
+def test_checkin_desfaz_transacao_esquecida(abertas):
+    pool = PoolDeConexoes("dsn", minimo=0, maximo=1)
+    conn = pool.checkout()
+    conn.status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+    pool.checkin(conn)
+    assert conn.rollbacks == 1
+    assert pool.status()["livres"] == 1
+
+
+def test_conexao_fechada_e_descartada(abertas):
+    pool = PoolDeConexoes("dsn", minimo=0, maximo=1)
+    conn = pool.checkout()
+    conn.closed = 1
+    pool.checkin(conn)
+    assert pool.status() == {"maximo": 1, "abertas": 0, "livres": 0, "emprestadas": 0}
+    assert pool.checkout() is not conn
+
+
+def test_pool_esgotado(abertas):
+    pool = PoolDeConexoes("dsn", minimo=0, maximo=1, timeout=0.05)
+    pool.checkout()
+    with pytest.raises(PoolEsgotadoError):
+        pool.checkout()
+
+
+def test_checkout_espera_um_checkin(abertas):
+    pool = PoolDeConexoes("dsn", minimo=0, maximo=1, timeout=5)
+    conn = pool.checkout()
+    recebida = []
+    t = threading.Thread(target=lambda: recebida.append(pool.checkout()))
+    t.start()
+    time.sleep(0.05)
+    pool.checkin(conn)
+    t.join(1)
+    assert recebida == [conn]
+
+
+def test_fechar_fecha_livres_agora_e_emprestadas_no_checkin(abertas):
+    pool = PoolDeConexoes("dsn", minimo=0, maximo=2)
+    livre, emprestada = pool.checkout(), pool.checkout()
+    pool.checkin(livre)
+    pool.fechar()
+    assert livre.closed and not emprestada.closed
+    pool.checkin(emprestada)
+    assert emprestada.closed
+    assert pool.status() == {"maximo": 2, "abertas": 0, "livres": 0, "emprestadas": 0}
+    with pytest.raises(PoolFechadoError):
+        pool.checkout()
+
+
+def test_fechar_acorda_quem_espera(abertas):
+    pool = PoolDeConexoes("dsn", minimo=0, maximo=1, timeout=5)
+    pool.checkout()
+    erros = []
+
+    def esperar():
+        try:
+            pool.checkout()
+        except PoolFechadoError as e:
+            erros.append(e)
+
+    t = threading.Thread(target=esperar)
+    t.start()
+    time.sleep(0.05)
+    pool.fechar()
+    t.join(1)
+    assert len(erros) == 1
@@ -0,0 +1,56 @@
+import random
+from dataclasses import replace
+
+import pytest
+
+from backend.diagnostico import MOTIVOS, limite_superior, motivos_das_vagas
+from backend.motor_escala import gerar_com_motor, vagas_do_snapshot
+
+
+@pytest.fixture(autouse=True)
+def scipy():
+    pytest.importorskip("scipy")
+
+
+@pytest.mark.parametrize("motor", ["greedy", "milp"])
+def test_nenhum_motor_passa_do_limite_superior(snapshot_pequeno, motor):
+    limite = limite_superior(snapshot_pequeno)
+    escala, _, _ = gerar_com_motor(snapshot_pequeno, motor, tempo_limite=30, rng=random.Random(3))
+    assert len(escala) <= limite["maximo"] <= limite["vagas"] == len(vagas_do_snapshot(snapshot_pequeno))
+    assert sum(p["maximo"] for p in limite["por_funcao_servico"]) >= limite["maximo"]
+    assert all(p["maximo"] <= p["vagas"] for p in limite["por_funcao_servico"])
+
+
+def test_escala_fixa_conta_como_preenchida(snapshot_pequeno):
+    escala, _, _ = gerar_com_motor(snapshot_pequeno, "greedy", rng=random.Random(3))
+    limite = limite_superior(snapshot_pequeno, escala_fixa=escala)
+    assert limite["fixas"] == len(escala)
+    assert len(escala) <= limite["maximo"] <= limite_superior(snapshot_pequeno)["maximo"]
+
+
+def test_motivos_somam_as_vagas_abertas(snapshot_pequeno):
+    escala, abertas, _ = gerar_com_motor(snapshot_pequeno, "greedy", rng=random.Random(3))
+    motivos = motivos_das_vagas(snapshot_pequeno, escala)
+    assert motivos["vagas_abertas"] == len(abertas) > 0
+    assert sum(m["vagas"] for m in motivos["por_motivo"]) == len(abertas)
+    assert sum(v["vagas_abertas"] for v in motivos["vagas"]) == len(abertas)
+    assert {m["motivo"] for m in motivos["por_motivo"]} <= set(MOTIVOS)
+
+
+def test_funcao_que_ninguem_tem(snapshot_pequeno):
+    id_funcao = snapshot_pequeno.funcoes[0].id_funcao
+    sem_funcao = replace(snapshot_pequeno, voluntarios=tuple(
+        replace(v, funcoes=v.funcoes - {id_funcao}) for v in snapshot_pequeno.voluntarios))
+    motivos = motivos_das_vagas(sem_funcao, [])
+    assert {v["motivo"] for v in motivos["vagas"] if v["id_funcao"] == id_funcao} == {"sem_funcao"}
+    por_funcao = sum(1 for v in vagas_do_snapshot(sem_funcao) if v.id_funcao == id_funcao)
+    assert limite_superior(sem_funcao)["maximo"] <= len(vagas_do_snapshot(sem_funcao)) - por_funcao
+
+
+def test_limite_do_mes_esgotado(snapshot_pequeno):
+    sem_limite = replace(snapshot_pequeno, voluntarios=tuple(
+        replace(v, limite_escalas_mes=0) for v in snapshot_pequeno.voluntarios))
+    motivos = motivos_das_vagas(sem_limite, [])
+    assert {v["motivo"] for v in motivos["vagas"]} <= {"sem_funcao", "disponibilidade", "limite"}
+    assert any(v["motivo"] == "limite" for v in motivos["vagas"])
+    assert limite_superior(sem_limite)["maximo"] == 0
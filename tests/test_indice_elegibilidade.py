@@ -0,0 +1,94 @@
+import random
+
+import pytest
+
+from backend import cache_escala, indice_elegibilidade
+from backend.elegibilidade import MatrizElegibilidade
+from backend.indice_elegibilidade import IndiceMes
+from backend.modelos_escala import EscalaEntry, chave_da_entrada
+from backend.motor_escala import gerar_com_motor, vagas_do_snapshot
+
+
+def _elegiveis(indice):
+    return {(x["id_evento"], x["id_funcao"]): sorted(x["elegiveis"]) for x in indice.como_dict()["vagas"]}
+
+
+def _referencia(snapshot, escala):
+    """O que o motor diria de cada (evento, função) com essa escala."""
+    vagas = vagas_do_snapshot(snapshot)
+    matriz = MatrizElegibilidade(snapshot, vagas)
+    matriz.registrar_escala(escala)
+    return {(v.id_evento, v.id_funcao): sorted(matriz.elegiveis(v).tolist()) for v in vagas}
+
+
+@pytest.fixture(scope="module")
+def escala_media(snapshot_medio):
+    escala, _, _ = gerar_com_motor(snapshot_medio, "greedy", rng=random.Random(3))
+    return escala
+
+
+def test_indice_igual_ao_motor(snapshot_medio, escala_media):
+    indice = IndiceMes(snapshot_medio, escala_media, 10)
+    assert _elegiveis(indice) == _referencia(snapshot_medio, escala_media)
+    abertas = sum(len(x["instancias_abertas"]) for x in indice.como_dict()["vagas"])
+    assert abertas == len(vagas_do_snapshot(snapshot_medio)) - len(escala_media)
+
+
+def test_aplicar_mudancas_igual_a_montar_de_novo(snapshot_medio, escala_media):
+    indice = IndiceMes(snapshot_medio, escala_media, 10)
+    rng = random.Random(1)
+    atual = {chave_da_entrada(e): e for e in escala_media}
+    mudancas = []
+    for k in rng.sample(sorted(atual), 20):
+        mudancas.append({"id_evento": k[0], "id_funcao": k[1], "funcao_instancia": k[2], "id_voluntario": None})
+        del atual[k]
+    for k in rng.sample(sorted(atual), 10):
+        novo = rng.choice(snapshot_medio.voluntarios).id_voluntario
+        mudancas.append({"id_evento": k[0], "id_funcao": k[1], "funcao_instancia": k[2], "id_voluntario": novo})
+        atual[k] = EscalaEntry(k[0], k[1], novo, k[2])
+    indice.aplicar(mudancas, 11)
+    indice.aplicar(mudancas, 11)   # reaplicar o mesmo cursor não muda nada
+    assert indice.versao == 11
+    assert _elegiveis(indice) == _referencia(snapshot_medio, list(atual.values()))
+    assert _elegiveis(indice) == _elegiveis(IndiceMes(snapshot_medio, list(atual.values()), 11))
+
+
+def test_leitura_atrasada_e_ignorada(snapshot_medio, escala_media):
+    indice = IndiceMes(snapshot_medio, escala_media, 10)
+    e = escala_media[0]
+    indice.aplicar([{"id_evento": e.id_evento, "id_funcao": e.id_funcao, "funcao_instancia": e.funcao_instancia,
+                     "id_voluntario": None}], 9)
+    assert indice.versao == 10
+    assert chave_da_entrada(e) in indice.ocupantes
+
+
+def test_datas_indisponiveis_bloqueiam_os_eventos_do_dia(snapshot_medio):
+    evento = snapshot_medio.eventos[0]
+    mesmo_dia = {ev.id_evento for ev in snapshot_medio.eventos if ev.data_evento == evento.data_evento}
+    livre = _elegiveis(IndiceMes(snapshot_medio, [], 0))
+    id_voluntario = next(v for (id_evento, _), ids in livre.items() if id_evento == evento.id_evento for v in ids)
+
+    bloqueado = _elegiveis(IndiceMes(snapshot_medio, [], 0, [(id_voluntario, evento.data_evento), (-1, evento.data_evento)]))
+    for (id_evento, id_funcao), ids in bloqueado.items():
+        if id_evento in mesmo_dia:
+            assert id_voluntario not in ids
+        else:
+            assert ids == livre[(id_evento, id_funcao)]
+
+
+def test_obter_guardar_e_invalidar(snapshot_pequeno, monkeypatch):
+    monkeypatch.setattr(indice_elegibilidade, "_indices", type(indice_elegibilidade._indices)())
+    indice = IndiceMes(snapshot_pequeno, [], 0)
+
+    validade = indice_elegibilidade.validade_atual(1, 2025, 3)
+    indice_elegibilidade.guardar(1, 2025, 3, indice, validade)
+    assert indice_elegibilidade.obter(1, 2025, 3) is indice
+
+    indice_elegibilidade.invalidar()
+    assert indice_elegibilidade.obter(1, 2025, 3) is None
+
+    # Montado antes de uma mudança de cadastro: não é guardado.
+    validade = indice_elegibilidade.validade_atual(1, 2025, 3)
+    cache_escala.invalidar_tudo()
+    indice_elegibilidade.guardar(1, 2025, 3, indice, validade)
+    assert indice_elegibilidade.obter(1, 2025, 3) is None
@@ -0,0 +1,171 @@
+import threading
+import time
+
+import pytest
+
+from backend import database, jobs_escala
+
+
+@pytest.fixture
+def geracao(monkeypatch):
+    """Jobs sem banco; a geração falsa espera 'liberar' e devolve 'resultado'."""
+    monkeypatch.setattr(jobs_escala, "_jobs", {})
+    monkeypatch.setattr(jobs_escala, "_em_andamento", {})
+    monkeypatch.setattr(jobs_escala, "_inserir", lambda job: None)
+    monkeypatch.setattr(jobs_escala, "_gravar", lambda dados: None)
+    monkeypatch.setattr(jobs_escala, "_ler", lambda id_job: None)
+    estado = {"liberar": threading.Event(), "chamadas": 0,
+              "resultado": {"status": "success", "message": "ok"}}
+    estado["liberar"].set()
+
+    def gerar(ano, mes, id_ministerio, progresso, **parametros):
+        estado["chamadas"] += 1
+        progresso("individuais", vagas=10, alocacoes=3)
+        estado["liberar"].wait(5)
+        if isinstance(estado["resultado"], Exception):
+            raise estado["resultado"]
+        return estado["resultado"]
+
+    monkeypatch.setattr(database, "gerar_escala_automatica", gerar)
+    yield estado
+    estado["liberar"].set()
+
+
+def esperar_fim(id_job, limite=5):
+    fim = time.monotonic() + limite
+    while time.monotonic() < fim:
+        dados = jobs_escala.consultar_job(id_job)
+        if dados["status"] in jobs_escala.STATUS_FINAIS:
+            return dados
+        time.sleep(0.01)
+    raise AssertionError(f"job {id_job} não terminou")
+
+
+def test_job_roda_em_segundo_plano_ate_concluir(geracao):
+    geracao["liberar"].clear()
+    job = jobs_escala.submeter_geracao(1, 2025, 3)
+    assert job["status"] in ("pendente", "executando") and not job["reaproveitado"]
+    geracao["liberar"].set()
+    dados = esperar_fim(job["id_job"])
+    assert dados["status"] == "concluido"
+    assert dados["fase"] == "individuais" and dados["progresso"] == {"vagas": 10, "alocacoes": 3}
+    assert dados["resultado"] == {"status": "success", "message": "ok"}
+    assert jobs_escala.rastro_do_job(job["id_job"])["status"] == "concluido"
+
+
+@pytest.mark.parametrize("resultado, erro", [
+    ({"status": "conflict", "message": "A escala mudou."}, "A escala mudou."),
+    ({"status": "error", "message": "Sem eventos."}, "Sem eventos."),
+    (RuntimeError("falhou"), "Ocorreu um erro interno ao gerar a escala."),
+])
+def test_falha_da_geracao_termina_o_job_em_erro(geracao, resultado, erro):
+    geracao["resultado"] = resultado
+    dados = esperar_fim(jobs_escala.submeter_geracao(1, 2025, 3)["id_job"])
+    assert dados["status"] == "erro"
+    assert dados["erro"] == erro
+
+
+class CursorFalso:
+    def __init__(self, comandos):
+        self.comandos = comandos
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *erro):
+        pass
+
+    def execute(self, sql, parametros=None):
+        self.comandos.append((" ".join(sql.split()), parametros))
+
+    def fetchone(self):
+        return ("job",)
+
+
+class ConexaoFalsa:
+    def __init__(self):
+        self.comandos = []
+
+    def cursor(self):
+        return CursorFalso(self.comandos)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def test_inserir_bate_e_libera_orfaos_do_mes_antes_de_gravar(monkeypatch):
+    conn = ConexaoFalsa()
+
+    class Contexto:
+        def __enter__(self):
+            return conn
+
+        def __exit__(self, *erro):
+            pass
+
+    monkeypatch.setattr(jobs_escala, "get_connection", Contexto)
+    job = jobs_escala.JobEscala(id_job="j1", id_ministerio=1, ano=2025, mes=3)
+    assert jobs_escala._inserir(job) is None
+
+    batimento, orfaos, insercao = conn.comandos
+    assert batimento[0].startswith("INSERT INTO jobs_escala_donos") and batimento[1] == (jobs_escala.DONO,)
+    assert orfaos[0].startswith("UPDATE jobs_escala j SET status = 'erro'")
+    assert orfaos[1] == (jobs_escala._limite_batimento(), 1, 2025, 3)
+    assert insercao[0].startswith("INSERT INTO jobs_escala") and insercao[1][-1] == jobs_escala.DONO
+
+
+def test_uma_so_thread_de_batimento(monkeypatch):
+    batidas = []
+    monkeypatch.setattr(jobs_escala, "_bater", lambda: batidas.append(1) or 0)
+    monkeypatch.setattr(jobs_escala, "INTERVALO_BATIMENTO", 0.01)
+    monkeypatch.setattr(jobs_escala, "_thread_batimento", None)
+    jobs_escala.marcar_jobs_abandonados()
+    thread = jobs_escala._thread_batimento
+    jobs_escala.marcar_jobs_abandonados()
+    try:
+        assert jobs_escala._thread_batimento is thread and thread.is_alive()
+        time.sleep(0.1)
+        assert len(batidas) > 2
+    finally:
+        jobs_escala._parar_batimento.set()
+        thread.join(1)
+    assert not thread.is_alive()
+
+
+def test_pedidos_simultaneos_do_mesmo_mes_viram_um_job(geracao):
+    geracao["liberar"].clear()
+    respostas = []
+    threads = [threading.Thread(target=lambda: respostas.append(jobs_escala.submeter_geracao(1, 2025, 3))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    assert len({r["id_job"] for r in respostas}) == 1
+    assert sum(not r["reaproveitado"] for r in respostas) == 1
+
+    outro_mes = jobs_escala.submeter_geracao(1, 2025, 4)
+    assert outro_mes["id_job"] != respostas[0]["id_job"] and not outro_mes["reaproveitado"]
+
+    geracao["liberar"].set()
+    esperar_fim(respostas[0]["id_job"])
+    esperar_fim(outro_mes["id_job"])
+    assert geracao["chamadas"] == 2
+
+
+def test_mes_volta_a_aceitar_geracao_depois_do_fim(geracao):
+    primeiro = jobs_escala.submeter_geracao(1, 2025, 3)
+    esperar_fim(primeiro["id_job"])
+    segundo = jobs_escala.submeter_geracao(1, 2025, 3)
+    assert segundo["id_job"] != primeiro["id_job"] and not segundo["reaproveitado"]
+    esperar_fim(segundo["id_job"])
+
+
+def test_geracao_ativa_em_outro_worker_e_reaproveitada(geracao, monkeypatch):
+    existente = {"id_job": "outro", "status": "executando"}
+    monkeypatch.setattr(jobs_escala, "_inserir", lambda job: existente)
+    resposta = jobs_escala.submeter_geracao(1, 2025, 3)
+    assert resposta == {**existente, "reaproveitado": True}
+    assert geracao["chamadas"] == 0 and jobs_escala._em_andamento == {}
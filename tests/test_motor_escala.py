@@ -0,0 +1,38 @@
+import random
+
+import pytest
+
+from backend.modelos_escala import chave_da_entrada
+from backend.motor_escala import gerar_alocacoes, gerar_com_motor, vagas_do_snapshot
+from tests.conftest import violacoes
+
+
+def test_guloso_respeita_as_regras(snapshot_medio):
+    escala, abertas, motor = gerar_com_motor(snapshot_medio, "greedy", rng=random.Random(3), busca_local=False)
+    assert motor == "greedy"
+    assert violacoes(snapshot_medio, escala) == []
+    assert len(escala) + len(abertas) == len(vagas_do_snapshot(snapshot_medio))
+
+
+def test_guloso_e_deterministico_com_a_mesma_semente(snapshot_medio):
+    a, _ = gerar_alocacoes(snapshot_medio, random.Random(7))
+    b, _ = gerar_alocacoes(snapshot_medio, random.Random(7))
+    assert a == b
+
+
+def test_motor_desconhecido(snapshot_pequeno):
+    with pytest.raises(ValueError):
+        gerar_com_motor(snapshot_pequeno, "inexistente")
+
+
+def _alocacoes(escala):
+    return {(chave_da_entrada(e), e.id_voluntario) for e in escala}
+
+
+def test_incremental_mantem_a_escala_fixa(snapshot_medio):
+    base, _, _ = gerar_com_motor(snapshot_medio, "greedy", rng=random.Random(3))
+    fixa = base[: len(base) // 2]
+    escala, abertas, _ = gerar_com_motor(snapshot_medio, "greedy", rng=random.Random(4), escala_fixa=fixa, incremental=True)
+    assert _alocacoes(fixa) <= _alocacoes(escala)
+    assert violacoes(snapshot_medio, escala) == []
+    assert not {chave_da_entrada(e) for e in escala} & {v.key for v in abertas.values()}
@@ -0,0 +1,17 @@
+import random
+
+import pytest
+
+from backend.motor_escala import gerar_com_motor, vagas_do_snapshot
+from tests.conftest import violacoes
+
+
+@pytest.mark.parametrize("motor", ["flow", "milp"])
+def test_motores_otimos_preenchem_ao_menos_o_guloso(snapshot_pequeno, motor):
+    pytest.importorskip("scipy")
+    gulosa, _, _ = gerar_com_motor(snapshot_pequeno, "greedy", rng=random.Random(3))
+    escala, abertas, usado = gerar_com_motor(snapshot_pequeno, motor, tempo_limite=30, rng=random.Random(3))
+    assert usado in (motor, "greedy")
+    assert violacoes(snapshot_pequeno, escala) == []
+    assert len(escala) >= len(gulosa)
+    assert len(escala) + len(abertas) == len(vagas_do_snapshot(snapshot_pequeno))
@@ -0,0 +1,76 @@
+import random
+from collections import Counter
+
+import pytest
+
+from backend.modelos_escala import EscalaEntry, chave_da_entrada
+from backend.motor_escala import gerar_com_motor
+from backend.reparo_ausencia import planejar_reparo
+from tests.conftest import violacoes
+
+
+@pytest.fixture(scope="module")
+def publicada(snapshot_medio):
+    # Sem a busca local sobra folga para substituições e cadeias.
+    escala, _, _ = gerar_com_motor(snapshot_medio, "greedy", rng=random.Random(3), busca_local=False)
+    return [(e, False) for e in escala]
+
+
+def _mais_escalado(existentes):
+    return Counter(e.id_voluntario for e, _ in existentes).most_common(1)[0][0]
+
+
+def _aplicar(existentes, plano):
+    ocupantes = {chave_da_entrada(e): e.id_voluntario for e, _ in existentes}
+    for m in plano["mudancas"]:
+        chave = (m["id_evento"], m["id_funcao"], m["funcao_instancia"])
+        assert ocupantes.get(chave) == m["id_voluntario_anterior"]
+        if m["id_voluntario_novo"] is None:
+            ocupantes.pop(chave, None)
+        else:
+            ocupantes[chave] = m["id_voluntario_novo"]
+    return [EscalaEntry(k[0], k[1], v, k[2]) for k, v in ocupantes.items()]
+
+
+def test_plano_tira_o_voluntario_e_mantem_as_regras(snapshot_medio, publicada):
+    tipos = Counter()
+    for ausente in sorted({e.id_voluntario for e, _ in publicada}):
+        plano = planejar_reparo(snapshot_medio, publicada, ausente)
+        deixadas = [e for e, _ in publicada if e.id_voluntario == ausente]
+        assert plano["vagas_deixadas"] == len(deixadas)
+        assert plano["cobertas"] + plano["sem_substituto"] == len(deixadas)
+
+        depois = _aplicar(publicada, plano)
+        assert not [e for e in depois if e.id_voluntario == ausente]
+        assert violacoes(snapshot_medio, depois) == []
+        # Só muda o que precisa: as vagas deixadas e, nas cadeias, a vaga de quem se moveu.
+        do_plano = Counter(m["tipo"] for m in plano["mudancas"])
+        assert len(plano["mudancas"]) == len(deixadas) + do_plano["cadeia"] // 2
+        tipos.update(do_plano)
+    assert tipos["substituicao"] and tipos["cadeia"]
+
+
+def test_so_os_eventos_pedidos(snapshot_medio, publicada):
+    ausente = _mais_escalado(publicada)
+    eventos = sorted({e.id_evento for e, _ in publicada if e.id_voluntario == ausente})
+    plano = planejar_reparo(snapshot_medio, publicada, ausente, eventos[:1])
+    assert plano["ids_eventos"] == eventos[:1]
+    depois = _aplicar(publicada, plano)
+    assert {e.id_evento for e in depois if e.id_voluntario == ausente} == set(eventos[1:])
+
+
+def test_vagas_fixadas_nao_se_movem(snapshot_medio, publicada):
+    ausente = _mais_escalado(publicada)
+    assert any(m["tipo"] == "cadeia" for m in planejar_reparo(snapshot_medio, publicada, ausente)["mudancas"])
+    fixadas = [(e, e.id_voluntario != ausente) for e, _ in publicada]
+    plano = planejar_reparo(snapshot_medio, fixadas, ausente)
+    movidas = {(m["id_evento"], m["id_funcao"], m["funcao_instancia"]) for m in plano["mudancas"]
+               if m["id_voluntario_anterior"] != ausente}
+    assert movidas == set()
+
+
+def test_voluntario_sem_escala_nao_gera_mudancas(snapshot_medio, publicada):
+    escalados = {e.id_voluntario for e, _ in publicada}
+    livre = next(v.id_voluntario for v in snapshot_medio.voluntarios if v.id_voluntario not in escalados)
+    plano = planejar_reparo(snapshot_medio, publicada, livre)
+    assert plano["vagas_deixadas"] == 0 and plano["mudancas"] == []
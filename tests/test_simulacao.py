@@ -0,0 +1,62 @@
+import random
+
+import pytest
+
+from backend.modelos_escala import EscalaEntry
+from backend.motor_escala import gerar_com_motor, vagas_do_snapshot
+from backend.simulacao import aplicar_hipoteses, comparar_escalas
+
+
+def test_hipotese_de_cota_muda_as_vagas(snapshot_pequeno):
+    cota = snapshot_pequeno.cotas[0]
+    novo = aplicar_hipoteses(snapshot_pequeno, cotas=[{"id_servico": cota.id_servico, "id_funcao": cota.id_funcao,
+                                                       "quantidade_necessaria": cota.quantidade_necessaria + 2}])
+    eventos_do_servico = sum(1 for ev in snapshot_pequeno.eventos if ev.id_servico_fixo == cota.id_servico)
+    assert len(vagas_do_snapshot(novo)) == len(vagas_do_snapshot(snapshot_pequeno)) + 2 * eventos_do_servico
+    assert len(novo.cotas) == len(snapshot_pequeno.cotas)
+
+
+def test_hipotese_de_voluntario_troca_so_os_campos_dados(snapshot_pequeno):
+    v = snapshot_pequeno.voluntarios[0]
+    novo = aplicar_hipoteses(snapshot_pequeno, voluntarios=[{"id_voluntario": v.id_voluntario, "limite_escalas_mes": 9,
+                                                             "funcoes": [1], "disponibilidade": None}])
+    trocado = novo.voluntarios[0]
+    assert trocado.limite_escalas_mes == 9 and trocado.funcoes == frozenset({1})
+    assert trocado.disponibilidade == v.disponibilidade
+    assert snapshot_pequeno.voluntarios[0] is v and novo.voluntarios[1:] == snapshot_pequeno.voluntarios[1:]
+
+
+@pytest.mark.parametrize("hipoteses", [
+    {"cotas": [{"id_servico": 999, "id_funcao": 1, "quantidade_necessaria": 1}]},
+    {"voluntarios": [{"id_voluntario": 999, "limite_escalas_mes": 1}]},
+])
+def test_ids_de_fora_do_ministerio(snapshot_pequeno, hipoteses):
+    with pytest.raises(ValueError):
+        aplicar_hipoteses(snapshot_pequeno, **hipoteses)
+
+
+def test_escalas_iguais_nao_tem_mudancas(snapshot_pequeno):
+    escala, _, _ = gerar_com_motor(snapshot_pequeno, "greedy", rng=random.Random(3))
+    diff = comparar_escalas(snapshot_pequeno, escala, list(escala))
+    assert diff["mudancas"] == []
+    assert diff["resumo"]["iguais"] == len(escala)
+    assert diff["resumo"]["preenchidas_antes"] == diff["resumo"]["preenchidas_depois"] == len(escala)
+
+
+def test_adicionadas_removidas_e_trocadas(snapshot_pequeno):
+    escala, _, _ = gerar_com_motor(snapshot_pequeno, "greedy", rng=random.Random(3))
+    removida, trocada, *resto = escala
+    outro = next(v.id_voluntario for v in snapshot_pequeno.voluntarios if v.id_voluntario != trocada.id_voluntario)
+    ocupadas = {(e.id_evento, e.id_funcao, e.funcao_instancia) for e in escala}
+    aberta = next(v for v in vagas_do_snapshot(snapshot_pequeno) if v.key not in ocupadas)
+    depois = resto + [EscalaEntry(trocada.id_evento, trocada.id_funcao, outro, trocada.funcao_instancia),
+                      EscalaEntry(aberta.id_evento, aberta.id_funcao, outro, aberta.funcao_instancia)]
+
+    diff = comparar_escalas(snapshot_pequeno, escala, depois)
+    resumo = diff["resumo"]
+    assert (resumo["adicionadas"], resumo["removidas"], resumo["trocadas"]) == (1, 1, 1)
+    assert resumo["iguais"] == len(resto)
+    assert {m["tipo"]: m["id_voluntario_novo"] for m in diff["mudancas"]} == {"adicionada": outro, "removida": None, "trocada": outro}
+    carga = {c["id_voluntario"]: (c["antes"], c["depois"]) for c in diff["carga"]}
+    antes_outro = sum(1 for e in escala if e.id_voluntario == outro)
+    assert carga[outro] == (antes_outro, antes_outro + 2)